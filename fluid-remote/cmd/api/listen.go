@@ -0,0 +1,69 @@
+package main
+
+import (
+	"errors"
+	"fmt"
+	"io/fs"
+	"net"
+	"os"
+
+	"github.com/aspectrr/fluid.sh/fluid-remote/internal/config"
+)
+
+// unixSocketMode lets the service user and its group connect; the socket
+// replaces a TCP port, so access is controlled by file permissions.
+const unixSocketMode = 0o660
+
+// openListeners opens the TCP listener for cfg.Addr and the Unix domain
+// socket listener for cfg.UnixSocket, skipping whichever is empty.
+func openListeners(cfg config.APIConfig) ([]net.Listener, error) {
+	if cfg.Addr == "" && cfg.UnixSocket == "" {
+		return nil, errors.New("api: neither addr nor unix_socket is set")
+	}
+	var listeners []net.Listener
+	if cfg.Addr != "" {
+		ln, err := net.Listen("tcp", cfg.Addr)
+		if err != nil {
+			return nil, fmt.Errorf("listen on %s: %w", cfg.Addr, err)
+		}
+		listeners = append(listeners, ln)
+	}
+	if cfg.UnixSocket != "" {
+		ln, err := listenUnix(cfg.UnixSocket)
+		if err != nil {
+			for _, l := range listeners {
+				_ = l.Close()
+			}
+			return nil, err
+		}
+		listeners = append(listeners, ln)
+	}
+	return listeners, nil
+}
+
+// listenUnix listens on a Unix domain socket at path. A socket file left by
+// a previous run is removed first; any other kind of file is an error. The
+// socket file is removed again when the listener is closed.
+func listenUnix(path string) (net.Listener, error) {
+	if info, err := os.Lstat(path); err == nil {
+		if info.Mode().Type() != fs.ModeSocket {
+			return nil, fmt.Errorf("unix socket %s: file exists and is not a socket", path)
+		}
+		if conn, err := net.Dial("unix", path); err == nil {
+			_ = conn.Close()
+			return nil, fmt.Errorf("unix socket %s: already in use", path)
+		}
+		if err := os.Remove(path); err != nil {
+			return nil, fmt.Errorf("remove stale unix socket %s: %w", path, err)
+		}
+	}
+	ln, err := net.Listen("unix", path)
+	if err != nil {
+		return nil, fmt.Errorf("listen on unix socket %s: %w", path, err)
+	}
+	if err := os.Chmod(path, unixSocketMode); err != nil {
+		_ = ln.Close()
+		return nil, fmt.Errorf("chmod unix socket %s: %w", path, err)
+	}
+	return ln, nil
+}
@@ -0,0 +1,88 @@
+package main
+
+import (
+	"context"
+	"io"
+	"net"
+	"net/http"
+	"os"
+	"path/filepath"
+	"testing"
+
+	"github.com/stretchr/testify/assert"
+	"github.com/stretchr/testify/require"
+
+	"github.com/aspectrr/fluid.sh/fluid-remote/internal/config"
+)
+
+func TestOpenListeners_TCPAndUnix(t *testing.T) {
+	path := filepath.Join(t.TempDir(), "api.sock")
+	listeners, err := openListeners(config.APIConfig{Addr: "127.0.0.1:0", UnixSocket: path})
+	require.NoError(t, err)
+	require.Len(t, listeners, 2)
+	assert.Equal(t, "tcp", listeners[0].Addr().Network())
+	assert.Equal(t, "unix", listeners[1].Addr().Network())
+
+	info, err := os.Stat(path)
+	require.NoError(t, err)
+	assert.Equal(t, os.FileMode(unixSocketMode), info.Mode().Perm())
+
+	srv := &http.Server{Handler: http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		_, _ = io.WriteString(w, "ok")
+	})}
+	go func() { _ = srv.Serve(listeners[1]) }()
+	defer srv.Close()
+
+	client := &http.Client{Transport: &http.Transport{
+		DialContext: func(ctx context.Context, _, _ string) (net.Conn, error) {
+			var d net.Dialer
+			return d.DialContext(ctx, "unix", path)
+		},
+	}}
+	resp, err := client.Get("http://localhost/v1/health")
+	require.NoError(t, err)
+	body, _ := io.ReadAll(resp.Body)
+	_ = resp.Body.Close()
+	assert.Equal(t, "ok", string(body))
+
+	for _, ln := range listeners {
+		_ = ln.Close()
+	}
+	_, err = os.Stat(path)
+	assert.True(t, os.IsNotExist(err), "socket file should be removed on close")
+}
+
+func TestOpenListeners_UnixOnly(t *testing.T) {
+	path := filepath.Join(t.TempDir(), "api.sock")
+	listeners, err := openListeners(config.APIConfig{UnixSocket: path})
+	require.NoError(t, err)
+	require.Len(t, listeners, 1)
+	_ = listeners[0].Close()
+
+	_, err = openListeners(config.APIConfig{})
+	assert.Error(t, err)
+}
+
+func TestListenUnix_StaleAndInUse(t *testing.T) {
+	dir := t.TempDir()
+
+	// A socket left behind by a process that exited is replaced.
+	stale := filepath.Join(dir, "stale.sock")
+	ln, err := net.Listen("unix", stale)
+	require.NoError(t, err)
+	ln.(*net.UnixListener).SetUnlinkOnClose(false)
+	_ = ln.Close()
+	ln, err = listenUnix(stale)
+	require.NoError(t, err)
+
+	// A socket something still listens on is left alone.
+	_, err = listenUnix(stale)
+	assert.ErrorContains(t, err, "already in use")
+	_ = ln.Close()
+
+	// So is a regular file.
+	file := filepath.Join(dir, "file.sock")
+	require.NoError(t, os.WriteFile(file, nil, 0o600))
+	_, err = listenUnix(file)
+	assert.ErrorContains(t, err, "not a socket")
+}
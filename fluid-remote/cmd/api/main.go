@@ -4,6 +4,7 @@ import (
 	"context"
 	"flag"
 	"log/slog"
+	"net"
 	"net/http"
 	"os"
 	"os/signal"
@@ -63,6 +64,7 @@ func main() {
 	logger.Info("starting virsh-sandbox API",
 		"config", *configPath,
 		"addr", cfg.API.Addr,
+		"unix_socket", cfg.API.UnixSocket,
 		"db", cfg.Database.URL,
 		"network", cfg.Libvirt.Network,
 		"default_vcpus", cfg.VM.DefaultVCPUs,
@@ -230,7 +232,6 @@ func main() {
 		writeTimeout = cfg.API.WriteTimeout
 	}
 	httpSrv := &http.Server{
-		Addr:              cfg.API.Addr,
 		Handler:           restSrv.Router, // use the chi router directly for graceful shutdowns
 		ReadHeaderTimeout: 15 * time.Second,
 		ReadTimeout:       cfg.API.ReadTimeout,
@@ -238,14 +239,21 @@ func main() {
 		IdleTimeout:       cfg.API.IdleTimeout,
 	}
 
-	// Start HTTP server
-	serverErrCh := make(chan error, 1)
-	go func() {
-		logger.Info("http server listening", "addr", cfg.API.Addr)
-		if err := httpSrv.ListenAndServe(); err != nil && err != http.ErrServerClosed {
-			serverErrCh <- err
-		}
-	}()
+	// Start HTTP server on TCP and/or a Unix domain socket
+	listeners, err := openListeners(cfg.API)
+	if err != nil {
+		logger.Error("failed to open listeners", "error", err)
+		os.Exit(1)
+	}
+	serverErrCh := make(chan error, len(listeners))
+	for _, ln := range listeners {
+		go func(ln net.Listener) {
+			logger.Info("http server listening", "network", ln.Addr().Network(), "addr", ln.Addr().String())
+			if err := httpSrv.Serve(ln); err != nil && err != http.ErrServerClosed {
+				serverErrCh <- err
+			}
+		}(ln)
+	}
 
 	// Wait for signal or server error
 	select {
@@ -24,7 +24,8 @@ type Config struct {
 
 // APIConfig holds HTTP server settings.
 type APIConfig struct {
-	Addr            string        `yaml:"addr"`
+	Addr            string        `yaml:"addr"`        // TCP listen address; empty disables TCP
+	UnixSocket      string        `yaml:"unix_socket"` // Optional Unix domain socket path for co-located clients
 	ReadTimeout     time.Duration `yaml:"read_timeout"`
 	WriteTimeout    time.Duration `yaml:"write_timeout"`
 	IdleTimeout     time.Duration `yaml:"idle_timeout"`
@@ -214,6 +215,9 @@ func applyEnvOverrides(cfg *Config) {
 	if v := os.Getenv("API_HTTP_ADDR"); v != "" {
 		cfg.API.Addr = v
 	}
+	if v := os.Getenv("API_UNIX_SOCKET"); v != "" {
+		cfg.API.UnixSocket = v
+	}
 	if v := os.Getenv("API_SHUTDOWN_TIMEOUT_SEC"); v != "" {
 		if d := parseDuration(v); d > 0 {
 			cfg.API.ShutdownTimeout = d
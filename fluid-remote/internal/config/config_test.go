@@ -136,6 +136,7 @@ func TestApplyEnvOverrides_AllFields(t *testing.T) {
 	cfg := DefaultConfig()
 
 	t.Setenv("API_HTTP_ADDR", ":7777")
+	t.Setenv("API_UNIX_SOCKET", "/run/fluid-remote.sock")
 	t.Setenv("API_SHUTDOWN_TIMEOUT_SEC", "30")
 	t.Setenv("DATABASE_URL", "postgresql://test/test")
 	t.Setenv("LIBVIRT_URI", "qemu:///session")
@@ -159,6 +160,7 @@ func TestApplyEnvOverrides_AllFields(t *testing.T) {
 	applyEnvOverrides(cfg)
 
 	assert.Equal(t, ":7777", cfg.API.Addr)
+	assert.Equal(t, "/run/fluid-remote.sock", cfg.API.UnixSocket)
 	assert.Equal(t, 30*time.Second, cfg.API.ShutdownTimeout)
 	assert.Equal(t, "postgresql://test/test", cfg.Database.URL)
 	assert.Equal(t, "qemu:///session", cfg.Libvirt.URI)
@@ -0,0 +1,396 @@
+package json
+
+import (
+	"bytes"
+	"encoding/base64"
+	"encoding/binary"
+	"encoding/json"
+	"fmt"
+	"math"
+	"net/http"
+	"reflect"
+	"sort"
+	"strconv"
+	"strings"
+	"sync"
+	"unicode/utf8"
+)
+
+// ContentTypeCBOR is the media type of CBOR (RFC 8949) response bodies.
+const ContentTypeCBOR = "application/cbor"
+
+// Respond writes v as CBOR if the request's Accept header prefers it and as
+// JSON otherwise. Large string fields (command output) and long string
+// lists (diff paths) are copied into CBOR without escaping, so heavy
+// responses are cheaper to encode and decode than JSON.
+func Respond(w http.ResponseWriter, r *http.Request, status int, v any) error {
+	w.Header().Add("Vary", "Accept")
+	if AcceptsCBOR(r) {
+		return RespondCBOR(w, status, v)
+	}
+	return RespondJSON(w, status, v)
+}
+
+// RespondCBOR writes v as CBOR. The document has the same shape as the
+// JSON one: struct fields are named and omitted by their json tags, times
+// are RFC 3339 strings and []byte values are base64 strings.
+func RespondCBOR(w http.ResponseWriter, status int, v any) error {
+	body, err := EncodeCBOR(v)
+	if err != nil {
+		return RespondJSON(w, http.StatusInternalServerError, map[string]string{
+			"error": "encode cbor: " + err.Error(),
+		})
+	}
+	w.Header().Set("Content-Type", ContentTypeCBOR)
+	w.Header().Set("X-Content-Type-Options", "nosniff")
+	w.Header().Set("Content-Length", strconv.Itoa(len(body)))
+	w.WriteHeader(status)
+	_, err = w.Write(body)
+	return err
+}
+
+// AcceptsCBOR reports whether the Accept header lists application/cbor with
+// a quality at least as high as that of JSON or a wildcard.
+func AcceptsCBOR(r *http.Request) bool {
+	cbor, other := -1.0, -1.0
+	for _, header := range r.Header.Values("Accept") {
+		for _, part := range strings.Split(header, ",") {
+			mediaType, q := parseMediaRange(part)
+			switch mediaType {
+			case ContentTypeCBOR:
+				cbor = math.Max(cbor, q)
+			case "application/json", "application/*", "*/*":
+				other = math.Max(other, q)
+			}
+		}
+	}
+	return cbor > 0 && cbor >= other
+}
+
+func parseMediaRange(s string) (string, float64) {
+	params := strings.Split(s, ";")
+	q := 1.0
+	for _, p := range params[1:] {
+		name, value, ok := strings.Cut(strings.TrimSpace(p), "=")
+		if ok && strings.EqualFold(name, "q") {
+			if f, err := strconv.ParseFloat(value, 64); err == nil {
+				q = f
+			}
+		}
+	}
+	return strings.ToLower(strings.TrimSpace(params[0])), q
+}
+
+// EncodeCBOR encodes v following encoding/json's rules for field names,
+// omitempty and json.Marshaler, so that clients can read either format
+// into the same models. Map keys are sorted.
+func EncodeCBOR(v any) ([]byte, error) {
+	e := cborEncoder{buf: make([]byte, 0, 512)}
+	if err := e.encode(reflect.ValueOf(v)); err != nil {
+		return nil, err
+	}
+	return e.buf, nil
+}
+
+const (
+	cborUnsigned = 0
+	cborNegative = 1
+	cborText     = 3
+	cborArray    = 4
+	cborMap      = 5
+)
+
+var (
+	marshalerType = reflect.TypeOf((*json.Marshaler)(nil)).Elem()
+	numberType    = reflect.TypeOf(json.Number(""))
+)
+
+type cborEncoder struct {
+	buf []byte
+}
+
+func (e *cborEncoder) head(major byte, n uint64) {
+	switch {
+	case n < 24:
+		e.buf = append(e.buf, major<<5|byte(n))
+	case n <= math.MaxUint8:
+		e.buf = append(e.buf, major<<5|24, byte(n))
+	case n <= math.MaxUint16:
+		e.buf = binary.BigEndian.AppendUint16(append(e.buf, major<<5|25), uint16(n))
+	case n <= math.MaxUint32:
+		e.buf = binary.BigEndian.AppendUint32(append(e.buf, major<<5|26), uint32(n))
+	default:
+		e.buf = binary.BigEndian.AppendUint64(append(e.buf, major<<5|27), n)
+	}
+}
+
+func (e *cborEncoder) text(s string) {
+	if !utf8.ValidString(s) {
+		s = validUTF8(s)
+	}
+	e.head(cborText, uint64(len(s)))
+	e.buf = append(e.buf, s...)
+}
+
+// validUTF8 replaces each invalid byte in s with U+FFFD, as encoding/json
+// does, so a CBOR text string is well-formed and matches the JSON one.
+func validUTF8(s string) string {
+	var b strings.Builder
+	b.Grow(len(s) + 8)
+	for _, r := range s {
+		b.WriteRune(r)
+	}
+	return b.String()
+}
+
+func (e *cborEncoder) int(i int64) {
+	if i >= 0 {
+		e.head(cborUnsigned, uint64(i))
+	} else {
+		e.head(cborNegative, uint64(-1-i))
+	}
+}
+
+func (e *cborEncoder) float(f float64) {
+	e.buf = binary.BigEndian.AppendUint64(append(e.buf, 0xfb), math.Float64bits(f))
+}
+
+func (e *cborEncoder) null() {
+	e.buf = append(e.buf, 0xf6)
+}
+
+func (e *cborEncoder) encode(v reflect.Value) error {
+	if !v.IsValid() {
+		e.null()
+		return nil
+	}
+	t := v.Type()
+	if t == numberType {
+		return e.number(json.Number(v.String()))
+	}
+	if t.Implements(marshalerType) {
+		if (v.Kind() == reflect.Pointer || v.Kind() == reflect.Interface) && v.IsNil() {
+			e.null()
+			return nil
+		}
+		return e.marshaler(v.Interface().(json.Marshaler))
+	}
+	switch v.Kind() {
+	case reflect.Bool:
+		if v.Bool() {
+			e.buf = append(e.buf, 0xf5)
+		} else {
+			e.buf = append(e.buf, 0xf4)
+		}
+	case reflect.Int, reflect.Int8, reflect.Int16, reflect.Int32, reflect.Int64:
+		e.int(v.Int())
+	case reflect.Uint, reflect.Uint8, reflect.Uint16, reflect.Uint32, reflect.Uint64, reflect.Uintptr:
+		e.head(cborUnsigned, v.Uint())
+	case reflect.Float32, reflect.Float64:
+		e.float(v.Float())
+	case reflect.String:
+		e.text(v.String())
+	case reflect.Slice:
+		if v.IsNil() {
+			e.null()
+			return nil
+		}
+		if t.Elem().Kind() == reflect.Uint8 {
+			e.text(base64.StdEncoding.EncodeToString(v.Bytes()))
+			return nil
+		}
+		return e.array(v)
+	case reflect.Array:
+		return e.array(v)
+	case reflect.Map:
+		return e.mapValue(v)
+	case reflect.Struct:
+		return e.structValue(v)
+	case reflect.Pointer, reflect.Interface:
+		if v.IsNil() {
+			e.null()
+			return nil
+		}
+		return e.encode(v.Elem())
+	default:
+		return fmt.Errorf("cbor: unsupported type %s", t)
+	}
+	return nil
+}
+
+func (e *cborEncoder) number(n json.Number) error {
+	if i, err := n.Int64(); err == nil {
+		e.int(i)
+		return nil
+	}
+	if u, err := strconv.ParseUint(string(n), 10, 64); err == nil {
+		e.head(cborUnsigned, u)
+		return nil
+	}
+	f, err := n.Float64()
+	if err != nil {
+		return fmt.Errorf("cbor: invalid number %q", n)
+	}
+	e.float(f)
+	return nil
+}
+
+// marshaler encodes a value with its own JSON encoding (time.Time, for
+// instance) by way of the decoded JSON document.
+func (e *cborEncoder) marshaler(m json.Marshaler) error {
+	raw, err := m.MarshalJSON()
+	if err != nil {
+		return err
+	}
+	dec := json.NewDecoder(bytes.NewReader(raw))
+	dec.UseNumber()
+	var doc any
+	if err := dec.Decode(&doc); err != nil {
+		return err
+	}
+	return e.encode(reflect.ValueOf(doc))
+}
+
+func (e *cborEncoder) array(v reflect.Value) error {
+	n := v.Len()
+	e.head(cborArray, uint64(n))
+	for i := 0; i < n; i++ {
+		if err := e.encode(v.Index(i)); err != nil {
+			return err
+		}
+	}
+	return nil
+}
+
+func (e *cborEncoder) mapValue(v reflect.Value) error {
+	if v.IsNil() {
+		e.null()
+		return nil
+	}
+	type entry struct {
+		key   string
+		value reflect.Value
+	}
+	entries := make([]entry, 0, v.Len())
+	iter := v.MapRange()
+	for iter.Next() {
+		k := iter.Key()
+		var key string
+		switch k.Kind() {
+		case reflect.String:
+			key = k.String()
+		case reflect.Int, reflect.Int8, reflect.Int16, reflect.Int32, reflect.Int64:
+			key = strconv.FormatInt(k.Int(), 10)
+		case reflect.Uint, reflect.Uint8, reflect.Uint16, reflect.Uint32, reflect.Uint64, reflect.Uintptr:
+			key = strconv.FormatUint(k.Uint(), 10)
+		default:
+			return fmt.Errorf("cbor: unsupported map key type %s", k.Type())
+		}
+		entries = append(entries, entry{key, iter.Value()})
+	}
+	sort.Slice(entries, func(i, j int) bool { return entries[i].key < entries[j].key })
+	e.head(cborMap, uint64(len(entries)))
+	for _, en := range entries {
+		e.text(en.key)
+		if err := e.encode(en.value); err != nil {
+			return err
+		}
+	}
+	return nil
+}
+
+func (e *cborEncoder) structValue(v reflect.Value) error {
+	fields := cachedFields(v.Type())
+	values := make([]reflect.Value, len(fields))
+	count := 0
+	for i, f := range fields {
+		fv, err := v.FieldByIndexErr(f.index)
+		if err != nil || (f.omitEmpty && isEmptyValue(fv)) {
+			continue // nil embedded pointer or empty
+		}
+		values[i] = fv
+		count++
+	}
+	e.head(cborMap, uint64(count))
+	for i, f := range fields {
+		if !values[i].IsValid() {
+			continue
+		}
+		e.text(f.name)
+		if err := e.encode(values[i]); err != nil {
+			return err
+		}
+	}
+	return nil
+}
+
+type cborField struct {
+	name      string
+	index     []int
+	omitEmpty bool
+}
+
+var fieldCache sync.Map // reflect.Type -> []cborField
+
+func cachedFields(t reflect.Type) []cborField {
+	if f, ok := fieldCache.Load(t); ok {
+		return f.([]cborField)
+	}
+	f, _ := fieldCache.LoadOrStore(t, typeFields(t, nil))
+	return f.([]cborField)
+}
+
+// typeFields lists the fields encoding/json would write for t, with the
+// fields of untagged embedded structs promoted into the outer object.
+func typeFields(t reflect.Type, index []int) []cborField {
+	var fields []cborField
+	for i := 0; i < t.NumField(); i++ {
+		sf := t.Field(i)
+		tag := sf.Tag.Get("json")
+		if tag == "-" {
+			continue
+		}
+		name, opts, _ := strings.Cut(tag, ",")
+		fieldIndex := append(append([]int(nil), index...), i)
+		if sf.Anonymous && name == "" {
+			ft := sf.Type
+			if ft.Kind() == reflect.Pointer {
+				ft = ft.Elem()
+			}
+			if ft.Kind() == reflect.Struct {
+				fields = append(fields, typeFields(ft, fieldIndex)...)
+				continue
+			}
+		}
+		if !sf.IsExported() {
+			continue
+		}
+		if name == "" {
+			name = sf.Name
+		}
+		fields = append(fields, cborField{
+			name:      name,
+			index:     fieldIndex,
+			omitEmpty: strings.Contains(","+opts+",", ",omitempty,"),
+		})
+	}
+	return fields
+}
+
+func isEmptyValue(v reflect.Value) bool {
+	switch v.Kind() {
+	case reflect.Array, reflect.Map, reflect.Slice, reflect.String:
+		return v.Len() == 0
+	case reflect.Bool:
+		return !v.Bool()
+	case reflect.Int, reflect.Int8, reflect.Int16, reflect.Int32, reflect.Int64:
+		return v.Int() == 0
+	case reflect.Uint, reflect.Uint8, reflect.Uint16, reflect.Uint32, reflect.Uint64, reflect.Uintptr:
+		return v.Uint() == 0
+	case reflect.Float32, reflect.Float64:
+		return v.Float() == 0
+	case reflect.Interface, reflect.Pointer:
+		return v.IsNil()
+	}
+	return false
+}
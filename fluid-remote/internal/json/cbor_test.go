@@ -0,0 +1,151 @@
+package json
+
+import (
+	"encoding/hex"
+	"encoding/json"
+	"net/http"
+	"net/http/httptest"
+	"testing"
+	"time"
+
+	"github.com/stretchr/testify/assert"
+	"github.com/stretchr/testify/require"
+)
+
+func TestEncodeCBOR_RFCVectors(t *testing.T) {
+	// From RFC 8949, Appendix A.
+	cases := []struct {
+		value any
+		hex   string
+	}{
+		{0, "00"},
+		{23, "17"},
+		{24, "1818"},
+		{1000, "1903e8"},
+		{1000000, "1a000f4240"},
+		{uint64(18446744073709551615), "1bffffffffffffffff"},
+		{-1, "20"},
+		{-1000, "3903e7"},
+		{1.1, "fb3ff199999999999a"},
+		{false, "f4"},
+		{true, "f5"},
+		{nil, "f6"},
+		{"", "60"},
+		{"IETF", "6449455446"},
+		{"ü", "62c3bc"},
+		{[]int{}, "80"},
+		{[]any{1, []int{2, 3}, []int{4, 5}}, "8301820203820405"},
+		{map[string]any{"a": 1, "b": []int{2, 3}}, "a26161016162820203"},
+	}
+	for _, c := range cases {
+		got, err := EncodeCBOR(c.value)
+		require.NoError(t, err)
+		assert.Equal(t, c.hex, hex.EncodeToString(got), "%#v", c.value)
+	}
+}
+
+type cborEmbedded struct {
+	Host string `json:"host"`
+}
+
+type cborSample struct {
+	cborEmbedded
+	ID       string            `json:"id"`
+	Output   *string           `json:"output,omitempty"`
+	Paths    []string          `json:"paths,omitempty"`
+	Labels   map[string]string `json:"labels"`
+	At       time.Time         `json:"at"`
+	Timeout  *time.Duration    `json:"timeout,omitempty"`
+	Raw      []byte            `json:"raw,omitempty"`
+	Internal string            `json:"-"`
+	private  int
+}
+
+func TestEncodeCBOR_FollowsJSONTags(t *testing.T) {
+	timeout := 2 * time.Second
+	v := cborSample{
+		cborEmbedded: cborEmbedded{Host: "kvm-01"},
+		ID:           "CMD-1",
+		At:           time.Date(2024, 1, 15, 10, 30, 0, 0, time.UTC),
+		Timeout:      &timeout,
+		Raw:          []byte{1, 2},
+		Internal:     "hidden",
+		private:      1,
+	}
+	got, err := EncodeCBOR(v)
+	require.NoError(t, err)
+
+	want := []byte{0xa6}
+	for _, kv := range [][2]string{
+		{"host", "kvm-01"}, {"id", "CMD-1"},
+	} {
+		want = append(want, cborTextBytes(kv[0])...)
+		want = append(want, cborTextBytes(kv[1])...)
+	}
+	want = append(want, cborTextBytes("labels")...)
+	want = append(want, 0xf6) // nil map, like JSON null
+	want = append(want, cborTextBytes("at")...)
+	want = append(want, cborTextBytes("2024-01-15T10:30:00Z")...)
+	want = append(want, cborTextBytes("timeout")...)
+	want = append(want, 0x1a, 0x77, 0x35, 0x94, 0x00) // 2e9 ns
+	want = append(want, cborTextBytes("raw")...)
+	want = append(want, cborTextBytes("AQI=")...)
+	assert.Equal(t, hex.EncodeToString(want), hex.EncodeToString(got))
+}
+
+func TestEncodeCBOR_InvalidUTF8MatchesJSON(t *testing.T) {
+	// Command output is whatever the process wrote, not necessarily UTF-8.
+	stdout := "ok \xff\xfe\x80 done\n"
+	got, err := EncodeCBOR(map[string]string{"stdout": stdout})
+	require.NoError(t, err)
+
+	fromJSON, err := json.Marshal(stdout)
+	require.NoError(t, err)
+	var text string
+	require.NoError(t, json.Unmarshal(fromJSON, &text))
+	assert.Equal(t, "ok \uFFFD\uFFFD\uFFFD done\n", text)
+
+	want := append([]byte{0xa1}, cborTextBytes("stdout")...)
+	want = append(want, cborTextBytes(text)...)
+	assert.Equal(t, hex.EncodeToString(want), hex.EncodeToString(got))
+}
+
+func cborTextBytes(s string) []byte {
+	return append([]byte{0x60 | byte(len(s))}, s...)
+}
+
+func TestAcceptsCBOR(t *testing.T) {
+	cases := map[string]bool{
+		"":                 false,
+		"application/json": false,
+		"application/cbor": true,
+		"application/cbor, application/json;q=0.9": true,
+		"application/json, application/cbor;q=0.5": false,
+		"application/cbor;q=0, */*":                false,
+		"*/*":                                      false,
+	}
+	for accept, want := range cases {
+		r := httptest.NewRequest(http.MethodGet, "/", nil)
+		if accept != "" {
+			r.Header.Set("Accept", accept)
+		}
+		assert.Equal(t, want, AcceptsCBOR(r), accept)
+	}
+}
+
+func TestRespond_Negotiates(t *testing.T) {
+	r := httptest.NewRequest(http.MethodGet, "/", nil)
+	r.Header.Set("Accept", "application/cbor, application/json;q=0.9")
+	w := httptest.NewRecorder()
+	require.NoError(t, Respond(w, r, http.StatusCreated, map[string]int{"total": 1}))
+	assert.Equal(t, http.StatusCreated, w.Code)
+	assert.Equal(t, ContentTypeCBOR, w.Header().Get("Content-Type"))
+	assert.Equal(t, "Accept", w.Header().Get("Vary"))
+	assert.Equal(t, "a165746f74616c01", hex.EncodeToString(w.Body.Bytes()))
+
+	r.Header.Set("Accept", "application/json")
+	w = httptest.NewRecorder()
+	require.NoError(t, Respond(w, r, http.StatusOK, map[string]int{"total": 1}))
+	assert.Equal(t, "application/json; charset=utf-8", w.Header().Get("Content-Type"))
+	assert.JSONEq(t, `{"total": 1}`, w.Body.String())
+}
@@ -2,6 +2,8 @@ package rest
 
 import (
 	"encoding/json"
+	"errors"
+	"fmt"
 	"net/http"
 	"strconv"
 	"time"
@@ -46,6 +48,7 @@ func (h *AccessHandler) RegisterRoutes(r chi.Router) {
 		// Session operations
 		r.Post("/session/start", h.handleRecordSessionStart)
 		r.Post("/session/end", h.handleRecordSessionEnd)
+		r.Post("/sessions/batch", h.handleRecordSessionBatch)
 
 		// List active sessions
 		r.Get("/sessions", h.handleListSessions)
@@ -159,6 +162,44 @@ type sessionEndResponse struct {
 	SessionID string `json:"session_id"`
 }
 
+// maxSessionBatch is the most events accepted in one batch request.
+const maxSessionBatch = 1000
+
+// sessionEvent is one buffered session start or end.
+type sessionEvent struct {
+	// Type is "start" or "end".
+	Type string `json:"type"`
+	// Ref is a client-chosen reference for the session. An end event may
+	// name its session by the ref of a start earlier in the same batch.
+	Ref           string `json:"ref,omitempty"`
+	CertificateID string `json:"certificate_id,omitempty"`
+	SourceIP      string `json:"source_ip,omitempty"`
+	SessionID     string `json:"session_id,omitempty"`
+	Reason        string `json:"reason,omitempty"`
+	// At is when the event happened (RFC3339); defaults to when it is
+	// processed.
+	At string `json:"at,omitempty"`
+}
+
+// sessionBatchRequest is the request body for recording session events in bulk.
+type sessionBatchRequest struct {
+	Events []sessionEvent `json:"events"`
+}
+
+// sessionEventResult is the outcome of one batched event.
+type sessionEventResult struct {
+	Ref       string `json:"ref,omitempty"`
+	SessionID string `json:"session_id,omitempty"`
+	Error     string `json:"error,omitempty"`
+}
+
+// sessionBatchResponse is the response for a session event batch, with one
+// result per event in request order.
+type sessionBatchResponse struct {
+	Results []sessionEventResult `json:"results"`
+	Failed  int                  `json:"failed"`
+}
+
 // revokeCertificateResponse is the response for revoking a certificate.
 type revokeCertificateResponse struct {
 	Message string `json:"message"`
@@ -561,6 +602,92 @@ func (h *AccessHandler) handleRecordSessionEnd(w http.ResponseWriter, r *http.Re
 	})
 }
 
+// handleRecordSessionBatch handles POST /v1/access/sessions/batch
+// @Summary Record session events in bulk
+// @Description Records buffered session starts and ends in order. Each event gets its own result; a failed event does not stop the batch.
+// @Tags Access
+// @Accept json
+// @Produce json
+// @Param request body sessionBatchRequest true "Session events"
+// @Success 200 {object} sessionBatchResponse
+// @Failure 400 {object} accessErrorResponse
+// @Id recordSessionBatch
+// @Router /v1/access/sessions/batch [post]
+func (h *AccessHandler) handleRecordSessionBatch(w http.ResponseWriter, r *http.Request) {
+	var req sessionBatchRequest
+	if err := json.NewDecoder(r.Body).Decode(&req); err != nil {
+		writeError(w, http.StatusBadRequest, "invalid request body", err.Error())
+		return
+	}
+	if len(req.Events) > maxSessionBatch {
+		writeError(w, http.StatusBadRequest, fmt.Sprintf("at most %d events per batch", maxSessionBatch), "")
+		return
+	}
+
+	resp := sessionBatchResponse{Results: make([]sessionEventResult, len(req.Events))}
+	started := make(map[string]string) // ref -> session ID
+	for i, ev := range req.Events {
+		res := &resp.Results[i]
+		res.Ref = ev.Ref
+		if err := h.recordSessionEvent(r, ev, started, res); err != nil {
+			res.Error = err.Error()
+			resp.Failed++
+		}
+	}
+
+	_ = serverJSON.RespondJSON(w, http.StatusOK, resp)
+}
+
+// recordSessionEvent applies one batched event and fills in its result.
+func (h *AccessHandler) recordSessionEvent(r *http.Request, ev sessionEvent, started map[string]string, res *sessionEventResult) error {
+	var at time.Time
+	if ev.At != "" {
+		t, err := time.Parse(time.RFC3339, ev.At)
+		if err != nil {
+			return fmt.Errorf("invalid at: %w", err)
+		}
+		at = t
+	}
+
+	switch ev.Type {
+	case "start":
+		if ev.CertificateID == "" {
+			return errors.New("certificate_id is required")
+		}
+		sourceIP := ev.SourceIP
+		if sourceIP == "" {
+			sourceIP = r.RemoteAddr
+		}
+		sessionID, err := h.accessSvc.RecordSessionStartAt(r.Context(), ev.CertificateID, sourceIP, at)
+		if err != nil {
+			return fmt.Errorf("failed to record session start: %w", err)
+		}
+		if ev.Ref != "" {
+			started[ev.Ref] = sessionID
+		}
+		res.SessionID = sessionID
+	case "end":
+		sessionID := ev.SessionID
+		if sessionID == "" && ev.Ref != "" {
+			sessionID = started[ev.Ref]
+		}
+		if sessionID == "" {
+			return errors.New("session_id or the ref of a recorded start is required")
+		}
+		reason := ev.Reason
+		if reason == "" {
+			reason = "session ended normally"
+		}
+		if err := h.accessSvc.RecordSessionEndAt(r.Context(), sessionID, reason, at); err != nil {
+			return fmt.Errorf("failed to record session end: %w", err)
+		}
+		res.SessionID = sessionID
+	default:
+		return fmt.Errorf("unknown event type %q; expected 'start' or 'end'", ev.Type)
+	}
+	return nil
+}
+
 // handleListSessions handles GET /v1/access/sessions
 // @Summary List sessions
 // @Description Lists access sessions with optional filtering
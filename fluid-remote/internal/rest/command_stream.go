@@ -0,0 +1,211 @@
+package rest
+
+import (
+	"context"
+	"encoding/json"
+	"errors"
+	"net/http"
+	"strings"
+	"sync"
+	"time"
+	"unicode/utf8"
+
+	"github.com/go-chi/chi/v5"
+	"github.com/gorilla/websocket"
+
+	"github.com/aspectrr/fluid.sh/fluid-remote/internal/store"
+	"github.com/aspectrr/fluid.sh/fluid-remote/internal/vm"
+)
+
+const (
+	// commandStreamRequestTimeout bounds how long the server waits for the
+	// run request after the WebSocket upgrade.
+	commandStreamRequestTimeout = 30 * time.Second
+
+	// commandStreamWriteTimeout bounds a single event write. A client that
+	// stops reading for longer than this aborts the command.
+	commandStreamWriteTimeout = 30 * time.Second
+)
+
+// StreamErrorEvent is sent when a streamed command cannot be started.
+type StreamErrorEvent struct {
+	Error string `json:"error"`
+}
+
+// commandStream serialises events onto a command stream WebSocket. Output
+// callbacks for stdout and stderr arrive concurrently, so every write goes
+// through mu.
+type commandStream struct {
+	conn      *websocket.Conn
+	sandboxID string
+	cancel    context.CancelFunc
+
+	mu sync.Mutex
+	// pending holds a trailing partial UTF-8 sequence per stream
+	// (index 0 = stdout, 1 = stderr) until the rest of it arrives.
+	pending [2][]byte
+}
+
+func (cs *commandStream) send(eventType string, payload interface{}) {
+	data, err := json.Marshal(payload)
+	if err != nil {
+		return
+	}
+	event := StreamEvent{
+		Type:      eventType,
+		Timestamp: time.Now().UTC().Format(time.RFC3339),
+		Data:      data,
+		SandboxID: cs.sandboxID,
+	}
+	_ = cs.conn.SetWriteDeadline(time.Now().Add(commandStreamWriteTimeout))
+	if err := cs.conn.WriteJSON(event); err != nil {
+		// The client is gone; stop the command instead of running it blind.
+		cs.cancel()
+	}
+}
+
+func (cs *commandStream) start(cmdID, command string) {
+	cs.mu.Lock()
+	defer cs.mu.Unlock()
+	cs.send("command_start", CommandStartEvent{CommandID: cmdID, Command: command})
+}
+
+func (cs *commandStream) output(cmdID string, chunk []byte, isStderr bool) {
+	cs.mu.Lock()
+	defer cs.mu.Unlock()
+	idx := 0
+	if isStderr {
+		idx = 1
+	}
+	buf := append(cs.pending[idx], chunk...)
+	n := completeUTF8(buf)
+	cs.pending[idx] = append([]byte(nil), buf[n:]...)
+	if n > 0 {
+		cs.send("command_output", CommandOutputEvent{CommandID: cmdID, Output: string(buf[:n]), IsStderr: isStderr})
+	}
+}
+
+// finish flushes any held-back bytes and sends the final event.
+func (cs *commandStream) finish(cmdID string, cmd *store.Command, runErr error) {
+	cs.mu.Lock()
+	defer cs.mu.Unlock()
+	for idx, rest := range cs.pending {
+		if len(rest) > 0 {
+			cs.send("command_output", CommandOutputEvent{CommandID: cmdID, Output: string(rest), IsStderr: idx == 1})
+		}
+		cs.pending[idx] = nil
+	}
+	if cmd == nil {
+		msg := "run command failed"
+		if runErr != nil {
+			msg = runErr.Error()
+		}
+		cs.send("error", StreamErrorEvent{Error: msg})
+		return
+	}
+	end := CommandEndEvent{
+		CommandID: cmd.ID,
+		ExitCode:  cmd.ExitCode,
+		Duration:  cmd.EndedAt.Sub(cmd.StartedAt).String(),
+	}
+	if runErr != nil {
+		end.Error = runErr.Error()
+	}
+	cs.send("command_end", end)
+}
+
+// close ends the stream with a normal closure.
+func (cs *commandStream) close() {
+	cs.mu.Lock()
+	defer cs.mu.Unlock()
+	_ = cs.conn.SetWriteDeadline(time.Now().Add(commandStreamWriteTimeout))
+	_ = cs.conn.WriteMessage(websocket.CloseMessage, websocket.FormatCloseMessage(websocket.CloseNormalClosure, ""))
+}
+
+// completeUTF8 returns the length of the longest prefix of b that does not
+// end in the middle of a UTF-8 sequence, so chunk boundaries never split a
+// character.
+func completeUTF8(b []byte) int {
+	for i := len(b) - 1; i >= 0 && i >= len(b)-utf8.UTFMax; i-- {
+		if utf8.RuneStart(b[i]) {
+			if utf8.FullRune(b[i:]) {
+				return len(b)
+			}
+			return i
+		}
+	}
+	return len(b)
+}
+
+// @Summary Run command in sandbox with streaming output
+// @Description Upgrades to a WebSocket and executes a command inside the sandbox while it streams the output. The client sends a runCommandRequest as the first text message. The server replies with a command_start event, one command_output event per stdout/stderr chunk, and a final command_end event carrying the exit code, then closes the connection. If the command cannot be started an error event is sent instead. The command is persisted exactly as with POST /run.
+// @Tags Sandbox
+// @Param id path string true "Sandbox ID"
+// @Success 101 {string} string "Switching Protocols - WebSocket connection established"
+// @Failure 400 {string} string "Invalid sandbox ID"
+// @Failure 404 {string} string "Sandbox not found"
+// @Id streamSandboxCommand
+// @Router /v1/sandboxes/{id}/run/stream [get]
+func (s *Server) handleRunCommandStream(w http.ResponseWriter, r *http.Request) {
+	id := chi.URLParam(r, "id")
+	if strings.TrimSpace(id) == "" {
+		http.Error(w, "sandbox id is required", http.StatusBadRequest)
+		return
+	}
+
+	// Verify sandbox exists before upgrading so callers get a plain 404.
+	if _, err := s.vmSvc.GetSandbox(r.Context(), id); err != nil {
+		if errors.Is(err, store.ErrNotFound) {
+			http.Error(w, "sandbox not found", http.StatusNotFound)
+			return
+		}
+		http.Error(w, "internal error", http.StatusInternalServerError)
+		return
+	}
+
+	conn, err := upgrader.Upgrade(w, r, nil)
+	if err != nil {
+		return
+	}
+	defer func() { _ = conn.Close() }()
+
+	ctx, cancel := context.WithCancel(r.Context())
+	defer cancel()
+	cs := &commandStream{conn: conn, sandboxID: id, cancel: cancel}
+
+	var req runCommandRequest
+	_ = conn.SetReadDeadline(time.Now().Add(commandStreamRequestTimeout))
+	if err := conn.ReadJSON(&req); err != nil {
+		cs.send("error", StreamErrorEvent{Error: "invalid run request: " + err.Error()})
+		cs.close()
+		return
+	}
+	_ = conn.SetReadDeadline(time.Time{})
+	if req.Command == "" {
+		cs.send("error", StreamErrorEvent{Error: "command is required"})
+		cs.close()
+		return
+	}
+
+	// Keep reading so a client disconnect (or close frame) cancels the command.
+	go func() {
+		for {
+			if _, _, err := conn.NextReader(); err != nil {
+				cancel()
+				return
+			}
+		}
+	}()
+
+	var cmdID string
+	timeout := time.Duration(req.TimeoutSec) * time.Second
+	cmd, runErr := s.vmSvc.RunCommandStream(ctx, id, req.Username, req.PrivateKeyPath, req.Command, timeout, req.Env, vm.CommandStreamHooks{
+		OnStart: func(startedID string) {
+			cmdID = startedID
+			cs.start(startedID, req.Command)
+		},
+		OnOutput: cs.output,
+	})
+	cs.finish(cmdID, cmd, runErr)
+	cs.close()
+}
@@ -150,7 +150,9 @@ func (s *Server) routes() {
 				r.Post("/sshkey", s.handleInjectSSHKey)
 				r.Post("/start", s.handleStartSandbox)
 				r.Post("/run", s.handleRunCommand)
+				r.Get("/run/stream", s.handleRunCommandStream)
 				r.Post("/snapshot", s.handleCreateSnapshot)
+				r.Get("/diff", s.handleGetCachedDiff)
 				r.Post("/diff", s.handleDiffSnapshots)
 
 				r.Post("/generate/{tool}", s.handleGenerate) // tool ∈ {ansible, puppet}
@@ -493,13 +495,13 @@ func (s *Server) handleRunCommand(w http.ResponseWriter, r *http.Request) {
 		// If we have a command result (with stderr/stdout), return it even on error.
 		// This allows callers to see SSH error messages in stderr.
 		if cmd != nil {
-			_ = serverJSON.RespondJSON(w, http.StatusOK, runCommandResponse{Command: cmd})
+			_ = serverJSON.Respond(w, r, http.StatusOK, runCommandResponse{Command: cmd})
 			return
 		}
 		serverError.RespondError(w, http.StatusInternalServerError, fmt.Errorf("run command: %w", err))
 		return
 	}
-	_ = serverJSON.RespondJSON(w, http.StatusOK, runCommandResponse{Command: cmd})
+	_ = serverJSON.Respond(w, r, http.StatusOK, runCommandResponse{Command: cmd})
 }
 
 // @Summary Create snapshot
@@ -561,7 +563,40 @@ func (s *Server) handleDiffSnapshots(w http.ResponseWriter, r *http.Request) {
 		serverError.RespondError(w, http.StatusInternalServerError, fmt.Errorf("diff snapshots: %w", err))
 		return
 	}
-	_ = serverJSON.RespondJSON(w, http.StatusOK, diffResponse{Diff: d})
+	_ = serverJSON.Respond(w, r, http.StatusOK, diffResponse{Diff: d})
+}
+
+// @Summary Get cached diff
+// @Description Returns the stored diff between two snapshots without computing it
+// @Tags Sandbox
+// @Produce json
+// @Param id path string true "Sandbox ID"
+// @Param from_snapshot query string true "Source snapshot name"
+// @Param to_snapshot query string true "Target snapshot name"
+// @Success 200 {object} diffResponse
+// @Failure 400 {object} ErrorResponse
+// @Failure 404 {object} ErrorResponse
+// @Failure 500 {object} ErrorResponse
+// @Id getCachedDiff
+// @Router /v1/sandboxes/{id}/diff [get]
+func (s *Server) handleGetCachedDiff(w http.ResponseWriter, r *http.Request) {
+	id := chi.URLParam(r, "id")
+	from := r.URL.Query().Get("from_snapshot")
+	to := r.URL.Query().Get("to_snapshot")
+	if from == "" || to == "" {
+		serverError.RespondError(w, http.StatusBadRequest, errors.New("from_snapshot and to_snapshot are required"))
+		return
+	}
+	d, err := s.vmSvc.GetCachedDiff(r.Context(), id, from, to)
+	if err != nil {
+		if errors.Is(err, store.ErrNotFound) {
+			serverError.RespondError(w, http.StatusNotFound, fmt.Errorf("no diff for %s..%s", from, to))
+			return
+		}
+		serverError.RespondError(w, http.StatusInternalServerError, fmt.Errorf("get diff: %w", err))
+		return
+	}
+	_ = serverJSON.Respond(w, r, http.StatusOK, diffResponse{Diff: d})
 }
 
 // @Summary Generate configuration
@@ -666,7 +701,7 @@ func (s *Server) handleListVMs(w http.ResponseWriter, r *http.Request) {
 			})
 		}
 
-		_ = serverJSON.RespondJSON(w, http.StatusOK, listVMsResponse{VMs: vms, HostErrors: hostErrors})
+		_ = serverJSON.Respond(w, r, http.StatusOK, listVMsResponse{VMs: vms, HostErrors: hostErrors})
 		return
 	}
 
@@ -692,7 +727,7 @@ func (s *Server) handleListVMs(w http.ResponseWriter, r *http.Request) {
 		})
 	}
 
-	_ = serverJSON.RespondJSON(w, http.StatusOK, listVMsResponse{VMs: vms})
+	_ = serverJSON.Respond(w, r, http.StatusOK, listVMsResponse{VMs: vms})
 }
 
 // @Summary List sandboxes
@@ -775,7 +810,7 @@ func (s *Server) handleListSandboxes(w http.ResponseWriter, r *http.Request) {
 		})
 	}
 
-	_ = serverJSON.RespondJSON(w, http.StatusOK, listSandboxesResponse{
+	_ = serverJSON.Respond(w, r, http.StatusOK, listSandboxesResponse{
 		Sandboxes: result,
 		Total:     len(result),
 	})
@@ -872,7 +907,7 @@ func (s *Server) handleGetSandbox(w http.ResponseWriter, r *http.Request) {
 		resp.Commands = cmds
 	}
 
-	_ = serverJSON.RespondJSON(w, http.StatusOK, resp)
+	_ = serverJSON.Respond(w, r, http.StatusOK, resp)
 }
 
 // --- List Sandbox Commands DTOs ---
@@ -903,23 +938,21 @@ func (s *Server) handleListSandboxCommands(w http.ResponseWriter, r *http.Reques
 		return
 	}
 
-	// Build list options from query params
-	var opts *store.ListOptions
+	// Build list options from query params. Commands are listed newest
+	// first so clients can page until they reach commands they already have.
+	opts := &store.ListOptions{OrderBy: "started_at"}
 	limitStr := r.URL.Query().Get("limit")
 	offsetStr := r.URL.Query().Get("offset")
-	if limitStr != "" || offsetStr != "" {
-		opts = &store.ListOptions{}
-		if limitStr != "" {
-			if _, err := fmt.Sscanf(limitStr, "%d", &opts.Limit); err != nil {
-				serverError.RespondError(w, http.StatusBadRequest, fmt.Errorf("invalid limit: %w", err))
-				return
-			}
+	if limitStr != "" {
+		if _, err := fmt.Sscanf(limitStr, "%d", &opts.Limit); err != nil {
+			serverError.RespondError(w, http.StatusBadRequest, fmt.Errorf("invalid limit: %w", err))
+			return
 		}
-		if offsetStr != "" {
-			if _, err := fmt.Sscanf(offsetStr, "%d", &opts.Offset); err != nil {
-				serverError.RespondError(w, http.StatusBadRequest, fmt.Errorf("invalid offset: %w", err))
-				return
-			}
+	}
+	if offsetStr != "" {
+		if _, err := fmt.Sscanf(offsetStr, "%d", &opts.Offset); err != nil {
+			serverError.RespondError(w, http.StatusBadRequest, fmt.Errorf("invalid offset: %w", err))
+			return
 		}
 	}
 
@@ -933,7 +966,7 @@ func (s *Server) handleListSandboxCommands(w http.ResponseWriter, r *http.Reques
 		return
 	}
 
-	_ = serverJSON.RespondJSON(w, http.StatusOK, listSandboxCommandsResponse{
+	_ = serverJSON.Respond(w, r, http.StatusOK, listSandboxCommandsResponse{
 		Commands: cmds,
 		Total:    len(cmds),
 	})
@@ -968,6 +1001,7 @@ type CommandEndEvent struct {
 	CommandID string `json:"command_id"`
 	ExitCode  int    `json:"exit_code"`
 	Duration  string `json:"duration"`
+	Error     string `json:"error,omitempty"` // set when the command ran but SSH reported a failure
 }
 
 // FileChangeEvent is sent when files are modified.
@@ -1039,35 +1073,49 @@ func (s *Server) handleSandboxStream(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
-	// Send existing commands
-	cmds, _ := s.vmSvc.GetSandboxCommands(r.Context(), id, &store.ListOptions{Limit: 50})
-	for _, cmd := range cmds {
-		cmdData, _ := json.Marshal(map[string]interface{}{
-			"command_id": cmd.ID,
-			"command":    cmd.Command,
-			"stdout":     cmd.Stdout,
-			"stderr":     cmd.Stderr,
-			"exit_code":  cmd.ExitCode,
-			"started_at": cmd.StartedAt.Format(time.RFC3339),
-			"ended_at":   cmd.EndedAt.Format(time.RFC3339),
-		})
-		cmdEvent := StreamEvent{
-			Type:      "command_history",
-			Timestamp: cmd.EndedAt.Format(time.RFC3339),
-			Data:      cmdData,
-			SandboxID: sb.ID,
-		}
-		if err := conn.WriteJSON(cmdEvent); err != nil {
-			return
+	// Commands are read newest first and sent oldest first. IDs already
+	// sent are remembered so a poll only forwards commands it has not seen.
+	recent := &store.ListOptions{OrderBy: "started_at", Limit: 50}
+	sent := make(map[string]struct{})
+	sendCommands := func(cmds []*store.Command, eventType string) error {
+		for i := len(cmds) - 1; i >= 0; i-- {
+			cmd := cmds[i]
+			if _, ok := sent[cmd.ID]; ok {
+				continue
+			}
+			cmdData, _ := json.Marshal(map[string]interface{}{
+				"command_id": cmd.ID,
+				"command":    cmd.Command,
+				"stdout":     cmd.Stdout,
+				"stderr":     cmd.Stderr,
+				"exit_code":  cmd.ExitCode,
+				"started_at": cmd.StartedAt.Format(time.RFC3339),
+				"ended_at":   cmd.EndedAt.Format(time.RFC3339),
+			})
+			cmdEvent := StreamEvent{
+				Type:      eventType,
+				Timestamp: cmd.EndedAt.Format(time.RFC3339),
+				Data:      cmdData,
+				SandboxID: sb.ID,
+			}
+			if err := conn.WriteJSON(cmdEvent); err != nil {
+				return err
+			}
+			sent[cmd.ID] = struct{}{}
 		}
+		return nil
+	}
+
+	// Send existing commands
+	cmds, _ := s.vmSvc.GetSandboxCommands(r.Context(), id, recent)
+	if err := sendCommands(cmds, "command_history"); err != nil {
+		return
 	}
 
 	// Keep connection alive with heartbeats and poll for new commands
 	ticker := time.NewTicker(5 * time.Second)
 	defer ticker.Stop()
 
-	lastCommandCount := len(cmds)
-
 	for {
 		select {
 		case <-r.Context().Done():
@@ -1079,31 +1127,9 @@ func (s *Server) handleSandboxStream(w http.ResponseWriter, r *http.Request) {
 			}
 
 			// Check for new commands
-			newCmds, _ := s.vmSvc.GetSandboxCommands(r.Context(), id, &store.ListOptions{Limit: 50})
-			if len(newCmds) > lastCommandCount {
-				// Send new commands
-				for i := lastCommandCount; i < len(newCmds); i++ {
-					cmd := newCmds[i]
-					cmdData, _ := json.Marshal(map[string]interface{}{
-						"command_id": cmd.ID,
-						"command":    cmd.Command,
-						"stdout":     cmd.Stdout,
-						"stderr":     cmd.Stderr,
-						"exit_code":  cmd.ExitCode,
-						"started_at": cmd.StartedAt.Format(time.RFC3339),
-						"ended_at":   cmd.EndedAt.Format(time.RFC3339),
-					})
-					cmdEvent := StreamEvent{
-						Type:      "command_new",
-						Timestamp: cmd.EndedAt.Format(time.RFC3339),
-						Data:      cmdData,
-						SandboxID: sb.ID,
-					}
-					if err := conn.WriteJSON(cmdEvent); err != nil {
-						return
-					}
-				}
-				lastCommandCount = len(newCmds)
+			newCmds, _ := s.vmSvc.GetSandboxCommands(r.Context(), id, recent)
+			if err := sendCommands(newCmds, "command_new"); err != nil {
+				return
 			}
 
 			// Send heartbeat
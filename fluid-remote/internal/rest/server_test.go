@@ -533,3 +533,42 @@ func TestStreamEventJSON_Heartbeat(t *testing.T) {
 		t.Error("expected data to be omitted for heartbeat event")
 	}
 }
+
+func TestCompleteUTF8(t *testing.T) {
+	euro := []byte("€") // 3-byte sequence
+	tests := []struct {
+		name string
+		in   []byte
+		want int
+	}{
+		{"ascii", []byte("hello\n"), 6},
+		{"empty", nil, 0},
+		{"complete multibyte", append([]byte("a"), euro...), 4},
+		{"split after first byte", append([]byte("a"), euro[:1]...), 1},
+		{"split after second byte", append([]byte("ab"), euro[:2]...), 2},
+	}
+	for _, tt := range tests {
+		t.Run(tt.name, func(t *testing.T) {
+			if got := completeUTF8(tt.in); got != tt.want {
+				t.Errorf("completeUTF8(%q) = %d, want %d", tt.in, got, tt.want)
+			}
+		})
+	}
+}
+
+func TestCommandEndEventJSON_OmitsEmptyError(t *testing.T) {
+	data, err := json.Marshal(CommandEndEvent{CommandID: "CMD-1", ExitCode: 0, Duration: "1s"})
+	if err != nil {
+		t.Fatalf("failed to marshal command end event: %v", err)
+	}
+	var rawMap map[string]interface{}
+	if err := json.Unmarshal(data, &rawMap); err != nil {
+		t.Fatalf("failed to unmarshal to map: %v", err)
+	}
+	if _, exists := rawMap["error"]; exists {
+		t.Error("expected error to be omitted on success")
+	}
+	if rawMap["exit_code"] != float64(0) {
+		t.Errorf("expected exit_code 0, got %v", rawMap["exit_code"])
+	}
+}
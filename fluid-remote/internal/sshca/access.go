@@ -269,8 +269,20 @@ func (s *AccessService) RevokeAccess(ctx context.Context, certificateID, reason
 	return nil
 }
 
+// MaxSessionEventAge bounds how far back a buffered session event may be
+// dated; older timestamps are clamped to it.
+const MaxSessionEventAge = 5 * time.Minute
+
 // RecordSessionStart records the start of an SSH session.
 func (s *AccessService) RecordSessionStart(ctx context.Context, certificateID, sourceIP string) (string, error) {
+	return s.RecordSessionStartAt(ctx, certificateID, sourceIP, time.Time{})
+}
+
+// RecordSessionStartAt records the start of an SSH session observed at the
+// given time, e.g. by a client that buffers audit events. A zero time means
+// now; future times are clamped to now and times older than
+// MaxSessionEventAge to that bound.
+func (s *AccessService) RecordSessionStartAt(ctx context.Context, certificateID, sourceIP string, at time.Time) (string, error) {
 	s.mu.Lock()
 	defer s.mu.Unlock()
 
@@ -288,7 +300,13 @@ func (s *AccessService) RecordSessionStart(ctx context.Context, certificateID, s
 	if cert.Status != CertStatusActive {
 		return "", fmt.Errorf("certificate status is %s, not active", cert.Status)
 	}
-	if cert.IsExpired() {
+	expired := cert.IsExpired()
+	if !at.IsZero() {
+		// A buffered start only needs the certificate valid when it happened.
+		at = s.clampEventTime(at)
+		expired = at.After(cert.ValidBefore)
+	}
+	if expired {
 		return "", fmt.Errorf("certificate has expired")
 	}
 
@@ -301,6 +319,9 @@ func (s *AccessService) RecordSessionStart(ctx context.Context, certificateID, s
 	// Create session record
 	sessionID := s.generateSessionID()
 	now := s.timeNowFn()
+	if !at.IsZero() {
+		now = at
+	}
 
 	session := &AccessSession{
 		ID:            sessionID,
@@ -329,6 +350,12 @@ func (s *AccessService) RecordSessionStart(ctx context.Context, certificateID, s
 
 // RecordSessionEnd records the end of an SSH session.
 func (s *AccessService) RecordSessionEnd(ctx context.Context, sessionID, reason string) error {
+	return s.RecordSessionEndAt(ctx, sessionID, reason, time.Time{})
+}
+
+// RecordSessionEndAt records the end of an SSH session observed at the given
+// time, clamped like in RecordSessionStartAt.
+func (s *AccessService) RecordSessionEndAt(ctx context.Context, sessionID, reason string, at time.Time) error {
 	s.mu.Lock()
 	defer s.mu.Unlock()
 
@@ -337,9 +364,25 @@ func (s *AccessService) RecordSessionEnd(ctx context.Context, sessionID, reason
 	}
 
 	now := s.timeNowFn()
+	if !at.IsZero() {
+		now = s.clampEventTime(at)
+	}
 	return s.store.EndSession(ctx, sessionID, now, reason)
 }
 
+// clampEventTime limits a client-supplied event time to
+// [now-MaxSessionEventAge, now].
+func (s *AccessService) clampEventTime(at time.Time) time.Time {
+	now := s.timeNowFn()
+	if at.After(now) {
+		return now
+	}
+	if oldest := now.Add(-MaxSessionEventAge); at.Before(oldest) {
+		return oldest
+	}
+	return at
+}
+
 // GetCertificate retrieves certificate information.
 func (s *AccessService) GetCertificate(ctx context.Context, id string) (*CertificateRecord, error) {
 	if s.store == nil {
@@ -0,0 +1,88 @@
+package sshca
+
+import (
+	"context"
+	"testing"
+	"time"
+)
+
+type stubVMInfo struct{}
+
+func (stubVMInfo) GetSandboxIP(ctx context.Context, sandboxID string) (string, error) {
+	return "10.0.0.5", nil
+}
+
+func (stubVMInfo) GetSandboxVMName(ctx context.Context, sandboxID string) (string, error) {
+	return "vm-" + sandboxID, nil
+}
+
+func (stubVMInfo) IsSandboxRunning(ctx context.Context, sandboxID string) (bool, error) {
+	return true, nil
+}
+
+func newTestAccessService(t *testing.T, now time.Time) (*AccessService, *MemoryStore) {
+	t.Helper()
+	store := NewMemoryStore()
+	cert := &CertificateRecord{
+		ID:          "CERT-1",
+		SandboxID:   "SBX-1",
+		UserID:      "alice",
+		ValidAfter:  now.Add(-time.Minute),
+		ValidBefore: now.Add(-30 * time.Second),
+		Status:      CertStatusActive,
+		IssuedAt:    now.Add(-time.Minute),
+	}
+	if err := store.CreateCertificate(context.Background(), cert); err != nil {
+		t.Fatalf("CreateCertificate: %v", err)
+	}
+	svc := NewAccessService(nil, store, stubVMInfo{}, DefaultAccessServiceConfig(),
+		WithAccessTimeNow(func() time.Time { return now }))
+	return svc, store
+}
+
+func TestRecordSessionStartAt_BufferedEventBeforeExpiry(t *testing.T) {
+	ctx := context.Background()
+	now := time.Date(2026, 1, 1, 12, 0, 0, 0, time.UTC)
+	svc, store := newTestAccessService(t, now)
+
+	// The certificate expired 30s ago, but the session started 45s ago.
+	at := now.Add(-45 * time.Second)
+	id, err := svc.RecordSessionStartAt(ctx, "CERT-1", "192.0.2.1", at)
+	if err != nil {
+		t.Fatalf("RecordSessionStartAt: %v", err)
+	}
+	session, err := store.GetSession(ctx, id)
+	if err != nil {
+		t.Fatalf("GetSession: %v", err)
+	}
+	if !session.StartedAt.Equal(at) {
+		t.Errorf("StartedAt = %v, want %v", session.StartedAt, at)
+	}
+
+	if _, err := svc.RecordSessionStart(ctx, "CERT-1", "192.0.2.1"); err == nil {
+		t.Error("expected an unbuffered start with an expired certificate to fail")
+	}
+}
+
+func TestRecordSessionEndAt_ClampsEventTime(t *testing.T) {
+	ctx := context.Background()
+	now := time.Date(2026, 1, 1, 12, 0, 0, 0, time.UTC)
+	svc, store := newTestAccessService(t, now)
+
+	id, err := svc.RecordSessionStartAt(ctx, "CERT-1", "", now.Add(-time.Hour))
+	if err != nil {
+		t.Fatalf("RecordSessionStartAt: %v", err)
+	}
+	session, _ := store.GetSession(ctx, id)
+	if want := now.Add(-MaxSessionEventAge); !session.StartedAt.Equal(want) {
+		t.Errorf("StartedAt = %v, want clamped to %v", session.StartedAt, want)
+	}
+
+	if err := svc.RecordSessionEndAt(ctx, id, "done", now.Add(time.Hour)); err != nil {
+		t.Fatalf("RecordSessionEndAt: %v", err)
+	}
+	session, _ = store.GetSession(ctx, id)
+	if session.EndedAt == nil || !session.EndedAt.Equal(now) {
+		t.Errorf("EndedAt = %v, want clamped to %v", session.EndedAt, now)
+	}
+}
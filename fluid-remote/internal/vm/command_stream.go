@@ -0,0 +1,88 @@
+package vm
+
+import (
+	"context"
+	"time"
+
+	"github.com/aspectrr/fluid.sh/fluid-remote/internal/store"
+)
+
+// OutputFunc receives a chunk of command output as soon as it is read from
+// the remote command. It may be called concurrently for stdout and stderr.
+// The chunk is only valid for the duration of the call.
+type OutputFunc func(chunk []byte, isStderr bool)
+
+// StreamingSSHRunner is implemented by SSH runners that can deliver output
+// while the remote command is still running. Runners that do not implement it
+// still work with RunCommandStream; their output is delivered once the
+// command has finished.
+type StreamingSSHRunner interface {
+	// RunStreaming behaves like Run (or RunWithCert when certPath is set) but
+	// passes every chunk of stdout and stderr to onOutput as it arrives. The
+	// complete output is still returned for persistence.
+	RunStreaming(ctx context.Context, addr, user, privateKeyPath, certPath, command string, timeout time.Duration, env map[string]string, onOutput OutputFunc) (stdout, stderr string, exitCode int, err error)
+}
+
+// CommandStreamHooks receives progress callbacks from RunCommandStream.
+// Both fields are optional.
+type CommandStreamHooks struct {
+	// OnStart is called with the command ID once the sandbox has been
+	// resolved and credentials prepared, just before the command executes.
+	OnStart func(cmdID string)
+
+	// OnOutput is called with each chunk of stdout or stderr. It may be
+	// called concurrently for the two streams.
+	OnOutput func(cmdID string, chunk []byte, isStderr bool)
+}
+
+// RunCommandStream executes a command inside the sandbox like RunCommand,
+// reporting its progress through hooks while it runs. The returned command is
+// persisted exactly as RunCommand would persist it.
+func (s *Service) RunCommandStream(ctx context.Context, sandboxID, username, privateKeyPath, command string, timeout time.Duration, env map[string]string, hooks CommandStreamHooks) (*store.Command, error) {
+	return s.runCommand(ctx, sandboxID, username, privateKeyPath, command, timeout, env, &hooks)
+}
+
+// runSSHStreaming runs command through the configured SSH runner, forwarding
+// output chunks to onOutput. certPath is empty for key-only authentication.
+func (s *Service) runSSHStreaming(ctx context.Context, cmdID, addr, user, privateKeyPath, certPath, command string, timeout time.Duration, env map[string]string, onOutput func(cmdID string, chunk []byte, isStderr bool)) (string, string, int, error) {
+	emit := func(chunk []byte, isStderr bool) { onOutput(cmdID, chunk, isStderr) }
+
+	if sr, ok := s.ssh.(StreamingSSHRunner); ok {
+		return sr.RunStreaming(ctx, addr, user, privateKeyPath, certPath, command, timeout, env, emit)
+	}
+
+	var stdout, stderr string
+	var code int
+	var err error
+	if certPath != "" {
+		stdout, stderr, code, err = s.ssh.RunWithCert(ctx, addr, user, privateKeyPath, certPath, command, timeout, env)
+	} else {
+		stdout, stderr, code, err = s.ssh.Run(ctx, addr, user, privateKeyPath, command, timeout, env)
+	}
+	// The runner cannot stream, so deliver the output in one piece.
+	if stdout != "" {
+		emit([]byte(stdout), false)
+	}
+	if stderr != "" {
+		emit([]byte(stderr), true)
+	}
+	return stdout, stderr, code, err
+}
+
+// outputWriter adapts an OutputFunc to io.Writer for exec.Cmd.
+type outputWriter struct {
+	fn       OutputFunc
+	isStderr bool
+}
+
+func (w outputWriter) Write(p []byte) (int, error) {
+	w.fn(p, w.isStderr)
+	return len(p), nil
+}
+
+// RunStreaming implements StreamingSSHRunner using the local ssh client.
+// Output is read through pipes, so chunks reach onOutput as soon as ssh
+// writes them rather than when the command exits.
+func (r *DefaultSSHRunner) RunStreaming(ctx context.Context, addr, user, privateKeyPath, certPath, command string, timeout time.Duration, _ map[string]string, onOutput OutputFunc) (string, string, int, error) {
+	return r.run(ctx, addr, user, privateKeyPath, certPath, command, timeout, onOutput)
+}
@@ -6,6 +6,7 @@ import (
 	"encoding/json"
 	"errors"
 	"fmt"
+	"io"
 	"log/slog"
 	"os"
 	"os/exec"
@@ -543,9 +544,17 @@ func (s *Service) GetSandboxCommands(ctx context.Context, sandboxID string, opts
 	if strings.TrimSpace(sandboxID) == "" {
 		return nil, fmt.Errorf("sandboxID is required")
 	}
-	// Verify sandbox exists
+	// Verify sandbox exists. A destroyed sandbox is hidden from reads, but
+	// its command history is kept and can still be listed.
 	if _, err := s.store.GetSandbox(ctx, sandboxID); err != nil {
-		return nil, err
+		if !errors.Is(err, store.ErrNotFound) {
+			return nil, err
+		}
+		cmds, listErr := s.store.ListCommands(ctx, sandboxID, opts)
+		if listErr != nil || len(cmds) == 0 {
+			return nil, err
+		}
+		return cmds, nil
 	}
 	return s.store.ListCommands(ctx, sandboxID, opts)
 }
@@ -816,6 +825,7 @@ func (s *Service) CreateSnapshot(ctx context.Context, sandboxID, name string, ex
 }
 
 // DiffSnapshots computes a normalized change set between two snapshots and persists a Diff.
+// Snapshots are immutable, so a diff already stored for the same pair is returned as is.
 // Note: This implementation currently aggregates command history into CommandsRun and
 // leaves file/package/service diffs empty. A dedicated diff engine should populate these fields
 // by mounting snapshots and computing differences.
@@ -823,6 +833,11 @@ func (s *Service) DiffSnapshots(ctx context.Context, sandboxID, from, to string)
 	if strings.TrimSpace(sandboxID) == "" || strings.TrimSpace(from) == "" || strings.TrimSpace(to) == "" {
 		return nil, fmt.Errorf("sandboxID, from, to are required")
 	}
+	if cached, err := s.store.GetDiffBySnapshots(ctx, sandboxID, from, to); err == nil {
+		return cached, nil
+	} else if !errors.Is(err, store.ErrNotFound) {
+		return nil, fmt.Errorf("lookup diff: %w", err)
+	}
 	sb, err := s.store.GetSandbox(ctx, sandboxID)
 	if err != nil {
 		return nil, err
@@ -875,10 +890,24 @@ func (s *Service) DiffSnapshots(ctx context.Context, sandboxID, from, to string)
 	return diff, nil
 }
 
+// GetCachedDiff returns the stored diff between two snapshots without computing one.
+// It returns store.ErrNotFound if the pair has not been diffed yet.
+func (s *Service) GetCachedDiff(ctx context.Context, sandboxID, from, to string) (*store.Diff, error) {
+	if strings.TrimSpace(sandboxID) == "" || strings.TrimSpace(from) == "" || strings.TrimSpace(to) == "" {
+		return nil, fmt.Errorf("sandboxID, from, to are required")
+	}
+	return s.store.GetDiffBySnapshots(ctx, sandboxID, from, to)
+}
+
 // RunCommand executes a command inside the sandbox via SSH.
 // If privateKeyPath is empty and a key manager is configured, managed credentials will be used.
 // Otherwise, username and privateKeyPath are required for SSH auth.
 func (s *Service) RunCommand(ctx context.Context, sandboxID, username, privateKeyPath, command string, timeout time.Duration, env map[string]string) (*store.Command, error) {
+	return s.runCommand(ctx, sandboxID, username, privateKeyPath, command, timeout, env, nil)
+}
+
+// runCommand implements RunCommand and RunCommandStream. hooks may be nil.
+func (s *Service) runCommand(ctx context.Context, sandboxID, username, privateKeyPath, command string, timeout time.Duration, env map[string]string, hooks *CommandStreamHooks) (*store.Command, error) {
 	if strings.TrimSpace(sandboxID) == "" {
 		return nil, fmt.Errorf("sandboxID is required")
 	}
@@ -964,11 +993,17 @@ func (s *Service) RunCommand(ctx context.Context, sandboxID, username, privateKe
 		envJSON = &tmp
 	}
 
+	if hooks != nil && hooks.OnStart != nil {
+		hooks.OnStart(cmdID)
+	}
+
 	// Execute SSH command
 	var stdout, stderr string
 	var code int
 	var runErr error
-	if useManagedCreds {
+	if hooks != nil && hooks.OnOutput != nil {
+		stdout, stderr, code, runErr = s.runSSHStreaming(ctx, cmdID, ip, username, privateKeyPath, certPath, commandWithEnv(command, env), timeout, env, hooks.OnOutput)
+	} else if useManagedCreds {
 		stdout, stderr, code, runErr = s.ssh.RunWithCert(ctx, ip, username, privateKeyPath, certPath, commandWithEnv(command, env), timeout, env)
 	} else {
 		stdout, stderr, code, runErr = s.ssh.Run(ctx, ip, username, privateKeyPath, commandWithEnv(command, env), timeout, env)
@@ -1027,71 +1062,21 @@ type DefaultSSHRunner struct {
 // It disables strict host key checking and sets a connect timeout.
 // It assumes the VM is reachable on the default SSH port (22).
 func (r *DefaultSSHRunner) Run(ctx context.Context, addr, user, privateKeyPath, command string, timeout time.Duration, _ map[string]string) (string, string, int, error) {
-	// Pre-flight check: verify the private key file exists and has correct permissions
-	keyInfo, err := os.Stat(privateKeyPath)
-	if err != nil {
-		if os.IsNotExist(err) {
-			return "", "", 255, fmt.Errorf("ssh key file not found: %s", privateKeyPath)
-		}
-		return "", "", 255, fmt.Errorf("ssh key file error: %w", err)
-	}
-	// Check permissions - SSH keys should not be world-readable
-	if keyInfo.Mode().Perm()&0o077 != 0 {
-		return "", "", 255, fmt.Errorf("ssh key file %s has insecure permissions %o (should be 0600 or stricter)", privateKeyPath, keyInfo.Mode().Perm())
-	}
-
-	if _, ok := ctx.Deadline(); !ok && timeout > 0 {
-		var cancel context.CancelFunc
-		ctx, cancel = context.WithTimeout(ctx, timeout)
-		defer cancel()
-	}
-
-	args := []string{
-		"-i", privateKeyPath,
-		"-o", "StrictHostKeyChecking=no",
-		"-o", "UserKnownHostsFile=/dev/null",
-		"-o", "ConnectTimeout=15",
-	}
-	// Add ProxyJump if configured
-	if r.ProxyJump != "" {
-		args = append(args, "-J", r.ProxyJump)
-	}
-	args = append(args,
-		fmt.Sprintf("%s@%s", user, addr),
-		"--",
-		command,
-	)
-
-	var stdout, stderr bytes.Buffer
-	cmd := exec.CommandContext(ctx, "ssh", args...)
-	cmd.Stdout = &stdout
-	cmd.Stderr = &stderr
-
-	err = cmd.Run()
-	exitCode := 0
-	if err != nil {
-		// Best-effort extract exit code
-		var ee *exec.ExitError
-		if errors.As(err, &ee) {
-			exitCode = ee.ExitCode()
-		} else {
-			exitCode = 255
-		}
-		// Include stderr in error message for better debugging
-		stderrStr := stderr.String()
-		if stderrStr != "" {
-			err = fmt.Errorf("%w: %s", err, stderrStr)
-		}
-		return stdout.String(), stderrStr, exitCode, err
-	}
-	if cmd.ProcessState != nil {
-		exitCode = cmd.ProcessState.ExitCode()
-	}
-	return stdout.String(), stderr.String(), exitCode, nil
+	return r.run(ctx, addr, user, privateKeyPath, "", command, timeout, nil)
 }
 
 // RunWithCert implements SSHRunner.RunWithCert using the local ssh client with certificate auth.
 func (r *DefaultSSHRunner) RunWithCert(ctx context.Context, addr, user, privateKeyPath, certPath, command string, timeout time.Duration, _ map[string]string) (string, string, int, error) {
+	if certPath == "" {
+		return "", "", 255, fmt.Errorf("ssh certificate file not found: %s", certPath)
+	}
+	return r.run(ctx, addr, user, privateKeyPath, certPath, command, timeout, nil)
+}
+
+// run executes command over ssh for Run, RunWithCert and RunStreaming.
+// certPath is empty for key-only authentication. When onOutput is set, it
+// also receives every chunk of output as ssh writes it.
+func (r *DefaultSSHRunner) run(ctx context.Context, addr, user, privateKeyPath, certPath, command string, timeout time.Duration, onOutput OutputFunc) (string, string, int, error) {
 	// Pre-flight check: verify the private key file exists and has correct permissions
 	keyInfo, err := os.Stat(privateKeyPath)
 	if err != nil {
@@ -1100,16 +1085,21 @@ func (r *DefaultSSHRunner) RunWithCert(ctx context.Context, addr, user, privateK
 		}
 		return "", "", 255, fmt.Errorf("ssh key file error: %w", err)
 	}
+	// Check permissions - SSH keys should not be world-readable
 	if keyInfo.Mode().Perm()&0o077 != 0 {
 		return "", "", 255, fmt.Errorf("ssh key file %s has insecure permissions %o (should be 0600 or stricter)", privateKeyPath, keyInfo.Mode().Perm())
 	}
 
-	// Check certificate file exists
-	if _, err := os.Stat(certPath); err != nil {
-		if os.IsNotExist(err) {
-			return "", "", 255, fmt.Errorf("ssh certificate file not found: %s", certPath)
+	args := []string{"-i", privateKeyPath}
+	if certPath != "" {
+		// Check certificate file exists
+		if _, err := os.Stat(certPath); err != nil {
+			if os.IsNotExist(err) {
+				return "", "", 255, fmt.Errorf("ssh certificate file not found: %s", certPath)
+			}
+			return "", "", 255, fmt.Errorf("ssh certificate file error: %w", err)
 		}
-		return "", "", 255, fmt.Errorf("ssh certificate file error: %w", err)
+		args = append(args, "-o", fmt.Sprintf("CertificateFile=%s", certPath))
 	}
 
 	if _, ok := ctx.Deadline(); !ok && timeout > 0 {
@@ -1118,13 +1108,11 @@ func (r *DefaultSSHRunner) RunWithCert(ctx context.Context, addr, user, privateK
 		defer cancel()
 	}
 
-	args := []string{
-		"-i", privateKeyPath,
-		"-o", fmt.Sprintf("CertificateFile=%s", certPath),
+	args = append(args,
 		"-o", "StrictHostKeyChecking=no",
 		"-o", "UserKnownHostsFile=/dev/null",
 		"-o", "ConnectTimeout=15",
-	}
+	)
 	// Add ProxyJump if configured
 	if r.ProxyJump != "" {
 		args = append(args, "-J", r.ProxyJump)
@@ -1139,16 +1127,22 @@ func (r *DefaultSSHRunner) RunWithCert(ctx context.Context, addr, user, privateK
 	cmd := exec.CommandContext(ctx, "ssh", args...)
 	cmd.Stdout = &stdout
 	cmd.Stderr = &stderr
+	if onOutput != nil {
+		cmd.Stdout = io.MultiWriter(&stdout, outputWriter{fn: onOutput})
+		cmd.Stderr = io.MultiWriter(&stderr, outputWriter{fn: onOutput, isStderr: true})
+	}
 
 	err = cmd.Run()
 	exitCode := 0
 	if err != nil {
+		// Best-effort extract exit code
 		var ee *exec.ExitError
 		if errors.As(err, &ee) {
 			exitCode = ee.ExitCode()
 		} else {
 			exitCode = 255
 		}
+		// Include stderr in error message for better debugging
 		stderrStr := stderr.String()
 		if stderrStr != "" {
 			err = fmt.Errorf("%w: %s", err, stderrStr)
@@ -15,9 +15,10 @@ import (
 
 // mockStore implements store.Store for testing
 type mockStore struct {
-	getSandboxFn    func(ctx context.Context, id string) (*store.Sandbox, error)
-	listCommandsFn  func(ctx context.Context, sandboxID string, opt *store.ListOptions) ([]*store.Command, error)
-	listSandboxesFn func(ctx context.Context, filter store.SandboxFilter, opt *store.ListOptions) ([]*store.Sandbox, error)
+	getSandboxFn         func(ctx context.Context, id string) (*store.Sandbox, error)
+	listCommandsFn       func(ctx context.Context, sandboxID string, opt *store.ListOptions) ([]*store.Command, error)
+	listSandboxesFn      func(ctx context.Context, filter store.SandboxFilter, opt *store.ListOptions) ([]*store.Sandbox, error)
+	getDiffBySnapshotsFn func(ctx context.Context, sandboxID, fromSnapshot, toSnapshot string) (*store.Diff, error)
 }
 
 func (m *mockStore) Config() store.Config { return store.Config{} }
@@ -108,6 +109,9 @@ func (m *mockStore) GetDiff(ctx context.Context, id string) (*store.Diff, error)
 }
 
 func (m *mockStore) GetDiffBySnapshots(ctx context.Context, sandboxID, fromSnapshot, toSnapshot string) (*store.Diff, error) {
+	if m.getDiffBySnapshotsFn != nil {
+		return m.getDiffBySnapshotsFn(ctx, sandboxID, fromSnapshot, toSnapshot)
+	}
 	return nil, store.ErrNotFound
 }
 
@@ -338,6 +342,31 @@ func TestGetSandboxCommands_SandboxNotFound(t *testing.T) {
 	}
 }
 
+func TestGetSandboxCommands_DestroyedSandbox(t *testing.T) {
+	mockSt := &mockStore{
+		getSandboxFn: func(ctx context.Context, id string) (*store.Sandbox, error) {
+			return nil, store.ErrNotFound
+		},
+		listCommandsFn: func(ctx context.Context, sandboxID string, opt *store.ListOptions) ([]*store.Command, error) {
+			return []*store.Command{{ID: "CMD-001", SandboxID: sandboxID, Command: "ls"}}, nil
+		},
+	}
+
+	svc := &Service{
+		telemetry: telemetry.NewNoopService(),
+		store:     mockSt,
+		timeNowFn: time.Now,
+	}
+
+	cmds, err := svc.GetSandboxCommands(context.Background(), "SBX-123", nil)
+	if err != nil {
+		t.Fatalf("unexpected error: %v", err)
+	}
+	if len(cmds) != 1 || cmds[0].ID != "CMD-001" {
+		t.Errorf("expected the destroyed sandbox's command, got %v", cmds)
+	}
+}
+
 func TestGetSandboxCommands_EmptyID(t *testing.T) {
 	svc := &Service{
 		telemetry: telemetry.NewNoopService(),
@@ -864,3 +893,159 @@ func TestValidateIPUniqueness_SameSandboxIgnored(t *testing.T) {
 		t.Fatalf("unexpected error (same sandbox should be ignored): %v", err)
 	}
 }
+
+// mockStreamingSSHRunner delivers output through RunStreaming in fixed chunks.
+type mockStreamingSSHRunner struct {
+	mockSSHRunner
+	chunks []string
+}
+
+func (m *mockStreamingSSHRunner) RunStreaming(ctx context.Context, addr, user, privateKeyPath, certPath, command string, timeout time.Duration, env map[string]string, onOutput OutputFunc) (string, string, int, error) {
+	var out strings.Builder
+	for _, c := range m.chunks {
+		onOutput([]byte(c), false)
+		out.WriteString(c)
+	}
+	onOutput([]byte("warning\n"), true)
+	return out.String(), "warning\n", 3, nil
+}
+
+func newStreamTestService(runner SSHRunner) *Service {
+	ip := "192.168.1.100"
+	return &Service{
+		telemetry: telemetry.NewNoopService(),
+		store: &mockStore{
+			getSandboxFn: func(ctx context.Context, id string) (*store.Sandbox, error) {
+				return &store.Sandbox{ID: id, SandboxName: "test-sandbox", State: store.SandboxStateRunning, IPAddress: &ip}, nil
+			},
+			listSandboxesFn: func(ctx context.Context, filter store.SandboxFilter, opt *store.ListOptions) ([]*store.Sandbox, error) {
+				return []*store.Sandbox{}, nil
+			},
+		},
+		ssh:       runner,
+		mgr:       &mockManager{},
+		timeNowFn: time.Now,
+		cfg:       Config{CommandTimeout: 30 * time.Second, IPDiscoveryTimeout: 30 * time.Second},
+	}
+}
+
+func TestRunCommandStream_StreamingRunner(t *testing.T) {
+	svc := newStreamTestService(&mockStreamingSSHRunner{chunks: []string{"line1\n", "line2\n"}})
+
+	var startedID string
+	var stdout, stderr []string
+	cmd, err := svc.RunCommandStream(context.Background(), "SBX-123", "ubuntu", "/path/to/key", "make", 0, nil, CommandStreamHooks{
+		OnStart: func(cmdID string) { startedID = cmdID },
+		OnOutput: func(cmdID string, chunk []byte, isStderr bool) {
+			if cmdID != startedID {
+				t.Errorf("expected command id %q, got %q", startedID, cmdID)
+			}
+			if isStderr {
+				stderr = append(stderr, string(chunk))
+			} else {
+				stdout = append(stdout, string(chunk))
+			}
+		},
+	})
+	if err != nil {
+		t.Fatalf("unexpected error: %v", err)
+	}
+	if startedID == "" || cmd.ID != startedID {
+		t.Errorf("expected OnStart with command id %q, got %q", cmd.ID, startedID)
+	}
+	if len(stdout) != 2 || stdout[0] != "line1\n" || stdout[1] != "line2\n" {
+		t.Errorf("unexpected stdout chunks: %q", stdout)
+	}
+	if len(stderr) != 1 || stderr[0] != "warning\n" {
+		t.Errorf("unexpected stderr chunks: %q", stderr)
+	}
+	if cmd.Stdout != "line1\nline2\n" || cmd.ExitCode != 3 {
+		t.Errorf("expected persisted output and exit code, got %q / %d", cmd.Stdout, cmd.ExitCode)
+	}
+}
+
+func TestRunCommandStream_NonStreamingRunner(t *testing.T) {
+	svc := newStreamTestService(&mockSSHRunner{
+		runFn: func(ctx context.Context, addr, user, privateKeyPath, command string, timeout time.Duration, env map[string]string) (string, string, int, error) {
+			return "done\n", "", 0, nil
+		},
+	})
+
+	var chunks []string
+	cmd, err := svc.RunCommandStream(context.Background(), "SBX-123", "ubuntu", "/path/to/key", "echo done", 0, nil, CommandStreamHooks{
+		OnOutput: func(cmdID string, chunk []byte, isStderr bool) {
+			chunks = append(chunks, string(chunk))
+		},
+	})
+	if err != nil {
+		t.Fatalf("unexpected error: %v", err)
+	}
+	if len(chunks) != 1 || chunks[0] != "done\n" {
+		t.Errorf("expected output delivered once after completion, got %q", chunks)
+	}
+	if cmd.Stdout != "done\n" {
+		t.Errorf("expected stdout %q, got %q", "done\n", cmd.Stdout)
+	}
+}
+
+func TestDiffSnapshots_ReturnsStoredDiff(t *testing.T) {
+	stored := &store.Diff{ID: "DIF-1", SandboxID: "SBX-123", FromSnapshot: "base", ToSnapshot: "after"}
+	mockSt := &mockStore{
+		getDiffBySnapshotsFn: func(ctx context.Context, sandboxID, from, to string) (*store.Diff, error) {
+			if sandboxID != "SBX-123" || from != "base" || to != "after" {
+				t.Errorf("unexpected lookup %s %s..%s", sandboxID, from, to)
+			}
+			return stored, nil
+		},
+		getSandboxFn: func(ctx context.Context, id string) (*store.Sandbox, error) {
+			t.Error("sandbox should not be loaded for a stored diff")
+			return nil, store.ErrNotFound
+		},
+	}
+	svc := &Service{
+		telemetry: telemetry.NewNoopService(),
+		store:     mockSt,
+		timeNowFn: time.Now,
+	}
+
+	d, err := svc.DiffSnapshots(context.Background(), "SBX-123", "base", "after")
+	if err != nil {
+		t.Fatalf("unexpected error: %v", err)
+	}
+	if d != stored {
+		t.Errorf("expected the stored diff, got %+v", d)
+	}
+}
+
+func TestDiffSnapshots_LookupError(t *testing.T) {
+	mockSt := &mockStore{
+		getDiffBySnapshotsFn: func(ctx context.Context, sandboxID, from, to string) (*store.Diff, error) {
+			return nil, errors.New("connection refused")
+		},
+	}
+	svc := &Service{
+		telemetry: telemetry.NewNoopService(),
+		store:     mockSt,
+		timeNowFn: time.Now,
+	}
+
+	if _, err := svc.DiffSnapshots(context.Background(), "SBX-123", "base", "after"); err == nil {
+		t.Fatal("expected error, got nil")
+	}
+}
+
+func TestGetCachedDiff_NotFound(t *testing.T) {
+	svc := &Service{
+		telemetry: telemetry.NewNoopService(),
+		store:     &mockStore{},
+		timeNowFn: time.Now,
+	}
+
+	_, err := svc.GetCachedDiff(context.Background(), "SBX-123", "base", "after")
+	if !errors.Is(err, store.ErrNotFound) {
+		t.Errorf("expected ErrNotFound, got %v", err)
+	}
+	if _, err := svc.GetCachedDiff(context.Background(), "SBX-123", "", "after"); err == nil {
+		t.Error("expected error for empty snapshot name")
+	}
+}
@@ -40,6 +40,9 @@ setup(
             "mypy",
             "flake8",
         ],
+        "numpy": ["numpy"],
+        "arrow": ["pyarrow"],
+        "cbor": ["cbor2"],
     },
     package_data={
         "virsh_sandbox": ["py.typed"],
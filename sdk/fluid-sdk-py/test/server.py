@@ -0,0 +1,61 @@
+# coding: utf-8
+
+"""Local HTTP servers with canned handlers, for tests that need a real socket."""
+
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Type
+
+from virsh_sandbox.configuration import Configuration
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    """Request handler that does not log requests to stderr."""
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(
+    handler: Type[BaseHTTPRequestHandler],
+    server_class: Type[ThreadingHTTPServer] = ThreadingHTTPServer,
+) -> ThreadingHTTPServer:
+    """Start ``handler`` on a free loopback port in a daemon thread."""
+    server = server_class(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stop(server: ThreadingHTTPServer) -> None:
+    """Stop a server started by :func:`serve` and close its socket."""
+    server.shutdown()
+    server.server_close()
+
+
+def url(server: ThreadingHTTPServer) -> str:
+    """Base URL of a server started by :func:`serve`."""
+    return "http://127.0.0.1:%d" % server.server_port
+
+
+class ServerTestCase(unittest.TestCase):
+    """Runs ``handler`` for the whole class; ``host`` is its base URL."""
+
+    handler: Type[BaseHTTPRequestHandler] = QuietHandler
+    server_class: Type[ThreadingHTTPServer] = ThreadingHTTPServer
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = serve(cls.handler, cls.server_class)
+        cls.host = url(cls.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        stop(cls.server)
+        super().tearDownClass()
+
+    @classmethod
+    def configuration(cls) -> Configuration:
+        """A new configuration pointing at the server."""
+        return Configuration(host=cls.host)
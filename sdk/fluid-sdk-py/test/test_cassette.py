@@ -0,0 +1,124 @@
+# coding: utf-8
+
+import gzip
+import json
+import os
+import tempfile
+import time
+import unittest
+from test.server import QuietHandler, ServerTestCase
+
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.cassette import CassettePlayer, use_cassette
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.exceptions import ApiException, NotFoundException
+from virsh_sandbox.models.fluid_remote_internal_rest_create_sandbox_request import (
+    FluidRemoteInternalRestCreateSandboxRequest,
+)
+
+
+class SandboxHandler(QuietHandler):
+    """Creates sandboxes and reports a state that advances on each GET."""
+
+    protocol_version = "HTTP/1.1"
+    delay = 0.05
+    polls = 0
+
+    def reply(self, status, doc):
+        time.sleep(SandboxHandler.delay)
+        body = json.dumps(doc).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        sandbox = {"id": "SBX-" + request["vm_name"], "state": "CREATED"}
+        self.reply(201, {"sandbox": sandbox, "ip_address": "10.0.0.9"})
+
+    def do_GET(self):
+        sandbox_id = self.path.split("/")[3].split("?")[0]
+        if sandbox_id == "SBX-missing":
+            return self.reply(404, {"error": "sandbox not found"})
+        SandboxHandler.polls += 1
+        state = "RUNNING" if SandboxHandler.polls > 1 else "STARTING"
+        self.reply(200, {"sandbox": {"id": sandbox_id, "state": state}})
+
+
+def workload(api):
+    """Create a sandbox, poll it until running and look up a missing one."""
+    created = api.create_sandbox(
+        FluidRemoteInternalRestCreateSandboxRequest(agent_id="a", vm_name="web")
+    )
+    states = []
+    while not states or states[-1] != "RUNNING":
+        states.append(api.get_sandbox(created.sandbox.id).sandbox.state)
+    try:
+        api.get_sandbox("SBX-missing")
+    except NotFoundException as e:
+        states.append(e.status)
+    return created.ip_address, states
+
+
+class TestCassette(ServerTestCase):
+    """Recording against a local server and replaying without it"""
+
+    handler = SandboxHandler
+
+    def setUp(self):
+        SandboxHandler.polls = 0
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "run.jsonl.gz")
+        client = ApiClient(self.configuration())
+        with use_cassette(client, self.path, record=True) as recorder:
+            self.recorded = workload(SandboxApi(client))
+        self.assertEqual(recorder.recorded, 4)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def offline_client(self):
+        # Nothing listens here; every answer must come from the cassette.
+        return ApiClient(Configuration(host="http://127.0.0.1:9"))
+
+    def test_replay_as_fast_as_possible(self):
+        self.assertEqual(self.recorded, ("10.0.0.9", ["STARTING", "RUNNING", 404]))
+        with gzip.open(self.path, "rt") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(lines[0], {"cassette": 1})
+        self.assertEqual(lines[1]["url"], "/v1/sandboxes")
+        self.assertIn('"vm_name": "web"', lines[1]["body"])
+
+        client = self.offline_client()
+        begin = time.perf_counter()
+        with use_cassette(client, self.path, speed=None) as player:
+            self.assertEqual(workload(SandboxApi(client)), self.recorded)
+        self.assertLess(time.perf_counter() - begin, 4 * SandboxHandler.delay)
+        self.assertEqual(player.remaining, 0)
+        self.assertIsNot(client.rest_client, player)
+
+    def test_replay_at_recorded_speed(self):
+        player = CassettePlayer(self.path, speed=1.0)
+        client = self.offline_client()
+        client.rest_client = player
+        begin = time.perf_counter()
+        self.assertEqual(workload(SandboxApi(client)), self.recorded)
+        self.assertGreaterEqual(time.perf_counter() - begin, 4 * SandboxHandler.delay)
+
+    def test_unrecorded_request(self):
+        client = self.offline_client()
+        with use_cassette(client, self.path, speed=None):
+            api = SandboxApi(client)
+            with self.assertRaises(ApiException) as ctx:
+                api.create_sandbox(
+                    FluidRemoteInternalRestCreateSandboxRequest(vm_name="db")
+                )
+            self.assertEqual(ctx.exception.status, 0)
+            self.assertIn("POST /v1/sandboxes", str(ctx.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,232 @@
+# coding: utf-8
+
+import json
+import mmap
+import unittest
+
+from virsh_sandbox import cbor
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api.vms_api import VMsApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.columnar import fetch_command_columns
+from virsh_sandbox.compact import (
+    list_sandboxes_compact,
+    list_virtual_machines_compact,
+)
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.diffcache import DiffCache, get_cached_diff
+from virsh_sandbox.loadgen import wire_formats
+from virsh_sandbox.mirror import SandboxMirror
+from virsh_sandbox.models.fluid_remote_internal_rest_create_sandbox_request import (
+    FluidRemoteInternalRestCreateSandboxRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_diff_request import (
+    FluidRemoteInternalRestDiffRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_run_command_request import (
+    FluidRemoteInternalRestRunCommandRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_snapshot_request import (
+    FluidRemoteInternalRestSnapshotRequest,
+)
+from virsh_sandbox.pathtrie import diff_snapshots_trie
+from virsh_sandbox.standin import StandinServer
+
+
+class TestCodec(unittest.TestCase):
+    """Encoding and decoding without cbor2"""
+
+    def test_rfc_vectors(self):
+        # From RFC 8949, Appendix A.
+        cases = [
+            ("00", 0),
+            ("1818", 24),
+            ("1903e8", 1000),
+            ("1bffffffffffffffff", 18446744073709551615),
+            ("3903e7", -1000),
+            ("f93c00", 1.0),
+            ("fa47c35000", 100000.0),
+            ("fb3ff199999999999a", 1.1),
+            ("f4", False),
+            ("f6", None),
+            ("6449455446", "IETF"),
+            ("62c3bc", "ü"),
+            ("4401020304", b"\x01\x02\x03\x04"),
+            ("8301820203820405", [1, [2, 3], [4, 5]]),
+            ("a26161016162820203", {"a": 1, "b": [2, 3]}),
+            ("c074323031332d30332d32315432303a30343a30305a", "2013-03-21T20:04:00Z"),
+        ]
+        for encoded, value in cases:
+            data, handles = cbor.load(bytes.fromhex(encoded))
+            self.assertEqual(data, value, encoded)
+            self.assertEqual(handles, [])
+
+    def test_round_trip(self):
+        doc = {
+            "commands": [{"stdout": "é\n" * 300, "exit_code": -1, "ok": True}],
+            "total": 2**40,
+            "ratio": 0.5,
+            "env": None,
+        }
+        self.assertEqual(cbor.load(cbor.dumps(doc))[0], doc)
+        self.assertEqual(cbor.dumps(1000).hex(), "1903e8")
+        with self.assertRaises(TypeError):
+            cbor.dumps({1, 2})
+
+    def test_invalid(self):
+        for encoded in ("", "1903", "6449", "5f", "0000"):
+            with self.assertRaises(ValueError, msg=encoded):
+                cbor.load(bytes.fromhex(encoded))
+
+    def test_non_utf8_output(self):
+        # fluid-remote replaces invalid bytes in command output with U+FFFD,
+        # as its JSON encoder does; older servers copied them as they were.
+        stdout = b"ok \xff\xfe\x80 done\n".decode("utf-8", "replace")
+        self.assertEqual(stdout, "ok \ufffd\ufffd\ufffd done\n")
+        raw = b"\xa1\x66stdout\x6c" + b"ok \xff\xfe\x80 done\n"
+        self.assertEqual(cbor.load(raw)[0], {"stdout": stdout})
+        self.assertEqual(cbor.load(raw, 4)[1][0][1].read(), stdout)
+
+    def test_large_strings_are_lazy(self):
+        body = cbor.dumps({"commands": [{"stdout": "x" * 100, "id": "CMD-1"}]})
+        with mmap.mmap(-1, len(body)) as buf:
+            buf.write(body)
+            data, handles = cbor.load(buf, 64)
+            self.assertEqual(data, {"commands": [{"stdout": "", "id": "CMD-1"}]})
+            ((path, handle),) = handles
+            self.assertEqual(path, ("commands", 0, "stdout"))
+            self.assertEqual(handle.read(), "x" * 100)
+
+    def test_negotiation(self):
+        self.assertTrue(cbor.is_cbor("application/cbor"))
+        self.assertTrue(cbor.is_cbor("Application/CBOR; charset=binary"))
+        self.assertFalse(cbor.is_cbor("application/cbor-seq"))
+        self.assertFalse(cbor.is_cbor(None))
+        self.assertTrue(cbor.prefers_cbor(cbor.ACCEPT))
+        self.assertTrue(cbor.prefers_cbor("application/cbor"))
+        self.assertFalse(cbor.prefers_cbor("application/json"))
+        self.assertFalse(cbor.prefers_cbor("application/json, application/cbor;q=0.5"))
+        self.assertFalse(cbor.prefers_cbor("application/cbor;q=0, */*"))
+        self.assertFalse(cbor.prefers_cbor(None))
+
+
+class TestCBORResponses(unittest.TestCase):
+    """API calls with accept_cbor set, against the stand-in"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandinServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+
+    def api(self, accept_cbor=True, **settings):
+        config = Configuration(host=self.server.url)
+        config.accept_cbor = accept_cbor
+        for name, value in settings.items():
+            setattr(config, name, value)
+        return SandboxApi(ApiClient(config))
+
+    def sandbox(self, api):
+        created = api.create_sandbox(
+            FluidRemoteInternalRestCreateSandboxRequest(
+                source_vm_name="ubuntu-base", agent_id="cbor", auto_start=True
+            )
+        )
+        api.run_sandbox_command(
+            created.sandbox.id,
+            FluidRemoteInternalRestRunCommandRequest(command="uptime"),
+        )
+        return created.sandbox.id
+
+    def test_negotiated_endpoints(self):
+        api = self.api()
+        id = self.sandbox(api)
+        resp = api.list_sandbox_commands_with_http_info(id)
+        self.assertEqual(resp.headers["Content-Type"], "application/cbor")
+        self.assertEqual(cbor.load(resp.raw_data)[0]["total"], 1)
+        as_json = self.api(accept_cbor=False).list_sandbox_commands_with_http_info(id)
+        self.assertEqual(as_json.headers["Content-Type"], "application/json")
+        self.assertEqual(resp.data, as_json.data)
+        self.assertEqual(resp.data.commands[0].stdout, "ok\n")
+
+        # Others answer in JSON whatever the client asks for.
+        resp = api.discover_sandbox_ip_with_http_info(id)
+        self.assertEqual(resp.headers["Content-Type"], "application/json")
+
+    def test_released_body(self):
+        api = self.api(retain_response_body=False)
+        id = self.sandbox(api)
+        resp = api.get_sandbox_with_http_info(id, include_commands=True)
+        self.assertEqual(resp.raw_data, b"")
+        self.assertEqual(resp.data.sandbox.id, id)
+        self.assertEqual(resp.data.commands[0].command, "uptime")
+
+    def test_spilled_body(self):
+        # Large strings stay lazy as in TestCodec; here the spilled body is
+        # decoded from its mapping.
+        id = self.sandbox(self.api())
+        api = self.api(spill_threshold=0)
+        resp = api.list_sandbox_commands_with_http_info(id)
+        self.assertEqual(resp.raw_data, b"")
+        self.assertEqual(resp.data.commands[0].stdout, "ok\n")
+        self.assertEqual(resp.data.total, 1)
+
+    def test_raw_body_helpers(self):
+        # Helpers that skip the models decode the body themselves.
+        api = self.api()
+        id = self.sandbox(api)
+        for name in ("before", "after"):
+            api.create_snapshot(id, FluidRemoteInternalRestSnapshotRequest(name=name))
+        request = FluidRemoteInternalRestDiffRequest(
+            from_snapshot="before", to_snapshot="after"
+        )
+        resp = api.diff_snapshots_with_http_info(id, request)
+        self.assertEqual(resp.headers["Content-Type"], "application/cbor")
+
+        columns = fetch_command_columns(api, id)
+        self.assertEqual(list(columns.command), ["uptime"])
+        trie = diff_snapshots_trie(api, id, request)
+        expected = resp.data.diff.diff_json
+        self.assertEqual(
+            trie.to_dict()["commands_run"], expected.to_dict()["commands_run"]
+        )
+        self.assertEqual(
+            get_cached_diff(api, id, "before", "after").diff.id, resp.data.diff.id
+        )
+        cache = DiffCache()
+        diff = cache.diff_snapshots(api, id, request)
+        self.assertEqual(diff.diff.id, resp.data.diff.id)
+        # Cached as JSON whatever the wire format.
+        body = cache.get_bytes(id, "before", "after")
+        self.assertEqual(json.loads(body)["diff"]["id"], resp.data.diff.id)
+
+        sandboxes = list_sandboxes_compact(api)
+        self.assertIn(id, [sb.id for sb in sandboxes])
+        vms = list_virtual_machines_compact(VMsApi(api.api_client))
+        self.assertIn("ubuntu-base", [vm.name for vm in vms])
+        mirror = SandboxMirror(":memory:", api.api_client)
+        self.assertGreaterEqual(mirror.sync().commands, 1)
+        rows = mirror.query("SELECT command FROM commands WHERE sandbox_id = ?", id)
+        self.assertEqual([row[0] for row in rows], ["uptime"])
+
+    def test_wire_formats(self):
+        results = wire_formats(repeat=1, scale=1)
+        self.assertEqual(
+            [(r.payload, r.format) for r in results],
+            [
+                ("commands", "json"),
+                ("commands", "cbor"),
+                ("diff", "json"),
+                ("diff", "cbor"),
+                ("sandboxes", "json"),
+                ("sandboxes", "cbor"),
+            ],
+        )
+        sizes = {(r.payload, r.format): r.size for r in results}
+        self.assertLess(sizes["commands", "cbor"], sizes["commands", "json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,234 @@
+# coding: utf-8
+
+import base64
+import json
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from test.server import QuietHandler, ServerTestCase
+
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.certcache import CertificateCache, parse_ssh_certificate
+from virsh_sandbox.exceptions import ApiException
+
+KEY_TYPE = "ssh-ed25519-cert-v01@openssh.com"
+
+
+def ssh_string(data):
+    if isinstance(data, str):
+        data = data.encode()
+    return struct.pack("!I", len(data)) + data
+
+
+def make_cert(serial, principals, valid_after, valid_before):
+    blob = b"".join(
+        [
+            ssh_string(KEY_TYPE),
+            ssh_string(os.urandom(32)),  # nonce
+            ssh_string(b"\x01" * 32),  # public key
+            struct.pack("!QI", serial, 1),
+            ssh_string("cert-%d" % serial),
+            ssh_string(b"".join(ssh_string(p) for p in principals)),
+            struct.pack("!QQ", valid_after, valid_before),
+            ssh_string(b""),  # critical options
+            ssh_string(b""),  # extensions
+            ssh_string(b""),  # reserved
+            ssh_string(b"ca"),
+            ssh_string(b"signature"),
+        ]
+    )
+    return "%s %s" % (KEY_TYPE, base64.b64encode(blob).decode())
+
+
+class AccessHandler(QuietHandler):
+    """Issues certificates valid for ``lifetime`` seconds."""
+
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    lifetime = 600
+    issued = []
+    revoked = []
+    fail = False
+
+    def reply(self, status, doc):
+        body = json.dumps(doc).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if AccessHandler.fail:
+            return self.reply(503, {"error": "ca unavailable"})
+        with self.lock:
+            serial = len(self.issued) + 1
+            self.issued.append(request)
+        now = time.time()
+        cert = make_cert(
+            serial, ["sandbox"], int(now) - 60, int(now + AccessHandler.lifetime)
+        )
+        self.reply(200, {"certificate": cert, "certificate_id": "CERT-%d" % serial})
+
+    def do_DELETE(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.lock:
+            self.revoked.append((self.path.rsplit("/", 1)[1], request["reason"]))
+        self.reply(200, {"revoked": True})
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+class TestParseCertificate(unittest.TestCase):
+    """parse_ssh_certificate"""
+
+    def test_fields(self):
+        cert = parse_ssh_certificate(make_cert(7, ["a", "b"], 100, 200) + " comment")
+        self.assertEqual(cert.key_type, KEY_TYPE)
+        self.assertEqual(cert.serial, 7)
+        self.assertEqual(cert.key_id, "cert-7")
+        self.assertEqual(cert.principals, ["a", "b"])
+        self.assertEqual((cert.valid_after, cert.valid_before), (100, 200))
+        self.assertTrue(cert.expires)
+
+    def test_rejects_other_input(self):
+        for text in ("", "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5", "x !!!"):
+            with self.assertRaises(ValueError):
+                parse_ssh_certificate(text)
+        truncated = make_cert(1, [], 0, 1)[:80]
+        with self.assertRaises(ValueError):
+            parse_ssh_certificate(truncated)
+
+    @unittest.skipUnless(shutil.which("ssh-keygen"), "ssh-keygen not installed")
+    def test_ssh_keygen_certificate(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ca, user = os.path.join(tmp, "ca"), os.path.join(tmp, "user")
+            for key in (ca, user):
+                subprocess.run(
+                    ["ssh-keygen", "-q", "-t", "ed25519", "-N", "", "-f", key],
+                    check=True,
+                )
+            subprocess.run(
+                ["ssh-keygen", "-q", "-s", ca, "-I", "alice", "-n", "sandbox,root"]
+                + ["-z", "42", "-V", "20300101000000:20300101001000", user + ".pub"],
+                check=True,
+                env=dict(os.environ, TZ="UTC"),
+            )
+            with open(user + "-cert.pub") as f:
+                cert = parse_ssh_certificate(f.read())
+        self.assertEqual(cert.serial, 42)
+        self.assertEqual(cert.key_id, "alice")
+        self.assertEqual(cert.principals, ["sandbox", "root"])
+        self.assertEqual(cert.valid_before - cert.valid_after, 600)
+        self.assertEqual(cert.valid_after, 1893456000)
+
+
+class TestCertificateCache(ServerTestCase):
+    """CertificateCache against a local access API"""
+
+    handler = AccessHandler
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.client = ApiClient(cls.configuration())
+
+    def setUp(self):
+        AccessHandler.lifetime = 600
+        AccessHandler.fail = False
+        AccessHandler.issued.clear()
+        AccessHandler.revoked.clear()
+
+    def cache(self, **kwargs):
+        cache = CertificateCache(self.client, ttl_minutes=5, **kwargs)
+        self.addCleanup(cache.close, revoke=False)
+        return cache
+
+    def test_reuses_certificate_per_key(self):
+        cache = self.cache(background=False)
+        first = cache.get("SBX-1", "alice", "ssh-ed25519 KEY")
+        again = cache.get("SBX-1", "alice", "ssh-ed25519 KEY")
+        self.assertIs(first, again)
+        self.assertEqual(first.certificate.principals, ["sandbox"])
+        self.assertGreater(first.remaining(), 590)
+        other = cache.get("SBX-1", "bob", "ssh-ed25519 KEY")
+        self.assertNotEqual(other.certificate_id, first.certificate_id)
+        self.assertEqual(cache.stats()["requests"], 2)
+        self.assertEqual(AccessHandler.issued[0]["ttl_minutes"], 5)
+        self.assertEqual(AccessHandler.issued[1]["user_id"], "bob")
+
+    def test_renews_in_background_before_expiry(self):
+        AccessHandler.lifetime = 2
+        cache = self.cache(renew_fraction=0.5)
+        first = cache.get("SBX-1", "alice", "KEY")
+        self.assertTrue(wait_until(lambda: len(AccessHandler.issued) >= 2))
+        renewed = cache.get("SBX-1", "alice", "KEY")
+        self.assertNotEqual(renewed.certificate_id, first.certificate_id)
+        self.assertGreater(renewed.remaining(), 0)
+        self.assertEqual(AccessHandler.revoked, [])
+
+    def test_idle_certificates_are_revoked(self):
+        cache = self.cache(idle_timeout=0.2)
+        cert = cache.get("SBX-1", "alice", "KEY")
+        self.assertTrue(wait_until(lambda: AccessHandler.revoked))
+        self.assertEqual(AccessHandler.revoked, [(cert.certificate_id, "idle")])
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_eviction_and_close_revoke(self):
+        cache = CertificateCache(self.client, max_entries=2, background=False)
+        ids = [cache.get("SBX-%d" % i, "alice", "KEY").certificate_id for i in range(3)]
+        self.assertEqual(AccessHandler.revoked, [(ids[0], "evicted")])
+        cache.invalidate("SBX-1", "alice", "KEY")
+        cache.close()
+        self.assertEqual(
+            AccessHandler.revoked,
+            [(ids[0], "evicted"), (ids[1], "invalidated"), (ids[2], "closed")],
+        )
+        self.assertEqual(cache.stats()["revocations"], 3)
+        with self.assertRaises(RuntimeError):
+            cache.get("SBX-1", "alice", "KEY")
+
+    def test_expired_certificate_is_fetched_again(self):
+        AccessHandler.lifetime = 1
+        cache = self.cache(background=False, renew_fraction=0.1)
+        first = cache.get("SBX-1", "alice", "KEY")
+        time.sleep(first.remaining() + 0.05)
+        AccessHandler.fail = True
+        with self.assertRaises(ApiException):
+            cache.get("SBX-1", "alice", "KEY")
+        AccessHandler.fail = False
+        second = cache.get("SBX-1", "alice", "KEY")
+        self.assertNotEqual(second.certificate_id, first.certificate_id)
+
+    def test_failed_renewal_is_retried(self):
+        AccessHandler.lifetime = 5
+        cache = self.cache(renew_fraction=0.99, retry_delay=0.1, background=False)
+        first = cache.get("SBX-1", "alice", "KEY")
+        AccessHandler.fail = True
+        time.sleep(0.1)
+        wake = cache.sweep()
+        self.assertLessEqual(wake, time.time() + 0.2)
+        self.assertIs(cache.get("SBX-1", "alice", "KEY"), first)
+        AccessHandler.fail = False
+        time.sleep(0.1)
+        cache.sweep()
+        self.assertNotEqual(
+            cache.get("SBX-1", "alice", "KEY").certificate_id, first.certificate_id
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+# coding: utf-8
+
+import importlib.util
+import json
+import math
+import unittest
+from test.server import QuietHandler, ServerTestCase
+from urllib.parse import parse_qs, urlparse
+
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.columnar import (
+    CommandColumns,
+    StringColumn,
+    fetch_command_columns,
+    list_sandbox_commands_columnar,
+    parse_timestamp,
+)
+from virsh_sandbox.exceptions import NotFoundException
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+HAS_ARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def command(i):
+    doc = {
+        "id": "CMD-%d" % i,
+        "sandbox_id": "SBX-1",
+        "command": "echo %d ✓" % i,
+        "stdout": "%d\n" % i,
+        "started_at": "2026-01-01T00:00:00Z",
+        "ended_at": "2026-01-01T00:00:%02d.5Z" % (i % 60),
+    }
+    if i % 10:
+        doc["exit_code"] = i % 3
+    if i % 7 == 0:
+        doc["stderr"] = "warn"
+    return doc
+
+
+COMMANDS = [command(i) for i in range(2500)]
+
+
+class CommandsHandler(QuietHandler):
+    protocol_version = "HTTP/1.1"
+    pages = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if "/SBX-1/" not in url.path:
+            status, doc = 404, {"error": "not found"}
+        else:
+            query = parse_qs(url.query)
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", ["100"])[0])
+            CommandsHandler.pages.append((offset, limit))
+            page = COMMANDS[offset : offset + limit]
+            # Like fluid-remote, total counts the page, not the history.
+            status, doc = 200, {"commands": page, "total": len(page)}
+        body = json.dumps(doc).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestColumns(unittest.TestCase):
+    """Column buffers filled from JSON"""
+
+    def setUp(self):
+        self.columns = CommandColumns()
+        self.columns.extend_from_json(
+            json.dumps({"commands": COMMANDS[:100], "total": 100})
+        )
+
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp("1970-01-01T00:00:01Z"), 1000000)
+        self.assertEqual(parse_timestamp("1970-01-01T01:00:00.123456789+01:00"), 123456)
+        self.assertEqual(parse_timestamp("1970-01-01T00:00:00.5"), 500000)
+        self.assertIsNone(parse_timestamp("yesterday"))
+        self.assertIsNone(parse_timestamp(None))
+
+    def test_string_column(self):
+        column = StringColumn()
+        for value in ("a", None, "", "é✓"):
+            column.append(value)
+        self.assertEqual(list(column), ["a", None, "", "é✓"])
+        self.assertEqual(column[-1], "é✓")
+        self.assertEqual(list(column.offsets), [0, 1, 1, 1, 6])
+
+    def test_columns(self):
+        columns = self.columns
+        self.assertEqual(len(columns), 100)
+        self.assertEqual(columns.total, 100)
+        self.assertEqual(columns.command[5], "echo 5 ✓")
+        self.assertIsNone(columns.stderr[1])
+        self.assertEqual(columns.stderr[7], "warn")
+        self.assertEqual(columns.exit_code[4], 1)
+        self.assertFalse(columns.exit_code_valid[10])
+        self.assertEqual(columns.durations()[3], 3.5)
+        counts = columns.exit_code_counts()
+        self.assertEqual(counts[None], 10)
+        self.assertEqual(sum(counts.values()), 100)
+        self.assertEqual(columns.slowest(2), [(59.5, 59), (58.5, 58)])
+
+    def test_missing_timestamps(self):
+        columns = CommandColumns()
+        columns.append({"id": "x"})
+        self.assertTrue(math.isnan(columns.durations()[0]))
+        self.assertEqual(columns.slowest(), [])
+
+    @unittest.skipUnless(HAS_NUMPY, "numpy not installed")
+    def test_to_numpy(self):
+        arrays = self.columns.to_numpy()
+        self.assertEqual(int(arrays["exit_code"].mask.sum()), 10)
+        self.assertEqual(float(arrays["duration"].max()), 59.5)
+        self.assertEqual(arrays["command"][5], "echo 5 ✓")
+        self.columns.append(command(100))
+
+    @unittest.skipUnless(HAS_ARROW, "pyarrow not installed")
+    def test_to_arrow(self):
+        table = self.columns.to_arrow()
+        self.assertEqual(table.num_rows, 100)
+        self.assertEqual(table.column("exit_code").null_count, 10)
+        self.assertEqual(table.column("stderr").to_pylist()[7], "warn")
+
+    @unittest.skipIf(HAS_NUMPY, "numpy installed")
+    def test_missing_numpy(self):
+        with self.assertRaises(ImportError):
+            self.columns.to_numpy()
+
+
+class TestColumnarPaging(ServerTestCase):
+    """Fetching command history into columns"""
+
+    handler = CommandsHandler
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        config = cls.configuration()
+        cls.api = SandboxApi(ApiClient(config))
+
+    def setUp(self):
+        CommandsHandler.pages = []
+
+    def test_single_page(self):
+        columns = list_sandbox_commands_columnar(self.api, "SBX-1", limit=50)
+        self.assertEqual(len(columns), 50)
+
+    def test_fetch_all_pages(self):
+        columns = fetch_command_columns(self.api, "SBX-1", page_size=1000)
+        self.assertEqual(len(columns), 2500)
+        self.assertEqual(list(columns.id)[-1], "CMD-2499")
+        self.assertEqual(CommandsHandler.pages, [(0, 1000), (1000, 1000), (2000, 1000)])
+
+    def test_full_last_page(self):
+        columns = fetch_command_columns(self.api, "SBX-1", page_size=500)
+        self.assertEqual(len(columns), 2500)
+        self.assertEqual(CommandsHandler.pages[-2:], [(2000, 500), (2500, 500)])
+
+    def test_max_rows_and_append(self):
+        columns = fetch_command_columns(self.api, "SBX-1", page_size=400, max_rows=500)
+        self.assertEqual(CommandsHandler.pages, [(0, 400), (400, 100)])
+        fetch_command_columns(self.api, "SBX-1", columns, max_rows=10)
+        self.assertEqual(len(columns), 510)
+
+    def test_error_status(self):
+        with self.assertRaises(NotFoundException):
+            fetch_command_columns(self.api, "SBX-404")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+# coding: utf-8
+
+import gc
+import json
+import pickle
+import tracemalloc
+import unittest
+from test.server import QuietHandler, ServerTestCase
+
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.compact import (
+    CompactSandbox,
+    CompactSandboxInfo,
+    list_sandboxes_compact,
+)
+from virsh_sandbox.exceptions import ServiceException
+from virsh_sandbox.models.fluid_remote_internal_rest_sandbox_info import (
+    FluidRemoteInternalRestSandboxInfo,
+)
+from virsh_sandbox.models.fluid_remote_internal_store_sandbox import (
+    FluidRemoteInternalStoreSandbox,
+)
+
+
+def sandbox(i):
+    return {
+        "id": "SBX-%06d" % i,
+        "agent_id": "agent-%d" % (i % 7),
+        "base_image": ("ubuntu-22.04", "debian-12")[i % 2],
+        "network": "default",
+        "state": ("RUNNING", "STOPPED", "CREATED")[i % 3],
+        "sandbox_name": "sbx-%d" % i,
+        "ip_address": "10.0.%d.%d" % (i // 250, i % 250),
+        "job_id": "job-%d" % i,
+        "created_at": "2026-01-01T00:00:00Z",
+        "updated_at": "2026-01-01T00:00:00Z",
+        "ttl_seconds": 3600,
+    }
+
+
+class ListHandler(QuietHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if "state=ERROR" in self.path:
+            status, doc = 500, {"error": "boom"}
+        else:
+            status, doc = 200, {
+                "sandboxes": [sandbox(i) for i in range(50)],
+                "total": 50,
+            }
+        body = json.dumps(doc).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestCompactRecords(unittest.TestCase):
+    """Slotted read-only records"""
+
+    def test_fields_and_interning(self):
+        a = CompactSandboxInfo.from_dict(json.loads(json.dumps(sandbox(0))))
+        b = CompactSandboxInfo.from_dict(json.loads(json.dumps(sandbox(3))))
+        self.assertEqual(a.id, "SBX-000000")
+        self.assertEqual(a.ttl_seconds, 3600)
+        self.assertIs(a.state, b.state)
+        self.assertIs(
+            a.base_image, CompactSandboxInfo(base_image="ubuntu-22.04").base_image
+        )
+        self.assertFalse(hasattr(a, "__dict__"))
+        self.assertIsNone(CompactSandboxInfo.from_dict({"unknown": 1}).id)
+
+    def test_read_only(self):
+        record = CompactSandboxInfo(id="SBX-1")
+        with self.assertRaises(AttributeError):
+            record.id = "SBX-2"
+        with self.assertRaises(AttributeError):
+            del record.id
+        with self.assertRaises(TypeError):
+            CompactSandboxInfo(nope=1)
+
+    def test_to_model_round_trip(self):
+        record = CompactSandboxInfo.from_dict(sandbox(5))
+        self.assertEqual(
+            record.to_model(), FluidRemoteInternalRestSandboxInfo.from_dict(sandbox(5))
+        )
+        store = CompactSandbox.from_dict(sandbox(5))
+        self.assertIsInstance(store.to_model(), FluidRemoteInternalStoreSandbox)
+        self.assertEqual(store.to_model().state.value, "CREATED")
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+        self.assertEqual(hash(pickle.loads(pickle.dumps(record))), hash(record))
+
+    def test_smaller_than_models(self):
+        docs = [sandbox(i) for i in range(2000)]
+
+        def measure(build):
+            gc.collect()
+            tracemalloc.start()
+            try:
+                result = build(json.loads(json.dumps(docs)))
+                gc.collect()
+                return tracemalloc.get_traced_memory()[0], result
+            finally:
+                tracemalloc.stop()
+
+        full, _ = measure(
+            lambda d: [FluidRemoteInternalRestSandboxInfo.from_dict(x) for x in d]
+        )
+        compact, _ = measure(lambda d: [CompactSandboxInfo.from_dict(x) for x in d])
+        self.assertLess(compact * 2, full)
+
+
+class TestCompactListing(ServerTestCase):
+    """list_sandboxes_compact against a local server"""
+
+    handler = ListHandler
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        config = cls.configuration()
+        cls.api = SandboxApi(ApiClient(config))
+
+    def test_list(self):
+        listing = list_sandboxes_compact(self.api, state="RUNNING")
+        self.assertEqual(len(listing), 50)
+        self.assertEqual(listing.total, 50)
+        self.assertEqual(listing[1].id, "SBX-000001")
+        self.assertEqual([r.id for r in listing][-1], "SBX-000049")
+
+    def test_error_status_raises(self):
+        with self.assertRaises(ServiceException):
+            list_sandboxes_compact(self.api, state="ERROR")
+
+
+if __name__ == "__main__":
+    unittest.main()
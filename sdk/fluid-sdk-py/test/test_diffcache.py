@@ -0,0 +1,155 @@
+# coding: utf-8
+
+import collections
+import json
+import os
+import tempfile
+import unittest
+from test.server import QuietHandler, ServerTestCase
+from urllib.parse import parse_qs, urlparse
+
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.diffcache import DiffCache, cache_key, get_cached_diff
+from virsh_sandbox.exceptions import NotFoundException
+from virsh_sandbox.models.fluid_remote_internal_rest_diff_request import (
+    FluidRemoteInternalRestDiffRequest,
+)
+
+
+def diff_doc(sandbox_id, from_snapshot, to_snapshot):
+    return {
+        "diff": {
+            "id": "DIF-%s-%s" % (from_snapshot, to_snapshot),
+            "sandbox_id": sandbox_id,
+            "from_snapshot": from_snapshot,
+            "to_snapshot": to_snapshot,
+            "diff_json": {"files_added": ["/etc/%s" % to_snapshot]},
+        }
+    }
+
+
+class DiffHandler(QuietHandler):
+    """POST computes and stores a diff; GET returns a stored one."""
+
+    protocol_version = "HTTP/1.1"
+    calls = collections.Counter()
+    stored = {}
+
+    def reply(self, status, doc):
+        body = json.dumps(doc).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        DiffHandler.calls["POST"] += 1
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        sandbox_id = self.path.split("/")[3]
+        if sandbox_id == "missing":
+            return self.reply(404, {"error": "sandbox not found"})
+        pair = (sandbox_id, request["from_snapshot"], request["to_snapshot"])
+        DiffHandler.stored[pair] = diff_doc(*pair)
+        self.reply(200, DiffHandler.stored[pair])
+
+    def do_GET(self):
+        DiffHandler.calls["GET"] += 1
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        pair = (url.path.split("/")[3], query["from_snapshot"], query["to_snapshot"])
+        if pair not in DiffHandler.stored:
+            return self.reply(404, {"error": "diff not found"})
+        self.reply(200, DiffHandler.stored[pair])
+
+
+class TestDiffCache(ServerTestCase):
+    """DiffCache against a local server"""
+
+    handler = DiffHandler
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        config = cls.configuration()
+        cls.api = SandboxApi(ApiClient(config))
+
+    def setUp(self):
+        DiffHandler.calls.clear()
+        DiffHandler.stored.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def request(self, to_snapshot="after"):
+        return FluidRemoteInternalRestDiffRequest(
+            from_snapshot="base", to_snapshot=to_snapshot
+        )
+
+    def test_repeat_diff_is_served_from_memory(self):
+        cache = DiffCache()
+        first = cache.diff_snapshots(self.api, "SBX-1", self.request())
+        second = cache.diff_snapshots(self.api, "SBX-1", self.request())
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.diff.diff_json.files_added, ["/etc/after"])
+        self.assertEqual(DiffHandler.calls["POST"], 1)
+        self.assertEqual(cache.stats(), (1, 1))
+
+    def test_disk_tier_survives_a_new_cache(self):
+        cache = DiffCache(self.tmp.name)
+        cache.diff_snapshots(self.api, "SBX-1", self.request())
+        path = os.path.join(
+            self.tmp.name, cache_key("SBX-1", "base", "after") + ".json"
+        )
+        self.assertTrue(os.path.exists(path))
+
+        reopened = DiffCache(self.tmp.name)
+        diff = reopened.diff_snapshots(self.api, "SBX-1", self.request())
+        self.assertEqual(diff.diff.to_snapshot, "after")
+        self.assertEqual(DiffHandler.calls["POST"], 1)
+        self.assertEqual(reopened.memory_bytes, os.path.getsize(path))
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        cache = DiffCache()
+        for name in ("a", "b", "c"):
+            cache.diff_snapshots(self.api, "SBX-1", self.request(name))
+        entry = cache.memory_bytes // 3
+        cache.max_memory_bytes = entry * 2
+        cache.get("SBX-1", "base", "a")
+        cache.diff_snapshots(self.api, "SBX-1", self.request("d"))
+        self.assertIsNotNone(cache.get("SBX-1", "base", "a"))
+        self.assertIsNone(cache.get("SBX-1", "base", "b"))
+        self.assertLessEqual(cache.memory_bytes, cache.max_memory_bytes)
+
+    def test_disk_tier_evicts_by_size(self):
+        cache = DiffCache(self.tmp.name, max_memory_bytes=0)
+        cache.diff_snapshots(self.api, "SBX-1", self.request("a"))
+        entry = cache.disk_bytes
+        cache.max_disk_bytes = entry * 2
+        for name in ("b", "c"):
+            cache.diff_snapshots(self.api, "SBX-1", self.request(name))
+        self.assertEqual(len(os.listdir(self.tmp.name)), 2)
+        self.assertIsNone(cache.get("SBX-1", "base", "a"))
+        self.assertEqual(cache.memory_bytes, 0)
+
+        cache.clear()
+        self.assertEqual(os.listdir(self.tmp.name), [])
+        self.assertEqual(len(cache), 0)
+
+    def test_error_status_raises_and_is_not_cached(self):
+        cache = DiffCache(self.tmp.name)
+        with self.assertRaises(NotFoundException):
+            cache.diff_snapshots(self.api, "missing", self.request())
+        self.assertEqual(len(cache), 0)
+
+    def test_get_cached_diff(self):
+        self.assertIsNone(get_cached_diff(self.api, "SBX-1", "base", "after"))
+        self.api.diff_snapshots("SBX-1", self.request())
+        stored = get_cached_diff(self.api, "SBX-1", "base", "after")
+        self.assertEqual(stored.diff.id, "DIF-base-after")
+        self.assertEqual(DiffHandler.calls["POST"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+# coding: utf-8
+
+import hashlib
+import os
+import re
+import tempfile
+import unittest
+from test.server import QuietHandler, ServerTestCase
+
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.download import download_file
+from virsh_sandbox.exceptions import NotFoundException
+
+ARTIFACT = bytes(range(256)) * 1024
+
+
+class ArtifactHandler(QuietHandler):
+    protocol_version = "HTTP/1.1"
+
+    def send_body(self, status, body, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/missing":
+            self.send_body(404, b"not found")
+            return
+        disposition = ("Content-Disposition", 'attachment; filename="artifact.bin"')
+        match = re.match(r"bytes=(\d+)-", self.headers.get("Range") or "")
+        if match is None or self.path == "/no-range":
+            self.send_body(200, ARTIFACT, [disposition])
+            return
+        start = int(match.group(1))
+        if start >= len(ARTIFACT):
+            self.send_body(416, b"", [("Content-Range", "bytes */%d" % len(ARTIFACT))])
+            return
+        content_range = "bytes %d-%d/%d" % (start, len(ARTIFACT) - 1, len(ARTIFACT))
+        self.send_body(206, ARTIFACT[start:], [("Content-Range", content_range)])
+
+
+class TestDownload(ServerTestCase):
+    """Chunked file downloads against a local HTTP server"""
+
+    handler = ArtifactHandler
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "artifact.bin")
+        self.base = self.host
+        config = Configuration(host=self.base)
+        config.temp_folder_path = self.tmp.name
+        self.client = ApiClient(config)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_download_with_hash_and_progress(self):
+        seen = []
+        result = download_file(
+            self.client,
+            "GET",
+            self.base + "/artifact",
+            self.path,
+            chunk_size=4096,
+            hash_algorithm="sha256",
+            progress=lambda done, total: seen.append((done, total)),
+        )
+        self.assertEqual(self.read(), ARTIFACT)
+        self.assertEqual(result.size, len(ARTIFACT))
+        self.assertEqual(result.digest, hashlib.sha256(ARTIFACT).hexdigest())
+        self.assertEqual(result.resumed_from, 0)
+        self.assertEqual(seen[-1], (len(ARTIFACT), len(ARTIFACT)))
+        self.assertGreater(len(seen), 1)
+
+    def test_resume_partial_file(self):
+        with open(self.path, "wb") as f:
+            f.write(ARTIFACT[:1000])
+        result = download_file(
+            self.client,
+            "GET",
+            self.base + "/artifact",
+            self.path,
+            resume=True,
+            hash_algorithm="md5",
+        )
+        self.assertEqual(self.read(), ARTIFACT)
+        self.assertEqual(result.resumed_from, 1000)
+        self.assertEqual(result.digest, hashlib.md5(ARTIFACT).hexdigest())
+
+    def test_resume_complete_file(self):
+        with open(self.path, "wb") as f:
+            f.write(ARTIFACT)
+        result = download_file(
+            self.client, "GET", self.base + "/artifact", self.path, resume=True
+        )
+        self.assertEqual(result.size, len(ARTIFACT))
+        self.assertEqual(result.resumed_from, len(ARTIFACT))
+
+    def test_range_ignored_restarts(self):
+        with open(self.path, "wb") as f:
+            f.write(b"stale")
+        result = download_file(
+            self.client, "GET", self.base + "/no-range", self.path, resume=True
+        )
+        self.assertEqual(self.read(), ARTIFACT)
+        self.assertEqual(result.resumed_from, 0)
+
+    def test_error_status_raises(self):
+        with self.assertRaises(NotFoundException):
+            download_file(self.client, "GET", self.base + "/missing", self.path)
+
+    def test_file_response_is_streamed(self):
+        response = self.client.call_api("GET", self.base + "/artifact")
+        self.assertIsNone(response.read())
+        path = self.client.response_deserialize(response, {"200": "file"}).data
+        self.assertEqual(os.path.basename(path), "artifact.bin")
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), ARTIFACT)
+
+    def test_bytearray_attachment_still_loaded(self):
+        response = self.client.call_api("GET", self.base + "/artifact")
+        response.read()
+        data = self.client.response_deserialize(response, {"200": "bytearray"}).data
+        self.assertEqual(data, ARTIFACT)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+# coding: utf-8
+
+import multiprocessing
+import os
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from virsh_sandbox.api.health_api import HealthApi
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.models.fluid_remote_internal_rest_create_sandbox_request import (
+    FluidRemoteInternalRestCreateSandboxRequest,
+)
+from virsh_sandbox.standin import StandinServer
+
+# Created in the parent and inherited by forked children.
+client = None
+
+
+def pooled_sockets(api_client):
+    pools = api_client.rest_client.pool_manager.pools
+    return [
+        conn.sock.fileno()
+        for key in pools.keys()
+        for conn in list(pools[key].pool.queue)
+        if conn is not None and conn.sock is not None
+    ]
+
+
+def health_in_child():
+    inherited = pooled_sockets(client)
+    status = HealthApi(client).get_health().status
+    return os.getpid(), inherited, status
+
+
+def create_in_child(n):
+    request = FluidRemoteInternalRestCreateSandboxRequest(
+        source_vm_name="ubuntu-base", agent_id="worker-%d" % n
+    )
+    return os.getpid(), SandboxApi(client).create_sandbox(request).sandbox.agent_id
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+class TestForkSafety(unittest.TestCase):
+    """Clients created before a fork and used on both sides of it"""
+
+    def setUp(self):
+        global client
+        self.server = StandinServer().start()
+        client = ApiClient(Configuration(host=self.server.url))
+        self.assertEqual(HealthApi(client).get_health().status, "ok")
+        self.parent_sockets = pooled_sockets(client)
+        self.assertEqual(len(self.parent_sockets), 1)
+
+    def tearDown(self):
+        global client
+        client = None
+        self.server.close()
+
+    def test_child_gets_fresh_pools(self):
+        pool = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("fork"))
+        with pool:
+            pid, inherited, status = pool.submit(health_in_child).result()
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual((inherited, status), ([], "ok"))
+
+        # The parent keeps using the connection it had before the fork.
+        self.assertEqual(HealthApi(client).get_health().status, "ok")
+        self.assertEqual(pooled_sockets(client), self.parent_sockets)
+        self.assertEqual(self.server.state.requests["health"], 3)
+
+    def test_fan_out(self):
+        pool = ProcessPoolExecutor(4, mp_context=multiprocessing.get_context("fork"))
+        with pool:
+            results = list(pool.map(create_in_child, range(16)))
+        self.assertEqual(
+            [agent for _, agent in results], ["worker-%d" % n for n in range(16)]
+        )
+        self.assertEqual(len(self.server.state.sandboxes), 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+# coding: utf-8
+
+import json
+import unittest
+from test.server import QuietHandler, ServerTestCase
+from urllib.parse import parse_qs, urlparse
+
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.exceptions import ServiceException
+from virsh_sandbox.interceptors import Interceptor, make_response
+
+
+class ListHandler(QuietHandler):
+    """GET /v1/sandboxes echoing the query and a header back as a sandbox."""
+
+    protocol_version = "HTTP/1.1"
+    hits = 0
+
+    def do_GET(self):
+        ListHandler.hits += 1
+        query = parse_qs(urlparse(self.path).query)
+        status = 500 if query.get("state") == ["broken"] else 200
+        doc = {
+            "sandboxes": [
+                {
+                    "id": "SBX-1",
+                    "state": query.get("state", [""])[0],
+                    "agent_id": self.headers.get("X-Trace", ""),
+                }
+            ],
+            "total": 1,
+        }
+        body = json.dumps(doc).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Recorder(Interceptor):
+    """Logs every stage it sees under its name."""
+
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+
+    def build(self, params, proceed):
+        self.log.append((self.name, "build"))
+        return proceed(params)
+
+    def send(self, request, proceed):
+        self.log.append((self.name, "send"))
+        response = proceed(request)
+        self.log.append((self.name, "sent", response.status))
+        return response
+
+    def deserialize(self, response, response_types_map, proceed):
+        self.log.append((self.name, "deserialize", response.request.method))
+        return proceed(response, response_types_map)
+
+
+class Cache(Interceptor):
+    """Serves repeated GETs from memory."""
+
+    def __init__(self):
+        self.bodies = {}
+
+    def send(self, request, proceed):
+        if request.url in self.bodies:
+            request.context["cached"] = True
+            return make_response(
+                200, self.bodies[request.url], {"Content-Type": "application/json"}
+            )
+        response = proceed(request)
+        if response.status == 200:
+            self.bodies[request.url] = response.read()
+        return response
+
+
+class TestInterceptors(ServerTestCase):
+    """Interceptor chains on ApiClient against a local server"""
+
+    handler = ListHandler
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.config = cls.configuration()
+
+    def setUp(self):
+        ListHandler.hits = 0
+
+    def test_no_interceptors_has_no_chains(self):
+        client = ApiClient(self.config)
+        self.assertEqual(client.interceptors, ())
+        self.assertIsNone(client._build_chain)
+        self.assertIsNone(client._send_chain)
+        self.assertIsNone(client._deserialize_chain)
+        # Hooks left at the default are skipped as well.
+        client.interceptors = [Interceptor(), Cache()]
+        self.assertIsNone(client._build_chain)
+        self.assertIsNotNone(client._send_chain)
+        result = SandboxApi(client).list_sandboxes(state="running")
+        self.assertEqual(result.sandboxes[0].state, "running")
+
+    def test_order_and_modification(self):
+        log = []
+
+        class Trace(Interceptor):
+            def build(self, params, proceed):
+                params["header_params"] = {"X-Trace": "t-1"}
+                params["query_params"] = [("state", "stopped")]
+                return proceed(params)
+
+        client = ApiClient(
+            self.config,
+            interceptors=[Recorder("outer", log), Trace(), Recorder("inner", log)],
+        )
+        result = SandboxApi(client).list_sandboxes()
+        self.assertEqual(result.sandboxes[0].state, "stopped")
+        self.assertEqual(result.sandboxes[0].agent_id, "t-1")
+        self.assertEqual(
+            log,
+            [
+                ("outer", "build"),
+                ("inner", "build"),
+                ("outer", "send"),
+                ("inner", "send"),
+                ("inner", "sent", 200),
+                ("outer", "sent", 200),
+                ("outer", "deserialize", "GET"),
+                ("inner", "deserialize", "GET"),
+            ],
+        )
+
+    def test_short_circuit_from_cache(self):
+        cache = Cache()
+        client = ApiClient(self.config, interceptors=[cache])
+        api = SandboxApi(client)
+        first = api.list_sandboxes(state="running")
+        second = api.list_sandboxes_with_http_info(state="running")
+        self.assertEqual(ListHandler.hits, 1)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first)
+        api.list_sandboxes(state="stopped")
+        self.assertEqual(ListHandler.hits, 2)
+
+    def test_errors_pass_through_deserialize_hooks(self):
+        seen = []
+
+        class Status(Interceptor):
+            def deserialize(self, response, response_types_map, proceed):
+                try:
+                    return proceed(response, response_types_map)
+                except ServiceException as e:
+                    seen.append(e.status)
+                    raise
+
+        client = ApiClient(self.config, interceptors=[Status()])
+        with self.assertRaises(ServiceException):
+            SandboxApi(client).list_sandboxes(state="broken")
+        self.assertEqual(seen, [500])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+# coding: utf-8
+
+import contextlib
+import io
+import json
+import unittest
+
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.loadgen import LoadGenerator, main, percentile
+from virsh_sandbox.standin import StandinServer, StandinState
+
+
+class TestLoadGenerator(unittest.TestCase):
+    """Load generation against the in-process stand-in"""
+
+    def test_percentile(self):
+        ordered = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(ordered, 50), 50.0)
+        self.assertEqual(percentile(ordered, 99), 99.0)
+        self.assertEqual(percentile([3.0], 99), 3.0)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_counts_calls_and_failures(self):
+        state = StandinState(failures={"snapshot": 1.0}, seed=3)
+        with StandinServer(state) as server:
+            config = Configuration(host=server.url)
+            config.connection_pool_maxsize = 4
+            generator = LoadGenerator(
+                ApiClient(config), commands=2, snapshot_rate=1.0, access_rate=1.0
+            )
+            report = generator.run(workers=4, lifecycles=10)
+
+        self.assertEqual(report.lifecycles, 10)
+        ops = report.operations
+        self.assertEqual((ops["create"].count, ops["create"].errors), (10, 0))
+        self.assertEqual((ops["destroy"].count, ops["destroy"].errors), (10, 0))
+        # The first snapshot fails, which ends each lifecycle early.
+        self.assertEqual((ops["snapshot"].count, ops["snapshot"].errors), (10, 10))
+        self.assertNotIn("run", ops)
+        self.assertLessEqual(ops["create"].p50, ops["create"].p99)
+        self.assertIn("snapshot", report.format())
+        self.assertTrue(
+            all(s["state"] == "DESTROYED" for s in state.sandboxes.values())
+        )
+
+    def test_command_line(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            main(["--standin", "-w", "2", "-n", "4", "--run", "0.001", "--json"])
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["lifecycles"], 4)
+        self.assertEqual(report["operations"]["run"]["count"], 12)
+        self.assertEqual(report["operations"]["run"]["errors"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
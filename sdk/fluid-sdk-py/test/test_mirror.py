@@ -0,0 +1,290 @@
+# coding: utf-8
+
+import json
+import os
+import tempfile
+import unittest
+from test.server import QuietHandler, serve, stop, url
+from urllib.parse import parse_qs, urlparse
+
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.mirror import SandboxMirror
+from virsh_sandbox.models.fluid_remote_internal_rest_snapshot_response import (
+    FluidRemoteInternalRestSnapshotResponse,
+)
+
+
+class FakeServer:
+    """In-memory fluid-remote with newest-first lists."""
+
+    def __init__(self):
+        self.sandboxes = {}
+        self.commands = {}
+        self.sessions = {}
+        self.requests = []
+        self.clock = 0
+
+    def add_sandbox(self, sandbox_id, state="RUNNING"):
+        self.clock += 1
+        stamp = "2026-01-01T00:00:%02dZ" % self.clock
+        self.sandboxes[sandbox_id] = {
+            "id": sandbox_id,
+            "sandbox_name": "sbx-" + sandbox_id,
+            "agent_id": "agent",
+            "base_image": "ubuntu",
+            "state": state,
+            "created_at": stamp,
+            "updated_at": stamp,
+        }
+        self.commands[sandbox_id] = []
+
+    def set_state(self, sandbox_id, state):
+        self.clock += 1
+        sandbox = self.sandboxes[sandbox_id]
+        sandbox["state"] = state
+        sandbox["updated_at"] = "2026-01-01T00:00:%02dZ" % self.clock
+
+    def destroy(self, sandbox_id):
+        # fluid-remote soft-deletes: the sandbox disappears from reads and
+        # lists, but its commands can still be listed.
+        self.set_state(sandbox_id, "DESTROYED")
+        self.sandboxes[sandbox_id]["deleted_at"] = self.sandboxes[sandbox_id][
+            "updated_at"
+        ]
+
+    def add_command(self, sandbox_id, exit_code=0):
+        commands = self.commands[sandbox_id]
+        commands.append(
+            {
+                "id": "%s-CMD-%d" % (sandbox_id, len(commands)),
+                "sandbox_id": sandbox_id,
+                "command": "echo %d" % len(commands),
+                "exit_code": exit_code,
+                "started_at": "2026-01-01T00:01:%02dZ" % len(commands),
+                "metadata": {"timed_out": False},
+            }
+        )
+
+    def handle(self, path):
+        url = urlparse(path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.requests.append(url.path)
+        parts = url.path.strip("/").split("/")
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", 100))
+        if parts == ["v1", "sandboxes"]:
+            items = sorted(
+                (s for s in self.sandboxes.values() if not s.get("deleted_at")),
+                key=lambda s: s["created_at"],
+                reverse=True,
+            )
+            if "state" in query:
+                items = [s for s in items if s["state"] == query["state"]]
+            page = items[offset : offset + limit]
+            return 200, {"sandboxes": page, "total": len(page)}
+        if parts[:2] == ["v1", "sandboxes"] and len(parts) == 3:
+            sandbox = self.sandboxes.get(parts[2])
+            if sandbox is None or sandbox.get("deleted_at"):
+                return 404, {"error": "sandbox not found"}
+            return 200, {"sandbox": sandbox}
+        if parts[:2] == ["v1", "sandboxes"] and parts[3:] == ["commands"]:
+            if parts[2] not in self.commands:
+                return 404, {"error": "sandbox not found"}
+            items = list(reversed(self.commands[parts[2]]))
+            page = items[offset : offset + limit]
+            return 200, {"commands": page, "total": len(page)}
+        if parts == ["v1", "access", "sessions"]:
+            items = self.sessions.get(query.get("sandbox_id"), [])
+            return 200, {"sessions": items, "total": len(items)}
+        return 404, {"error": "not found"}
+
+
+def make_handler(server):
+    class Handler(QuietHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            status, doc = server.handle(self.path)
+            body = json.dumps(doc).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+class TestSandboxMirror(unittest.TestCase):
+    """SandboxMirror incremental sync"""
+
+    def setUp(self):
+        self.fake = FakeServer()
+        self.httpd = serve(make_handler(self.fake))
+        self.client = ApiClient(Configuration(host=url(self.httpd)))
+        self.mirror = SandboxMirror(":memory:", self.client, page_size=3)
+
+    def tearDown(self):
+        self.mirror.close()
+        stop(self.httpd)
+
+    def count(self, table):
+        return self.mirror.query("SELECT COUNT(*) FROM %s" % table)[0][0]
+
+    def test_initial_sync(self):
+        for i in range(7):
+            self.fake.add_sandbox("SBX-%d" % i, "DESTROYED" if i < 2 else "RUNNING")
+            for _ in range(i):
+                self.fake.add_command("SBX-%d" % i, exit_code=i % 2)
+        self.fake.sessions["SBX-3"] = [
+            {"id": "SES-1", "sandbox_id": "SBX-3", "status": "ACTIVE"}
+        ]
+
+        stats = self.mirror.sync()
+
+        self.assertEqual(stats.sandboxes, 7)
+        self.assertEqual(stats.commands, 21)
+        self.assertEqual(stats.sessions, 1)
+        self.assertEqual(self.count("sandboxes"), 7)
+        self.assertEqual(self.count("commands"), 21)
+        row = self.mirror.query("SELECT * FROM commands WHERE id = 'SBX-6-CMD-0'")[0]
+        self.assertEqual(row["sandbox_id"], "SBX-6")
+        self.assertEqual(json.loads(row["metadata"]), {"timed_out": False})
+        failed = self.mirror.query("SELECT COUNT(*) FROM commands WHERE exit_code = 1")[
+            0
+        ][0]
+        self.assertEqual(failed, 1 + 3 + 5)
+        self.assertIsNotNone(self.mirror.last_sync)
+
+    def test_incremental_sync_fetches_only_new_pages(self):
+        for i in range(10):
+            self.fake.add_sandbox("SBX-%d" % i, "DESTROYED")
+        self.fake.add_sandbox("LIVE")
+        for _ in range(10):
+            self.fake.add_command("LIVE")
+        self.mirror.sync()
+
+        self.fake.add_sandbox("NEW")
+        self.fake.add_command("LIVE")
+        self.fake.requests.clear()
+        stats = self.mirror.sync()
+
+        self.assertEqual(stats.commands, 1)
+        self.assertEqual(self.count("commands"), 11)
+        self.assertEqual(self.count("sandboxes"), 12)
+        # One page of the full list, one per live state, one commands page
+        # each for LIVE and NEW, one sessions call each; destroyed sandboxes
+        # are not asked for commands again.
+        self.assertEqual(self.fake.requests.count("/v1/sandboxes"), 1 + 4)
+        self.assertNotIn("/v1/sandboxes/SBX-0/commands", self.fake.requests)
+        self.assertEqual(self.fake.requests.count("/v1/sandboxes/LIVE/commands"), 1)
+        self.assertEqual(stats.requests, len(self.fake.requests))
+
+    def test_state_changes_and_deletions(self):
+        self.fake.add_sandbox("A")
+        self.fake.add_sandbox("B")
+        self.fake.add_sandbox("C")
+        self.fake.add_command("A")
+        self.mirror.sync()
+
+        self.fake.set_state("A", "DESTROYED")
+        self.fake.add_command("A")
+        self.fake.destroy("B")
+
+        self.mirror.sync()
+
+        states = dict(self.mirror.query("SELECT id, state FROM sandboxes"))
+        self.assertEqual(states, {"A": "DESTROYED", "B": "DESTROYED", "C": "RUNNING"})
+        # The last commands of a sandbox that stopped are still picked up.
+        self.assertEqual(
+            self.mirror.query("SELECT COUNT(*) FROM commands WHERE sandbox_id = 'A'")[
+                0
+            ][0],
+            2,
+        )
+        final = self.mirror.query("SELECT commands_final FROM sandboxes WHERE id = 'A'")
+        self.assertEqual(final[0][0], 1)
+
+    def test_destroyed_between_syncs_keeps_last_commands(self):
+        self.fake.add_sandbox("A")
+        self.fake.add_command("A")
+        self.mirror.sync()
+
+        self.fake.add_command("A")
+        self.fake.add_command("A", exit_code=1)
+        self.fake.destroy("A")
+        self.mirror.sync()
+
+        row = self.mirror.query(
+            "SELECT state, commands_final FROM sandboxes WHERE id = 'A'"
+        )
+        self.assertEqual(tuple(row[0]), ("DESTROYED", 1))
+        self.assertEqual(self.count("commands"), 3)
+        self.fake.requests.clear()
+        self.mirror.sync()
+        self.assertNotIn("/v1/sandboxes/A", self.fake.requests)
+        self.assertNotIn("/v1/sandboxes/A/commands", self.fake.requests)
+
+    def test_closed_sessions_are_kept(self):
+        self.fake.add_sandbox("A")
+        self.fake.sessions["A"] = [
+            {"id": "SES-1", "sandbox_id": "A", "status": "ACTIVE"},
+            {"id": "SES-2", "sandbox_id": "A", "status": "PENDING"},
+        ]
+        self.mirror.sync()
+        self.fake.sessions["A"] = [
+            {"id": "SES-2", "sandbox_id": "A", "status": "ACTIVE"}
+        ]
+        self.mirror.sync()
+
+        rows = self.mirror.query("SELECT id, status, active FROM sessions ORDER BY id")
+        self.assertEqual(
+            [tuple(r) for r in rows], [("SES-1", "ACTIVE", 0), ("SES-2", "ACTIVE", 1)]
+        )
+
+    def test_record_snapshot_and_diff(self):
+        snapshot = FluidRemoteInternalRestSnapshotResponse.from_dict(
+            {
+                "snapshot": {
+                    "id": "SNP-1",
+                    "sandbox_id": "A",
+                    "name": "base",
+                    "kind": "INTERNAL",
+                    "created_at": "2026-01-01T00:00:00Z",
+                }
+            }
+        )
+        self.mirror.record_snapshot(snapshot)
+        self.mirror.record_diff(
+            {
+                "id": "DIF-1",
+                "sandbox_id": "A",
+                "from_snapshot": "base",
+                "to_snapshot": "after",
+                "diff_json": {"files_added": ["/etc/motd"]},
+            }
+        )
+        row = self.mirror.query("SELECT name, kind FROM snapshots WHERE id = 'SNP-1'")
+        self.assertEqual(tuple(row[0]), ("base", "INTERNAL"))
+        diff = self.mirror.query("SELECT diff_json FROM diffs WHERE id = 'DIF-1'")
+        self.assertEqual(json.loads(diff[0][0]), {"files_added": ["/etc/motd"]})
+        with self.assertRaises(ValueError):
+            self.mirror.record_diff({"sandbox_id": "A"})
+
+    def test_persists_between_opens(self):
+        self.fake.add_sandbox("A")
+        self.fake.add_command("A")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "mirror.db")
+            with SandboxMirror(path, self.client) as mirror:
+                mirror.sync()
+            self.fake.requests.clear()
+            with SandboxMirror(path, self.client) as mirror:
+                stats = mirror.sync()
+                self.assertEqual(stats.commands, 0)
+                self.assertEqual(mirror.query("SELECT COUNT(*) FROM commands")[0][0], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
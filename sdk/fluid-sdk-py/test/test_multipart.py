@@ -0,0 +1,144 @@
+# coding: utf-8
+
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from test.server import QuietHandler, ServerTestCase
+
+from urllib3.filepost import encode_multipart_formdata
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.multipart import MultipartEncoder
+
+PAYLOAD = os.urandom(300 * 1024)
+
+
+class Unseekable(io.RawIOBase):
+    def __init__(self, data):
+        self.inner = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self.inner.readinto(b)
+
+
+class UploadHandler(QuietHandler):
+    protocol_version = "HTTP/1.1"
+    received = []
+
+    def do_POST(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                chunk = self.rfile.read(size + 2)[:size]
+                if size == 0:
+                    break
+                body += chunk
+        else:
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+        UploadHandler.received.append((dict(self.headers), body))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class TestMultipartEncoder(unittest.TestCase):
+    """Streaming multipart encoding"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "asset.bin")
+        with open(self.path, "wb") as f:
+            f.write(PAYLOAD)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def expected(self, boundary):
+        fields = [
+            ("name", "asset"),
+            ("file", ("asset.bin", PAYLOAD, "application/octet-stream")),
+        ]
+        return encode_multipart_formdata(fields, boundary=boundary)[0]
+
+    def test_matches_urllib3_encoding(self):
+        for data in (PAYLOAD, Path(self.path), open(self.path, "rb")):
+            encoder = MultipartEncoder(
+                [
+                    ("name", "asset"),
+                    ("file", ("asset.bin", data, "application/octet-stream")),
+                ],
+                boundary="b0undary",
+                chunk_size=8192,
+            )
+            body = b"".join(encoder)
+            self.assertEqual(body, self.expected("b0undary"))
+            self.assertEqual(encoder.content_length, len(body))
+            # Re-iterating (e.g. on a urllib3 retry) yields the same body.
+            self.assertEqual(b"".join(encoder), body)
+            if hasattr(data, "close"):
+                data.close()
+
+    def test_unknown_size_has_no_length(self):
+        encoder = MultipartEncoder(
+            [("file", ("x.bin", Unseekable(PAYLOAD), "application/octet-stream"))]
+        )
+        self.assertIsNone(encoder.content_length)
+
+    def test_files_parameters_defers_reading(self):
+        params = ApiClient().files_parameters({"file": self.path})
+        self.assertEqual(
+            params,
+            [("file", ("asset.bin", Path(self.path), "application/octet-stream"))],
+        )
+
+    def test_files_parameters_descriptor_file(self):
+        with os.fdopen(os.open(self.path, os.O_RDONLY), "rb") as f:
+            params = ApiClient().files_parameters({"file": f})
+        self.assertEqual(params, [("file", ("file", f, "application/octet-stream"))])
+
+
+class TestMultipartUpload(ServerTestCase):
+    """Multipart requests through the REST client"""
+
+    handler = UploadHandler
+
+    def setUp(self):
+        UploadHandler.received = []
+        self.url = "http://127.0.0.1:%d/upload" % self.server.server_address[1]
+        self.client = ApiClient(Configuration())
+
+    def upload(self, files):
+        response = self.client.call_api(
+            "POST",
+            self.url,
+            header_params={"Content-Type": "multipart/form-data"},
+            post_params=self.client.files_parameters(files),
+        )
+        response.read()
+        self.assertEqual(response.status, 200)
+        return UploadHandler.received[-1]
+
+    def test_known_size_uses_content_length(self):
+        with tempfile.NamedTemporaryFile(suffix=".bin") as f:
+            f.write(PAYLOAD)
+            f.flush()
+            headers, body = self.upload({"file": f.name})
+        self.assertNotIn("Transfer-Encoding", headers)
+        self.assertEqual(int(headers["Content-Length"]), len(body))
+        self.assertIn(PAYLOAD, body)
+        self.assertTrue(headers["Content-Type"].startswith("multipart/form-data; "))
+
+    def test_unknown_size_uses_chunked_transfer(self):
+        headers, body = self.upload({"file": ("stream.bin", Unseekable(PAYLOAD))})
+        self.assertEqual(headers.get("Transfer-Encoding"), "chunked")
+        self.assertIn(PAYLOAD, body)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+# coding: utf-8
+
+import asyncio
+import base64
+import collections
+import hashlib
+import json
+import struct
+import unittest
+from test.server import QuietHandler, serve, stop, url
+
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.multiplex import EVENT_CLOSED, ActivityMultiplexer
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def frame(opcode, payload):
+    if len(payload) < 126:
+        return bytes([0x80 | opcode, len(payload)]) + payload
+    return bytes([0x80 | opcode, 126]) + struct.pack("!H", len(payload)) + payload
+
+
+def event(kind, sandbox_id, **data):
+    body = {"type": kind, "timestamp": "2026-01-01T00:00:00Z", "sandbox_id": sandbox_id}
+    if data:
+        body["data"] = data
+    return frame(0x1, json.dumps(body).encode())
+
+
+class StreamHandler(QuietHandler):
+    """Sandbox activity stream. Sandboxes named ``hold-*`` keep the
+    connection open; the others close after their history, forcing a
+    reconnect that replays it."""
+
+    protocol_version = "HTTP/1.1"
+    connects = collections.Counter()
+
+    def do_GET(self):
+        sandbox_id = self.path.strip("/").split("/")[2]
+        if sandbox_id == "missing":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        StreamHandler.connects[sandbox_id] += 1
+        key = self.headers["Sec-WebSocket-Key"]
+        accept = base64.b64encode(hashlib.sha1((key + GUID).encode()).digest())
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept.decode())
+        self.end_headers()
+        self.wfile.write(event("connected", sandbox_id, state="RUNNING"))
+        for i in range(2):
+            command_id = "%s-CMD-%d" % (sandbox_id, i)
+            self.wfile.write(
+                event("command_history", sandbox_id, command_id=command_id)
+            )
+        self.wfile.write(event("heartbeat", sandbox_id))
+        if sandbox_id.startswith("hold"):
+            self.wfile.flush()
+            self.rfile.read(1)  # until the client closes
+        else:
+            self.wfile.write(frame(0x8, struct.pack("!H", 1000)))
+            self.wfile.flush()
+        self.close_connection = True
+
+
+def start_server():
+    server = serve(StreamHandler)
+    client = ApiClient(Configuration(host=url(server)))
+    return server, client
+
+
+async def collect(mux, count, timeout=5):
+    events = []
+    while len(events) < count:
+        events.append(await asyncio.wait_for(mux.get(), timeout))
+    return events
+
+
+class TestActivityMultiplexer(unittest.TestCase):
+    """ActivityMultiplexer against local WebSocket servers"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.client = start_server()
+        cls.other_server, cls.other_client = start_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        for server in (cls.server, cls.other_server):
+            stop(server)
+
+    def setUp(self):
+        StreamHandler.connects.clear()
+
+    def mux(self, **kwargs):
+        kwargs.setdefault("reconnect_delay", 0.01)
+        return ActivityMultiplexer(self.client, **kwargs)
+
+    def test_merges_streams_tagged_by_sandbox(self):
+        async def run():
+            async with self.mux() as mux:
+                mux.update(["hold-%d" % i for i in range(20)])
+                return await collect(mux, 60)
+
+        events = asyncio.run(run())
+        by_sandbox = collections.defaultdict(list)
+        for e in events:
+            by_sandbox[e.sandbox_id].append(e.type)
+        self.assertEqual(len(by_sandbox), 20)
+        for types in by_sandbox.values():
+            self.assertEqual(types, ["connected", "command_history", "command_history"])
+        self.assertNotIn("heartbeat", {e.type for e in events})
+
+    def test_reconnects_without_replaying_history(self):
+        async def run():
+            async with self.mux(heartbeats=True) as mux:
+                mux.subscribe("SBX-1")
+                events = await collect(mux, 3 * 4)
+                return events, mux.connects("SBX-1")
+
+        events, connects = asyncio.run(run())
+        history = [e.data["command_id"] for e in events if e.type == "command_history"]
+        self.assertEqual(history, ["SBX-1-CMD-0", "SBX-1-CMD-1"])
+        self.assertEqual([e.type for e in events].count("connected"), 5)
+        self.assertGreaterEqual(connects, 5)
+
+    def test_refused_subscription_is_closed(self):
+        async def run():
+            async with self.mux() as mux:
+                mux.subscribe("missing")
+                closed = await collect(mux, 1)
+                return closed[0], mux.subscriptions
+
+        closed, subscriptions = asyncio.run(run())
+        self.assertEqual(closed.type, EVENT_CLOSED)
+        self.assertEqual(closed.data["status"], 404)
+        self.assertEqual(subscriptions, frozenset())
+
+    def test_update_drops_and_adds(self):
+        async def run():
+            async with self.mux() as mux:
+                mux.update(["hold-a", "hold-b"])
+                await collect(mux, 6)
+                mux.update(["hold-b", "hold-c"])
+                events = await collect(mux, 3)
+                return events, mux.subscriptions
+
+        events, subscriptions = asyncio.run(run())
+        self.assertEqual({e.sandbox_id for e in events}, {"hold-c"})
+        self.assertEqual(subscriptions, frozenset({"hold-b", "hold-c"}))
+        self.assertEqual(StreamHandler.connects["hold-b"], 1)
+
+    def test_subscriptions_across_hosts(self):
+        async def run():
+            async with self.mux() as mux:
+                mux.subscribe("hold-local")
+                mux.subscribe("hold-remote", self.other_client)
+                return await collect(mux, 6)
+
+        events = asyncio.run(run())
+        hosts = {e.sandbox_id: e.host for e in events}
+        self.assertEqual(hosts["hold-local"], self.client.configuration.host)
+        self.assertEqual(hosts["hold-remote"], self.other_client.configuration.host)
+
+    def test_bounded_queue_and_close(self):
+        async def run():
+            mux = self.mux(max_queue=2)
+            mux.update(["hold-%d" % i for i in range(5)])
+            await asyncio.sleep(0.3)
+            size = mux._queue.qsize()
+            await mux.close()
+            rest = [e async for e in mux]
+            with self.assertRaises(RuntimeError):
+                mux.subscribe("hold-late")
+            return size, rest
+
+        size, rest = asyncio.run(run())
+        self.assertEqual(size, 2)
+        self.assertEqual(rest, [])
+
+    def test_created_outside_the_loop(self):
+        mux = self.mux()
+        self.assertIsNone(mux._queue)
+
+        async def run():
+            async with mux:
+                mux.subscribe("hold-1")
+                return await collect(mux, 1)
+
+        self.assertEqual(asyncio.run(run())[0].type, "connected")
+
+
+if __name__ == "__main__":
+    unittest.main()
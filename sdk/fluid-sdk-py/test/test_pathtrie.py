@@ -0,0 +1,197 @@
+# coding: utf-8
+
+import gc
+import json
+import tracemalloc
+import unittest
+from test.server import QuietHandler, ServerTestCase
+
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.exceptions import NotFoundException
+from virsh_sandbox.models.fluid_remote_internal_rest_diff_request import (
+    FluidRemoteInternalRestDiffRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_store_change_diff import (
+    FluidRemoteInternalStoreChangeDiff,
+)
+from virsh_sandbox.pathtrie import DiffTrie, PathTrie, diff_snapshots_trie
+
+PATHS = [
+    "/etc/nginx/nginx.conf",
+    "/etc/nginx/sites-enabled/default",
+    "/etc/hosts",
+    "/etc.d/x",
+    "/usr/lib/python3/dist-packages/a.py",
+    "/usr/lib/python3/dist-packages/b.py",
+    "/usr/bin/nginx",
+    "relative/file",
+    "/var//double",
+    "/tmp/dir/",
+]
+
+
+def package_install(n):
+    return [
+        "/usr/share/pkg%02d/lib%02d/file_%05d.py" % (i % 40, i % 17, i)
+        for i in range(n)
+    ]
+
+
+class TestPathTrie(unittest.TestCase):
+    """PathTrie"""
+
+    def test_round_trip_in_sorted_order(self):
+        trie = PathTrie(PATHS + PATHS[:3])
+        self.assertEqual(len(trie), len(PATHS))
+        self.assertEqual(trie.to_list(), sorted(PATHS))
+        self.assertEqual(
+            list(PathTrie(package_install(500))), sorted(package_install(500))
+        )
+
+    def test_membership(self):
+        trie = PathTrie(PATHS)
+        for path in PATHS:
+            self.assertIn(path, trie)
+        self.assertNotIn("/etc/nginx", trie)
+        self.assertNotIn("/etc/hosts/x", trie)
+        self.assertNotIn(None, trie)
+
+    def test_directory_queries(self):
+        trie = PathTrie(PATHS)
+        self.assertEqual(
+            trie.under("/etc").to_list(),
+            ["/etc/hosts", "/etc/nginx/nginx.conf", "/etc/nginx/sites-enabled/default"],
+        )
+        self.assertEqual(trie.under("/etc/").to_list(), trie.under("/etc").to_list())
+        self.assertEqual(trie.count_under("/etc/nginx"), 2)
+        self.assertEqual(trie.count_under("/usr"), 3)
+        self.assertEqual(trie.count_under("/"), len(PATHS) - 1)
+        self.assertEqual(trie.count_under(""), len(PATHS))
+        self.assertEqual(trie.count_under("/nope"), 0)
+        self.assertEqual(len(trie.under("/nope")), 0)
+        self.assertEqual(trie.children("/usr"), {"bin": 1, "lib": 2})
+        self.assertEqual(trie.children("/etc/hosts"), {})
+
+    def test_set_operations(self):
+        a = PathTrie(PATHS[:6])
+        b = PathTrie(PATHS[4:])
+        self.assertEqual((a | b).to_list(), sorted(PATHS))
+        self.assertEqual((a & b).to_list(), sorted(PATHS[4:6]))
+        self.assertEqual((a - b).to_list(), sorted(PATHS[:4]))
+        self.assertEqual(a - a, PathTrie())
+        self.assertEqual(a | PathTrie(), a)
+        self.assertNotEqual(a, b)
+
+    def test_set_operations_share_untouched_subtrees(self):
+        etc = PathTrie(PATHS[:3])
+        usr = PathTrie(package_install(100))
+        union = etc | usr
+        self.assertIs(union._root.dirs[""].dirs["usr"], usr._root.dirs[""].dirs["usr"])
+
+    def test_smaller_than_lists(self):
+        paths = package_install(20000)
+        blob = json.dumps(paths)
+
+        def measure(build):
+            gc.collect()
+            tracemalloc.start()
+            try:
+                result = build(json.loads(blob))
+                gc.collect()
+                return tracemalloc.get_traced_memory()[0], result
+            finally:
+                tracemalloc.stop()
+
+        as_list, _ = measure(lambda p: p)
+        as_trie, _ = measure(PathTrie)
+        self.assertLess(as_trie * 3, as_list)
+
+
+class TestDiffTrie(unittest.TestCase):
+    """DiffTrie"""
+
+    doc = {
+        "files_added": ["/etc/motd", "/usr/bin/nginx"],
+        "files_modified": ["/etc/hosts"],
+        "files_removed": ["/tmp/old"],
+        "packages_added": [{"name": "nginx", "version": "1.24"}],
+    }
+
+    def test_model_round_trip(self):
+        model = FluidRemoteInternalStoreChangeDiff.from_dict(self.doc)
+        diff = DiffTrie.from_model(model)
+        self.assertEqual(len(diff), 4)
+        self.assertEqual(diff.to_model(), model)
+        self.assertEqual(diff.to_dict(), self.doc)
+
+    def test_under_and_set_operations(self):
+        diff = DiffTrie.from_dict(self.doc)
+        etc = diff.under("/etc")
+        self.assertEqual(etc.added.to_list(), ["/etc/motd"])
+        self.assertEqual(etc.modified.to_list(), ["/etc/hosts"])
+        self.assertEqual(len(etc.removed), 0)
+        self.assertEqual(
+            diff.changed().to_list(),
+            ["/etc/hosts", "/etc/motd", "/tmp/old", "/usr/bin/nginx"],
+        )
+        later = DiffTrie.from_dict({"files_added": ["/etc/motd", "/srv/app"]})
+        self.assertEqual(
+            (diff | later).added.to_list(), ["/etc/motd", "/srv/app", "/usr/bin/nginx"]
+        )
+        self.assertEqual((diff & later).added.to_list(), ["/etc/motd"])
+        self.assertEqual((diff - later).added.to_list(), ["/usr/bin/nginx"])
+        self.assertEqual((diff - later).extra, diff.extra)
+        self.assertEqual(diff, DiffTrie.from_dict(self.doc))
+
+
+class DiffHandler(QuietHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if "/SBX-1/" in self.path:
+            status = 200
+            doc = {
+                "diff": {
+                    "id": "DIF-1",
+                    "from_snapshot": request["from_snapshot"],
+                    "diff_json": {"files_added": package_install(300)},
+                }
+            }
+        else:
+            status, doc = 404, {"error": "sandbox not found"}
+        body = json.dumps(doc).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestDiffSnapshotsTrie(ServerTestCase):
+    """diff_snapshots_trie against a local server"""
+
+    handler = DiffHandler
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        config = cls.configuration()
+        cls.api = SandboxApi(ApiClient(config))
+        cls.request = FluidRemoteInternalRestDiffRequest(
+            from_snapshot="base", to_snapshot="after"
+        )
+
+    def test_diff(self):
+        diff = diff_snapshots_trie(self.api, "SBX-1", self.request)
+        self.assertEqual(len(diff.added), 300)
+        self.assertEqual(diff.added.count_under("/usr/share/pkg00"), 8)
+
+    def test_error_status_raises(self):
+        with self.assertRaises(NotFoundException):
+            diff_snapshots_trie(self.api, "SBX-2", self.request)
+
+
+if __name__ == "__main__":
+    unittest.main()
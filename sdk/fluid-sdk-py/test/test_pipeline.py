@@ -0,0 +1,160 @@
+# coding: utf-8
+
+import collections
+import json
+import threading
+import time
+import unittest
+from test.server import QuietHandler, ServerTestCase
+
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.exceptions import ApiException, NotFoundException
+from virsh_sandbox.pipeline import SandboxPipeline, Stage, publish_stages
+
+DELAY = 0.1
+
+
+class PublishHandler(QuietHandler):
+    """Every stage takes DELAY seconds. Sandboxes named ``bad-*`` have no
+    base snapshot, so their diff fails."""
+
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    active = collections.Counter()
+    peak = collections.Counter()
+    requests = []
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        _, _, _, sandbox_id, stage = self.path.split("/")[:5]
+        with self.lock:
+            self.active[stage] += 1
+            self.peak[stage] = max(self.peak[stage], self.active[stage])
+            self.requests.append((sandbox_id, stage, request))
+        time.sleep(DELAY)
+        with self.lock:
+            self.active[stage] -= 1
+        status, doc = 200, {}
+        if stage == "snapshot":
+            doc = {"snapshot": {"name": request["name"], "sandbox_id": sandbox_id}}
+        elif stage == "diff":
+            if sandbox_id.startswith("bad"):
+                status, doc = 404, {"error": "snapshot not found"}
+            else:
+                doc = {
+                    "diff": {
+                        "id": "DIF-" + sandbox_id,
+                        "to_snapshot": request["to_snapshot"],
+                    }
+                }
+        elif stage == "publish":
+            doc = {"message": "published", "note": request["job_id"]}
+        body = json.dumps(doc).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestSandboxPipeline(ServerTestCase):
+    """SandboxPipeline against a local server"""
+
+    handler = PublishHandler
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        config = cls.configuration()
+        config.connection_pool_maxsize = 32
+        cls.api = SandboxApi(ApiClient(config))
+
+    def setUp(self):
+        PublishHandler.active.clear()
+        PublishHandler.peak.clear()
+        PublishHandler.requests.clear()
+
+    def test_runs_sandboxes_concurrently(self):
+        ids = ["SBX-%d" % i for i in range(8)]
+        stages = publish_stages(
+            "JOB-1",
+            base_snapshot="initial",
+            snapshot_name=lambda sid: "final-" + sid,
+            concurrency={"snapshot": 8, "diff": 8, "generate": 8, "publish": 8},
+        )
+        report = SandboxPipeline(stages, self.api).run(ids)
+
+        self.assertEqual(report.succeeded, ids)
+        self.assertEqual(report.failed, {})
+        # Sequentially this would take 8 sandboxes * 4 stages * DELAY.
+        self.assertLess(report.wall_seconds, 8 * 4 * DELAY / 2)
+        results = report.sandboxes["SBX-3"].results()
+        self.assertEqual(list(results), ["snapshot", "diff", "generate", "publish"])
+        self.assertEqual(results["diff"].diff.to_snapshot, "final-SBX-3")
+        published = [
+            r for sid, stage, r in PublishHandler.requests if stage == "publish"
+        ]
+        self.assertEqual(published[0]["job_id"], "JOB-1")
+        self.assertEqual(report.stages["publish"].runs, 8)
+        self.assertGreaterEqual(report.stages["diff"].max_seconds, DELAY)
+
+    def test_concurrency_limits(self):
+        ids = ["SBX-%d" % i for i in range(6)]
+        stages = publish_stages(
+            "JOB-1",
+            "initial",
+            "final",
+            tool=None,
+            concurrency={"snapshot": 2, "diff": 1},
+        )
+        self.assertEqual([s.name for s in stages], ["snapshot", "diff", "publish"])
+        report = SandboxPipeline(stages, self.api).run(ids)
+
+        self.assertEqual(len(report.succeeded), 6)
+        self.assertEqual(PublishHandler.peak["snapshot"], 2)
+        self.assertEqual(PublishHandler.peak["diff"], 1)
+        self.assertGreater(report.stages["diff"].total_wait, 0)
+
+    def test_failure_stops_only_that_sandbox(self):
+        report = SandboxPipeline(
+            publish_stages("JOB-1", "initial", "final"), self.api
+        ).run(["SBX-1", "bad-1", "SBX-2"])
+
+        self.assertEqual(report.succeeded, ["SBX-1", "SBX-2"])
+        self.assertEqual(list(report.failed), ["bad-1"])
+        failed = report.failed["bad-1"]
+        self.assertEqual(failed.failed_stage, "diff")
+        self.assertIsInstance(failed.error, NotFoundException)
+        self.assertEqual(list(failed.results()), ["snapshot"])
+        self.assertEqual(report.stages["diff"].failures, 1)
+        stages = [stage for sid, stage, _ in PublishHandler.requests if sid == "bad-1"]
+        self.assertEqual(stages, ["snapshot", "diff"])
+
+    def test_custom_stages(self):
+        def double(api, sandbox_id, results):
+            return results["length"] * 2
+
+        def explode(api, sandbox_id, results):
+            raise ApiException(status=500, reason="boom")
+
+        stages = [
+            Stage("length", lambda api, sid, results: len(sid)),
+            Stage("double", double, concurrency=1),
+        ]
+        report = SandboxPipeline(stages, api=object()).run(["a", "bbb"])
+        self.assertEqual(report.sandboxes["bbb"].results()["double"], 6)
+
+        report = SandboxPipeline([Stage("explode", explode)], object()).run(["a"])
+        self.assertEqual(report.failed["a"].error.status, 500)
+        self.assertEqual(SandboxPipeline(stages, object()).run([]).succeeded, [])
+
+        with self.assertRaises(ValueError):
+            SandboxPipeline([stages[0], stages[0]])
+        with self.assertRaises(ValueError):
+            SandboxPipeline([Stage("x", double, concurrency=0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+# coding: utf-8
+
+import json
+import tracemalloc
+import unittest
+from test.server import QuietHandler, ServerTestCase
+
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.exceptions import ApiException, ServiceException
+
+STDOUT = "x" * (4 * 1024 * 1024)
+BODY = json.dumps(
+    {"commands": [{"id": "CMD-1", "command": "cat", "stdout": STDOUT}], "total": 1}
+).encode()
+
+
+class CommandsHandler(QuietHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if "/SBX-FAIL/" in self.path:
+            status, body = 500, json.dumps({"error": "e" * 100000}).encode()
+        else:
+            status, body = 200, BODY
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestResponseRetention(ServerTestCase):
+    """retain_response_body and exception_body_limit"""
+
+    handler = CommandsHandler
+
+    def api(self, retain=True, limit=None):
+        config = self.configuration()
+        config.retain_response_body = retain
+        config.exception_body_limit = limit
+        return SandboxApi(ApiClient(config))
+
+    def test_default_keeps_raw_data(self):
+        resp = self.api().list_sandbox_commands_with_http_info("SBX-1")
+        self.assertEqual(resp.raw_data, BODY)
+        self.assertEqual(resp.data.commands[0].stdout, STDOUT)
+
+    def test_released_body(self):
+        api = self.api(retain=False)
+        resp = api.list_sandbox_commands_with_http_info("SBX-1")
+        self.assertEqual(resp.raw_data, b"")
+        self.assertEqual(resp.data.commands[0].stdout, STDOUT)
+
+        params = api._list_sandbox_commands_serialize(
+            id="SBX-1",
+            limit=None,
+            offset=None,
+            _request_auth=None,
+            _content_type=None,
+            _headers=None,
+            _host_index=0,
+        )
+        response_data = api.api_client.call_api(*params)
+        response_data.read()
+        api.api_client.response_deserialize(
+            response_data, {"200": "FluidRemoteInternalRestListSandboxCommandsResponse"}
+        )
+        self.assertEqual(response_data.data, b"")
+        self.assertFalse(response_data.response.data)
+
+    def test_lower_peak_memory(self):
+        def peak(api):
+            tracemalloc.start()
+            try:
+                resp = api.list_sandbox_commands("SBX-1")
+                return tracemalloc.get_traced_memory()[1], resp
+            finally:
+                tracemalloc.stop()
+
+        retained, _ = peak(self.api())
+        released, _ = peak(self.api(retain=False))
+        self.assertLess(released, retained * 0.8)
+
+    def test_exception_body_limit(self):
+        with self.assertRaises(ServiceException) as ctx:
+            self.api(limit=1000).list_sandbox_commands("SBX-FAIL")
+        self.assertLess(len(ctx.exception.body), 1100)
+        self.assertTrue(ctx.exception.body.endswith("[truncated at 1000 characters]"))
+        with self.assertRaises(ServiceException) as ctx:
+            self.api().list_sandbox_commands("SBX-FAIL")
+        self.assertGreater(len(ctx.exception.body), 100000)
+
+    def test_traceback_drops_full_body(self):
+        # Caught by hand: assertRaises clears the frames.
+        try:
+            self.api(limit=1000).list_sandbox_commands("SBX-FAIL")
+        except ServiceException as e:
+            tb = e.__traceback__
+        else:
+            self.fail("no exception")
+        while tb is not None:
+            for name, value in tb.tb_frame.f_locals.items():
+                for held in (value, getattr(value, "data", None)):
+                    if isinstance(held, (str, bytes)):
+                        self.assertLess(len(held), 100000, name)
+            tb = tb.tb_next
+
+    def test_limit_applies_to_raw_bodies(self):
+        class Resp:
+            status = 502
+            reason = "Bad Gateway"
+            data = "é".encode() * 5000
+            headers = {}
+
+        exc = ApiException(http_resp=Resp(), body_limit=10)
+        self.assertEqual(exc.body, "é" * 10 + "... [truncated at 10 characters]")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+# coding: utf-8
+
+import json
+import threading
+import unittest
+from test.server import QuietHandler, ServerTestCase
+
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.sessionlog import SessionRecorder
+
+
+class AccessHandler(QuietHandler):
+    """Session start, end and batch endpoints recording what they saw."""
+
+    protocol_version = "HTTP/1.1"
+    batch_supported = True
+    lock = threading.Lock()
+    requests = []  # (path, document)
+    ended = []  # (session_id, reason) in the order recorded
+    next_id = 0
+
+    def reply(self, status, doc):
+        body = json.dumps(doc).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @classmethod
+    def start_session(cls, certificate_id):
+        if certificate_id == "CERT-expired":
+            raise ValueError("certificate expired")
+        cls.next_id += 1
+        return "SES-%d" % cls.next_id
+
+    def do_POST(self):
+        doc = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        cls = AccessHandler
+        with cls.lock:
+            cls.requests.append((self.path, doc))
+            if self.path == "/v1/access/sessions/batch":
+                if not cls.batch_supported:
+                    return self.reply(404, {"error": "not found"})
+                refs, results, failed = {}, [], 0
+                for event in doc["events"]:
+                    result = {"ref": event.get("ref")}
+                    try:
+                        if event["type"] == "start":
+                            session_id = cls.start_session(event["certificate_id"])
+                            refs[event.get("ref")] = session_id
+                        else:
+                            session_id = event.get("session_id") or refs[event["ref"]]
+                            cls.ended.append((session_id, event.get("reason")))
+                        result["session_id"] = session_id
+                    except (KeyError, ValueError) as e:
+                        result["error"] = str(e)
+                        failed += 1
+                    results.append(result)
+                return self.reply(200, {"results": results, "failed": failed})
+            if self.path == "/v1/access/session/start":
+                try:
+                    session_id = cls.start_session(doc["certificate_id"])
+                except ValueError as e:
+                    return self.reply(400, {"error": str(e)})
+                return self.reply(200, {"session_id": session_id})
+            cls.ended.append((doc["session_id"], doc.get("reason")))
+            self.reply(200, {"session_id": doc["session_id"]})
+
+
+class TestSessionRecorder(ServerTestCase):
+    """SessionRecorder against a local server"""
+
+    handler = AccessHandler
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        config = cls.configuration()
+        cls.client = ApiClient(config)
+
+    def setUp(self):
+        AccessHandler.batch_supported = True
+        AccessHandler.requests = []
+        AccessHandler.ended = []
+
+    def test_batches_by_size_and_flushes_on_close(self):
+        recorder = SessionRecorder(self.client, max_batch=10, flush_interval=60)
+        handles = [recorder.start("CERT-1", source_ip="192.0.2.1") for _ in range(5)]
+        for handle in handles:
+            recorder.end(handle, reason="done")
+        # Ten events fill a batch; the remaining ones wait for close().
+        self.assertTrue(handles[0]._done.wait(5))
+        recorder.start("CERT-1")
+        recorder.close()
+
+        self.assertEqual(
+            [len(doc["events"]) for _, doc in AccessHandler.requests], [10, 1]
+        )
+        event = AccessHandler.requests[0][1]["events"][0]
+        self.assertEqual(event["source_ip"], "192.0.2.1")
+        self.assertIn("at", event)
+        ids = [handle.wait(0) for handle in handles]
+        self.assertEqual(AccessHandler.ended, [(i, "done") for i in ids])
+        self.assertEqual(
+            recorder.stats(),
+            {"recorded": 11, "failed": 0, "requests": 2, "queued": 0},
+        )
+        with self.assertRaises(RuntimeError):
+            recorder.start("CERT-1")
+
+    def test_flush_interval_and_failures(self):
+        with SessionRecorder(self.client, flush_interval=0.05) as recorder:
+            good = recorder.start("CERT-1")
+            bad = recorder.start("CERT-expired")
+            self.assertTrue(good.wait(5).startswith("SES-"))
+            with self.assertRaises(Exception) as ctx:
+                bad.wait(5)
+            self.assertIn("certificate expired", str(ctx.exception))
+            recorder.end(good)
+            recorder.end("SES-elsewhere", reason="closed")
+            self.assertTrue(recorder.flush(5))
+            self.assertEqual(recorder.stats()["failed"], 1)
+        self.assertEqual(
+            AccessHandler.ended, [(good.session_id, None), ("SES-elsewhere", "closed")]
+        )
+
+    def test_falls_back_to_single_calls_in_session_order(self):
+        AccessHandler.batch_supported = False
+        with SessionRecorder(self.client, flush_interval=60) as recorder:
+            handles = [recorder.start("CERT-1") for _ in range(8)]
+            for handle in handles:
+                recorder.end(handle, reason="bye")
+            bad = recorder.start("CERT-expired")
+            recorder.end(bad)
+            self.assertTrue(recorder.flush(10))
+            paths = [path for path, _ in AccessHandler.requests]
+            self.assertEqual(paths.count("/v1/access/sessions/batch"), 1)
+
+            # Later flushes go straight to the single-event endpoints.
+            recorder.end("SES-elsewhere")
+            self.assertTrue(recorder.flush(10))
+            paths = [path for path, _ in AccessHandler.requests]
+            self.assertEqual(paths.count("/v1/access/sessions/batch"), 1)
+
+        ids = {handle.wait(0) for handle in handles}
+        self.assertEqual(len(ids), 8)
+        self.assertEqual(
+            sorted(AccessHandler.ended),
+            sorted([(i, "bye") for i in ids] + [("SES-elsewhere", None)]),
+        )
+        self.assertIsNotNone(bad.error)
+        self.assertEqual(recorder.stats()["failed"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,310 @@
+# coding: utf-8
+
+import itertools
+import json
+import re
+import socket
+import time
+import unittest
+from test.server import QuietHandler, serve, stop, url
+from urllib.parse import parse_qs
+
+import urllib3
+from dateutil.parser import isoparse
+
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.exceptions import NotFoundException, ServiceException
+from virsh_sandbox.models.fluid_remote_internal_rest_create_sandbox_request import (
+    FluidRemoteInternalRestCreateSandboxRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_run_command_request import (
+    FluidRemoteInternalRestRunCommandRequest,
+)
+from virsh_sandbox.sharding import OutlierPolicy, Shard, ShardedSandboxClient
+
+_ids = itertools.count(1)
+
+
+def make_handler(name, sandboxes, healthy=True, probe_delay=None):
+    class Handler(QuietHandler):
+        protocol_version = "HTTP/1.1"
+
+        def reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            if path == "/v1/health":
+                if probe_delay is not None and probe_delay.get("seconds"):
+                    time.sleep(probe_delay["seconds"])
+                self.reply(200, {"status": "ok" if healthy else "degraded"})
+            elif path == "/v1/sandboxes":
+                # Newest first and paged, like fluid-remote.
+                params = parse_qs(query)
+                offset = int(params.get("offset", ["0"])[0])
+                limit = int(params.get("limit", [len(sandboxes)])[0])
+                listed = sorted(
+                    sandboxes.values(),
+                    key=lambda sb: isoparse(sb["created_at"]),
+                    reverse=True,
+                )[offset : offset + limit]
+                self.reply(200, {"sandboxes": listed, "total": len(listed)})
+            elif path.startswith("/v1/sandboxes/"):
+                sb = sandboxes.get(path.rsplit("/", 1)[1])
+                if sb is None:
+                    self.reply(404, {"error": "not found"})
+                else:
+                    self.reply(200, {"sandbox": sb})
+            else:
+                self.reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            body = self.body()
+            if self.path == "/v1/sandboxes":
+                n = next(_ids)
+                sb = {
+                    "id": "SBX-%04d" % n,
+                    "state": "RUNNING",
+                    "created_at": "2026-01-01T00:00:%02dZ" % n,
+                }
+                sandboxes[sb["id"]] = sb
+                self.reply(201, {"sandbox": sb})
+                return
+            match = re.match(r"/v1/sandboxes/([^/]+)/run$", self.path)
+            if match and match.group(1) in sandboxes:
+                command = body["command"]
+                self.reply(200, {"command": {"stdout": name + ":" + command}})
+            else:
+                self.reply(404, {"error": "not found"})
+
+        def do_DELETE(self):
+            sb = sandboxes.pop(self.path.rsplit("/", 1)[1], None)
+            self.reply(200 if sb else 404, {"state": "DESTROYED"})
+
+    return Handler
+
+
+class TestShardedSandboxClient(unittest.TestCase):
+    """Placement, routing and fan-out over several local hosts"""
+
+    def setUp(self):
+        self.servers = []
+        self.sandboxes = []
+        for name, preloaded, healthy in (
+            ("a", 2, True),
+            ("b", 0, True),
+            ("c", 0, False),
+        ):
+            store = {}
+            for _ in range(preloaded):
+                n = next(_ids)
+                store["SBX-%04d" % n] = {
+                    "id": "SBX-%04d" % n,
+                    "state": "RUNNING",
+                    "created_at": "2026-01-01T00:00:%02dZ" % n,
+                }
+            self.servers.append(serve(make_handler(name, store, healthy)))
+            self.sandboxes.append(store)
+        self.hosts = [url(s) for s in self.servers]
+        self.client = ShardedSandboxClient(self.hosts, load_ttl=60)
+
+    def tearDown(self):
+        self.client.close()
+        for server in self.servers:
+            stop(server)
+
+    def create(self):
+        request = FluidRemoteInternalRestCreateSandboxRequest(source_vm_name="base")
+        return self.client.create_sandbox(request).sandbox.id
+
+    def test_placement_balances_load_and_skips_unhealthy(self):
+        ids = [self.create() for _ in range(4)]
+        self.assertEqual(
+            [self.client.host_for(i) for i in ids],
+            [self.hosts[1], self.hosts[1], self.hosts[0], self.hosts[1]],
+        )
+        self.assertEqual(len(self.sandboxes[2]), 0)
+
+    def test_follow_up_calls_are_routed(self):
+        sandbox_id = self.create()
+        result = self.client.run_sandbox_command(
+            sandbox_id, FluidRemoteInternalRestRunCommandRequest(command="uptime")
+        )
+        self.assertEqual(result.command.stdout, "b:uptime")
+        self.client.destroy_sandbox(sandbox_id)
+        self.assertNotIn(sandbox_id, self.sandboxes[1])
+        with self.assertRaises(NotFoundException):
+            self.client.host_for(sandbox_id)
+
+    def test_unknown_ids_are_located(self):
+        sandbox_id = next(iter(self.sandboxes[0]))
+        resp = self.client.get_sandbox_with_http_info(sandbox_id)
+        self.assertEqual(resp.data.sandbox.id, sandbox_id)
+        self.assertEqual(self.client.host_for(sandbox_id), self.hosts[0])
+
+    def test_list_merges_all_hosts(self):
+        created = self.create()
+        listing = self.client.list_sandboxes()
+        ids = [sb.id for sb in listing.sandboxes]
+        self.assertEqual(listing.total, 3)
+        self.assertEqual(ids, sorted(list(self.sandboxes[0]) + [created], reverse=True))
+        pages = [self.client.list_sandboxes(limit=2, offset=o) for o in (0, 2)]
+        self.assertEqual([sb.id for p in pages for sb in p.sandboxes], ids)
+        self.assertEqual([p.total for p in pages], [2, 1])
+
+    def test_list_orders_by_time_not_text(self):
+        # Go trims trailing zeros from fractional seconds.
+        for store, stamp in (
+            (self.sandboxes[0], "2026-01-02T09:00:00.5Z"),
+            (self.sandboxes[1], "2026-01-02T09:00:00Z"),
+            (self.sandboxes[1], "2026-01-02T10:00:00.25+01:00"),
+        ):
+            sandbox_id = "SBX-%04d" % next(_ids)
+            store[sandbox_id] = {"id": sandbox_id, "created_at": stamp}
+        listing = self.client.list_sandboxes(limit=3)
+        self.assertEqual(
+            [sb.created_at for sb in listing.sandboxes],
+            [
+                "2026-01-02T09:00:00.5Z",
+                "2026-01-02T10:00:00.25+01:00",
+                "2026-01-02T09:00:00Z",
+            ],
+        )
+
+    def test_no_healthy_host(self):
+        request = FluidRemoteInternalRestCreateSandboxRequest(source_vm_name="base")
+        with ShardedSandboxClient(self.hosts[2:]) as client:
+            with self.assertRaises(ServiceException):
+                client.create_sandbox(request)
+
+    def test_unknown_attribute(self):
+        with self.assertRaises(AttributeError):
+            self.client.list_virtual_machines
+
+
+class TestOutlierEjection(unittest.TestCase):
+    """Per-host error tracking, ejection and failover"""
+
+    def shard(self, **policy):
+        return Shard(
+            Configuration(host="http://127.0.0.1:1"), policy=OutlierPolicy(**policy)
+        )
+
+    def test_consecutive_failures_eject_with_backoff(self):
+        shard = self.shard(consecutive_failures=2, base_ejection=60)
+        shard.record(False, 0.1)
+        self.assertTrue(shard.available)
+        shard.record(False, 0.1)
+        self.assertFalse(shard.available)
+        self.assertAlmostEqual(shard.ejected_until - time.monotonic(), 60, delta=1)
+        shard.ejected_until = time.monotonic()
+        shard.record(False, 0.1)
+        shard.record(False, 0.1)
+        self.assertAlmostEqual(shard.ejected_until - time.monotonic(), 120, delta=1)
+
+    def test_error_rate_and_latency_eject(self):
+        shard = self.shard(consecutive_failures=100, min_requests=4, error_rate=0.5)
+        for ok in (True, False, True, True):
+            shard.record(ok, 0.01)
+        self.assertTrue(shard.available)
+        self.assertEqual(shard.error_rate, 0.25)
+        shard.record(False, 0.01)
+        shard.record(False, 0.01)
+        self.assertFalse(shard.available)
+
+        slow = self.shard(max_latency=0.5)
+        slow.record(True, 0.1)
+        self.assertTrue(slow.available)
+        for _ in range(5):
+            slow.record(True, 2.0)
+        self.assertTrue(slow.ejected)
+
+    def test_client_errors_do_not_count(self):
+        shard = self.shard(consecutive_failures=1)
+
+        def fail(status):
+            raise NotFoundException(status=status)
+
+        with self.assertRaises(NotFoundException):
+            shard.call(fail, 404)
+        self.assertTrue(shard.available)
+        with self.assertRaises(NotFoundException):
+            shard.call(fail, 503)
+        self.assertFalse(shard.available)
+
+    def serve(self, handler):
+        server = serve(handler)
+        self.addCleanup(stop, server)
+        return url(server)
+
+    def test_create_fails_over_from_unreachable_host(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            dead = "http://127.0.0.1:%d" % sock.getsockname()[1]
+        store = {}
+        live = self.serve(make_handler("live", store))
+        with ShardedSandboxClient([dead, live], load_ttl=60) as client:
+            # Pretend the last probe saw the dead host healthy and idle.
+            client.shards[0].refreshed_at = time.monotonic()
+            client.shards[1].refresh()
+            client.shards[1].live = 5
+            request = FluidRemoteInternalRestCreateSandboxRequest(source_vm_name="b")
+            start = time.monotonic()
+            sandbox_id = client.create_sandbox(request).sandbox.id
+            self.assertLess(time.monotonic() - start, 5)
+        self.assertIn(sandbox_id, store)
+        self.assertFalse(client.shards[0].healthy)
+
+    def test_stalled_call_times_out_and_fails_over(self):
+        # Accepts connections (through the backlog) and never replies.
+        sock = socket.socket()
+        self.addCleanup(sock.close)
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(8)
+        stalled = "http://127.0.0.1:%d" % sock.getsockname()[1]
+        store = {}
+        live = self.serve(make_handler("live", store))
+        with ShardedSandboxClient(
+            [stalled, live], load_ttl=60, read_timeout=0.2
+        ) as client:
+            client.shards[0].refreshed_at = time.monotonic()
+            client.shards[1].refresh()
+            client.shards[1].live = 5
+            request = FluidRemoteInternalRestCreateSandboxRequest(source_vm_name="b")
+            start = time.monotonic()
+            with self.assertRaises(urllib3.exceptions.ReadTimeoutError):
+                client.create_sandbox(request)
+            self.assertLess(time.monotonic() - start, 5)
+            self.assertFalse(client.shards[0].available)
+            self.assertEqual(client.shards[0].consecutive_failures, 1)
+            sandbox_id = client.create_sandbox(request).sandbox.id
+        self.assertIn(sandbox_id, store)
+
+    def test_background_probe_detects_stalled_host(self):
+        delay = {"seconds": 0}
+        stalled = self.serve(make_handler("s", {}, probe_delay=delay))
+        other = self.serve(make_handler("o", {}))
+        with ShardedSandboxClient(
+            [stalled, other], probe_interval=0.05, probe_timeout=0.2
+        ) as client:
+            client.refresh()
+            self.assertEqual(len(client.available_shards()), 2)
+            delay["seconds"] = 1
+            deadline = time.monotonic() + 5
+            while client.shards[0].available and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(client.available_shards(), [client.shards[1]])
+            delay["seconds"] = 0
+
+
+if __name__ == "__main__":
+    unittest.main()
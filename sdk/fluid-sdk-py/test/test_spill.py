@@ -0,0 +1,122 @@
+# coding: utf-8
+
+import io
+import json
+import unittest
+from test.server import QuietHandler, ServerTestCase
+
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.spill import SpilledText, is_spilled, load_json, spool
+
+STDOUT = 'line é€\U0001f600 "quoted" \\ tab\t\n' * 2000
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+        self.released = False
+
+    def stream(self, amt):
+        for pos in range(0, len(self.body), amt):
+            yield self.body[pos : pos + amt]
+
+    def release_conn(self):
+        self.released = True
+
+
+class CommandsHandler(QuietHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = json.dumps(
+            {
+                "commands": [
+                    {"id": "CMD-1", "command": "cat big.log", "stdout": STDOUT},
+                    {"id": "CMD-2", "command": "true", "stdout": "", "exit_code": 0},
+                ],
+                "total": 2,
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestSpill(unittest.TestCase):
+    """Spooling and lazy parsing of oversized responses"""
+
+    def test_spool_keeps_small_bodies_in_memory(self):
+        response = FakeResponse(b'{"a": 1}')
+        self.assertEqual(spool(response, 1024), b'{"a": 1}')
+        self.assertTrue(response.released)
+
+    def test_spool_maps_large_bodies(self):
+        body = json.dumps({"stdout": STDOUT}).encode()
+        data = spool(FakeResponse(body), 1024, chunk_size=4096)
+        self.assertTrue(is_spilled(data))
+        self.assertEqual(bytes(data), body)
+
+    def test_load_json_matches_json_module(self):
+        doc = {
+            "s": "x",
+            "n": [-1, 2.5, 3e2, 0],
+            "b": [True, False, None],
+            "nested": {"empty": {}, "list": [], "u": "é😀"},
+        }
+        data, handles = load_json(json.dumps(doc, indent=2).encode(), 1024)
+        self.assertEqual(data, doc)
+        self.assertEqual(handles, [])
+
+    def test_large_strings_become_handles(self):
+        body = json.dumps({"a": [{"stdout": STDOUT}], "small": "ok"}).encode()
+        data, handles = load_json(body, 1024)
+        self.assertEqual(data, {"a": [{"stdout": ""}], "small": "ok"})
+        [(path, handle)] = handles
+        self.assertEqual(path, ("a", 0, "stdout"))
+        self.assertIsInstance(handle, SpilledText)
+        self.assertEqual(handle.read(), STDOUT)
+        # Chunk boundaries that split escapes, surrogate pairs and UTF-8.
+        for size in (7, 13, 64, 1001):
+            self.assertEqual("".join(handle.iter_chunks(size)), STDOUT)
+        out = io.StringIO()
+        self.assertEqual(handle.copy_to(out), len(STDOUT))
+        self.assertEqual(out.getvalue(), STDOUT)
+
+    def test_invalid_json_raises(self):
+        for body in (b'{"a": }', b'{"a": 1', b"[1 2]", b'{"a": "x'):
+            with self.assertRaises(ValueError):
+                load_json(body, 1024)
+
+
+class TestSpilledResponses(ServerTestCase):
+    """API calls with spill_threshold set"""
+
+    handler = CommandsHandler
+
+    def api(self, spill_threshold):
+        config = self.configuration()
+        config.spill_threshold = spill_threshold
+        config.spill_string_threshold = 4096
+        return SandboxApi(ApiClient(config))
+
+    def test_large_fields_are_lazy(self):
+        resp = self.api(8192).list_sandbox_commands_with_http_info("SBX-1")
+        commands = resp.data.commands
+        self.assertIsInstance(commands[0].stdout, SpilledText)
+        self.assertEqual(str(commands[0].stdout), STDOUT)
+        self.assertEqual(commands[0].command, "cat big.log")
+        self.assertEqual(commands[1].stdout, "")
+        self.assertEqual(resp.data.total, 2)
+        self.assertEqual(resp.raw_data, b"")
+
+    def test_below_threshold_is_unchanged(self):
+        resp = self.api(None).list_sandbox_commands_with_http_info("SBX-1")
+        self.assertEqual(resp.data.commands[0].stdout, STDOUT)
+        self.assertTrue(resp.raw_data)
+
+
+if __name__ == "__main__":
+    unittest.main()
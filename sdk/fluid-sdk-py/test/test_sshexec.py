@@ -0,0 +1,238 @@
+# coding: utf-8
+
+import base64
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from test.server import QuietHandler, ServerTestCase
+
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.sshexec import DirectExecutor
+
+# Stands in for the OpenSSH client: "-N -f" creates the control socket as
+# a plain file, "-O" checks or removes it, and commands run locally with
+# sh once it exists. Every call is logged next to the control socket.
+FAKE_SSH = r"""#!%s
+import os, subprocess, sys
+
+args, options, i = sys.argv[1:], {}, 0
+op = master = None
+while i < len(args):
+    a = args[i]
+    if a == "-o":
+        key, value = args[i + 1].split("=", 1)
+        options[key] = value
+        i += 2
+    elif a in ("-p", "-i"):
+        i += 2
+    elif a == "-O":
+        op = args[i + 1]
+        i += 2
+    elif a == "-N":
+        master = True
+        i += 1
+    elif a == "-f":
+        i += 1
+    else:
+        break
+destination, command = args[i], " ".join(args[i + 2:])
+path = options["ControlPath"]
+with open(os.path.join(os.path.dirname(path), "ssh.log"), "a") as log:
+    log.write("%%s %%s\n" %% (op or ("master" if master else "exec"), destination))
+if master:
+    if destination.endswith("@unreachable"):
+        sys.stderr.write("ssh: connect to host unreachable: No route to host\n")
+        sys.exit(255)
+    assert os.path.exists(options["CertificateFile"])
+    open(path, "w").close()
+    sys.exit(0)
+if op == "check":
+    sys.exit(0 if os.path.exists(path) else 255)
+if op == "exit":
+    if os.path.exists(path):
+        os.unlink(path)
+    sys.exit(0)
+if not os.path.exists(path):
+    sys.stderr.write("Control socket connect(%%s): No such file or directory\n" %% path)
+    sys.exit(255)
+sys.exit(subprocess.run(["sh", "-c", command]).returncode)
+""" % sys.executable
+
+
+def make_cert():
+    def string(data):
+        return struct.pack("!I", len(data)) + data
+
+    now = int(time.time())
+    blob = b"".join(
+        [
+            string(b"ssh-ed25519-cert-v01@openssh.com"),
+            string(b"nonce"),
+            string(b"\x01" * 32),
+            struct.pack("!QI", 1, 1),
+            string(b"alice"),
+            string(string(b"sandbox")),
+            struct.pack("!QQ", now - 60, now + 600),
+        ]
+    )
+    return "ssh-ed25519-cert-v01@openssh.com " + base64.b64encode(blob).decode()
+
+
+class AccessHandler(QuietHandler):
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    calls = []
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.lock:
+            self.calls.append((self.path, request))
+            count = len(self.calls)
+        if self.path == "/v1/access/request":
+            host = "unreachable" if request["sandbox_id"] == "down" else "10.0.0.5"
+            doc = {
+                "certificate": make_cert(),
+                "certificate_id": "CERT-%s" % request["sandbox_id"],
+                "username": "sandbox",
+                "vm_ip_address": host,
+                "ssh_port": 22,
+            }
+        elif self.path == "/v1/access/session/start":
+            doc = {"session_id": "SES-%d" % count}
+        else:
+            doc = {"message": "session ended successfully"}
+        body = json.dumps(doc).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestDirectExecutor(ServerTestCase):
+    """DirectExecutor with a stand-in ssh client"""
+
+    handler = AccessHandler
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.client = ApiClient(cls.configuration())
+
+    def setUp(self):
+        AccessHandler.calls.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.ssh = os.path.join(self.dir, "ssh")
+        with open(self.ssh, "w") as f:
+            f.write(FAKE_SSH)
+        os.chmod(self.ssh, 0o755)
+        self.key = os.path.join(self.dir, "id_ed25519")
+        with open(self.key + ".pub", "w") as f:
+            f.write("ssh-ed25519 AAAAKEY alice\n")
+        self.control = os.path.join(self.dir, "control")
+
+    def executor(self):
+        executor = DirectExecutor(
+            self.key,
+            "alice",
+            self.client,
+            control_dir=self.control,
+            ssh_binary=self.ssh,
+        )
+        self.addCleanup(executor.close)
+        return executor
+
+    def ssh_log(self):
+        with open(os.path.join(self.control, "ssh.log")) as f:
+            return [line.split()[0] for line in f]
+
+    def paths(self):
+        return [path for path, _ in AccessHandler.calls]
+
+    def test_commands_share_one_connection(self):
+        executor = self.executor()
+        first = executor.run("SBX-1", "echo hello; echo oops >&2")
+        failed = executor.run("SBX-1", "exit 3")
+        piped = executor.run("SBX-1", "tr a-z A-Z", input=b"abc")
+
+        self.assertEqual(first.stdout, b"hello\n")
+        self.assertEqual(first.stderr, b"oops\n")
+        self.assertEqual(failed.exit_code, 3)
+        self.assertEqual(piped.stdout, b"ABC")
+        self.assertEqual(first.session_id, piped.session_id)
+        self.assertEqual(self.ssh_log(), ["master", "exec", "exec", "exec"])
+        self.assertEqual(
+            self.paths(), ["/v1/access/request", "/v1/access/session/start"]
+        )
+        self.assertEqual(AccessHandler.calls[1][1]["certificate_id"], "CERT-SBX-1")
+        self.assertEqual(len(executor.history), 3)
+
+    def test_close_ends_sessions_with_summary(self):
+        executor = self.executor()
+        executor.run_many("SBX-1", ["true", "false", "true"])
+        executor.run("SBX-2", "true")
+        executor.close()
+
+        ends = [r for p, r in AccessHandler.calls if p == "/v1/access/session/end"]
+        self.assertEqual(len(ends), 2)
+        self.assertEqual(
+            ends[0]["reason"],
+            "closed by client; 3 commands, 1 failed\n[0] true\n[1] false\n[0] true",
+        )
+        self.assertEqual(self.ssh_log().count("exit"), 2)
+        with self.assertRaises(RuntimeError):
+            executor.run("SBX-1", "true")
+
+    def test_session_log_is_bounded(self):
+        executor = self.executor()
+        executor.session_log_limit = 30
+        executor.run_many("SBX-1", ["echo 'a\nb'", "echo 1", "echo 2", "echo 3"])
+        executor.close()
+
+        ends = [r for p, r in AccessHandler.calls if p == "/v1/access/session/end"]
+        self.assertEqual(
+            ends[0]["reason"].split("\n"),
+            [
+                "closed by client; 4 commands, 0 failed",
+                "[0] echo 'a\\nb'",
+                "[0] echo 1",
+                "... 2 more",
+            ],
+        )
+
+    def test_lost_connection_reconnects(self):
+        executor = self.executor()
+        executor.run("SBX-1", "true")
+        for name in os.listdir(self.control):
+            if len(name) == 16:
+                os.unlink(os.path.join(self.control, name))  # master died
+
+        with self.assertRaises(ConnectionError):
+            executor.run("SBX-1", "true")
+        result = executor.run("SBX-1", "echo back")
+        self.assertEqual(result.stdout, b"back\n")
+        self.assertEqual(self.ssh_log().count("master"), 2)
+        ends = [r for p, r in AccessHandler.calls if p == "/v1/access/session/end"]
+        self.assertEqual(
+            ends[0]["reason"], "connection lost; 1 commands, 0 failed\n[0] true"
+        )
+        # The certificate came from the cache.
+        self.assertEqual(self.paths().count("/v1/access/request"), 1)
+
+    def test_connect_failure(self):
+        executor = self.executor()
+        with self.assertRaises(ConnectionError) as ctx:
+            executor.run("down", "true")
+        self.assertIn("No route to host", str(ctx.exception))
+        self.assertNotIn("/v1/access/session/start", self.paths())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,240 @@
+# coding: utf-8
+
+import random
+import time
+import unittest
+
+from virsh_sandbox.api.access_api import AccessApi
+from virsh_sandbox.api.ansible_api import AnsibleApi
+from virsh_sandbox.api.ansible_playbooks_api import AnsiblePlaybooksApi
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api.vms_api import VMsApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.certcache import parse_ssh_certificate
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.diffcache import get_cached_diff
+from virsh_sandbox.exceptions import NotFoundException, ServiceException
+from virsh_sandbox.models.fluid_remote_internal_ansible_job_request import (
+    FluidRemoteInternalAnsibleJobRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_create_sandbox_request import (
+    FluidRemoteInternalRestCreateSandboxRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_diff_request import (
+    FluidRemoteInternalRestDiffRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_run_command_request import (
+    FluidRemoteInternalRestRunCommandRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_snapshot_request import (
+    FluidRemoteInternalRestSnapshotRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_start_sandbox_request import (
+    FluidRemoteInternalRestStartSandboxRequest,
+)
+from virsh_sandbox.models.internal_ansible_add_task_request import (
+    InternalAnsibleAddTaskRequest,
+)
+from virsh_sandbox.models.internal_ansible_create_playbook_request import (
+    InternalAnsibleCreatePlaybookRequest,
+)
+from virsh_sandbox.models.internal_ansible_reorder_tasks_request import (
+    InternalAnsibleReorderTasksRequest,
+)
+from virsh_sandbox.models.internal_ansible_update_task_request import (
+    InternalAnsibleUpdateTaskRequest,
+)
+from virsh_sandbox.models.internal_rest_request_access_request import (
+    InternalRestRequestAccessRequest,
+)
+from virsh_sandbox.sessionlog import SessionRecorder
+from virsh_sandbox.standin import Latency, StandinServer, StandinState
+
+
+class TestLatency(unittest.TestCase):
+    """Latency distributions and their command-line form"""
+
+    def test_parse_and_sample(self):
+        self.assertEqual(Latency.parse("0.25"), Latency("fixed", 0.25))
+        self.assertEqual(Latency.parse("uniform:1,2"), Latency("uniform", 1, 2))
+        with self.assertRaises(ValueError):
+            Latency.parse("poisson:1")
+        rng = random.Random(1)
+        samples = [Latency("lognormal", 2.0, 0.5).sample(rng) for _ in range(2000)]
+        samples.sort()
+        self.assertAlmostEqual(samples[1000], 2.0, delta=0.15)
+        self.assertTrue(
+            all(1 <= Latency("uniform", 1, 2).sample(rng) <= 2 for _ in range(50))
+        )
+        self.assertGreaterEqual(Latency("normal", 0.0, 1.0).sample(rng), 0.0)
+
+    def test_unknown_operation(self):
+        with self.assertRaises(ValueError):
+            StandinState(latency={"clone": Latency()})
+
+
+class TestStandinServer(unittest.TestCase):
+    """The generated SDK against the stand-in"""
+
+    def setUp(self):
+        self.state = StandinState(seed=7)
+        self.server = StandinServer(self.state).start()
+        self.client = ApiClient(Configuration(host=self.server.url))
+        self.sandboxes = SandboxApi(self.client)
+
+    def tearDown(self):
+        self.server.close()
+
+    def create(self, **kwargs):
+        request = FluidRemoteInternalRestCreateSandboxRequest(
+            source_vm_name="ubuntu-base", agent_id="agent", **kwargs
+        )
+        return self.sandboxes.create_sandbox(request)
+
+    def test_sandbox_lifecycle(self):
+        vms = VMsApi(self.client).list_virtual_machines()
+        self.assertEqual([vm.name for vm in vms.vms], ["ubuntu-base"])
+
+        created = self.create()
+        sandbox_id = created.sandbox.id
+        self.assertEqual(created.sandbox.state, "CREATED")
+        with self.assertRaises(ServiceException):
+            self.sandboxes.run_sandbox_command(
+                sandbox_id, FluidRemoteInternalRestRunCommandRequest(command="true")
+            )
+        started = self.sandboxes.start_sandbox(
+            sandbox_id, FluidRemoteInternalRestStartSandboxRequest(wait_for_ip=True)
+        )
+        self.assertTrue(started.ip_address.startswith("10."))
+        self.assertEqual(
+            self.sandboxes.discover_sandbox_ip(sandbox_id).ip_address,
+            started.ip_address,
+        )
+
+        snapshot = FluidRemoteInternalRestSnapshotRequest
+        self.sandboxes.create_snapshot(sandbox_id, snapshot(name="before"))
+        for command in ("apt-get update", "apt-get install -y nginx"):
+            result = self.sandboxes.run_sandbox_command(
+                sandbox_id, FluidRemoteInternalRestRunCommandRequest(command=command)
+            )
+            self.assertEqual(result.command.exit_code, 0)
+        self.sandboxes.create_snapshot(sandbox_id, snapshot(name="after"))
+        commands = self.sandboxes.list_sandbox_commands(sandbox_id, limit=1)
+        self.assertEqual(commands.commands[0].command, "apt-get install -y nginx")
+
+        self.assertIsNone(
+            get_cached_diff(self.sandboxes, sandbox_id, "before", "after")
+        )
+        diff = self.sandboxes.diff_snapshots(
+            sandbox_id,
+            FluidRemoteInternalRestDiffRequest(
+                from_snapshot="before", to_snapshot="after"
+            ),
+        ).diff
+        self.assertEqual(len(diff.diff_json.commands_run), 2)
+        cached = get_cached_diff(self.sandboxes, sandbox_id, "before", "after")
+        self.assertEqual(cached.diff.id, diff.id)
+
+        listed = self.sandboxes.list_sandboxes(state="RUNNING")
+        self.assertEqual([s.id for s in listed.sandboxes], [sandbox_id])
+        destroyed = self.sandboxes.destroy_sandbox(sandbox_id)
+        self.assertEqual(destroyed.state, "DESTROYED")
+        with self.assertRaises(NotFoundException):
+            self.sandboxes.get_sandbox("SBX-none")
+        # Destroyed sandboxes are soft-deleted: hidden from reads and lists,
+        # but their command history can still be listed.
+        with self.assertRaises(NotFoundException):
+            self.sandboxes.get_sandbox(sandbox_id)
+        self.assertEqual(self.sandboxes.list_sandboxes().sandboxes, [])
+        with self.assertRaises(NotFoundException):
+            self.sandboxes.destroy_sandbox(sandbox_id)
+        commands = self.sandboxes.list_sandbox_commands(sandbox_id)
+        self.assertEqual(len(commands.commands), 2)
+
+    def test_ansible(self):
+        self.state.latency["ansible"] = Latency("fixed", 0.05)
+        ansible = AnsibleApi(self.client)
+        job = ansible.create_ansible_job(
+            FluidRemoteInternalAnsibleJobRequest(vm_name="vm", playbook="site.yml")
+        )
+        self.assertEqual(ansible.get_ansible_job(job.job_id).status, "running")
+        time.sleep(0.06)
+        self.assertEqual(ansible.get_ansible_job(job.job_id).status, "finished")
+
+        playbooks = AnsiblePlaybooksApi(self.client)
+        playbooks.create_playbook(InternalAnsibleCreatePlaybookRequest(name="web"))
+        playbooks.add_playbook_task(
+            "web",
+            InternalAnsibleAddTaskRequest(
+                name="nginx", module="apt", params={"name": "nginx"}
+            ),
+        )
+        playbooks.add_playbook_task(
+            "web", InternalAnsibleAddTaskRequest(name="start", module="service")
+        )
+        tasks = playbooks.get_playbook("web").tasks
+        self.assertEqual(len(tasks), 2)
+        self.assertIn("apt:", playbooks.export_playbook("web").yaml)
+
+        updated = playbooks.update_playbook_task(
+            "web", tasks[0].id, InternalAnsibleUpdateTaskRequest(name="install")
+        )
+        self.assertEqual((updated.task.name, updated.task.module), ("install", "apt"))
+        with self.assertRaises(NotFoundException):
+            playbooks.update_playbook_task(
+                "web", "TSK-none", InternalAnsibleUpdateTaskRequest(name="x")
+            )
+        playbooks.reorder_playbook_tasks(
+            "web",
+            InternalAnsibleReorderTasksRequest(task_ids=[tasks[1].id, tasks[0].id]),
+        )
+        reordered = playbooks.get_playbook("web").tasks
+        self.assertEqual([t.name for t in reordered], ["start", "install"])
+        self.assertEqual([t.position for t in reordered], [0, 1])
+
+    def test_access(self):
+        sandbox_id = self.create(auto_start=True, wait_for_ip=True).sandbox.id
+        access = AccessApi(self.client)
+        response = access.request_access(
+            InternalRestRequestAccessRequest(
+                sandbox_id=sandbox_id,
+                user_id="alice",
+                public_key="ssh-ed25519 AAAA alice",
+                ttl_minutes=10,
+            )
+        )
+        certificate = parse_ssh_certificate(response.certificate)
+        self.assertEqual(certificate.principals, ["sandbox"])
+        self.assertEqual(certificate.valid_before - certificate.valid_after, 660)
+
+        with SessionRecorder(self.client, flush_interval=0.01) as recorder:
+            session = recorder.start(response.certificate_id, source_ip="192.0.2.1")
+            recorder.end(session, reason="done")
+        sessions = access.list_sessions(sandbox_id=sandbox_id).sessions
+        self.assertEqual(
+            [(s.id, s.status) for s in sessions], [(session.session_id, "ENDED")]
+        )
+
+    def test_latency_and_failure_injection(self):
+        self.state.latency["create"] = Latency("fixed", 0.05)
+        self.state.failures["run"] = 1.0
+        self.state.command_failure_rate = 1.0
+        begin = time.perf_counter()
+        sandbox_id = self.create(auto_start=True).sandbox.id
+        self.assertGreaterEqual(time.perf_counter() - begin, 0.05)
+        with self.assertRaises(ServiceException) as ctx:
+            self.sandboxes.run_sandbox_command(
+                sandbox_id, FluidRemoteInternalRestRunCommandRequest(command="true")
+            )
+        self.assertIn("injected failure", ctx.exception.body)
+
+        self.state.failures["run"] = 0.0
+        result = self.sandboxes.run_sandbox_command(
+            sandbox_id, FluidRemoteInternalRestRunCommandRequest(command="true")
+        )
+        self.assertEqual(result.command.exit_code, 1)
+        self.assertEqual(self.state.requests["run_command"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
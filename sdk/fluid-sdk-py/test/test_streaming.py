@@ -0,0 +1,240 @@
+# coding: utf-8
+
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import struct
+import tempfile
+import unittest
+from test.server import QuietHandler, ServerTestCase
+
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.exceptions import ApiException, NotFoundException
+from virsh_sandbox.models.fluid_remote_internal_ansible_job_status import (
+    FluidRemoteInternalAnsibleJobStatus,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_run_command_request import (
+    FluidRemoteInternalRestRunCommandRequest,
+)
+from virsh_sandbox.streaming import (
+    AnsibleJobOutputStream,
+    AsyncAnsibleJobOutputStream,
+    AsyncCommandOutputStream,
+    CommandOutput,
+    CommandOutputStream,
+)
+from virsh_sandbox.websocket import to_websocket_url
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def server_frame(opcode, payload, fin=True):
+    header = bytes([(0x80 if fin else 0) | opcode])
+    if len(payload) < 126:
+        header += bytes([len(payload)])
+    else:
+        header += bytes([126]) + struct.pack("!H", len(payload))
+    return header + payload
+
+
+def read_client_frame(rfile):
+    head = rfile.read(2)
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", rfile.read(2))[0]
+    mask = rfile.read(4)
+    data = rfile.read(length)
+    return bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+
+
+def event(kind, **data):
+    body = {"type": kind, "timestamp": "2024-01-15T10:30:00Z", "data": data}
+    return server_frame(0x1, json.dumps(body).encode())
+
+
+class JobHandler(QuietHandler):
+    protocol_version = "HTTP/1.1"
+
+    def upgrade(self):
+        key = self.headers["Sec-WebSocket-Key"]
+        accept = base64.b64encode(hashlib.sha1((key + GUID).encode()).digest())
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept.decode())
+        self.end_headers()
+
+    def run_stream(self, sandbox_id):
+        if sandbox_id == "missing":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.upgrade()
+        request = json.loads(read_client_frame(self.rfile))
+        if sandbox_id == "broken":
+            self.wfile.write(event("error", error="discover ip: timeout"))
+        else:
+            self.wfile.write(event("command_start", command_id="CMD-1", command="x"))
+            self.wfile.write(event("command_output", output=request["command"]))
+            self.wfile.write(server_frame(0x9, b"ping"))
+            self.wfile.write(event("command_output", output="warn\n", is_stderr=True))
+            if sandbox_id != "cut":
+                self.wfile.write(
+                    event(
+                        "command_end", command_id="CMD-1", exit_code=2, duration="5ms"
+                    )
+                )
+        self.wfile.write(server_frame(0x8, struct.pack("!H", 1000)))
+        self.wfile.flush()
+        self.close_connection = True
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if parts[1] == "sandboxes":
+            self.run_stream(parts[2])
+            return
+        job_id = parts[3]
+        if job_id == "missing":
+            body = b"Invalid job ID\n"
+            self.send_response(404)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if parts[-1] != "stream":
+            body = json.dumps({"id": job_id, "status": "finished"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.upgrade()
+        self.wfile.write(server_frame(0x1, b"Running: ansible-playbook site.yml\n"))
+        self.wfile.write(server_frame(0x9, b"ping"))
+        self.wfile.write(server_frame(0x1, b"TASK [ok]", fin=False))
+        self.wfile.write(server_frame(0x0, b" changed=1"))
+        self.wfile.write(server_frame(0x1, b"\nJob finished (rc=0)"))
+        self.wfile.write(server_frame(0x8, struct.pack("!H", 1000)))
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class TestAnsibleJobOutputStream(ServerTestCase):
+    """AnsibleJobOutputStream against a local WebSocket server"""
+
+    expected = [
+        "Running: ansible-playbook site.yml",
+        "TASK [ok] changed=1",
+        "",
+        "Job finished (rc=0)",
+    ]
+
+    handler = JobHandler
+
+    def setUp(self):
+        self.client = ApiClient(self.configuration())
+
+    def test_iterates_lines_and_fetches_status(self):
+        stream = AnsibleJobOutputStream("job-1", self.client, timeout=5)
+        self.assertEqual(list(stream), self.expected)
+        self.assertEqual(
+            stream.status, FluidRemoteInternalAnsibleJobStatus.JobStatusFinished
+        )
+        self.assertEqual(stream.lines_read, 4)
+
+    def test_tail_is_bounded(self):
+        stream = AnsibleJobOutputStream("job-1", self.client, tail_lines=2, timeout=5)
+        stream.wait()
+        self.assertEqual(list(stream.tail), self.expected[-2:])
+
+    def test_tee_to_path_and_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "job.log")
+            with AnsibleJobOutputStream("job-1", self.client, tee=path) as stream:
+                for _ in stream:
+                    pass
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read().splitlines(), self.expected)
+        buf = io.StringIO()
+        AnsibleJobOutputStream("job-1", self.client, tee=buf).wait()
+        self.assertEqual(buf.getvalue().splitlines(), self.expected)
+
+    def test_unknown_job_raises(self):
+        with self.assertRaises(NotFoundException):
+            AnsibleJobOutputStream("missing", self.client).open()
+
+    def test_async_stream(self):
+        async def run():
+            lines = []
+            async with AsyncAnsibleJobOutputStream("job-2", self.client) as stream:
+                async for line in stream:
+                    lines.append(line)
+            return lines, stream.status
+
+        lines, status = asyncio.run(run())
+        self.assertEqual(lines, self.expected)
+        self.assertEqual(status, FluidRemoteInternalAnsibleJobStatus.JobStatusFinished)
+
+    def test_websocket_url(self):
+        self.assertEqual(to_websocket_url("https://h/v1/x"), "wss://h/v1/x")
+        self.assertEqual(to_websocket_url("http://h:8080/v1"), "ws://h:8080/v1")
+
+
+class TestCommandOutputStream(ServerTestCase):
+    """CommandOutputStream against a local WebSocket server"""
+
+    expected = [CommandOutput("echo hi\n", False), CommandOutput("warn\n", True)]
+
+    handler = JobHandler
+
+    def setUp(self):
+        self.client = ApiClient(self.configuration())
+        self.request = FluidRemoteInternalRestRunCommandRequest(command="echo hi\n")
+
+    def test_iterates_chunks_then_exit_frame(self):
+        with CommandOutputStream("SBX-1", self.request, self.client, timeout=5) as s:
+            self.assertEqual(list(s), self.expected)
+        self.assertEqual(s.command_id, "CMD-1")
+        self.assertEqual(s.exit_code, 2)
+        self.assertEqual(s.result.duration, "5ms")
+        self.assertIsNone(s.result.error)
+
+    def test_tail_is_bounded(self):
+        stream = CommandOutputStream("SBX-1", self.request, self.client, tail_chunks=1)
+        self.assertEqual(stream.wait().exit_code, 2)
+        self.assertEqual(list(stream.tail), self.expected[-1:])
+
+    def test_error_event_raises(self):
+        with self.assertRaises(ApiException) as ctx:
+            CommandOutputStream("broken", self.request, self.client).wait()
+        self.assertIn("discover ip", ctx.exception.reason)
+
+    def test_missing_exit_frame_raises(self):
+        with self.assertRaises(ApiException):
+            CommandOutputStream("cut", self.request, self.client).wait()
+
+    def test_unknown_sandbox_raises(self):
+        with self.assertRaises(NotFoundException):
+            CommandOutputStream("missing", self.request, self.client).open()
+
+    def test_async_stream(self):
+        async def run():
+            chunks = []
+            stream = AsyncCommandOutputStream("SBX-2", self.request, self.client)
+            async with stream:
+                async for chunk in stream:
+                    chunks.append(chunk)
+            return chunks, stream.exit_code
+
+        chunks, exit_code = asyncio.run(run())
+        self.assertEqual(chunks, self.expected)
+        self.assertEqual(exit_code, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
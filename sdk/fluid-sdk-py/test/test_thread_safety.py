@@ -0,0 +1,111 @@
+# coding: utf-8
+
+import json
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from test.server import QuietHandler, ServerTestCase
+
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+
+WORKERS = 64
+CALLS_PER_WORKER = 25
+
+
+class EchoHandler(QuietHandler):
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    peers = set()
+
+    def do_GET(self):
+        with EchoHandler.lock:
+            EchoHandler.peers.add(self.client_address)
+        sandbox_id = self.path.split("?")[0].rsplit("/", 1)[1]
+        body = json.dumps(
+            {
+                "sandbox": {
+                    "id": sandbox_id,
+                    "agent_id": self.headers.get("X-Worker"),
+                    "job_id": self.path.partition("?")[2],
+                }
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class EchoServer(ThreadingHTTPServer):
+    # Set before listen() so that a burst of WORKERS connects is not refused.
+    request_queue_size = WORKERS * 2
+
+
+class TestThreadSafety(ServerTestCase):
+    """One ApiClient shared by a large thread pool"""
+
+    handler = EchoHandler
+    server_class = EchoServer
+
+    def setUp(self):
+        EchoHandler.peers = set()
+        config = self.configuration()
+        config.connection_pool_maxsize = WORKERS
+        self.client = ApiClient(config)
+
+    def test_param_serialize_copies_caller_state(self):
+        headers = {"X-Worker": "1"}
+        queries = [("include_commands", True)]
+        _, url, sent, _, _ = self.client.param_serialize(
+            "GET", "/v1/sandboxes/{id}", {"id": "SBX-1"}, queries, headers
+        )
+        self.assertEqual(headers, {"X-Worker": "1"})
+        self.assertEqual(queries, [("include_commands", True)])
+        self.assertIn("User-Agent", sent)
+        self.assertTrue(url.endswith("/v1/sandboxes/SBX-1?include_commands=true"))
+
+    def test_concurrent_calls_do_not_cross(self):
+        api = SandboxApi(self.client)
+
+        def work(worker):
+            headers = {"X-Worker": str(worker)}
+            for i in range(CALLS_PER_WORKER):
+                sandbox_id = "SBX-%d-%d" % (worker, i)
+                resp = api.get_sandbox(
+                    sandbox_id, include_commands=bool(i % 2), _headers=headers
+                )
+                sb = resp.sandbox
+                assert sb.id == sandbox_id, (sb.id, sandbox_id)
+                assert sb.agent_id == str(worker), (sb.agent_id, worker)
+                expected = "include_commands=%s" % ("true" if i % 2 else "false")
+                assert sb.job_id == expected, (sb.job_id, expected)
+            assert headers == {"X-Worker": str(worker)}
+            return CALLS_PER_WORKER
+
+        with ThreadPoolExecutor(WORKERS) as pool:
+            done = sum(pool.map(work, range(WORKERS)))
+        self.assertEqual(done, WORKERS * CALLS_PER_WORKER)
+        # Connections are reused from the shared pool instead of being opened
+        # per call or discarded because the pool is full.
+        self.assertLessEqual(len(EchoHandler.peers), WORKERS)
+
+    def test_get_default_is_created_once(self):
+        previous = ApiClient._default
+        ApiClient._default = None
+        self.addCleanup(ApiClient.set_default, previous)
+        barrier = threading.Barrier(WORKERS)
+
+        def get(_):
+            barrier.wait()
+            return ApiClient.get_default()
+
+        with ThreadPoolExecutor(WORKERS) as pool:
+            clients = set(map(id, pool.map(get, range(WORKERS))))
+        self.assertEqual(len(clients), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
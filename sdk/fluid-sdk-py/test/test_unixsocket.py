@@ -0,0 +1,130 @@
+# coding: utf-8
+
+import asyncio
+import os
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+from test.test_streaming import JobHandler
+
+import urllib3
+
+from virsh_sandbox.api.health_api import HealthApi
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.loadgen import transport_latency
+from virsh_sandbox.models.fluid_remote_internal_rest_create_sandbox_request import (
+    FluidRemoteInternalRestCreateSandboxRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_run_command_request import (
+    FluidRemoteInternalRestRunCommandRequest,
+)
+from virsh_sandbox.standin import StandinServer
+from virsh_sandbox.streaming import (
+    AnsibleJobOutputStream,
+    AsyncCommandOutputStream,
+    CommandOutput,
+)
+from virsh_sandbox.unixsocket import socket_path, split_url
+
+
+class LingeringJobHandler(JobHandler):
+    def run_stream(self, sandbox_id):
+        super().run_stream(sandbox_id)
+        # Hold the connection open for the client's pong, as a server
+        # awaiting the close handshake would.
+        time.sleep(0.1)
+
+
+class UnixStreamingServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class TestUnixSocket(unittest.TestCase):
+    """Requests and streams to servers on a Unix domain socket"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "fluid-remote.sock")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_urls(self):
+        self.assertEqual(socket_path("unix:///run/fluid.sock/"), "/run/fluid.sock")
+        self.assertIsNone(socket_path("http://localhost:8080"))
+        path = "/run/fluid.sock"
+        self.assertEqual(
+            split_url("unix:///run/fluid.sock/v1/vms?limit=2", path),
+            (path, "/v1/vms?limit=2"),
+        )
+        self.assertEqual(split_url("unix:///run/fluid.sock", path), (path, "/"))
+        self.assertIsNone(split_url("unix:///run/fluid.sock2/v1", path))
+        self.assertIsNone(split_url("http://localhost/v1", path))
+
+    def test_requests(self):
+        with StandinServer(unix_socket=self.path) as server:
+            self.assertEqual(server.url, "unix://" + self.path)
+            client = ApiClient(Configuration(host=server.url))
+            sandboxes = SandboxApi(client)
+            created = sandboxes.create_sandbox(
+                FluidRemoteInternalRestCreateSandboxRequest(
+                    source_vm_name="ubuntu-base", agent_id="a", auto_start=True
+                )
+            )
+            result = sandboxes.run_sandbox_command(
+                created.sandbox.id,
+                FluidRemoteInternalRestRunCommandRequest(command="uptime"),
+            )
+            self.assertEqual(result.command.exit_code, 0)
+            listed = sandboxes.list_sandboxes(agent_id="a")
+            self.assertEqual(len(listed.sandboxes), 1)
+            # All of it went over one kept-alive connection.
+            pools = client.rest_client.pool_manager.pools
+            (key,) = pools.keys()
+            self.assertEqual(pools[key].num_connections, 1)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_no_server(self):
+        config = Configuration(host="unix://" + self.path)
+        config.retries = 0
+        with self.assertRaises(urllib3.exceptions.MaxRetryError) as ctx:
+            HealthApi(ApiClient(config)).get_health()
+        self.assertIsInstance(
+            ctx.exception.reason, urllib3.exceptions.NewConnectionError
+        )
+
+    def test_streams(self):
+        server = UnixStreamingServer(self.path, LingeringJobHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            client = ApiClient(Configuration(host="unix://" + self.path))
+            # The server closes right after a ping here; the unanswerable pong
+            # must not end the stream early.
+            lines = list(AnsibleJobOutputStream("job-1", client, timeout=5))
+            self.assertEqual(lines[-1], "Job finished (rc=0)")
+
+            async def run():
+                request = FluidRemoteInternalRestRunCommandRequest(command="hi\n")
+                async with AsyncCommandOutputStream("SBX-1", request, client) as s:
+                    return [chunk async for chunk in s]
+
+            self.assertEqual(
+                asyncio.run(run()),
+                [CommandOutput("hi\n", False), CommandOutput("warn\n", True)],
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_transport_latency(self):
+        timings = transport_latency(requests=20)
+        self.assertEqual(sorted(timings), ["tcp", "unix"])
+        self.assertTrue(all(len(t) == 20 for t in timings.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -33,6 +33,27 @@ __all__ = [
     "ApiKeyError",
     "ApiAttributeError",
     "ApiException",
+    "AnsibleJobOutputStream",
+    "AsyncAnsibleJobOutputStream",
+    "CommandOutputStream",
+    "AsyncCommandOutputStream",
+    "ActivityMultiplexer",
+    "SpilledText",
+    "CompactSandbox",
+    "CompactSandboxInfo",
+    "CompactVmInfo",
+    "ShardedSandboxClient",
+    "OutlierPolicy",
+    "SandboxMirror",
+    "PathTrie",
+    "DiffTrie",
+    "DiffCache",
+    "SandboxPipeline",
+    "CertificateCache",
+    "DirectExecutor",
+    "SessionRecorder",
+    "Interceptor",
+    "use_cassette",
     "FluidRemoteInternalAnsibleAddTaskRequest",
     "FluidRemoteInternalAnsibleAddTaskResponse",
     "FluidRemoteInternalAnsibleCreatePlaybookRequest",
@@ -174,6 +195,31 @@ from virsh_sandbox.exceptions import ApiKeyError as ApiKeyError
 from virsh_sandbox.exceptions import ApiTypeError as ApiTypeError
 from virsh_sandbox.exceptions import ApiValueError as ApiValueError
 from virsh_sandbox.exceptions import OpenApiException as OpenApiException
+from virsh_sandbox.cassette import use_cassette as use_cassette
+from virsh_sandbox.certcache import CertificateCache as CertificateCache
+from virsh_sandbox.compact import CompactSandbox as CompactSandbox
+from virsh_sandbox.compact import CompactSandboxInfo as CompactSandboxInfo
+from virsh_sandbox.compact import CompactVmInfo as CompactVmInfo
+from virsh_sandbox.diffcache import DiffCache as DiffCache
+from virsh_sandbox.interceptors import Interceptor as Interceptor
+from virsh_sandbox.mirror import SandboxMirror as SandboxMirror
+from virsh_sandbox.multiplex import ActivityMultiplexer as ActivityMultiplexer
+from virsh_sandbox.pathtrie import DiffTrie as DiffTrie
+from virsh_sandbox.pathtrie import PathTrie as PathTrie
+from virsh_sandbox.pipeline import SandboxPipeline as SandboxPipeline
+from virsh_sandbox.sessionlog import SessionRecorder as SessionRecorder
+from virsh_sandbox.sharding import OutlierPolicy as OutlierPolicy
+from virsh_sandbox.sharding import ShardedSandboxClient as ShardedSandboxClient
+from virsh_sandbox.spill import SpilledText as SpilledText
+from virsh_sandbox.sshexec import DirectExecutor as DirectExecutor
+from virsh_sandbox.streaming import AnsibleJobOutputStream as AnsibleJobOutputStream
+from virsh_sandbox.streaming import (
+    AsyncAnsibleJobOutputStream as AsyncAnsibleJobOutputStream,
+)
+from virsh_sandbox.streaming import (
+    AsyncCommandOutputStream as AsyncCommandOutputStream,
+)
+from virsh_sandbox.streaming import CommandOutputStream as CommandOutputStream
 
 # import models into sdk package
 from virsh_sandbox.models.fluid_remote_internal_ansible_add_task_request import (
@@ -17,8 +17,10 @@ import decimal
 import json
 import mimetypes
 import os
+import pathlib
 import re
 import tempfile
+import threading
 import uuid
 from enum import Enum
 from typing import Dict, List, Optional, Tuple, Union
@@ -28,7 +30,7 @@ from dateutil.parser import parse
 from pydantic import SecretStr
 
 import virsh_sandbox.models
-from virsh_sandbox import rest
+from virsh_sandbox import cbor, download, interceptors, rest, spill
 from virsh_sandbox.api_response import ApiResponse
 from virsh_sandbox.api_response import T as ApiResponseT
 from virsh_sandbox.configuration import Configuration
@@ -53,12 +55,28 @@ class ApiClient:
     the methods and models for each application are generated from the OpenAPI
     templates.
 
+    One ApiClient, and the urllib3 connection pool behind it, can be shared
+    by any number of threads. Requests do not lock and keep no per-call state
+    on the client; ``param_serialize`` works on copies of the parameters it
+    is given. Changes to ``default_headers``, ``user_agent``, ``cookie`` or
+    the configuration should be made before the client is shared. Set
+    ``configuration.connection_pool_maxsize`` to at least the number of
+    threads so that every thread can keep a connection alive.
+
+    A client may also be created before ``os.fork()`` or a fork-based
+    process pool starts. A forked child replaces the inherited connection
+    pools with empty ones, so the parent and its children never share a
+    socket.
+
     :param configuration: .Configuration object for this client
     :param header_name: a header to pass when making calls to the API.
     :param header_value: a header value to pass when making calls to
         the API.
     :param cookie: a cookie to include in the header when making calls
         to the API
+    :param interceptors: ``virsh_sandbox.interceptors.Interceptor`` objects
+        wrapping request building, transport and deserialization, outermost
+        first. Can be replaced later through the ``interceptors`` property.
     """
 
     PRIMITIVE_TYPES = (float, bool, bytes, str, int)
@@ -76,7 +94,12 @@ class ApiClient:
     _pool = None
 
     def __init__(
-        self, configuration=None, header_name=None, header_value=None, cookie=None
+        self,
+        configuration=None,
+        header_name=None,
+        header_value=None,
+        cookie=None,
+        interceptors=None,
     ) -> None:
         # use default configuration if none is provided
         if configuration is None:
@@ -91,6 +114,7 @@ class ApiClient:
         # Set default User-Agent.
         self.user_agent = "OpenAPI-Generator/0.0.21-beta/python"
         self.client_side_validation = configuration.client_side_validation
+        self.interceptors = interceptors or ()
 
     def __enter__(self):
         return self
@@ -110,7 +134,25 @@ class ApiClient:
     def set_default_header(self, header_name, header_value):
         self.default_headers[header_name] = header_value
 
+    @property
+    def interceptors(self):
+        """Interceptors of this client, outermost first"""
+        return self._interceptors
+
+    @interceptors.setter
+    def interceptors(self, value):
+        # The chains are built once here so that calls only test for None.
+        self._interceptors = tuple(value)
+        self._build_chain = interceptors.compose(
+            self._interceptors, "build", lambda params: self._param_serialize(**params)
+        )
+        self._send_chain = interceptors.compose(self._interceptors, "send", self._send)
+        self._deserialize_chain = interceptors.compose(
+            self._interceptors, "deserialize", self._response_deserialize
+        )
+
     _default = None
+    _default_lock = threading.Lock()
 
     @classmethod
     def get_default(cls):
@@ -123,7 +165,9 @@ class ApiClient:
         :return: The ApiClient object.
         """
         if cls._default is None:
-            cls._default = ApiClient()
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = ApiClient()
         return cls._default
 
     @classmethod
@@ -172,11 +216,57 @@ class ApiClient:
         :return: tuple of form (path, http_method, query_params, header_params,
             body, post_params, files)
         """
+        if self._build_chain is None:
+            return self._param_serialize(
+                method,
+                resource_path,
+                path_params,
+                query_params,
+                header_params,
+                body,
+                post_params,
+                files,
+                auth_settings,
+                collection_formats,
+                _host,
+                _request_auth,
+            )
+        return self._build_chain(
+            {
+                "method": method,
+                "resource_path": resource_path,
+                "path_params": path_params,
+                "query_params": query_params,
+                "header_params": header_params,
+                "body": body,
+                "post_params": post_params,
+                "files": files,
+                "auth_settings": auth_settings,
+                "collection_formats": collection_formats,
+                "_host": _host,
+                "_request_auth": _request_auth,
+            }
+        )
 
+    def _param_serialize(
+        self,
+        method,
+        resource_path,
+        path_params=None,
+        query_params=None,
+        header_params=None,
+        body=None,
+        post_params=None,
+        files=None,
+        auth_settings=None,
+        collection_formats=None,
+        _host=None,
+        _request_auth=None,
+    ) -> RequestSerialized:
         config = self.configuration
 
-        # header parameters
-        header_params = header_params or {}
+        # header parameters; copied so the caller's dict is never modified
+        header_params = dict(header_params or {})
         header_params.update(self.default_headers)
         if self.cookie:
             header_params["Cookie"] = self.cookie
@@ -193,7 +283,10 @@ class ApiClient:
             for k, v in path_params:
                 # specified safe chars, encode everything
                 resource_path = resource_path.replace(
-                    "{%s}" % k, quote(str(v), safe=config.safe_chars_for_path_param)
+                    "{%s}" % k,
+                    quote(
+                        str(v), safe=getattr(config, "safe_chars_for_path_param", "")
+                    ),
                 )
 
         # post parameters
@@ -204,7 +297,11 @@ class ApiClient:
             if files:
                 post_params.extend(self.files_parameters(files))
 
-        # auth setting
+        # auth setting may append to the query parameters
+        if isinstance(query_params, dict):
+            query_params = list(query_params.items())
+        else:
+            query_params = list(query_params or [])
         self.update_params_for_auth(
             header_params,
             query_params,
@@ -220,7 +317,9 @@ class ApiClient:
             body = self.sanitize_for_serialization(body)
 
         # request url
-        if _host is None or self.configuration.ignore_operation_servers:
+        if _host is None or getattr(
+            self.configuration, "ignore_operation_servers", False
+        ):
             url = self.configuration.host + resource_path
         else:
             # use server/host defined in path or operation instead
@@ -255,9 +354,9 @@ class ApiClient:
         :return: RESTResponse
         """
 
-        try:
+        if self._send_chain is None:
             # perform request and return response
-            response_data = self.rest_client.request(
+            return self.rest_client.request(
                 method,
                 url,
                 headers=header_params,
@@ -265,12 +364,23 @@ class ApiClient:
                 post_params=post_params,
                 _request_timeout=_request_timeout,
             )
-
-        except ApiException as e:
-            raise e
-
+        request = interceptors.Request(
+            method, url, header_params, body, post_params, _request_timeout
+        )
+        response_data = self._send_chain(request)
+        response_data.request = request
         return response_data
 
+    def _send(self, request):
+        return self.rest_client.request(
+            request.method,
+            request.url,
+            headers=request.headers,
+            body=request.body,
+            post_params=request.post_params,
+            _request_timeout=request.timeout,
+        )
+
     def response_deserialize(
         self,
         response_data: rest.RESTResponse,
@@ -281,9 +391,13 @@ class ApiClient:
         :param response_types_map: dict of response types.
         :return: ApiResponse
         """
+        if self._deserialize_chain is not None:
+            return self._deserialize_chain(response_data, response_types_map)
+        return self._response_deserialize(response_data, response_types_map)
 
+    def _response_deserialize(self, response_data, response_types_map):
         msg = "RESTResponse.read() must be called before passing it to response_deserialize()"
-        assert response_data.data is not None, msg
+        assert response_data.data is not None or response_data.is_attachment, msg
 
         response_type = response_types_map.get(str(response_data.status), None)
         if (
@@ -296,39 +410,122 @@ class ApiClient:
                 str(response_data.status)[0] + "XX", None
             )
 
+        if response_data.data is None and response_type != "file":
+            response_data.read(stream_attachment=False)
+
         # deserialize response data
         response_text = None
         return_data = None
+        spilled = spill.is_spilled(response_data.data)
+        release = (
+            not self.configuration.retain_response_body
+            and 200 <= response_data.status <= 299
+        )
         try:
             if response_type == "bytearray":
                 return_data = response_data.data
             elif response_type == "file":
                 return_data = self.__deserialize_file(response_data)
+            elif spilled and response_type is not None:
+                return_data = self.__deserialize_spilled(response_data, response_type)
             elif response_type is not None:
                 match = None
                 content_type = response_data.headers.get("content-type")
                 if content_type is not None:
                     match = re.search(r"charset=([a-zA-Z\-\d]+)[\s;]?", content_type)
                 encoding = match.group(1) if match else "utf-8"
-                response_text = response_data.data.decode(encoding)
-                return_data = self.deserialize(
-                    response_text, response_type, content_type
-                )
+                if cbor.is_cbor(content_type):
+                    # Binary bodies are decoded from the bytes as they are.
+                    encoding = None
+                if release:
+                    # deserialize() holds the only reference to the text and
+                    # drops it once parsed.
+                    return_data = self.deserialize(
+                        self.__release_text(response_data, encoding),
+                        response_type,
+                        content_type,
+                    )
+                elif encoding is None:
+                    return_data = self.deserialize(
+                        response_data.data, response_type, content_type
+                    )
+                else:
+                    response_text = response_data.data.decode(encoding)
+                    return_data = self.deserialize(
+                        response_text, response_type, content_type
+                    )
         finally:
             if not 200 <= response_data.status <= 299:
-                raise ApiException.from_response(
-                    http_resp=response_data,
-                    body=response_text,
-                    data=return_data,
-                )
+                body_limit = self.configuration.exception_body_limit
+                try:
+                    raise ApiException.from_response(
+                        http_resp=response_data,
+                        body=response_text,
+                        data=return_data,
+                        body_limit=body_limit,
+                    )
+                finally:
+                    if (
+                        body_limit is not None
+                        and len(response_data.data or b"") > body_limit
+                    ):
+                        # The exception keeps a truncated copy; drop the full
+                        # body so the traceback's frames do not hold it.
+                        response_data.data = b""
+                        del response_text
 
         return ApiResponse(
             status_code=response_data.status,
             data=return_data,
             headers=response_data.headers,
-            raw_data=response_data.data,
+            # A spilled body stays in its mapping, referenced by the handles;
+            # a streamed attachment is only on disk.
+            raw_data=(
+                b""
+                if spilled or release or response_data.data is None
+                else response_data.data
+            ),
         )
 
+    @staticmethod
+    def __release_text(response_data, encoding):
+        """Detach the body from the response and return it decoded.
+
+        :param response_data: RESTResponse whose data is bytes.
+        :param encoding: Charset of the body, or None to return the bytes.
+        :return: Decoded body; the response keeps an empty body.
+        """
+        body = response_data.data
+        response_data.data = b""
+        return body if encoding is None else body.decode(encoding)
+
+    def __deserialize_spilled(self, response_data, response_type):
+        """Deserializes a body that was spooled to disk.
+
+        Large strings are left in the mapping as SpilledText handles.
+
+        :param response_data: RESTResponse whose data is an mmap.
+        :param response_type: class literal or string of class name.
+        :return: deserialized object.
+        """
+        content_type = response_data.headers.get("content-type")
+        match = None
+        if content_type is not None:
+            match = re.search(r"charset=([a-zA-Z\-\d]+)[\s;]?", content_type)
+        encoding = match.group(1) if match else "utf-8"
+        body = response_data.data
+        if content_type is not None and re.match(
+            r"^text\/[a-z.+-]+\s*(;|$)", content_type, re.IGNORECASE
+        ):
+            return spill.SpilledText(body, 0, len(body), False, encoding)
+        if cbor.is_cbor(content_type):
+            data, handles = cbor.load(body, self.configuration.spill_string_threshold)
+        else:
+            data, handles = spill.load_json(
+                body, self.configuration.spill_string_threshold
+            )
+        return spill.attach(self.__deserialize(data, response_type), handles)
+
     def sanitize_for_serialization(self, obj):
         """Builds a JSON POST object.
 
@@ -397,6 +594,7 @@ class ApiClient:
 
         :return: deserialized object.
         """
+        # response_text is the raw bytes for CBOR bodies.
 
         # fetch data from response object
         if content_type is None:
@@ -413,6 +611,8 @@ class ApiClient:
                 data = ""
             else:
                 data = json.loads(response_text)
+        elif cbor.is_cbor(content_type):
+            data = cbor.loads(response_text)
         elif re.match(r"^text\/[a-z.+-]+\s*(;|$)", content_type, re.IGNORECASE):
             data = response_text
         else:
@@ -420,6 +620,8 @@ class ApiClient:
                 status=0, reason="Unsupported content type: {0}".format(content_type)
             )
 
+        # The parsed data is all that is needed from here on.
+        del response_text
         return self.__deserialize(data, response_type)
 
     def __deserialize(self, data, klass):
@@ -541,15 +743,25 @@ class ApiClient:
     ):
         """Builds form parameters.
 
+        Paths and binary file objects are not read here; their contents are
+        streamed by the multipart encoder while the request is sent.
+
         :param files: File parameters.
         :return: Form parameters with files.
         """
         params = []
         for k, v in files.items():
-            if isinstance(v, str):
-                with open(v, "rb") as f:
-                    filename = os.path.basename(f.name)
-                    filedata = f.read()
+            if isinstance(v, (str, os.PathLike)):
+                # Opened and streamed by the multipart encoder when sending.
+                filename = os.path.basename(v)
+                filedata = pathlib.Path(v)
+            elif hasattr(v, "read"):
+                # Files opened from a descriptor have an int name.
+                name = getattr(v, "name", None)
+                if not isinstance(name, (str, bytes, os.PathLike)):
+                    name = k
+                filename = os.path.basename(os.fsdecode(name))
+                filedata = v
             elif isinstance(v, bytes):
                 filename = k
                 filedata = v
@@ -576,6 +788,8 @@ class ApiClient:
 
         for accept in accepts:
             if re.search("json", accept, re.IGNORECASE):
+                if self.configuration.accept_cbor and accept == "application/json":
+                    return cbor.ACCEPT
                 return accept
 
         return accepts[0]
@@ -679,7 +893,14 @@ class ApiClient:
             path = os.path.join(os.path.dirname(path), filename)
 
         with open(path, "wb") as f:
-            f.write(response.data)
+            if response.data is not None:
+                f.write(response.data)
+            else:
+                # Attachment left unread by RESTResponse.read(): stream it.
+                try:
+                    download.write_stream(response.response, f)
+                finally:
+                    response.response.release_conn()
 
         return path
 
@@ -761,3 +982,13 @@ class ApiClient:
         """
 
         return klass.from_dict(data)
+
+
+def _reset_default_lock_after_fork():
+    # A fork while another thread held the lock would leave it locked for
+    # good in the child.
+    ApiClient._default_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_default_lock_after_fork)
@@ -0,0 +1,270 @@
+# coding: utf-8
+
+"""Record API traffic to a cassette file and replay it without a server.
+
+A cassette stands in for ``ApiClient.rest_client``. While recording, it
+passes requests to the real transport and appends one JSON line per
+request to the file: the method, the URL without scheme and host, the JSON
+body, the response and how long the server took. Replaying serves those
+responses in order. Replay can reproduce the recorded latencies, optionally
+scaled, or answer at once. Code built on the SDK can then be tested and
+benchmarked repeatably without fluid-remote or libvirt.
+
+Request headers are not recorded, so credentials never end up in the file.
+A path ending in ``.gz`` is gzip-compressed.
+"""
+
+import base64
+import collections
+import contextlib
+import gzip
+import io
+import json
+import threading
+import time
+from typing import IO, Any, Deque, Dict, Iterator, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import urllib3
+
+from virsh_sandbox import rest
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.exceptions import ApiException
+
+FORMAT_VERSION = 1
+
+# urllib3 has already decoded the body these describe.
+_DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length"}
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _key(method: str, url: str, body: Any) -> Tuple[str, str, Optional[str]]:
+    parts = urlsplit(url)
+    target = parts.path + ("?" + parts.query if parts.query else "")
+    if body is None or isinstance(body, (bytes, bytearray)):
+        # Raw bodies (uploads) are matched by URL alone.
+        canonical = None
+    else:
+        canonical = json.dumps(body, sort_keys=True, default=str)
+    return method.upper(), target, canonical
+
+
+def _response(
+    transport: Any,
+    status: int,
+    reason: Optional[str],
+    headers: Dict[str, str],
+    data: bytes,
+) -> rest.RESTResponse:
+    headers = dict(headers)
+    headers["Content-Length"] = str(len(data))
+    return rest.RESTResponse(
+        urllib3.HTTPResponse(
+            body=io.BytesIO(data),
+            headers=headers,
+            status=status,
+            reason=reason,
+            preload_content=False,
+        ),
+        getattr(transport, "spill_threshold", None),
+        getattr(transport, "spill_dir", None),
+        getattr(transport, "retain_body", True),
+    )
+
+
+class CassetteRecorder:
+    """Transport that records the requests it forwards to ``transport``.
+
+    :param path: Cassette file to write; replaced if it exists.
+    :param transport: The transport to record, normally the client's
+        ``rest.RESTClientObject``.
+    """
+
+    def __init__(self, path: str, transport: rest.RESTClientObject) -> None:
+        self.path = path
+        self.transport = transport
+        self.spill_threshold = transport.spill_threshold
+        self.spill_dir = transport.spill_dir
+        self.retain_body = transport.retain_body
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._file = _open(path, "w")
+        self._file.write(json.dumps({"cassette": FORMAT_VERSION}) + "\n")
+
+    def request(
+        self,
+        method,
+        url,
+        headers=None,
+        body=None,
+        post_params=None,
+        _request_timeout=None,
+    ) -> rest.RESTResponse:
+        """Forward the request and record it; arguments as for
+        ``RESTClientObject.request``."""
+        begin = time.perf_counter()
+        response = self.transport.request(
+            method, url, headers, body, post_params, _request_timeout
+        )
+        try:
+            data = response.response.data
+        finally:
+            response.response.release_conn()
+        latency = time.perf_counter() - begin
+
+        method, target, canonical = _key(method, url, body)
+        headers = {
+            k: v
+            for k, v in response.response.headers.items()
+            if k.lower() not in _DROPPED_HEADERS
+        }
+        entry: Dict[str, Any] = {
+            "method": method,
+            "url": target,
+            "body": canonical,
+            "status": response.status,
+            "reason": response.reason,
+            "headers": headers,
+            "latency": round(latency, 6),
+        }
+        try:
+            entry["text"] = data.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["data"] = base64.b64encode(data).decode("ascii")
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self.recorded += 1
+        return _response(self, response.status, response.reason, headers, data)
+
+    def close(self) -> None:
+        """Finish the cassette file."""
+        with self._lock:
+            self._file.close()
+
+
+class CassettePlayer:
+    """Transport that answers requests from a cassette file.
+
+    A request gets the oldest unused recording with the same method, URL
+    and JSON body, so repeated calls such as status polls replay in order.
+
+    :param path: Cassette file written by :class:`CassetteRecorder`.
+    :param speed: ``1.0`` waits the recorded latency before each answer,
+        ``2.0`` half of it. ``None`` answers at once.
+    :param spill_threshold: As ``Configuration.spill_threshold``.
+    :param retain_body: As ``Configuration.retain_response_body``.
+    :raises ApiException: From :meth:`request`, with status 0, when the
+        cassette has no unused recording for the request.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        speed: Optional[float] = 1.0,
+        spill_threshold: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        retain_body: bool = True,
+    ) -> None:
+        self.path = path
+        self.speed = speed
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self.retain_body = retain_body
+        self.played = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str, Optional[str]], Deque[Dict[str, Any]]]
+        self._entries = collections.defaultdict(collections.deque)
+        with _open(path, "r") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("cassette") != FORMAT_VERSION:
+                raise ValueError(
+                    "%s is not a version %d cassette" % (path, FORMAT_VERSION)
+                )
+            for line in f:
+                entry = json.loads(line)
+                key = (entry["method"], entry["url"], entry["body"])
+                self._entries[key].append(entry)
+
+    @property
+    def remaining(self) -> int:
+        """Recordings not played yet."""
+        with self._lock:
+            return sum(len(entries) for entries in self._entries.values())
+
+    def request(
+        self,
+        method,
+        url,
+        headers=None,
+        body=None,
+        post_params=None,
+        _request_timeout=None,
+    ) -> rest.RESTResponse:
+        """Answer from the cassette; arguments as for
+        ``RESTClientObject.request``."""
+        key = _key(method, url, body)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise ApiException(
+                    status=0,
+                    reason="no recorded response for %s %s" % key[:2],
+                )
+            entry = entries.popleft()
+            self.played += 1
+        if self.speed:
+            time.sleep(entry["latency"] / self.speed)
+        if "text" in entry:
+            data = entry["text"].encode("utf-8")
+        else:
+            data = base64.b64decode(entry["data"])
+        return _response(self, entry["status"], entry["reason"], entry["headers"], data)
+
+    def close(self) -> None:
+        pass
+
+
+@contextlib.contextmanager
+def use_cassette(
+    api_client: ApiClient,
+    path: str,
+    record: bool = False,
+    speed: Optional[float] = 1.0,
+) -> Iterator[Union[CassetteRecorder, CassettePlayer]]:
+    """Swap the transport of ``api_client`` for a cassette inside the block.
+
+    Example:
+        >>> with use_cassette(api_client, "deploy.jsonl.gz", record=True):
+        ...     run_deploy(api_client)
+        >>> with use_cassette(api_client, "deploy.jsonl.gz", speed=None):
+        ...     run_deploy(api_client)  # no server needed
+
+    :param record: Record through the current transport instead of
+        replaying.
+    :param speed: Replay speed; see :class:`CassettePlayer`.
+    """
+    transport = api_client.rest_client
+    cassette: Union[CassetteRecorder, CassettePlayer]
+    if record:
+        cassette = CassetteRecorder(path, transport)
+    else:
+        config = api_client.configuration
+        cassette = CassettePlayer(
+            path,
+            speed,
+            spill_threshold=config.spill_threshold,
+            spill_dir=config.temp_folder_path,
+            retain_body=config.retain_response_body,
+        )
+    api_client.rest_client = cassette
+    try:
+        yield cassette
+    finally:
+        api_client.rest_client = transport
+        cassette.close()
@@ -0,0 +1,237 @@
+# coding: utf-8
+
+"""CBOR (RFC 8949) response bodies.
+
+fluid-remote answers the command, diff and list endpoints in CBOR when the
+request's ``Accept`` header prefers ``application/cbor``; other endpoints
+and all errors stay JSON. Set ``Configuration.accept_cbor = True`` to ask for
+it. The document has the same keys and values as the JSON one, so it
+deserializes into the same models.
+
+CBOR strings are length-prefixed UTF-8 rather than escaped text, so command
+output is sliced out of the body instead of scanned for escapes, and bodies
+shrink by the escaping JSON needs for quotes, newlines and control
+characters. A spilled CBOR body keeps its large strings in the mapping as
+:class:`~virsh_sandbox.spill.SpilledText` handles, like a spilled JSON body.
+
+:func:`loads` uses ``cbor2`` when it is installed
+(``pip install virsh_sandbox[cbor]``) and the decoder here otherwise.
+``python -m virsh_sandbox.loadgen --formats 20`` compares payload sizes and
+decode times of both formats.
+"""
+
+import json
+import re
+import struct
+from typing import Any, List, Optional, Tuple
+
+from virsh_sandbox.spill import Buffer, Path, SpilledText
+
+try:
+    import cbor2 as _cbor2
+except ImportError:  # pragma: no cover - optional
+    _cbor2 = None
+
+CONTENT_TYPE = "application/cbor"
+
+ACCEPT = "application/cbor, application/json;q=0.9"
+"""``Accept`` header asking for CBOR with JSON as the fallback."""
+
+_CONTENT_TYPE = re.compile(r"^application/cbor\s*(;|$)", re.IGNORECASE)
+_SIMPLE = {20: False, 21: True, 22: None, 23: None}
+_FLOATS = {25: (">e", 2), 26: (">f", 4), 27: (">d", 8)}
+_ARGUMENTS = {25: (">H", 2), 26: (">I", 4), 27: (">Q", 8)}
+
+
+def is_cbor(content_type: Optional[str]) -> bool:
+    """Whether a ``Content-Type`` header is CBOR."""
+    return content_type is not None and bool(_CONTENT_TYPE.match(content_type))
+
+
+def prefers_cbor(accept: Optional[str]) -> bool:
+    """Whether an ``Accept`` header rates CBOR at least as high as JSON.
+
+    The same rule fluid-remote applies; wildcards count as JSON.
+    """
+    cbor, other = -1.0, -1.0
+    for part in (accept or "").split(","):
+        media_type, *params = part.split(";")
+        q = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    pass
+        media_type = media_type.strip().lower()
+        if media_type == CONTENT_TYPE:
+            cbor = max(cbor, q)
+        elif media_type in ("application/json", "application/*", "*/*"):
+            other = max(other, q)
+    return cbor > 0 and cbor >= other
+
+
+class _Decoder:
+    """Decoder for the definite-length CBOR fluid-remote writes. Tags are
+    skipped and their content returned as is."""
+
+    def __init__(self, buf: Buffer, string_threshold: Optional[int]) -> None:
+        self.buf = buf
+        self.string_threshold = string_threshold
+        self.handles: List[Tuple[Path, SpilledText]] = []
+
+    def argument(self, info: int, pos: int) -> Tuple[int, int]:
+        if info in _ARGUMENTS:
+            fmt, size = _ARGUMENTS[info]
+            return struct.unpack_from(fmt, self.buf, pos)[0], pos + size
+        raise ValueError("unsupported CBOR item at offset %d" % (pos - 1))
+
+    def value(self, pos: int, path: Optional[Path]) -> Tuple[Any, int]:
+        buf = self.buf
+        initial = buf[pos]
+        major, info = initial >> 5, initial & 0x1F
+        pos += 1
+        if major == 7:
+            if info in _SIMPLE:
+                return _SIMPLE[info], pos
+            if info in _FLOATS:
+                fmt, size = _FLOATS[info]
+                return struct.unpack_from(fmt, buf, pos)[0], pos + size
+            raise ValueError("unsupported CBOR item at offset %d" % (pos - 1))
+        # Most arguments fit the initial byte or the one after it.
+        if info < 24:
+            arg = info
+        elif info == 24:
+            arg = buf[pos]
+            pos += 1
+        else:
+            arg, pos = self.argument(info, pos)
+        if major == 3 or major == 2:
+            end = pos + arg
+            if end > len(buf):
+                raise ValueError("truncated CBOR string at offset %d" % pos)
+            if major == 2:
+                return bytes(buf[pos:end]), end
+            threshold = self.string_threshold
+            if path is not None and threshold is not None and arg >= threshold:
+                self.handles.append((path, SpilledText(buf, pos, end, False)))
+                return "", end
+            # Like SpilledText, tolerate output from servers that copied
+            # invalid UTF-8 into a text string.
+            return str(buf[pos:end], "utf-8", "replace"), end
+        if major == 0:
+            return arg, pos
+        if major == 1:
+            return -1 - arg, pos
+        value = self.value
+        if major == 4:
+            items = [None] * arg
+            for i in range(arg):
+                items[i], pos = value(pos, None if path is None else path + (i,))
+            return items, pos
+        if major == 5:
+            obj = {}
+            for _ in range(arg):
+                key, pos = value(pos, None)
+                obj[key], pos = value(pos, None if path is None else path + (key,))
+            return obj, pos
+        return value(pos, path)  # major 6: a tag
+
+
+def load(
+    buf: Buffer, string_threshold: Optional[int] = None
+) -> Tuple[Any, List[Tuple[Path, SpilledText]]]:
+    """Decode a CBOR document, leaving large strings in the buffer.
+
+    Like :func:`virsh_sandbox.spill.load_json`: each text string of at least
+    ``string_threshold`` bytes is ``""`` in the result, and its location and
+    handle are returned alongside for :func:`virsh_sandbox.spill.attach`.
+
+    :param buf: Response body, bytes or the ``mmap`` of a spilled body.
+    :param string_threshold: Smallest string, in bytes, to leave lazy; None
+        decodes every string.
+    :return: ``(data, [(path, handle), ...])``.
+    """
+    decoder = _Decoder(buf, string_threshold)
+    try:
+        data, end = decoder.value(0, None if string_threshold is None else ())
+    except (IndexError, struct.error):
+        raise ValueError("truncated CBOR document") from None
+    if end != len(buf):
+        raise ValueError("extra data after CBOR document at offset %d" % end)
+    return data, decoder.handles
+
+
+def loads(data: Buffer) -> Any:
+    """Decode a CBOR document."""
+    if _cbor2 is not None:
+        return _cbor2.loads(data)
+    return load(data)[0]
+
+
+def load_response(response: Any) -> Any:
+    """Decode the body of a ``*_without_preload_content`` response.
+
+    For helpers that read bodies without models: with ``accept_cbor`` set,
+    the negotiated endpoints answer in CBOR, so the body is decoded by its
+    ``Content-Type``.
+    """
+    if is_cbor(response.headers.get("Content-Type")):
+        return loads(response.data)
+    return json.loads(response.data)
+
+
+def _head(out: bytearray, major: int, n: int) -> None:
+    if n < 24:
+        out.append(major << 5 | n)
+    elif n < 0x100:
+        out += bytes((major << 5 | 24, n))
+    elif n < 0x10000:
+        out += struct.pack(">BH", major << 5 | 25, n)
+    elif n < 0x100000000:
+        out += struct.pack(">BI", major << 5 | 26, n)
+    else:
+        out += struct.pack(">BQ", major << 5 | 27, n)
+
+
+def _encode(out: bytearray, obj: Any) -> None:
+    if obj is None:
+        out.append(0xF6)
+    elif obj is True:
+        out.append(0xF5)
+    elif obj is False:
+        out.append(0xF4)
+    elif isinstance(obj, int):
+        if obj >= 0:
+            _head(out, 0, obj)
+        else:
+            _head(out, 1, -1 - obj)
+    elif isinstance(obj, float):
+        out += struct.pack(">Bd", 0xFB, obj)
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        _head(out, 3, len(data))
+        out += data
+    elif isinstance(obj, (bytes, bytearray)):
+        _head(out, 2, len(obj))
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        _head(out, 4, len(obj))
+        for item in obj:
+            _encode(out, item)
+    elif isinstance(obj, dict):
+        _head(out, 5, len(obj))
+        for key, value in obj.items():
+            _encode(out, key)
+            _encode(out, value)
+    else:
+        raise TypeError("cannot encode %s as CBOR" % type(obj).__name__)
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode JSON-like data (dicts, lists, strings, numbers, booleans and
+    None) as CBOR, the way fluid-remote does."""
+    out = bytearray()
+    _encode(out, obj)
+    return bytes(out)
@@ -0,0 +1,422 @@
+# coding: utf-8
+
+"""Client-side cache of short-lived SSH access certificates.
+
+Every ``AccessApi.request_access`` call signs a new certificate on the
+server, which adds a round trip and the signing time to each connection.
+:class:`CertificateCache` keeps the certificate issued for a sandbox, user
+and public key and hands it out again while it is valid. The expiry is read
+from the OpenSSH certificate itself, so checking it needs no
+``get_certificate`` call. A background thread renews certificates that are
+still in use shortly before they expire. Certificates dropped from the
+cache are revoked.
+"""
+
+import base64
+import collections
+import struct
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from virsh_sandbox.api.access_api import AccessApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.models.internal_rest_request_access_request import (
+    InternalRestRequestAccessRequest,
+)
+from virsh_sandbox.models.internal_rest_request_access_response import (
+    InternalRestRequestAccessResponse,
+)
+from virsh_sandbox.models.internal_rest_revoke_certificate_request import (
+    InternalRestRevokeCertificateRequest,
+)
+
+# Length-prefixed public key fields between the nonce and the serial, per
+# certificate type (PROTOCOL.certkeys in OpenSSH).
+_KEY_FIELDS = {
+    "ssh-rsa-cert-v01@openssh.com": 2,
+    "ssh-dss-cert-v01@openssh.com": 4,
+    "ecdsa-sha2-nistp256-cert-v01@openssh.com": 2,
+    "ecdsa-sha2-nistp384-cert-v01@openssh.com": 2,
+    "ecdsa-sha2-nistp521-cert-v01@openssh.com": 2,
+    "ssh-ed25519-cert-v01@openssh.com": 1,
+    "sk-ecdsa-sha2-nistp256-cert-v01@openssh.com": 3,
+    "sk-ssh-ed25519-cert-v01@openssh.com": 2,
+}
+
+_FOREVER = 0xFFFFFFFFFFFFFFFF
+
+
+class SSHCertificate(NamedTuple):
+    """The fields of an OpenSSH certificate that the cache needs."""
+
+    key_type: str
+    serial: int
+    cert_type: int
+    """1 for user certificates, 2 for host certificates."""
+    key_id: str
+    principals: List[str]
+    valid_after: int
+    """Unix time; 0 means always."""
+    valid_before: int
+    """Unix time; ``2**64 - 1`` means forever."""
+
+    @property
+    def expires(self) -> bool:
+        return self.valid_before != _FOREVER
+
+
+class _Reader:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.pos = 0
+
+    def take(self, n: int) -> bytes:
+        if self.pos + n > len(self.data):
+            raise ValueError("truncated SSH certificate")
+        chunk = self.data[self.pos : self.pos + n]
+        self.pos += n
+        return chunk
+
+    def uint32(self) -> int:
+        return struct.unpack("!I", self.take(4))[0]
+
+    def uint64(self) -> int:
+        return struct.unpack("!Q", self.take(8))[0]
+
+    def string(self) -> bytes:
+        return self.take(self.uint32())
+
+
+def parse_ssh_certificate(text: str) -> SSHCertificate:
+    """Parse an OpenSSH certificate in ``authorized_keys`` format.
+
+    The signature is not checked; sshd does that when the certificate is
+    used.
+
+    :raises ValueError: If ``text`` is not a supported certificate.
+    """
+    parts = text.split()
+    if len(parts) < 2:
+        raise ValueError("not an OpenSSH certificate")
+    try:
+        blob = base64.b64decode(parts[1], validate=True)
+    except ValueError as e:
+        raise ValueError("invalid certificate encoding: %s" % e) from e
+    reader = _Reader(blob)
+    key_type = reader.string().decode("ascii", "replace")
+    fields = _KEY_FIELDS.get(key_type)
+    if fields is None or key_type != parts[0]:
+        raise ValueError("unsupported certificate type %r" % key_type)
+    reader.string()  # nonce
+    for _ in range(fields):
+        reader.string()
+    serial = reader.uint64()
+    cert_type = reader.uint32()
+    key_id = reader.string().decode("utf-8", "replace")
+    principals = []
+    packed = _Reader(reader.string())
+    while packed.pos < len(packed.data):
+        principals.append(packed.string().decode("utf-8", "replace"))
+    valid_after = reader.uint64()
+    valid_before = reader.uint64()
+    return SSHCertificate(
+        key_type, serial, cert_type, key_id, principals, valid_after, valid_before
+    )
+
+
+class CachedCertificate(NamedTuple):
+    """A certificate handed out by :class:`CertificateCache`."""
+
+    response: InternalRestRequestAccessResponse
+    """The ``request_access`` response, with connection details."""
+    certificate: SSHCertificate
+    issued_at: float
+    """Unix time the certificate was received."""
+
+    @property
+    def certificate_id(self) -> Optional[str]:
+        return self.response.certificate_id
+
+    def remaining(self, now: Optional[float] = None) -> float:
+        """Seconds until the certificate expires."""
+        if not self.certificate.expires:
+            return float("inf")
+        return self.certificate.valid_before - (time.time() if now is None else now)
+
+
+class _Entry:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.current: Optional[CachedCertificate] = None
+        self.last_used = time.time()
+        self.retry_at = 0.0
+
+
+_Key = Tuple[str, str, str]
+
+
+class CertificateCache:
+    """Reuse and renew SSH certificates from ``AccessApi.request_access``.
+
+    Certificates are cached by sandbox ID, user ID and public key. One is
+    renewed in the background once ``renew_fraction`` of its lifetime is
+    left, if it was handed out within the last ``idle_timeout`` seconds. An
+    idle certificate is revoked and dropped instead, as is the least recently
+    used one when more than ``max_entries`` are cached. The renewed
+    certificate replaces the old one for new sessions. The old one is not
+    revoked, so sessions that use it keep working until it expires.
+
+    With the background thread, :meth:`get` waits for the server only when
+    no valid certificate is cached.
+
+    Example:
+        >>> with CertificateCache(api_client, ttl_minutes=5) as certs:
+        ...     cert = certs.get(sandbox_id, "alice", public_key)
+        ...     open("key-cert.pub", "w").write(cert.response.certificate)
+
+    :param api_client: Client for the access API; the default client if
+        omitted.
+    :param ttl_minutes: Lifetime requested for each certificate, 1 to 10.
+    :param renew_fraction: Part of the lifetime left when a certificate is
+        renewed.
+    :param idle_timeout: Seconds without :meth:`get` after which a
+        certificate is revoked instead of renewed.
+    :param max_entries: Most certificates kept at once.
+    :param retry_delay: Seconds before a failed renewal is tried again.
+    :param background: Renew and evict on a background thread. Without it,
+        renewal happens inside :meth:`get` and eviction in :meth:`sweep`.
+    """
+
+    def __init__(
+        self,
+        api_client: Optional[ApiClient] = None,
+        ttl_minutes: Optional[int] = None,
+        renew_fraction: float = 0.25,
+        idle_timeout: float = 300.0,
+        max_entries: int = 256,
+        retry_delay: float = 5.0,
+        background: bool = True,
+    ) -> None:
+        if not 0 < renew_fraction < 1:
+            raise ValueError("renew_fraction must be between 0 and 1")
+        self.api = AccessApi(api_client)
+        self.ttl_minutes = ttl_minutes
+        self.renew_fraction = renew_fraction
+        self.idle_timeout = idle_timeout
+        self.max_entries = max_entries
+        self.retry_delay = retry_delay
+        self.requests = 0
+        self.revocations = 0
+        self.revoke_failures = 0
+        self._entries: "collections.OrderedDict[_Key, _Entry]" = (
+            collections.OrderedDict()
+        )
+        self._cond = threading.Condition()
+        self._closed = False
+        self._changes = 0
+        self._thread: Optional[threading.Thread] = None
+        if background:
+            self._thread = threading.Thread(
+                target=self._run, name="certificate-renewal", daemon=True
+            )
+            self._thread.start()
+
+    def __enter__(self) -> "CertificateCache":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return sum(1 for e in self._entries.values() if e.current is not None)
+
+    def _renew_at(self, cert: CachedCertificate) -> float:
+        if not cert.certificate.expires:
+            return float("inf")
+        start = max(cert.certificate.valid_after, cert.issued_at)
+        lifetime = cert.certificate.valid_before - start
+        return cert.certificate.valid_before - lifetime * self.renew_fraction
+
+    def get(self, sandbox_id: str, user_id: str, public_key: str) -> CachedCertificate:
+        """A valid certificate for ``user_id``'s key on ``sandbox_id``.
+
+        :raises ApiException: If a new certificate was needed and the
+            server refused it.
+        :raises ValueError: If the server's certificate cannot be parsed.
+        """
+        key = (sandbox_id, user_id, public_key)
+        now = time.time()
+        evicted: List[CachedCertificate] = []
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("certificate cache is closed")
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+                while len(self._entries) > self.max_entries:
+                    _, old = self._entries.popitem(last=False)
+                    if old.current is not None:
+                        evicted.append(old.current)
+            self._entries.move_to_end(key)
+            entry.last_used = now
+            cert = entry.current
+        for old_cert in evicted:
+            self._revoke(old_cert, "evicted")
+        if cert is not None and now < self._renew_at(cert):
+            return cert
+        if cert is not None and cert.remaining(now) > 0 and self._thread is not None:
+            # The renewal thread is due to replace it.
+            return cert
+        with entry.lock:
+            cert = entry.current
+            if cert is None or cert.remaining() <= 0:
+                return self._fetch(key, entry)
+            if time.time() >= max(self._renew_at(cert), entry.retry_at):
+                try:
+                    cert = self._fetch(key, entry)
+                except Exception:
+                    # Still valid; keep handing it out until a retry works.
+                    self._renewal_failed(key, entry)
+        return cert
+
+    def _fetch(self, key: _Key, entry: _Entry) -> CachedCertificate:
+        sandbox_id, user_id, public_key = key
+        request = InternalRestRequestAccessRequest(
+            sandbox_id=sandbox_id,
+            user_id=user_id,
+            public_key=public_key,
+            ttl_minutes=self.ttl_minutes,
+        )
+        with self._cond:
+            self.requests += 1
+        response = self.api.request_access(request)
+        cert = CachedCertificate(
+            response, parse_ssh_certificate(response.certificate or ""), time.time()
+        )
+        with self._cond:
+            entry.current = cert
+            entry.retry_at = 0.0
+            self._changes += 1
+            self._cond.notify_all()
+        return cert
+
+    def invalidate(self, sandbox_id: str, user_id: str, public_key: str) -> None:
+        """Drop and revoke the certificate for a key, if cached."""
+        with self._cond:
+            entry = self._entries.pop((sandbox_id, user_id, public_key), None)
+        if entry is not None and entry.current is not None:
+            self._revoke(entry.current, "invalidated")
+
+    def sweep(self) -> float:
+        """Renew due certificates and evict idle and expired ones.
+
+        Called by the background thread; call it yourself when the cache
+        was created with ``background=False``.
+
+        :return: Unix time of the next renewal or retry that is due.
+        """
+        now = time.time()
+        due: List[Tuple[_Key, _Entry]] = []
+        idle: List[CachedCertificate] = []
+        wake = float("inf")
+        with self._cond:
+            for key, entry in list(self._entries.items()):
+                cert = entry.current
+                if cert is None:
+                    continue
+                if now - entry.last_used > self.idle_timeout:
+                    del self._entries[key]
+                    if cert.remaining(now) > 0:
+                        idle.append(cert)
+                    continue
+                at = max(self._renew_at(cert), entry.retry_at)
+                if at <= now:
+                    due.append((key, entry))
+                else:
+                    wake = min(wake, at)
+        for cert in idle:
+            self._revoke(cert, "idle")
+        for key, entry in due:
+            with entry.lock:
+                if entry.current is None or time.time() < self._renew_at(entry.current):
+                    continue
+                try:
+                    self._fetch(key, entry)
+                except Exception:
+                    self._renewal_failed(key, entry)
+                    continue
+            wake = min(wake, self._renew_at(entry.current))
+        with self._cond:
+            for entry in self._entries.values():
+                if entry.current is not None:
+                    wake = min(wake, max(self._renew_at(entry.current), entry.retry_at))
+        return wake
+
+    def _renewal_failed(self, key: _Key, entry: _Entry) -> None:
+        with self._cond:
+            cert = entry.current
+            if cert is not None and cert.remaining() <= 0:
+                # Expired without a replacement; the next get() fetches.
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                return
+            entry.retry_at = time.time() + self.retry_delay
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                changes = self._changes
+            wake = self.sweep()
+            with self._cond:
+                # Also wake for idle checks and for certificates fetched
+                # since the sweep started.
+                timeout = min(wake - time.time(), self.idle_timeout)
+                self._cond.wait_for(
+                    lambda: self._closed or self._changes != changes,
+                    max(timeout, 0),
+                )
+                if self._closed:
+                    return
+
+    def _revoke(self, cert: CachedCertificate, reason: str) -> None:
+        if not cert.certificate_id:
+            return
+        try:
+            self.api.revoke_certificate(
+                cert.certificate_id, InternalRestRevokeCertificateRequest(reason=reason)
+            )
+        except Exception:
+            # Best effort: the certificate expires soon regardless.
+            with self._cond:
+                self.revoke_failures += 1
+        else:
+            with self._cond:
+                self.revocations += 1
+
+    def close(self, revoke: bool = True) -> None:
+        """Stop renewing and, by default, revoke every cached certificate."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        if revoke:
+            for entry in entries:
+                cert = entry.current
+                if cert is not None and cert.remaining() > 0:
+                    self._revoke(cert, "closed")
+
+    def stats(self) -> Dict[str, int]:
+        """Counters: ``requests``, ``revocations`` and ``revoke_failures``."""
+        with self._cond:
+            return {
+                "requests": self.requests,
+                "revocations": self.revocations,
+                "revoke_failures": self.revoke_failures,
+            }
@@ -0,0 +1,357 @@
+# coding: utf-8
+
+"""Columnar command history for analytics.
+
+:class:`CommandColumns` fills typed column buffers straight from the JSON of
+``list_sandbox_commands`` responses, without building a model per command.
+Exit codes and timestamps live in :mod:`array` buffers, strings in UTF-8
+data buffers indexed by offsets (the Arrow string layout), so the columns
+export to NumPy or Arrow as whole buffers instead of row by row. NumPy and
+PyArrow are optional; only the matching export needs them.
+"""
+
+import datetime
+import json
+import math
+import re
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from virsh_sandbox import cbor
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.exceptions import ApiException
+
+DEFAULT_PAGE_SIZE = 1000
+"""Commands requested per page by :func:`fetch_command_columns`."""
+
+STRING_FIELDS = ("id", "sandbox_id", "command", "stdout", "stderr")
+"""Command fields stored as offset-indexed string columns."""
+
+_TIMESTAMP = re.compile(
+    r"(\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:?\d\d)?$"
+)
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _require(module: str) -> Any:
+    try:
+        return __import__(module)
+    except ImportError as e:
+        raise ImportError(
+            "%s is required for this export; install it with `pip install %s`"
+            % (module, module)
+        ) from e
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[int]:
+    """Parse an RFC 3339 timestamp into microseconds since the Unix epoch.
+
+    Accepts the nanosecond precision Go emits; digits past microseconds are
+    dropped. Timestamps without an offset are taken as UTC.
+
+    :return: Microseconds, or ``None`` for a missing or malformed value.
+    """
+    if not value:
+        return None
+    match = _TIMESTAMP.match(value)
+    if match is None:
+        return None
+    base, fraction, zone = match.groups()
+    text = base.replace(" ", "T") + "." + (fraction or "")[:6].ljust(6, "0")
+    if zone and zone != "Z":
+        text += zone if ":" in zone else zone[:3] + ":" + zone[3:]
+    else:
+        text += "+00:00"
+    try:
+        parsed = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    delta = parsed - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+class StringColumn:
+    """Append-only nullable string column in the Arrow layout.
+
+    Values are UTF-8 encoded back to back in ``data``; value ``i`` is
+    ``data[offsets[i]:offsets[i + 1]]``, and ``valid[i]`` is 0 for nulls.
+    """
+
+    __slots__ = ("data", "offsets", "valid")
+
+    def __init__(self) -> None:
+        self.data = bytearray()
+        self.offsets = array("q", [0])
+        self.valid = bytearray()
+
+    def append(self, value: Optional[str]) -> None:
+        if value is not None:
+            self.data += value.encode("utf-8")
+        self.offsets.append(len(self.data))
+        self.valid.append(value is not None)
+
+    def __len__(self) -> int:
+        return len(self.valid)
+
+    def __getitem__(self, index: int) -> Optional[str]:
+        if index < 0:
+            index += len(self)
+        if not self.valid[index]:
+            return None
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.data[start:end].decode("utf-8")
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the column buffers."""
+        return (
+            len(self.data) + self.offsets.itemsize * len(self.offsets) + len(self.valid)
+        )
+
+    def to_numpy(self) -> Any:
+        """Return an object array of ``str`` and ``None``."""
+        np = _require("numpy")
+        out = np.empty(len(self), dtype=object)
+        out[:] = list(self)
+        return out
+
+    def to_arrow(self) -> Any:
+        """Return a ``pyarrow.LargeStringArray`` built from copies of the buffers."""
+        pa = _require("pyarrow")
+        null_count = len(self) - sum(self.valid)
+        return pa.Array.from_buffers(
+            pa.large_string(),
+            len(self),
+            [
+                pa.py_buffer(_pack_bits(self.valid)) if null_count else None,
+                pa.py_buffer(self.offsets.tobytes()),
+                pa.py_buffer(bytes(self.data)),
+            ],
+            null_count=null_count,
+        )
+
+
+def _pack_bits(flags: bytearray) -> bytes:
+    """Pack one byte per flag into an LSB-first validity bitmap."""
+    out = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            out[i >> 3] |= 1 << (i & 7)
+    return bytes(out)
+
+
+class CommandColumns:
+    """Column buffers for ``FluidRemoteInternalStoreCommand`` records.
+
+    ``exit_code`` is an ``int64`` array with ``exit_code_valid`` marking the
+    rows that have one; ``started_at`` and ``ended_at`` are microseconds since
+    the epoch with their own validity flags. String fields are
+    :class:`StringColumn` objects. ``metadata`` and ``env_json`` are not kept.
+    """
+
+    def __init__(self) -> None:
+        self.exit_code = array("q")
+        self.exit_code_valid = bytearray()
+        self.started_at = array("q")
+        self.ended_at = array("q")
+        self.started_at_valid = bytearray()
+        self.ended_at_valid = bytearray()
+        self.strings: Dict[str, StringColumn] = {
+            name: StringColumn() for name in STRING_FIELDS
+        }
+        self.total: Optional[int] = None
+        """``total`` reported by the last response appended."""
+
+    def __len__(self) -> int:
+        return len(self.exit_code)
+
+    def __getattr__(self, name: str) -> StringColumn:
+        strings = self.__dict__.get("strings")
+        if strings is not None and name in strings:
+            return strings[name]
+        raise AttributeError(
+            "%r object has no attribute %r" % (type(self).__name__, name)
+        )
+
+    def append(self, command: Dict[str, Any]) -> None:
+        """Append one command given as a decoded JSON object."""
+        exit_code = command.get("exit_code")
+        self.exit_code.append(exit_code if exit_code is not None else 0)
+        self.exit_code_valid.append(exit_code is not None)
+        for stamps, valid, key in (
+            (self.started_at, self.started_at_valid, "started_at"),
+            (self.ended_at, self.ended_at_valid, "ended_at"),
+        ):
+            micros = parse_timestamp(command.get(key))
+            stamps.append(micros if micros is not None else 0)
+            valid.append(micros is not None)
+        for name, column in self.strings.items():
+            column.append(command.get(name))
+
+    def extend_from_json(self, body: Any) -> int:
+        """Append the commands of a ``list_sandbox_commands`` response body.
+
+        :param body: Response body as ``bytes``/``str``, or already decoded.
+        :return: Number of commands appended.
+        """
+        doc = json.loads(body) if isinstance(body, (bytes, bytearray, str)) else body
+        commands = doc.get("commands") or []
+        for command in commands:
+            self.append(command)
+        if doc.get("total") is not None:
+            self.total = doc["total"]
+        return len(commands)
+
+    def durations(self) -> array:
+        """Seconds from ``started_at`` to ``ended_at``; NaN where unknown."""
+        out = array("d")
+        for i in range(len(self)):
+            if self.started_at_valid[i] and self.ended_at_valid[i]:
+                out.append((self.ended_at[i] - self.started_at[i]) / 1e6)
+            else:
+                out.append(math.nan)
+        return out
+
+    def exit_code_counts(self) -> Dict[Optional[int], int]:
+        """Number of commands per exit code; ``None`` counts missing codes."""
+        counts: Dict[Optional[int], int] = {}
+        for code, valid in zip(self.exit_code, self.exit_code_valid):
+            key = code if valid else None
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def slowest(self, n: int = 10) -> List[Tuple[float, int]]:
+        """The ``n`` longest commands as ``(seconds, row)``, longest first."""
+        timed = [(d, i) for i, d in enumerate(self.durations()) if not math.isnan(d)]
+        timed.sort(key=lambda item: (-item[0], item[1]))
+        return timed[:n]
+
+    def to_numpy(self) -> Dict[str, Any]:
+        """Export as a dict of NumPy arrays.
+
+        ``exit_code`` is a masked ``int64`` array, ``started_at``/``ended_at``
+        are ``datetime64[us]`` (``NaT`` when missing), ``duration`` is
+        ``float64`` seconds with NaN, and strings are object arrays.
+        """
+        np = _require("numpy")
+
+        def mask(valid: bytearray) -> Any:
+            return np.frombuffer(bytes(valid), dtype=np.uint8) == 0
+
+        started = np.frombuffer(self.started_at.tobytes(), dtype=np.int64)
+        ended = np.frombuffer(self.ended_at.tobytes(), dtype=np.int64)
+        start_missing = mask(self.started_at_valid)
+        end_missing = mask(self.ended_at_valid)
+        duration = (ended - started) / 1e6
+        duration[start_missing | end_missing] = np.nan
+        columns = {
+            "exit_code": np.ma.MaskedArray(
+                np.frombuffer(self.exit_code.tobytes(), dtype=np.int64),
+                mask=mask(self.exit_code_valid),
+            ),
+            "started_at": np.where(
+                start_missing, np.datetime64("NaT"), started.astype("datetime64[us]")
+            ),
+            "ended_at": np.where(
+                end_missing, np.datetime64("NaT"), ended.astype("datetime64[us]")
+            ),
+            "duration": duration,
+        }
+        for name, column in self.strings.items():
+            columns[name] = column.to_numpy()
+        return columns
+
+    def to_arrow(self) -> Any:
+        """Export as a ``pyarrow.Table``; missing values are nulls."""
+        pa = _require("pyarrow")
+
+        def nullable(values: array, valid: bytearray, type_: Any) -> Any:
+            null_count = len(valid) - sum(valid)
+            return pa.Array.from_buffers(
+                type_,
+                len(valid),
+                [
+                    pa.py_buffer(_pack_bits(valid)) if null_count else None,
+                    pa.py_buffer(values.tobytes()),
+                ],
+                null_count=null_count,
+            )
+
+        durations = self.durations()
+        stamp = pa.timestamp("us", tz="UTC")
+        columns = {
+            "exit_code": nullable(self.exit_code, self.exit_code_valid, pa.int64()),
+            "started_at": nullable(self.started_at, self.started_at_valid, stamp),
+            "ended_at": nullable(self.ended_at, self.ended_at_valid, stamp),
+            "duration": pa.array(durations, type=pa.float64(), from_pandas=True),
+        }
+        for name, column in self.strings.items():
+            columns[name] = column.to_arrow()
+        return pa.table(columns)
+
+
+def _fetch_page(
+    api: SandboxApi, sandbox_id: str, columns: CommandColumns, **kwargs: Any
+) -> int:
+    response = api.list_sandbox_commands_without_preload_content(sandbox_id, **kwargs)
+    try:
+        if not 200 <= response.status <= 299:
+            raise ApiException.from_response(
+                http_resp=response,
+                body=None,
+                data=None,
+                body_limit=api.api_client.configuration.exception_body_limit,
+            )
+        return columns.extend_from_json(cbor.load_response(response))
+    finally:
+        response.release_conn()
+
+
+def list_sandbox_commands_columnar(
+    api: SandboxApi,
+    id: str,
+    columns: Optional[CommandColumns] = None,
+    **kwargs: Any,
+) -> CommandColumns:
+    """``SandboxApi.list_sandbox_commands`` into :class:`CommandColumns`.
+
+    Accepts the same ``limit``/``offset`` and ``_``-prefixed options.
+
+    :param columns: Buffers to append to, e.g. to collect several sandboxes.
+    :raises ApiException: On a non-success status.
+    """
+    columns = CommandColumns() if columns is None else columns
+    _fetch_page(api, id, columns, **kwargs)
+    return columns
+
+
+def fetch_command_columns(
+    api: SandboxApi,
+    id: str,
+    columns: Optional[CommandColumns] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    max_rows: Optional[int] = None,
+    **kwargs: Any,
+) -> CommandColumns:
+    """Page through a sandbox's whole command history into columns.
+
+    Pages of ``page_size`` are requested until a short page or ``max_rows``
+    is reached; each page is decoded straight into the buffers. ``total`` in
+    a response counts that page only, so it is not used to stop.
+
+    :param columns: Buffers to append to, e.g. to collect several sandboxes.
+    :raises ApiException: On a non-success status.
+    """
+    columns = CommandColumns() if columns is None else columns
+    fetched = 0
+    while max_rows is None or fetched < max_rows:
+        limit = page_size if max_rows is None else min(page_size, max_rows - fetched)
+        count = _fetch_page(api, id, columns, limit=limit, offset=fetched, **kwargs)
+        fetched += count
+        if count < limit:
+            break
+    return columns
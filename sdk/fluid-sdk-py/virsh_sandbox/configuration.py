@@ -6,6 +6,7 @@ import copy
 import http.client as httplib
 import logging
 import sys
+import threading
 from typing import Any, Dict, List, Optional, TypeVar, Union
 
 T = TypeVar("T")
@@ -33,6 +34,10 @@ class Configuration:
         format.
     :param retries: Number of retries for API requests.
 
+    A Configuration is read, never written, while requests are made, so one
+    instance can be shared by clients in many threads once it is set up.
+    Setting attributes while requests are in flight is not synchronized.
+
     Example:
         >>> config = Configuration(
         ...     host="https://api.example.com",
@@ -42,6 +47,7 @@ class Configuration:
     """
 
     _default: Optional["Configuration"] = None
+    _default_lock = threading.Lock()
 
     def __init__(
         self,
@@ -78,6 +84,34 @@ class Configuration:
         """Temp file folder for downloading files.
         """
 
+        self.spill_threshold: Optional[int] = None
+        """Response size in bytes above which the body is spooled to a temporary
+        file in temp_folder_path and memory-mapped instead of read into memory.
+        None keeps every response in memory.
+        """
+
+        self.spill_string_threshold = 64 * 1024
+        """Encoded size in bytes from which strings in a spilled JSON response
+        (e.g. command stdout/stderr) are returned as lazy SpilledText handles.
+        """
+
+        self.retain_response_body = True
+        """Keep the raw body of successful responses. When False, the body bytes
+        and decoded text are released as soon as the model is built and
+        ApiResponse.raw_data is empty.
+        """
+
+        self.accept_cbor = False
+        """Ask for CBOR instead of JSON. fluid-remote answers the command, diff
+        and list endpoints in CBOR then, which is smaller and faster to decode
+        for large command output and long path lists; see virsh_sandbox.cbor.
+        """
+
+        self.exception_body_limit: Optional[int] = None
+        """Maximum number of characters of a response body kept on
+        ApiException.body; longer bodies are truncated. None keeps them whole.
+        """
+
         # Authentication Settings
         self.api_key = api_key if api_key else {}
         """Dict to store API key(s).
@@ -218,7 +252,9 @@ class Configuration:
         :return: Configuration object.
         """
         if cls._default is None:
-            cls._default = Configuration()
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = Configuration()
         return cls._default
 
     @property
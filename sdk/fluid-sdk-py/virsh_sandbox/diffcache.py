@@ -0,0 +1,327 @@
+# coding: utf-8
+
+"""Cache for snapshot diffs.
+
+Snapshots never change, so the diff between two of them never changes
+either. :class:`DiffCache` keeps ``diff_snapshots`` response bodies in
+memory and, optionally, in a directory. Both tiers are bounded by size and
+evict the least recently used entries first. Entries are addressed by a
+SHA-256 of ``(sandbox_id, from_snapshot, to_snapshot)``.
+
+The server also remembers every diff it has computed.
+:func:`get_cached_diff` reads a stored diff without computing a new one.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from virsh_sandbox import cbor
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.exceptions import ApiException
+from virsh_sandbox.models.fluid_remote_internal_rest_diff_request import (
+    FluidRemoteInternalRestDiffRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_diff_response import (
+    FluidRemoteInternalRestDiffResponse,
+)
+
+DEFAULT_MEMORY_BYTES = 32 * 1024 * 1024
+"""Default size limit of the in-memory tier."""
+
+DEFAULT_DISK_BYTES = 512 * 1024 * 1024
+"""Default size limit of the on-disk tier."""
+
+_SUFFIX = ".json"
+
+
+def cache_key(sandbox_id: str, from_snapshot: str, to_snapshot: str) -> str:
+    """Hex SHA-256 address of a diff."""
+    raw = "\0".join((sandbox_id, from_snapshot, to_snapshot)).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _read(response: Any, api: SandboxApi, missing_ok: bool) -> Optional[bytes]:
+    try:
+        if missing_ok and response.status in (404, 405):
+            response.drain_conn()
+            return None
+        if not 200 <= response.status <= 299:
+            raise ApiException.from_response(
+                http_resp=response,
+                body=None,
+                data=None,
+                body_limit=api.api_client.configuration.exception_body_limit,
+            )
+        if cbor.is_cbor(response.headers.get("Content-Type")):
+            # Entries are stored as JSON whatever the wire format.
+            return json.dumps(cbor.load_response(response)).encode("utf-8")
+        return response.data
+    finally:
+        response.release_conn()
+
+
+def get_cached_diff(
+    api: SandboxApi, id: str, from_snapshot: str, to_snapshot: str, **kwargs: Any
+) -> Optional[FluidRemoteInternalRestDiffResponse]:
+    """Fetch the diff the server stored for a snapshot pair, if any.
+
+    Unlike ``diff_snapshots`` this never computes a diff.
+
+    :return: The stored diff, or ``None`` if the pair was never diffed or
+        the server predates the lookup endpoint.
+    :raises ApiException: On any other non-success status.
+    """
+    body = _lookup(api, id, from_snapshot, to_snapshot, **kwargs)
+    if body is None:
+        return None
+    return FluidRemoteInternalRestDiffResponse.from_json(body.decode("utf-8"))
+
+
+def _lookup(
+    api: SandboxApi,
+    id: str,
+    from_snapshot: str,
+    to_snapshot: str,
+    _request_timeout: Any = None,
+    _headers: Optional[Dict[str, Any]] = None,
+) -> Optional[bytes]:
+    client = api.api_client
+    method, url, headers, _, _ = client.param_serialize(
+        method="GET",
+        resource_path="/v1/sandboxes/{id}/diff",
+        path_params={"id": id},
+        query_params=[("from_snapshot", from_snapshot), ("to_snapshot", to_snapshot)],
+        header_params=dict(_headers or {}, Accept="application/json"),
+    )
+    response = client.call_api(method, url, headers, _request_timeout=_request_timeout)
+    return _read(response.response, api, missing_ok=True)
+
+
+class DiffCache:
+    """Two-tier LRU cache of ``diff_snapshots`` responses.
+
+    The memory tier holds raw response bodies and decodes a fresh model on
+    every hit, so callers cannot change each other's results. The disk tier
+    holds one file per diff in ``directory``. Files are written atomically,
+    and the least recently used ones are deleted once the tier is over
+    ``max_disk_bytes``. Last use is tracked through the file mtime, so the
+    order survives restarts. Several processes may share a directory; each
+    one enforces the limit for the files it knows about.
+
+    Safe to use from several threads.
+
+    :param directory: Directory for the disk tier, created if missing;
+        ``None`` keeps diffs in memory only.
+    :param max_memory_bytes: Size limit of the memory tier.
+    :param max_disk_bytes: Size limit of the disk tier.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_memory_bytes: int = DEFAULT_MEMORY_BYTES,
+        max_disk_bytes: int = DEFAULT_DISK_BYTES,
+    ) -> None:
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory: "collections.OrderedDict[str, bytes]" = collections.OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "collections.OrderedDict[str, int]" = collections.OrderedDict()
+        self._disk_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+
+    def _scan(self) -> None:
+        assert self.directory is not None
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(_SUFFIX):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, name[: -len(_SUFFIX)], st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _path(self, key: str) -> str:
+        assert self.directory is not None
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes held by the memory tier."""
+        return self._memory_bytes
+
+    @property
+    def disk_bytes(self) -> int:
+        """Bytes held by the disk tier, as known to this process."""
+        return self._disk_bytes
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(set(self._memory) | set(self._disk))
+
+    def get_bytes(
+        self, sandbox_id: str, from_snapshot: str, to_snapshot: str
+    ) -> Optional[bytes]:
+        """Raw cached response body for a pair, or ``None``."""
+        key = cache_key(sandbox_id, from_snapshot, to_snapshot)
+        with self._lock:
+            body = self._memory.get(key)
+            if body is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return body
+        body = self._read_disk(key)
+        with self._lock:
+            if body is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, body)
+        return body
+
+    def get(
+        self, sandbox_id: str, from_snapshot: str, to_snapshot: str
+    ) -> Optional[FluidRemoteInternalRestDiffResponse]:
+        """Cached diff for a pair, or ``None``."""
+        body = self.get_bytes(sandbox_id, from_snapshot, to_snapshot)
+        if body is None:
+            return None
+        return FluidRemoteInternalRestDiffResponse.from_json(body.decode("utf-8"))
+
+    def put(
+        self,
+        sandbox_id: str,
+        from_snapshot: str,
+        to_snapshot: str,
+        diff: Any,
+    ) -> None:
+        """Store a diff given as a response model, a dict or raw JSON bytes."""
+        if isinstance(diff, FluidRemoteInternalRestDiffResponse):
+            body = diff.to_json().encode("utf-8")
+        elif isinstance(diff, dict):
+            body = json.dumps(diff).encode("utf-8")
+        else:
+            body = bytes(diff)
+        key = cache_key(sandbox_id, from_snapshot, to_snapshot)
+        with self._lock:
+            self._remember(key, body)
+        self._write_disk(key, body)
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            keys = list(self._disk)
+            self._disk.clear()
+            self._disk_bytes = 0
+        for key in keys:
+            self._unlink(key)
+
+    def diff_snapshots(
+        self,
+        api: SandboxApi,
+        id: str,
+        request: FluidRemoteInternalRestDiffRequest,
+        **kwargs: Any,
+    ) -> FluidRemoteInternalRestDiffResponse:
+        """``SandboxApi.diff_snapshots`` answered from the cache when possible.
+
+        On a miss the server is asked; it returns the diff it already stored
+        for the pair, or computes and stores one. The response body is cached
+        as received.
+
+        :raises ApiException: On a non-success status.
+        """
+        pair = (id, request.from_snapshot, request.to_snapshot)
+        body = self.get_bytes(*pair)
+        if body is None:
+            response = api.diff_snapshots_without_preload_content(id, request, **kwargs)
+            body = _read(response, api, missing_ok=False)
+            assert body is not None
+            self.put(*pair, body)
+        return FluidRemoteInternalRestDiffResponse.from_json(body.decode("utf-8"))
+
+    def _remember(self, key: str, body: bytes) -> None:
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        if len(body) > self.max_memory_bytes:
+            return
+        self._memory[key] = body
+        self._memory_bytes += len(body)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                size = self._disk.pop(key, None)
+                if size is not None:
+                    self._disk_bytes -= size
+            return None
+        with self._lock:
+            size = self._disk.pop(key, None)
+            self._disk_bytes += len(body) - (size or 0)
+            self._disk[key] = len(body)
+        return body
+
+    def _write_disk(self, key: str, body: bytes) -> None:
+        if self.directory is None or len(body) > self.max_disk_bytes:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        with self._lock:
+            size = self._disk.pop(key, None)
+            self._disk_bytes += len(body) - (size or 0)
+            self._disk[key] = len(body)
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self._unlink(key)
+
+    def _unlink(self, key: str) -> None:
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Tuple[int, int]:
+        """``(hits, misses)`` since the cache was created."""
+        return self.hits, self.misses
@@ -0,0 +1,172 @@
+# coding: utf-8
+
+"""Chunked, optionally resumable downloads of file responses.
+
+Bodies are copied from the urllib3 response to disk in fixed-size chunks,
+so memory use does not depend on the size of the artifact.
+"""
+
+import hashlib
+import os
+import re
+from typing import IO, TYPE_CHECKING, Any, Callable, Dict, NamedTuple, Optional
+
+from virsh_sandbox.exceptions import ApiException
+
+if TYPE_CHECKING:
+    from virsh_sandbox.api_client import ApiClient
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+"""Bytes read from the response and written to disk per step."""
+
+ProgressCallback = Callable[[int, Optional[int]], None]
+"""Called after every chunk with ``(bytes_on_disk, total_bytes_or_None)``."""
+
+_CONTENT_RANGE = re.compile(r"bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)")
+
+
+class DownloadResult(NamedTuple):
+    """Outcome of :func:`download_file`."""
+
+    path: str
+    size: int
+    """Size of the complete file on disk, in bytes."""
+    digest: Optional[str]
+    """Hex digest of the whole file, if a hash algorithm was requested."""
+    resumed_from: int
+    """Bytes that were already on disk and not downloaded again."""
+
+
+def write_stream(
+    response: Any,
+    fp: IO[bytes],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    hasher: Optional[Any] = None,
+    progress: Optional[ProgressCallback] = None,
+    offset: int = 0,
+    total: Optional[int] = None,
+) -> int:
+    """Copy an unread urllib3 response body to ``fp`` chunk by chunk.
+
+    :param response: ``urllib3.HTTPResponse`` requested without preloading.
+    :param fp: Binary file object to write to.
+    :param chunk_size: Bytes per read.
+    :param hasher: ``hashlib`` object updated with every chunk.
+    :param progress: Callback receiving ``(offset + written, total)``.
+    :param offset: Bytes already in ``fp`` before this call, for progress.
+    :param total: Expected final size, for progress.
+    :return: Number of bytes written.
+    """
+    written = 0
+    for chunk in response.stream(chunk_size):
+        fp.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+        written += len(chunk)
+        if progress is not None:
+            progress(offset + written, total)
+    return written
+
+
+def _hash_file(path: str, hasher: Any, size: int, chunk_size: int) -> None:
+    with open(path, "rb") as f:
+        remaining = size
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            remaining -= len(chunk)
+
+
+def download_file(
+    api_client: "ApiClient",
+    method: str,
+    url: str,
+    path: str,
+    headers: Optional[Dict[str, str]] = None,
+    resume: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    hash_algorithm: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None,
+    _request_timeout: Any = None,
+) -> DownloadResult:
+    """Download a response body straight to ``path``.
+
+    With ``resume``, an existing partial file is continued with a
+    ``Range: bytes=<size>-`` request. If the server ignores the range and
+    answers ``200`` the file is rewritten from the start; ``416`` with a
+    matching ``Content-Range`` means the file is already complete.
+
+    Example:
+        >>> method, url, headers, _, _ = api_client.param_serialize(
+        ...     "GET", "/v1/artifacts/{id}", path_params={"id": artifact_id})
+        >>> download_file(api_client, method, url, "artifact.tar",
+        ...               headers=headers, resume=True, hash_algorithm="sha256")
+
+    :param api_client: Client whose connection pool is used.
+    :param method: HTTP method, as returned by ``param_serialize``.
+    :param url: Full request URL, as returned by ``param_serialize``.
+    :param path: Destination file.
+    :param headers: Request headers.
+    :param resume: Continue a partial download already at ``path``.
+    :param chunk_size: Bytes per read and write.
+    :param hash_algorithm: ``hashlib`` algorithm name; the digest covers the
+        whole file, including a resumed prefix.
+    :param progress: Callback receiving ``(bytes_on_disk, total_or_None)``.
+    :param _request_timeout: Timeout passed to the REST client.
+    :return: Download summary.
+    :raises ApiException: On a non-success status.
+    """
+    offset = os.path.getsize(path) if resume and os.path.exists(path) else 0
+    request_headers = dict(headers or {})
+    if offset:
+        request_headers["Range"] = "bytes=%d-" % offset
+
+    response_data = api_client.call_api(
+        method, url, header_params=request_headers, _request_timeout=_request_timeout
+    )
+    response = response_data.response
+    try:
+        content_range = _CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+        if response_data.status == 416 and offset and content_range:
+            if content_range.group(2) == str(offset):
+                hasher = hashlib.new(hash_algorithm) if hash_algorithm else None
+                if hasher is not None:
+                    _hash_file(path, hasher, offset, chunk_size)
+                return DownloadResult(
+                    path, offset, hasher.hexdigest() if hasher else None, offset
+                )
+        if not 200 <= response_data.status <= 299:
+            response_data.read()
+            raise ApiException.from_response(
+                http_resp=response_data,
+                body=None,
+                data=None,
+                body_limit=api_client.configuration.exception_body_limit,
+            )
+
+        if response_data.status != 206 or content_range is None:
+            offset = 0
+        elif int(content_range.group(1) or 0) != offset:
+            raise ApiException(
+                status=response_data.status,
+                reason="Unexpected Content-Range: %s" % content_range.group(0),
+            )
+
+        length = response.headers.get("Content-Length")
+        total = offset + int(length) if length is not None else None
+        hasher = hashlib.new(hash_algorithm) if hash_algorithm else None
+        if hasher is not None and offset:
+            _hash_file(path, hasher, offset, chunk_size)
+
+        with open(path, "ab" if offset else "wb") as f:
+            written = write_stream(
+                response, f, chunk_size, hasher, progress, offset, total
+            )
+    finally:
+        response.release_conn()
+
+    return DownloadResult(
+        path, offset + written, hasher.hexdigest() if hasher else None, offset
+    )
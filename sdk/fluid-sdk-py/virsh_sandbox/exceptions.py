@@ -113,6 +113,7 @@ class ApiException(OpenApiException):
         *,
         body: Optional[str] = None,
         data: Optional[Any] = None,
+        body_limit: Optional[int] = None,
     ) -> None:
         self.status = status
         self.reason = reason
@@ -127,11 +128,22 @@ class ApiException(OpenApiException):
                 self.reason = http_resp.reason
             if self.body is None:
                 try:
-                    self.body = http_resp.data.decode("utf-8")
+                    if body_limit is None:
+                        self.body = http_resp.data.decode("utf-8")
+                    else:
+                        # Decode no more than could be kept.
+                        raw = http_resp.data[: body_limit * 4 + 4]
+                        self.body = raw.decode("utf-8", "ignore")
                 except Exception:
                     pass
             self.headers = http_resp.headers
 
+        if body_limit is not None and self.body and len(self.body) > body_limit:
+            self.body = "%s... [truncated at %d characters]" % (
+                self.body[:body_limit],
+                body_limit,
+            )
+
     @classmethod
     def from_response(
         cls,
@@ -139,31 +151,54 @@ class ApiException(OpenApiException):
         http_resp,
         body: Optional[str],
         data: Optional[Any],
+        body_limit: Optional[int] = None,
     ) -> Self:
+        """Raise the exception class matching the response status.
+
+        :param body_limit: Keep at most this many characters of the body.
+        """
+        if body_limit is not None and body is not None and len(body) > body_limit:
+            # Enough to be marked truncated; this frame stays in the
+            # traceback, so it must not hold the whole body.
+            body = body[: body_limit + 1]
         if http_resp.status == 400:
-            raise BadRequestException(http_resp=http_resp, body=body, data=data)
+            raise BadRequestException(
+                http_resp=http_resp, body=body, data=data, body_limit=body_limit
+            )
 
         if http_resp.status == 401:
-            raise UnauthorizedException(http_resp=http_resp, body=body, data=data)
+            raise UnauthorizedException(
+                http_resp=http_resp, body=body, data=data, body_limit=body_limit
+            )
 
         if http_resp.status == 403:
-            raise ForbiddenException(http_resp=http_resp, body=body, data=data)
+            raise ForbiddenException(
+                http_resp=http_resp, body=body, data=data, body_limit=body_limit
+            )
 
         if http_resp.status == 404:
-            raise NotFoundException(http_resp=http_resp, body=body, data=data)
+            raise NotFoundException(
+                http_resp=http_resp, body=body, data=data, body_limit=body_limit
+            )
 
         # Added new conditions for 409 and 422
         if http_resp.status == 409:
-            raise ConflictException(http_resp=http_resp, body=body, data=data)
+            raise ConflictException(
+                http_resp=http_resp, body=body, data=data, body_limit=body_limit
+            )
 
         if http_resp.status == 422:
             raise UnprocessableEntityException(
-                http_resp=http_resp, body=body, data=data
+                http_resp=http_resp, body=body, data=data, body_limit=body_limit
             )
 
         if 500 <= http_resp.status <= 599:
-            raise ServiceException(http_resp=http_resp, body=body, data=data)
-        raise ApiException(http_resp=http_resp, body=body, data=data)
+            raise ServiceException(
+                http_resp=http_resp, body=body, data=data, body_limit=body_limit
+            )
+        raise ApiException(
+            http_resp=http_resp, body=body, data=data, body_limit=body_limit
+        )
 
     def __str__(self):
         """Custom error messages for exception"""
@@ -0,0 +1,161 @@
+# coding: utf-8
+
+"""Interceptors around the stages of an ``ApiClient`` call.
+
+Every generated API method goes through three ``ApiClient`` stages:
+
+* ``param_serialize`` builds the method, URL, headers and body.
+* ``call_api`` sends the request.
+* ``response_deserialize`` turns the response into a model.
+
+An :class:`Interceptor` can wrap any of them. Each hook gets the stage's
+input and ``proceed``, the rest of the chain. It can change the input,
+inspect or replace the result, or return without calling ``proceed`` to
+skip the stage. For example, a cache can answer from memory with
+:func:`make_response`. The first interceptor in the list is the outermost.
+Hooks an interceptor does not override are left out of the chain, and a
+client without interceptors takes the same path as before.
+
+The client is synchronous, so hooks are too. Async code calls the API
+methods through ``loop.run_in_executor``, as ``AsyncAnsibleJobOutputStream``
+does, and the hooks run on that worker thread.
+"""
+
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence
+
+import urllib3
+
+from virsh_sandbox import rest
+from virsh_sandbox.api_response import ApiResponse
+
+
+class Request:
+    """A serialized request on its way to the transport.
+
+    Hooks may change any attribute before calling ``proceed``. ``context``
+    is a dict for the interceptors' own use. The response that comes back
+    carries the request as ``response.request``, so deserialize hooks can
+    see it too.
+    """
+
+    __slots__ = (
+        "method",
+        "url",
+        "headers",
+        "body",
+        "post_params",
+        "timeout",
+        "context",
+    )
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: Any = None,
+        post_params: Any = None,
+        timeout: Any = None,
+    ) -> None:
+        self.method = method
+        self.url = url
+        self.headers = headers if headers is not None else {}
+        self.body = body
+        self.post_params = post_params
+        self.timeout = timeout
+        self.context: Dict[str, Any] = {}
+
+    def __repr__(self) -> str:
+        return "Request(%r, %r)" % (self.method, self.url)
+
+
+class Interceptor:
+    """Base class for interceptors; override the hooks you need."""
+
+    def build(
+        self,
+        params: Dict[str, Any],
+        proceed: Callable[[Dict[str, Any]], Any],
+    ) -> Any:
+        """Wrap ``param_serialize``.
+
+        :param params: Keyword arguments of ``param_serialize``, such as
+            ``method``, ``resource_path``, ``query_params`` and
+            ``header_params``.
+        :return: The ``(method, url, headers, body, post_params)`` tuple.
+        """
+        return proceed(params)
+
+    def send(
+        self,
+        request: Request,
+        proceed: Callable[[Request], rest.RESTResponse],
+    ) -> rest.RESTResponse:
+        """Wrap ``call_api``.
+
+        :return: The response, unread.
+        """
+        return proceed(request)
+
+    def deserialize(
+        self,
+        response: rest.RESTResponse,
+        response_types_map: Optional[Dict[str, Any]],
+        proceed: Callable[..., ApiResponse],
+    ) -> ApiResponse:
+        """Wrap ``response_deserialize``.
+
+        ``response`` has been read. ``proceed`` raises ``ApiException`` for
+        error statuses.
+        """
+        return proceed(response, response_types_map)
+
+
+def make_response(
+    status: int,
+    body: bytes = b"",
+    headers: Optional[Mapping[str, str]] = None,
+    reason: Optional[str] = None,
+) -> rest.RESTResponse:
+    """Build a response without a connection, for a ``send`` hook to return.
+
+    Example:
+        >>> make_response(
+        ...     200, b'{"sandboxes": []}', {"Content-Type": "application/json"}
+        ... )
+    """
+    return rest.RESTResponse(
+        urllib3.HTTPResponse(
+            body=body,
+            headers=dict(headers or {}),
+            status=status,
+            reason=reason,
+            preload_content=False,
+        )
+    )
+
+
+def compose(
+    interceptors: Sequence[Interceptor], hook: str, terminal: Callable[..., Any]
+) -> Optional[Callable[..., Any]]:
+    """Chain the ``hook`` methods of ``interceptors`` in front of ``terminal``.
+
+    :return: The chain, or ``None`` if no interceptor overrides ``hook``.
+    """
+    default = getattr(Interceptor, hook)
+    call = None
+    for interceptor in reversed(interceptors):
+        method = getattr(interceptor, hook, None)
+        if method is None or getattr(method, "__func__", None) is default:
+            continue
+        call = _link(method, call or terminal)
+    return call
+
+
+def _link(
+    method: Callable[..., Any], proceed: Callable[..., Any]
+) -> Callable[..., Any]:
+    def step(*args: Any) -> Any:
+        return method(*args, proceed)
+
+    return step
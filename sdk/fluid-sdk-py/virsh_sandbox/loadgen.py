@@ -0,0 +1,559 @@
+# coding: utf-8
+
+"""Load generator for fluid-remote and its stand-in.
+
+:class:`LoadGenerator` runs sandbox lifecycles from worker threads through
+the SDK. A lifecycle creates a sandbox and runs commands in it. It can
+also snapshot, diff and request SSH access, and then it destroys the
+sandbox. Every call is timed, and :class:`LoadReport` has the count,
+error count, throughput and p50/p99 latency per operation.
+
+From the command line, against a running server or an in-process
+:class:`~virsh_sandbox.standin.StandinServer`::
+
+    python -m virsh_sandbox.loadgen --standin --create lognormal:0.2,0.5 \\
+        --fail run=0.01 -w 16 -d 30
+    python -m virsh_sandbox.loadgen --api http://fluid:8080 -w 4 -n 20
+    python -m virsh_sandbox.loadgen --api unix:///run/fluid-remote.sock -n 20
+
+``--transports REQUESTS`` instead compares the latency of single requests
+over loopback TCP and a Unix domain socket, and ``--formats REPEAT`` the
+size and decode time of JSON and CBOR responses.
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from virsh_sandbox import cbor, standin
+from virsh_sandbox.api.access_api import AccessApi
+from virsh_sandbox.api.health_api import HealthApi
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.models.fluid_remote_internal_rest_create_sandbox_request import (
+    FluidRemoteInternalRestCreateSandboxRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_diff_request import (
+    FluidRemoteInternalRestDiffRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_run_command_request import (
+    FluidRemoteInternalRestRunCommandRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_snapshot_request import (
+    FluidRemoteInternalRestSnapshotRequest,
+)
+from virsh_sandbox.models.internal_rest_request_access_request import (
+    InternalRestRequestAccessRequest,
+)
+
+_PUBLIC_KEY = (
+    "ssh-ed25519 "
+    "AAAAC3NzaC1lZDI1NTE5AAAAIAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA loadgen"
+)
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list; 0.0 if it is empty."""
+    if not ordered:
+        return 0.0
+    rank = max(int(-(-p * len(ordered) // 100)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class OperationStats(NamedTuple):
+    """Timings of one operation over a run."""
+
+    name: str
+    count: int
+    errors: int
+    throughput: float
+    """Completed calls per second of wall time."""
+    p50: float
+    p99: float
+    max: float
+
+
+class LoadReport(NamedTuple):
+    """Result of :meth:`LoadGenerator.run`."""
+
+    operations: Dict[str, OperationStats]
+    lifecycles: int
+    """Lifecycles finished, whether or not every call in them succeeded."""
+    wall_seconds: float
+
+    def format(self) -> str:
+        """Render the report as a table, one operation per row."""
+        lines = [
+            "%-10s %8s %7s %9s %9s %9s %9s"
+            % ("operation", "calls", "errors", "calls/s", "p50 ms", "p99 ms", "max ms")
+        ]
+        for op in self.operations.values():
+            lines.append(
+                "%-10s %8d %7d %9.1f %9.1f %9.1f %9.1f"
+                % (
+                    op.name,
+                    op.count,
+                    op.errors,
+                    op.throughput,
+                    op.p50 * 1000,
+                    op.p99 * 1000,
+                    op.max * 1000,
+                )
+            )
+        lines.append(
+            "%d lifecycles in %.1f s (%.2f/s)"
+            % (
+                self.lifecycles,
+                self.wall_seconds,
+                self.lifecycles / self.wall_seconds if self.wall_seconds else 0.0,
+            )
+        )
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "lifecycles": self.lifecycles,
+            "wall_seconds": self.wall_seconds,
+            "operations": {k: v._asdict() for k, v in self.operations.items()},
+        }
+
+
+class LoadGenerator:
+    """Drive sandbox lifecycles concurrently and time every call.
+
+    :param api_client: Client for the server under test; the default client
+        if omitted. Give its configuration a ``connection_pool_maxsize`` of
+        at least the number of workers.
+    :param source_vm: Base VM to clone.
+    :param commands: Commands to run per sandbox.
+    :param snapshot_rate: Share of lifecycles that snapshot before and
+        after the commands and diff the two snapshots.
+    :param access_rate: Share of lifecycles that request SSH access.
+    :param agent_id: Agent ID for created sandboxes.
+    :param seed: Seed for choosing which lifecycles snapshot or request
+        access.
+    """
+
+    def __init__(
+        self,
+        api_client: Optional[ApiClient] = None,
+        source_vm: str = "ubuntu-base",
+        commands: int = 3,
+        snapshot_rate: float = 0.5,
+        access_rate: float = 0.0,
+        agent_id: str = "loadgen",
+        seed: Optional[int] = None,
+    ) -> None:
+        self.sandboxes = SandboxApi(api_client)
+        self.access = AccessApi(api_client)
+        self.source_vm = source_vm
+        self.commands = commands
+        self.snapshot_rate = snapshot_rate
+        self.access_rate = access_rate
+        self.agent_id = agent_id
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._timings: Dict[str, List[float]] = {}
+        self._errors: Dict[str, int] = {}
+
+    def _timed(self, name: str, call: Callable[[], Any]) -> Any:
+        begin = time.perf_counter()
+        try:
+            return call()
+        except Exception:
+            with self._lock:
+                self._errors[name] = self._errors.get(name, 0) + 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - begin
+            with self._lock:
+                self._timings.setdefault(name, []).append(elapsed)
+
+    def lifecycle(self) -> None:
+        """Run one sandbox lifecycle; failed calls are counted, not raised.
+
+        A sandbox that was created is always destroyed.
+        """
+        with self._lock:
+            snapshot = self._rng.random() < self.snapshot_rate
+            access = self._rng.random() < self.access_rate
+        try:
+            created = self._timed(
+                "create",
+                lambda: self.sandboxes.create_sandbox(
+                    FluidRemoteInternalRestCreateSandboxRequest(
+                        source_vm_name=self.source_vm,
+                        agent_id=self.agent_id,
+                        auto_start=True,
+                        wait_for_ip=True,
+                    )
+                ),
+            )
+        except Exception:
+            return
+        sandbox_id = created.sandbox.id
+        try:
+            if snapshot:
+                self._snapshot(sandbox_id, "before")
+            for i in range(self.commands):
+                request = FluidRemoteInternalRestRunCommandRequest(
+                    command="echo loadgen %d" % i
+                )
+                self._timed(
+                    "run",
+                    lambda: self.sandboxes.run_sandbox_command(sandbox_id, request),
+                )
+            if snapshot:
+                self._snapshot(sandbox_id, "after")
+                request = FluidRemoteInternalRestDiffRequest(
+                    from_snapshot="before", to_snapshot="after"
+                )
+                self._timed(
+                    "diff", lambda: self.sandboxes.diff_snapshots(sandbox_id, request)
+                )
+            if access:
+                request = InternalRestRequestAccessRequest(
+                    sandbox_id=sandbox_id, user_id=self.agent_id, public_key=_PUBLIC_KEY
+                )
+                self._timed("access", lambda: self.access.request_access(request))
+        except Exception:
+            pass
+        finally:
+            try:
+                self._timed(
+                    "destroy", lambda: self.sandboxes.destroy_sandbox(sandbox_id)
+                )
+            except Exception:
+                pass
+
+    def _snapshot(self, sandbox_id: str, name: str) -> None:
+        request = FluidRemoteInternalRestSnapshotRequest(name=name)
+        self._timed(
+            "snapshot", lambda: self.sandboxes.create_snapshot(sandbox_id, request)
+        )
+
+    def run(
+        self,
+        workers: int = 4,
+        lifecycles: Optional[int] = None,
+        duration: Optional[float] = None,
+    ) -> LoadReport:
+        """Run lifecycles from ``workers`` threads.
+
+        Stops after ``lifecycles`` in total or once ``duration`` seconds
+        have passed, whichever comes first; lifecycles under way are
+        finished. With neither, each worker runs one lifecycle.
+        """
+        if lifecycles is None and duration is None:
+            lifecycles = workers
+        deadline = time.monotonic() + duration if duration is not None else None
+        remaining = [lifecycles]
+        done = [0]
+
+        def claim() -> bool:
+            with self._lock:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                if remaining[0] is not None:
+                    if remaining[0] <= 0:
+                        return False
+                    remaining[0] -= 1
+                return True
+
+        def worker() -> None:
+            while claim():
+                self.lifecycle()
+                with self._lock:
+                    done[0] += 1
+
+        with self._lock:
+            self._timings = {}
+            self._errors = {}
+        begin = time.perf_counter()
+        with ThreadPoolExecutor(workers, thread_name_prefix="loadgen") as pool:
+            for future in [pool.submit(worker) for _ in range(workers)]:
+                future.result()
+        wall = time.perf_counter() - begin
+
+        operations = {}
+        for name, timings in self._timings.items():
+            ordered = sorted(timings)
+            operations[name] = OperationStats(
+                name,
+                len(ordered),
+                self._errors.get(name, 0),
+                len(ordered) / wall if wall else 0.0,
+                percentile(ordered, 50),
+                percentile(ordered, 99),
+                ordered[-1],
+            )
+        return LoadReport(operations, done[0], wall)
+
+
+def transport_latency(requests: int = 5000) -> Dict[str, List[float]]:
+    """Time sequential health checks over loopback TCP and a Unix socket.
+
+    Both go to in-process stand-in servers sharing one state, through one
+    kept-alive connection each. Returns the sorted timings per transport.
+    """
+    timings = {}
+    state = standin.StandinState()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fluid-remote.sock")
+        with standin.StandinServer(state) as tcp, standin.StandinServer(
+            state, unix_socket=path
+        ) as unix:
+            for name, server in (("tcp", tcp), ("unix", unix)):
+                health = HealthApi(ApiClient(Configuration(host=server.url)))
+                health.get_health()  # connect before timing
+                elapsed = []
+                for _ in range(requests):
+                    begin = time.perf_counter()
+                    health.get_health()
+                    elapsed.append(time.perf_counter() - begin)
+                timings[name] = sorted(elapsed)
+    return timings
+
+
+def _print_transport_latency(timings: Dict[str, List[float]]) -> None:
+    print(
+        "%-9s %9s %9s %9s %9s" % ("transport", "mean us", "p50 us", "p99 us", "max us")
+    )
+    for name, ordered in timings.items():
+        print(
+            "%-9s %9.1f %9.1f %9.1f %9.1f"
+            % (
+                name,
+                sum(ordered) / len(ordered) * 1e6,
+                percentile(ordered, 50) * 1e6,
+                percentile(ordered, 99) * 1e6,
+                ordered[-1] * 1e6,
+            )
+        )
+
+
+class FormatTiming(NamedTuple):
+    """Size and median decode times of one response in one wire format."""
+
+    payload: str
+    format: str
+    size: int
+    parse: float
+    """Seconds to decode the body into dicts and lists."""
+    model: float
+    """Seconds for ``ApiClient.deserialize`` into the response model."""
+
+
+def _format_payloads(scale: int) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    """Responses of the endpoints fluid-remote can answer in CBOR, shaped as
+    it returns them, with command output, diffs and lists about ``scale``
+    times the size of a typical one."""
+    rng = random.Random(0)
+    now = "2024-01-15T10:30:00.123456789Z"
+    lines = [
+        '%s systemd[1]: Started "unit-%d.service"\twith pid %d' % (now, i, 1000 + i)
+        for i in range(64)
+    ] + ["  ✓ check passed: /etc/app/conf.d/%02d.yaml" % i for i in range(16)]
+    commands = [
+        {
+            "id": "CMD-%08x" % i,
+            "sandbox_id": "SBX-00000001",
+            "command": "apt-get install -y nginx",
+            "stdout": "\n".join(rng.choice(lines) for _ in range(100 * scale)),
+            "stderr": "W: apt does not have a stable CLI interface.\n",
+            "exit_code": 0,
+            "started_at": now,
+            "ended_at": now,
+            "metadata": {"user": "sandbox", "workdir": "/root", "timeout": 60 * 10**9},
+        }
+        for i in range(10)
+    ]
+    paths = [
+        "/usr/share/doc/pkg-%d/%s-%d.gz" % (i % 97, rng.choice("abcdefgh") * 6, i)
+        for i in range(500 * scale)
+    ]
+    diff = {
+        "id": "DIF-00000001",
+        "sandbox_id": "SBX-00000001",
+        "from_snapshot": "before",
+        "to_snapshot": "after",
+        "created_at": now,
+        "diff_json": {
+            "files_added": paths[::2],
+            "files_modified": paths[1::4],
+            "files_removed": paths[3::4],
+            "packages_added": [
+                {"name": "lib%d" % i, "version": "1.%d.0-1" % i} for i in range(50)
+            ],
+            "commands_run": [{"cmd": c["command"], "exit_code": 0} for c in commands],
+        },
+    }
+    sandboxes = [
+        {
+            "id": "SBX-%08x" % i,
+            "sandbox_name": "sbx-%08x" % i,
+            "agent_id": "agent-%d" % (i % 8),
+            "job_id": "JOB-%08x" % i,
+            "base_image": "ubuntu-base",
+            "network": "default",
+            "state": "RUNNING",
+            "ip_address": "10.0.%d.%d" % (i >> 8, i & 255),
+            "ttl_seconds": 3600,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(20 * scale)
+    ]
+    return {
+        "commands": (
+            "FluidRemoteInternalRestListSandboxCommandsResponse",
+            {"commands": commands, "total": len(commands)},
+        ),
+        "diff": ("FluidRemoteInternalRestDiffResponse", {"diff": diff}),
+        "sandboxes": (
+            "FluidRemoteInternalRestListSandboxesResponse",
+            {"sandboxes": sandboxes, "total": len(sandboxes)},
+        ),
+    }
+
+
+def wire_formats(repeat: int = 20, scale: int = 10) -> List[FormatTiming]:
+    """Compare JSON and CBOR bodies of the command, diff and list endpoints.
+
+    The JSON is written as fluid-remote writes it, UTF-8 without HTML
+    escaping. Decode times are medians of ``repeat`` runs and include
+    decoding the JSON body's bytes to text.
+    """
+    client = ApiClient(Configuration())
+    results = []
+    for payload, (model, doc) in _format_payloads(scale).items():
+        bodies = (
+            (
+                "json",
+                json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode(),
+                "application/json; charset=utf-8",
+            ),
+            ("cbor", cbor.dumps(doc), cbor.CONTENT_TYPE),
+        )
+        for name, body, content_type in bodies:
+            binary = cbor.is_cbor(content_type)
+
+            def parse(body: bytes = body, binary: bool = binary) -> Any:
+                return cbor.loads(body) if binary else json.loads(body.decode())
+
+            def deserialize(
+                body: bytes = body,
+                binary: bool = binary,
+                content_type: str = content_type,
+            ) -> Any:
+                data = body if binary else body.decode()
+                return client.deserialize(data, model, content_type)
+
+            results.append(
+                FormatTiming(
+                    payload,
+                    name,
+                    len(body),
+                    _median_seconds(parse, repeat),
+                    _median_seconds(deserialize, repeat),
+                )
+            )
+    return results
+
+
+def _median_seconds(fn: Callable[[], Any], repeat: int) -> float:
+    elapsed = []
+    for _ in range(max(repeat, 1)):
+        begin = time.perf_counter()
+        fn()
+        elapsed.append(time.perf_counter() - begin)
+    return percentile(sorted(elapsed), 50)
+
+
+def _print_wire_formats(results: List[FormatTiming]) -> None:
+    print(
+        "%-9s %-6s %11s %9s %9s"
+        % ("payload", "format", "bytes", "parse ms", "model ms")
+    )
+    for r in results:
+        print(
+            "%-9s %-6s %11d %9.2f %9.2f"
+            % (r.payload, r.format, r.size, r.parse * 1e3, r.model * 1e3)
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Drive sandbox lifecycles through the SDK and report latency."
+    )
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--api", help="base URL of the server under test")
+    target.add_argument(
+        "--standin", action="store_true", help="start an in-process stand-in server"
+    )
+    target.add_argument(
+        "--transports",
+        type=int,
+        metavar="REQUESTS",
+        help="only compare request latency over loopback TCP and a Unix socket",
+    )
+    target.add_argument(
+        "--formats",
+        type=int,
+        metavar="REPEAT",
+        help="only compare JSON and CBOR payload sizes and decode times",
+    )
+    parser.add_argument("-w", "--workers", type=int, default=4)
+    parser.add_argument("-n", "--lifecycles", type=int, help="total lifecycles to run")
+    parser.add_argument("-d", "--duration", type=float, help="seconds to run for")
+    parser.add_argument("--commands", type=int, default=3, help="commands per sandbox")
+    parser.add_argument("--snapshot-rate", type=float, default=0.5)
+    parser.add_argument("--access-rate", type=float, default=0.0)
+    parser.add_argument("--source-vm", default="ubuntu-base")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    standin.add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.transports:
+        _print_transport_latency(transport_latency(args.transports))
+        return
+    if args.formats:
+        _print_wire_formats(wire_formats(args.formats))
+        return
+
+    server = None
+    host = args.api
+    if args.standin:
+        state = standin.state_from_arguments(args)
+        state.vms = tuple(dict.fromkeys(state.vms + (args.source_vm,)))
+        server = standin.StandinServer(state).start()
+        host = server.url
+    config = Configuration(host=host)
+    config.connection_pool_maxsize = max(args.workers, 1)
+    try:
+        generator = LoadGenerator(
+            ApiClient(config),
+            source_vm=args.source_vm,
+            commands=args.commands,
+            snapshot_rate=args.snapshot_rate,
+            access_rate=args.access_rate,
+            seed=args.seed,
+        )
+        report = generator.run(args.workers, args.lifecycles, args.duration)
+    finally:
+        if server is not None:
+            server.close()
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        print(report.format())
+
+
+if __name__ == "__main__":
+    main()
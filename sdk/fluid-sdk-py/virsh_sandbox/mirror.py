@@ -0,0 +1,477 @@
+# coding: utf-8
+
+"""Local SQLite mirror of sandboxes, command history and access sessions.
+
+:class:`SandboxMirror` copies what the server knows into one SQLite file so
+reports and ad-hoc queries run locally instead of paging the API every time.
+Syncs are incremental. Sandboxes and commands are listed newest first, so
+each list is paged only until it reaches a record the mirror already holds.
+Sandboxes that can still change state are refreshed by state. Sandboxes
+that were destroyed and have had their final commands copied are not asked
+for commands again.
+
+The server has no list endpoints for snapshots and diffs. Pass the results
+of ``create_snapshot`` and ``diff_snapshots`` to :meth:`SandboxMirror.record_snapshot`
+and :meth:`SandboxMirror.record_diff` to keep them in the same file.
+"""
+
+import datetime
+import json
+import sqlite3
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from virsh_sandbox import cbor
+from virsh_sandbox.api.access_api import AccessApi
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.exceptions import ApiException, NotFoundException
+
+LIVE_STATES = ("CREATED", "STARTING", "RUNNING", "STOPPED")
+"""Sandbox states that can still change; re-read on every sync."""
+
+DEFAULT_PAGE_SIZE = 200
+"""Records requested per page while syncing."""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sandboxes (
+    id TEXT PRIMARY KEY,
+    sandbox_name TEXT,
+    agent_id TEXT,
+    job_id TEXT,
+    base_image TEXT,
+    network TEXT,
+    ip_address TEXT,
+    state TEXT,
+    ttl_seconds INTEGER,
+    created_at TEXT,
+    updated_at TEXT,
+    commands_final INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sandboxes_state ON sandboxes (state);
+CREATE INDEX IF NOT EXISTS sandboxes_agent ON sandboxes (agent_id);
+CREATE INDEX IF NOT EXISTS sandboxes_job ON sandboxes (job_id);
+CREATE INDEX IF NOT EXISTS sandboxes_created ON sandboxes (created_at);
+
+CREATE TABLE IF NOT EXISTS commands (
+    id TEXT PRIMARY KEY,
+    sandbox_id TEXT NOT NULL,
+    command TEXT,
+    stdout TEXT,
+    stderr TEXT,
+    exit_code INTEGER,
+    started_at TEXT,
+    ended_at TEXT,
+    env_json TEXT,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS commands_sandbox ON commands (sandbox_id, started_at);
+CREATE INDEX IF NOT EXISTS commands_exit_code ON commands (exit_code);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    sandbox_id TEXT,
+    certificate_id TEXT,
+    user_id TEXT,
+    vm_id TEXT,
+    vm_ip_address TEXT,
+    source_ip TEXT,
+    status TEXT,
+    started_at TEXT,
+    ended_at TEXT,
+    duration_seconds INTEGER,
+    active INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_sandbox ON sessions (sandbox_id, started_at);
+CREATE INDEX IF NOT EXISTS sessions_user ON sessions (user_id);
+CREATE INDEX IF NOT EXISTS sessions_active ON sessions (active);
+
+CREATE TABLE IF NOT EXISTS snapshots (
+    id TEXT PRIMARY KEY,
+    sandbox_id TEXT,
+    name TEXT,
+    kind TEXT,
+    ref TEXT,
+    meta_json TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS snapshots_sandbox ON snapshots (sandbox_id, created_at);
+
+CREATE TABLE IF NOT EXISTS diffs (
+    id TEXT PRIMARY KEY,
+    sandbox_id TEXT,
+    from_snapshot TEXT,
+    to_snapshot TEXT,
+    diff_json TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS diffs_sandbox ON diffs (sandbox_id, created_at);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_SANDBOX_COLUMNS = (
+    "id",
+    "sandbox_name",
+    "agent_id",
+    "job_id",
+    "base_image",
+    "network",
+    "ip_address",
+    "state",
+    "ttl_seconds",
+    "created_at",
+    "updated_at",
+)
+_COMMAND_COLUMNS = (
+    "id",
+    "sandbox_id",
+    "command",
+    "stdout",
+    "stderr",
+    "exit_code",
+    "started_at",
+    "ended_at",
+    "env_json",
+    "metadata",
+)
+_SESSION_COLUMNS = (
+    "id",
+    "sandbox_id",
+    "certificate_id",
+    "user_id",
+    "vm_id",
+    "vm_ip_address",
+    "source_ip",
+    "status",
+    "started_at",
+    "ended_at",
+    "duration_seconds",
+)
+_SNAPSHOT_COLUMNS = (
+    "id",
+    "sandbox_id",
+    "name",
+    "kind",
+    "ref",
+    "meta_json",
+    "created_at",
+)
+_DIFF_COLUMNS = (
+    "id",
+    "sandbox_id",
+    "from_snapshot",
+    "to_snapshot",
+    "diff_json",
+    "created_at",
+)
+
+
+class SyncStats(NamedTuple):
+    """What one :meth:`SandboxMirror.sync` wrote and how many calls it made."""
+
+    sandboxes: int
+    commands: int
+    sessions: int
+    requests: int
+
+
+def _row(entry: Dict[str, Any], columns: Iterable[str]) -> List[Any]:
+    values = []
+    for name in columns:
+        value = entry.get(name)
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value, separators=(",", ":"), sort_keys=True)
+        values.append(value)
+    return values
+
+
+def _upsert_sql(table: str, columns: Iterable[str]) -> str:
+    # An upsert rather than INSERT OR REPLACE, so columns the mirror owns
+    # (commands_final, active) keep their values.
+    columns = tuple(columns)
+    return "INSERT INTO %s (%s) VALUES (%s) ON CONFLICT (id) DO UPDATE SET %s" % (
+        table,
+        ", ".join(columns),
+        ", ".join("?" * len(columns)),
+        ", ".join("%s = excluded.%s" % (c, c) for c in columns[1:]),
+    )
+
+
+class SandboxMirror:
+    """Incrementally synced SQLite copy of one server's sandbox data.
+
+    Tables: ``sandboxes``, ``commands``, ``sessions``, ``snapshots``,
+    ``diffs`` and ``sync_state``. Columns follow the JSON field names;
+    nested objects are stored as JSON text. Use :meth:`query` or
+    :attr:`connection` to read them.
+
+    Each sandbox list, and each sandbox's command list, is written in one
+    transaction. An interrupted sync never leaves a gap that a later sync
+    would skip.
+
+    The SQLite connection belongs to the thread that created the mirror.
+
+    :param path: Database file, created if missing. ``":memory:"`` works
+        for throwaway use.
+    :param api_client: Client for the server to mirror; the default client
+        if omitted.
+    :param page_size: Records requested per page.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        api_client: Optional[ApiClient] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> None:
+        if page_size < 1:
+            raise ValueError("page_size must be positive")
+        self.api_client = api_client or ApiClient.get_default()
+        self.sandbox_api = SandboxApi(self.api_client)
+        self.access_api = AccessApi(self.api_client)
+        self.page_size = page_size
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        self._requests = 0
+
+    def __enter__(self) -> "SandboxMirror":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self.connection.close()
+
+    def query(self, sql: str, *params: Any) -> List[sqlite3.Row]:
+        """Run a read query against the mirror and return all rows."""
+        return self.connection.execute(sql, params).fetchall()
+
+    @property
+    def last_sync(self) -> Optional[str]:
+        """UTC ISO timestamp of the last completed :meth:`sync`, if any."""
+        row = self.connection.execute(
+            "SELECT value FROM sync_state WHERE key = 'last_sync'"
+        ).fetchone()
+        return row[0] if row else None
+
+    def sync(self, commands: bool = True, sessions: bool = True) -> SyncStats:
+        """Bring the mirror up to date with the server.
+
+        :param commands: Also sync command history.
+        :param sessions: Also sync active access sessions.
+        :return: Rows written per table and API calls made.
+        :raises ApiException: If the server rejects a request. Everything
+            synced before the failure is kept.
+        """
+        self._requests = 0
+        sandboxes = self._sync_sandboxes()
+        command_rows = self._sync_commands() if commands else 0
+        session_rows = self._sync_sessions() if sessions else 0
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('last_sync', ?)",
+                (now,),
+            )
+        return SyncStats(sandboxes, command_rows, session_rows, self._requests)
+
+    def record_snapshot(self, snapshot: Any) -> None:
+        """Store a snapshot returned by ``create_snapshot``.
+
+        Accepts the ``FluidRemoteInternalStoreSnapshot`` model, the
+        ``create_snapshot`` response holding it, or a plain dict.
+        """
+        self._record("snapshots", _SNAPSHOT_COLUMNS, snapshot, "snapshot")
+
+    def record_diff(self, diff: Any) -> None:
+        """Store a diff returned by ``diff_snapshots``.
+
+        Accepts the ``FluidRemoteInternalStoreDiff`` model, the
+        ``diff_snapshots`` response holding it, or a plain dict.
+        """
+        self._record("diffs", _DIFF_COLUMNS, diff, "diff")
+
+    def _record(self, table: str, columns: Iterable[str], obj: Any, key: str) -> None:
+        entry = obj if isinstance(obj, dict) else obj.to_dict()
+        if key in entry and isinstance(entry[key], dict):
+            entry = entry[key]
+        if not entry.get("id"):
+            raise ValueError("%s has no id" % key)
+        with self.connection:
+            self.connection.execute(_upsert_sql(table, columns), _row(entry, columns))
+
+    def _get(self, method: Callable[..., Any], **kwargs: Any) -> Dict[str, Any]:
+        self._requests += 1
+        response = method(**kwargs)
+        try:
+            if not 200 <= response.status <= 299:
+                raise ApiException.from_response(
+                    http_resp=response,
+                    body=None,
+                    data=None,
+                    body_limit=self.api_client.configuration.exception_body_limit,
+                )
+            return cbor.load_response(response)
+        finally:
+            response.release_conn()
+
+    def _pages(
+        self, method: Callable[..., Any], key: str, **kwargs: Any
+    ) -> Iterable[List[Dict[str, Any]]]:
+        offset = 0
+        while True:
+            doc = self._get(method, limit=self.page_size, offset=offset, **kwargs)
+            entries = doc.get(key) or []
+            if entries:
+                yield entries
+            if len(entries) < self.page_size:
+                return
+            offset += len(entries)
+
+    def _known(self, table: str, ids: List[str]) -> Dict[str, sqlite3.Row]:
+        if not ids:
+            return {}
+        rows = self.connection.execute(
+            "SELECT * FROM %s WHERE id IN (%s)" % (table, ", ".join("?" * len(ids))),
+            ids,
+        )
+        return {row["id"]: row for row in rows}
+
+    def _sync_sandboxes(self) -> int:
+        list_sandboxes = self.sandbox_api.list_sandboxes_without_preload_content
+        upsert = _upsert_sql("sandboxes", _SANDBOX_COLUMNS)
+        # New sandboxes: newest first, stopping at the first one already
+        # mirrored with the same updated_at.
+        fresh = []
+        for page in self._pages(list_sandboxes, "sandboxes"):
+            known = self._known("sandboxes", [e.get("id") for e in page])
+            reached = False
+            for entry in page:
+                row = known.get(entry.get("id"))
+                if row is not None and row["updated_at"] == entry.get("updated_at"):
+                    reached = True
+                    break
+                fresh.append(entry)
+            if reached:
+                break
+
+        # State changes: everything still live on the server, plus a direct
+        # read of any sandbox the mirror thinks is live but the server no
+        # longer lists as such.
+        live: Dict[str, Dict[str, Any]] = {}
+        for state in LIVE_STATES:
+            for page in self._pages(list_sandboxes, "sandboxes", state=state):
+                live.update((e["id"], e) for e in page if e.get("id"))
+        stale = [
+            row["id"]
+            for row in self.connection.execute(
+                "SELECT id FROM sandboxes WHERE state IN (%s)"
+                % ", ".join("?" * len(LIVE_STATES)),
+                LIVE_STATES,
+            )
+            if row["id"] not in live
+        ]
+        settled: List[Dict[str, Any]] = []
+        destroyed: List[str] = []
+        for sandbox_id in stale:
+            try:
+                doc = self._get(
+                    self.sandbox_api.get_sandbox_without_preload_content, id=sandbox_id
+                )
+            except NotFoundException:
+                # Destroyed sandboxes are hidden from reads, but their
+                # commands can still be listed; keep the row so the last
+                # of them are copied before it is marked final.
+                destroyed.append(sandbox_id)
+                continue
+            if doc.get("sandbox"):
+                settled.append(doc["sandbox"])
+
+        changed = {
+            e["id"]: e for e in fresh + list(live.values()) + settled if e.get("id")
+        }
+        with self.connection:
+            self.connection.executemany(
+                upsert, [_row(e, _SANDBOX_COLUMNS) for e in changed.values()]
+            )
+            self.connection.executemany(
+                "UPDATE sandboxes SET state = 'DESTROYED', commands_final = 0"
+                " WHERE id = ?",
+                [(i,) for i in destroyed],
+            )
+        return len(changed) + len(destroyed)
+
+    def _sync_commands(self) -> int:
+        upsert = _upsert_sql("commands", _COMMAND_COLUMNS)
+        pending = self.connection.execute(
+            "SELECT id, state FROM sandboxes WHERE commands_final = 0"
+        ).fetchall()
+        written = 0
+        for sandbox in pending:
+            fresh: List[Dict[str, Any]] = []
+            try:
+                for page in self._pages(
+                    self.sandbox_api.list_sandbox_commands_without_preload_content,
+                    "commands",
+                    id=sandbox["id"],
+                ):
+                    known = self._known("commands", [e.get("id") for e in page])
+                    new = [e for e in page if e.get("id") not in known]
+                    fresh.extend(new)
+                    if len(new) < len(page):
+                        break
+            except NotFoundException:
+                pass
+            # Commands never change once recorded, so a settled sandbox
+            # whose history has been read in full is done for good.
+            final = 0 if sandbox["state"] in LIVE_STATES else 1
+            with self.connection:
+                self.connection.executemany(
+                    upsert, [_row(e, _COMMAND_COLUMNS) for e in fresh]
+                )
+                self.connection.execute(
+                    "UPDATE sandboxes SET commands_final = ? WHERE id = ?",
+                    (final, sandbox["id"]),
+                )
+            written += len(fresh)
+        return written
+
+    def _sync_sessions(self) -> int:
+        # The server lists only the open sessions of one sandbox at a time.
+        # Sessions that drop out of that list have closed; the mirror keeps
+        # their last known row and clears ``active``.
+        upsert = _upsert_sql("sessions", _SESSION_COLUMNS)
+        live = [
+            row["id"]
+            for row in self.connection.execute(
+                "SELECT id FROM sandboxes WHERE state IN (%s)"
+                % ", ".join("?" * len(LIVE_STATES)),
+                LIVE_STATES,
+            )
+        ]
+        seen: Set[str] = set()
+        entries: List[Dict[str, Any]] = []
+        for sandbox_id in live:
+            doc = self._get(
+                self.access_api.list_sessions_without_preload_content,
+                sandbox_id=sandbox_id,
+            )
+            for entry in doc.get("sessions") or []:
+                if entry.get("id") and entry["id"] not in seen:
+                    seen.add(entry["id"])
+                    entries.append(entry)
+        with self.connection:
+            self.connection.execute("UPDATE sessions SET active = 0 WHERE active = 1")
+            self.connection.executemany(
+                upsert, [_row(e, _SESSION_COLUMNS) for e in entries]
+            )
+            self.connection.executemany(
+                "UPDATE sessions SET active = 1 WHERE id = ?", [(i,) for i in seen]
+            )
+        return len(entries)
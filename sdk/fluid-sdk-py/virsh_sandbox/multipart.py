@@ -0,0 +1,144 @@
+# coding: utf-8
+
+"""Streaming ``multipart/form-data`` encoding.
+
+File parts are read from their file object or path in fixed-size chunks
+while the request is sent, so uploads use flat memory whatever the file
+size. When every part has a known size the body is sent with a
+``Content-Length``; otherwise urllib3 falls back to chunked transfer.
+"""
+
+import os
+from typing import IO, Iterator, List, Optional, Sequence, Tuple, Union
+
+from urllib3.fields import format_multipart_header_param
+from urllib3.filepost import choose_boundary
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+"""Bytes read from a file part per step."""
+
+PartData = Union[str, bytes, "os.PathLike[str]", IO[bytes]]
+Field = Tuple[str, Union[PartData, Tuple[str, PartData, str]]]
+
+
+def _data_size(data: PartData, position: Optional[int]) -> Optional[int]:
+    """Return the number of bytes ``data`` will contribute, if knowable.
+
+    ``position`` is the offset a seekable file object is rewound to.
+    """
+    if isinstance(data, str):
+        return len(data.encode("utf-8"))
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, os.PathLike):
+        return os.path.getsize(data)
+    if position is None:
+        return None
+    try:
+        return os.fstat(data.fileno()).st_size - position
+    except (AttributeError, OSError, ValueError):
+        pass
+    try:
+        current = data.tell()
+        end = data.seek(0, os.SEEK_END)
+        data.seek(current)
+        return end - position
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class MultipartEncoder:
+    """Re-iterable ``multipart/form-data`` body for urllib3.
+
+    Accepts the ``post_params`` produced by ``ApiClient.files_parameters``:
+    plain ``(name, value)`` fields and ``(name, (filename, data, mimetype))``
+    file fields, where ``data`` may be ``bytes``, a binary file object or an
+    ``os.PathLike`` that is opened only while its part is sent. Seekable file
+    objects are rewound on every iteration, so urllib3 can retry the request.
+
+    :param fields: Form fields in order.
+    :param boundary: Multipart boundary; random by default.
+    :param chunk_size: Bytes read from a file part per step.
+    """
+
+    def __init__(
+        self,
+        fields: Sequence[Field],
+        boundary: Optional[str] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        self.boundary = boundary or choose_boundary()
+        self.chunk_size = chunk_size
+        self._parts: List[Tuple[bytes, PartData, Optional[int]]] = []
+        for name, value in fields:
+            if isinstance(value, tuple):
+                filename, data, mimetype = value
+                head = (
+                    "Content-Disposition: form-data; %s; %s\r\nContent-Type: %s\r\n"
+                    % (
+                        format_multipart_header_param("name", name),
+                        format_multipart_header_param("filename", filename),
+                        mimetype,
+                    )
+                )
+            else:
+                data = value if isinstance(value, (bytes, str)) else str(value)
+                head = "Content-Disposition: form-data; %s\r\n" % (
+                    format_multipart_header_param("name", name)
+                )
+            position = None
+            if hasattr(data, "read"):
+                try:
+                    position = data.tell() if data.seekable() else None
+                except (AttributeError, OSError, ValueError):
+                    position = None
+            header = ("--%s\r\n%s\r\n" % (self.boundary, head)).encode("utf-8")
+            self._parts.append((header, data, position))
+        self._closing = ("--%s--\r\n" % self.boundary).encode("utf-8")
+
+    @property
+    def content_type(self) -> str:
+        """``Content-Type`` header value including the boundary."""
+        return "multipart/form-data; boundary=%s" % self.boundary
+
+    @property
+    def content_length(self) -> Optional[int]:
+        """Total body size, or ``None`` if any part has an unknown size."""
+        total = len(self._closing)
+        for header, data, position in self._parts:
+            size = _data_size(data, position)
+            if size is None:
+                return None
+            total += len(header) + size + 2
+        return total
+
+    def _iter_data(self, data: PartData, position: Optional[int]) -> Iterator[bytes]:
+        if isinstance(data, str):
+            yield data.encode("utf-8")
+        elif isinstance(data, (bytes, bytearray)):
+            yield bytes(data)
+        elif isinstance(data, os.PathLike):
+            with open(data, "rb") as f:
+                yield from self._iter_file(f)
+        else:
+            if position is not None:
+                data.seek(position)
+            yield from self._iter_file(data)
+
+    def _iter_file(self, f: IO[bytes]) -> Iterator[bytes]:
+        while True:
+            chunk = f.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def __iter__(self) -> Iterator[bytes]:
+        for header, data, position in self._parts:
+            if isinstance(data, (str, bytes, bytearray)):
+                # Small in-memory parts go out as a single write.
+                yield header + b"".join(self._iter_data(data, position)) + b"\r\n"
+                continue
+            yield header
+            yield from self._iter_data(data, position)
+            yield b"\r\n"
+        yield self._closing
@@ -0,0 +1,312 @@
+# coding: utf-8
+
+"""Fan-in of many sandbox activity streams onto one asyncio queue.
+
+:class:`ActivityMultiplexer` keeps one ``/v1/sandboxes/{id}/stream``
+WebSocket per subscribed sandbox, on one event loop, and merges their events
+into a single bounded queue. Each subscription reconnects on its own with
+exponential backoff. Command events the server replays after a reconnect
+are dropped, so every command reaches the queue once.
+"""
+
+import asyncio
+import collections
+import json
+import random
+from typing import (
+    Any,
+    AsyncIterator,
+    Deque,
+    Dict,
+    FrozenSet,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Set,
+)
+
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.exceptions import ApiException
+from virsh_sandbox.websocket import (
+    DEFAULT_MAX_MESSAGE_SIZE,
+    AsyncWebSocketConnection,
+    to_websocket_url,
+)
+
+EVENT_CLOSED = "closed"
+"""Synthetic last event of a subscription the server refused, e.g. with
+404 once the sandbox is gone. ``data`` holds ``status`` and ``reason``."""
+
+_COMMAND_EVENTS = frozenset({"command_history", "command_new"})
+_STOP = object()
+
+
+class ActivityEvent(NamedTuple):
+    """One event from a sandbox activity stream."""
+
+    sandbox_id: str
+    type: str
+    """``connected``, ``command_history``, ``command_new``, ``heartbeat`` or
+    :data:`EVENT_CLOSED`."""
+    timestamp: Optional[str]
+    data: Dict[str, Any]
+    host: str
+    """Base URL of the server the event came from."""
+
+
+class _Subscription:
+    """Connection state of one subscribed sandbox."""
+
+    def __init__(self, sandbox_id: str, api: SandboxApi, history_window: int) -> None:
+        self.sandbox_id = sandbox_id
+        self.api = api
+        self.task: Optional["asyncio.Task[None]"] = None
+        self.connects = 0
+        self._seen: Set[str] = set()
+        self._order: Deque[str] = collections.deque()
+        self._window = history_window
+
+    @property
+    def host(self) -> str:
+        return self.api.api_client.configuration.host
+
+    def first_delivery(self, command_id: str) -> bool:
+        """Record ``command_id``; return whether it had not been seen."""
+        if command_id in self._seen:
+            return False
+        self._seen.add(command_id)
+        self._order.append(command_id)
+        if len(self._order) > self._window:
+            self._seen.discard(self._order.popleft())
+        return True
+
+
+class ActivityMultiplexer:
+    """Merge activity streams from many sandboxes, possibly on many hosts.
+
+    Subscriptions can be added and dropped at any time from the loop that
+    consumes the events. Each one runs as a task that connects, forwards
+    events and reconnects after a dropped connection or an idle timeout.
+    Consume the merged events with ``async for`` or :meth:`get`.
+
+    The queue is bounded. When it is full, the stream tasks wait for space
+    instead of buffering. Unread frames then stay in the socket buffers and
+    the server is slowed down through TCP.
+
+    A subscription ends by itself only when the server refuses the upgrade
+    with a 4xx status, typically 404 after the sandbox was destroyed. It is
+    then removed and an :data:`EVENT_CLOSED` event is queued.
+
+    Example:
+        >>> async with ActivityMultiplexer(api_client) as mux:
+        ...     mux.update(sandbox_ids)
+        ...     async for event in mux:
+        ...         print(event.sandbox_id, event.type, event.data)
+
+    :param api_client: Client for subscriptions that do not name their own;
+        the default client if omitted.
+    :param max_queue: Capacity of the merged queue.
+    :param heartbeats: Forward the server's ``heartbeat`` events.
+    :param idle_timeout: Seconds without any frame before a connection is
+        considered dead and reopened. The server sends a heartbeat every
+        5 seconds. ``None`` waits forever.
+    :param reconnect_delay: First delay before reconnecting, in seconds.
+    :param max_reconnect_delay: Upper bound for the doubling delay.
+    :param history_window: Command IDs remembered per sandbox to drop
+        replayed history after a reconnect.
+    :param max_message_size: Largest WebSocket message to accept.
+    """
+
+    def __init__(
+        self,
+        api_client: Optional[ApiClient] = None,
+        max_queue: int = 1024,
+        heartbeats: bool = False,
+        idle_timeout: Optional[float] = 30.0,
+        reconnect_delay: float = 0.5,
+        max_reconnect_delay: float = 30.0,
+        history_window: int = 256,
+        max_message_size: int = DEFAULT_MAX_MESSAGE_SIZE,
+    ) -> None:
+        self.api = SandboxApi(api_client)
+        self.heartbeats = heartbeats
+        self.idle_timeout = idle_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.history_window = history_window
+        self.max_message_size = max_message_size
+        self.max_queue = max_queue
+        self._queue: "Optional[asyncio.Queue[Any]]" = None
+        self._subscriptions: Dict[str, _Subscription] = {}
+        self.closed = False
+
+    @property
+    def subscriptions(self) -> FrozenSet[str]:
+        """IDs of the sandboxes currently subscribed."""
+        return frozenset(self._subscriptions)
+
+    def subscribe(
+        self, sandbox_id: str, api_client: Optional[ApiClient] = None
+    ) -> None:
+        """Start following ``sandbox_id``; a no-op if already subscribed.
+
+        Must be called from a running event loop.
+
+        :param sandbox_id: Sandbox to follow.
+        :param api_client: Client for the host that owns the sandbox, e.g.
+            ``ShardedSandboxClient.shard_for(sandbox_id).api_client``.
+        """
+        if self.closed:
+            raise RuntimeError("multiplexer is closed")
+        if sandbox_id in self._subscriptions:
+            return
+        api = SandboxApi(api_client) if api_client is not None else self.api
+        loop = asyncio.get_running_loop()
+        self._events()
+        sub = _Subscription(sandbox_id, api, self.history_window)
+        self._subscriptions[sandbox_id] = sub
+        sub.task = loop.create_task(self._follow(sub))
+
+    def unsubscribe(self, sandbox_id: str) -> None:
+        """Stop following ``sandbox_id``; unknown IDs are ignored."""
+        sub = self._subscriptions.pop(sandbox_id, None)
+        if sub is not None and sub.task is not None:
+            sub.task.cancel()
+
+    def update(
+        self, sandbox_ids: Iterable[str], api_client: Optional[ApiClient] = None
+    ) -> None:
+        """Make the subscriptions match ``sandbox_ids``.
+
+        New IDs are subscribed through ``api_client``, missing ones are
+        dropped and the rest keep their connections.
+        """
+        wanted = set(sandbox_ids)
+        for sandbox_id in self.subscriptions - wanted:
+            self.unsubscribe(sandbox_id)
+        for sandbox_id in wanted:
+            self.subscribe(sandbox_id, api_client)
+
+    def connects(self, sandbox_id: str) -> int:
+        """Number of successful connects for ``sandbox_id`` so far."""
+        sub = self._subscriptions.get(sandbox_id)
+        return sub.connects if sub is not None else 0
+
+    async def get(self) -> ActivityEvent:
+        """Wait for the next event from any subscription.
+
+        :raises StopAsyncIteration: Once the multiplexer is closed.
+        """
+        queue = self._events()
+        item = await queue.get()
+        if item is _STOP:
+            queue.put_nowait(_STOP)
+            raise StopAsyncIteration
+        return item
+
+    async def __aiter__(self) -> AsyncIterator[ActivityEvent]:
+        while True:
+            try:
+                yield await self.get()
+            except StopAsyncIteration:
+                return
+
+    async def close(self) -> None:
+        """Drop every subscription and end iteration for consumers."""
+        if self.closed:
+            return
+        self.closed = True
+        tasks = [s.task for s in self._subscriptions.values() if s.task is not None]
+        self._subscriptions.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Discard undelivered events so the stop marker always fits.
+        queue = self._events()
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(_STOP)
+
+    async def __aenter__(self) -> "ActivityMultiplexer":
+        self._events()
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        await self.close()
+
+    def _events(self) -> "asyncio.Queue[Any]":
+        # Created on first use from the event loop rather than in __init__:
+        # before Python 3.10 a queue binds to the loop current at creation.
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_queue)
+        return self._queue
+
+    def _event(self, sub: _Subscription, payload: bytes) -> Optional[ActivityEvent]:
+        try:
+            doc = json.loads(payload)
+        except ValueError:
+            return None
+        kind = doc.get("type") or ""
+        data = doc.get("data") or {}
+        if kind == "heartbeat" and not self.heartbeats:
+            return None
+        if kind in _COMMAND_EVENTS and data.get("command_id"):
+            if not sub.first_delivery(data["command_id"]):
+                return None
+        return ActivityEvent(sub.sandbox_id, kind, doc.get("timestamp"), data, sub.host)
+
+    def _active(self, sub: _Subscription) -> bool:
+        return self._subscriptions.get(sub.sandbox_id) is sub
+
+    async def _follow(self, sub: _Subscription) -> None:
+        delay = self.reconnect_delay
+        # Checked besides cancellation: wait_for can swallow a cancel that
+        # races with a completed receive.
+        while self._active(sub):
+            _, url, headers, _, _ = sub.api._stream_sandbox_activity_serialize(
+                id=sub.sandbox_id,
+                _request_auth=None,
+                _content_type=None,
+                _headers=None,
+                _host_index=0,
+            )
+            try:
+                conn = await AsyncWebSocketConnection.connect(
+                    to_websocket_url(url),
+                    headers=headers,
+                    configuration=sub.api.api_client.configuration,
+                    timeout=self.idle_timeout,
+                    max_message_size=self.max_message_size,
+                )
+            except ApiException as e:
+                if e.status is not None and 400 <= e.status <= 499:
+                    await self._end(sub, e)
+                    return
+            except (OSError, asyncio.TimeoutError):
+                pass
+            else:
+                sub.connects += 1
+                try:
+                    while True:
+                        message = await asyncio.wait_for(conn.recv(), self.idle_timeout)
+                        if message is None or not self._active(sub):
+                            break
+                        delay = self.reconnect_delay
+                        event = self._event(sub, message[1])
+                        if event is not None:
+                            await self._events().put(event)
+                except (ApiException, OSError, asyncio.TimeoutError):
+                    pass
+                finally:
+                    await conn.close()
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _end(self, sub: _Subscription, error: ApiException) -> None:
+        if self._active(sub):
+            del self._subscriptions[sub.sandbox_id]
+        data = {"status": error.status, "reason": error.reason}
+        await self._events().put(
+            ActivityEvent(sub.sandbox_id, EVENT_CLOSED, None, data, sub.host)
+        )
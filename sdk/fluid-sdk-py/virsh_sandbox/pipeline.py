@@ -0,0 +1,306 @@
+# coding: utf-8
+
+"""Run per-sandbox stages concurrently across many sandboxes.
+
+The end of a job runs the same chain of calls for every sandbox: snapshot,
+diff, generate configuration, publish. :class:`SandboxPipeline` runs each
+stage on its own thread pool, sized by the stage's concurrency limit. A
+sandbox moves on to the next stage as soon as its previous stage is done,
+without waiting for the other sandboxes. A failing stage stops only its own
+sandbox. The whole run takes about as long as the slowest sandbox, plus any
+queueing from the limits, rather than the sum of all of them.
+
+:func:`publish_stages` builds the usual four stages.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Union,
+)
+
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.models.fluid_remote_internal_rest_diff_request import (
+    FluidRemoteInternalRestDiffRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_publish_request import (
+    FluidRemoteInternalRestPublishRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_snapshot_request import (
+    FluidRemoteInternalRestSnapshotRequest,
+)
+
+StageFn = Callable[[Any, str, Dict[str, Any]], Any]
+"""``fn(api, sandbox_id, results)``; ``results`` maps the names of the
+sandbox's earlier stages to their return values."""
+
+
+class Stage(NamedTuple):
+    """One step run for every sandbox."""
+
+    name: str
+    fn: StageFn
+    concurrency: int = 4
+    """Most sandboxes in this stage at once."""
+
+
+class StageOutcome(NamedTuple):
+    """Result of one stage for one sandbox."""
+
+    stage: str
+    value: Any
+    error: Optional[Exception]
+    waited: float
+    """Seconds between becoming ready for the stage and starting it."""
+    seconds: float
+    """Seconds the stage took."""
+
+
+class SandboxOutcome:
+    """Stage outcomes of one sandbox, in stage order.
+
+    Stages after a failed one are absent.
+    """
+
+    def __init__(self, sandbox_id: str) -> None:
+        self.sandbox_id = sandbox_id
+        self.outcomes: List[StageOutcome] = []
+
+    @property
+    def error(self) -> Optional[Exception]:
+        """Error of the failed stage, if any."""
+        last = self.outcomes[-1] if self.outcomes else None
+        return last.error if last is not None else None
+
+    @property
+    def failed_stage(self) -> Optional[str]:
+        """Name of the failed stage, if any."""
+        last = self.outcomes[-1] if self.outcomes else None
+        return last.stage if last is not None and last.error is not None else None
+
+    def results(self) -> Dict[str, Any]:
+        """Return values of the completed stages by stage name."""
+        return {o.stage: o.value for o in self.outcomes if o.error is None}
+
+    def __repr__(self) -> str:
+        state = "failed at %s" % self.failed_stage if self.failed_stage else "ok"
+        return "SandboxOutcome(%r, %s)" % (self.sandbox_id, state)
+
+
+class StageStats(NamedTuple):
+    """Timings of one stage over a whole run."""
+
+    name: str
+    runs: int
+    failures: int
+    total_seconds: float
+    max_seconds: float
+    total_wait: float
+    """Summed queueing time; a large value means the stage's concurrency
+    limit is what holds the run back."""
+
+
+class PipelineReport(NamedTuple):
+    """What a :meth:`SandboxPipeline.run` did."""
+
+    sandboxes: Dict[str, SandboxOutcome]
+    """Outcomes by sandbox ID, in input order."""
+    stages: Dict[str, StageStats]
+    wall_seconds: float
+
+    @property
+    def succeeded(self) -> List[str]:
+        """Sandboxes that finished every stage."""
+        stages = len(self.stages)
+        return [
+            sid
+            for sid, outcome in self.sandboxes.items()
+            if len(outcome.outcomes) == stages and outcome.error is None
+        ]
+
+    @property
+    def failed(self) -> Dict[str, SandboxOutcome]:
+        """Sandboxes stopped by a failing stage."""
+        return {
+            sid: outcome
+            for sid, outcome in self.sandboxes.items()
+            if outcome.error is not None
+        }
+
+
+class SandboxPipeline:
+    """Push many sandboxes through a sequence of stages concurrently.
+
+    Example:
+        >>> pipeline = SandboxPipeline(
+        ...     publish_stages(job_id, base_snapshot="initial", snapshot_name="final"),
+        ...     api=sandbox_api,
+        ... )
+        >>> report = pipeline.run(sandbox_ids)
+        >>> for sandbox_id, outcome in report.failed.items():
+        ...     print(sandbox_id, outcome.failed_stage, outcome.error)
+
+    :param stages: Stages in the order each sandbox goes through them.
+    :param api: Object the stage functions call, normally a ``SandboxApi``;
+        a ``ShardedSandboxClient`` routes each sandbox to its own host. The
+        default is ``SandboxApi()``.
+    """
+
+    def __init__(self, stages: Sequence[Stage], api: Optional[Any] = None) -> None:
+        if not stages:
+            raise ValueError("at least one stage is required")
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError("stage names must be unique")
+        for stage in stages:
+            if stage.concurrency < 1:
+                raise ValueError("stage %r: concurrency must be >= 1" % stage.name)
+        self.stages = list(stages)
+        self.api = api if api is not None else SandboxApi()
+
+    def run(self, sandbox_ids: Iterable[str]) -> PipelineReport:
+        """Run every stage for every sandbox and wait until all are done.
+
+        Errors raised by stage functions are recorded, never raised.
+        """
+        started = time.monotonic()
+        outcomes = {sid: SandboxOutcome(sid) for sid in sandbox_ids}
+        executors = [
+            ThreadPoolExecutor(
+                max_workers=stage.concurrency,
+                thread_name_prefix="pipeline-%s" % stage.name,
+            )
+            for stage in self.stages
+        ]
+        done = threading.Condition()
+        pending = [len(outcomes)]
+
+        def finish() -> None:
+            with done:
+                pending[0] -= 1
+                if not pending[0]:
+                    done.notify_all()
+
+        def step(index: int, outcome: SandboxOutcome, ready: float) -> None:
+            stage = self.stages[index]
+            begin = time.monotonic()
+            try:
+                value = stage.fn(self.api, outcome.sandbox_id, outcome.results())
+                error: Optional[Exception] = None
+            except Exception as e:
+                value, error = None, e
+            end = time.monotonic()
+            outcome.outcomes.append(
+                StageOutcome(stage.name, value, error, begin - ready, end - begin)
+            )
+            if error is None and index + 1 < len(self.stages):
+                executors[index + 1].submit(step, index + 1, outcome, end)
+            else:
+                finish()
+
+        try:
+            now = time.monotonic()
+            for outcome in outcomes.values():
+                executors[0].submit(step, 0, outcome, now)
+            with done:
+                done.wait_for(lambda: not pending[0])
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=True)
+        return PipelineReport(
+            outcomes, self._stats(outcomes.values()), time.monotonic() - started
+        )
+
+    def _stats(self, outcomes: Iterable[SandboxOutcome]) -> Dict[str, StageStats]:
+        by_stage: Dict[str, List[StageOutcome]] = {s.name: [] for s in self.stages}
+        for outcome in outcomes:
+            for o in outcome.outcomes:
+                by_stage[o.stage].append(o)
+        return {
+            name: StageStats(
+                name,
+                len(runs),
+                sum(1 for o in runs if o.error is not None),
+                sum(o.seconds for o in runs),
+                max((o.seconds for o in runs), default=0.0),
+                sum(o.waited for o in runs),
+            )
+            for name, runs in by_stage.items()
+        }
+
+
+def _per_sandbox(value: Union[str, Callable[[str], str]]) -> Callable[[str], str]:
+    if callable(value):
+        return value
+    return lambda sandbox_id: value
+
+
+def publish_stages(
+    job_id: str,
+    base_snapshot: Union[str, Callable[[str], str]],
+    snapshot_name: Union[str, Callable[[str], str]],
+    tool: Optional[str] = "ansible",
+    message: Optional[str] = None,
+    reviewers: Optional[List[str]] = None,
+    external: Optional[bool] = None,
+    concurrency: Optional[Dict[str, int]] = None,
+    **kwargs: Any,
+) -> List[Stage]:
+    """The end-of-job stages: ``snapshot``, ``diff``, ``generate``, ``publish``.
+
+    Servers without a configuration generator or GitOps publisher answer
+    ``generate`` and ``publish`` with 501; the report then lists those
+    sandboxes as failed with a ``ServiceException``.
+
+    :param job_id: Job whose changes are published.
+    :param base_snapshot: Snapshot to diff against, or a function from
+        sandbox ID to its name.
+    :param snapshot_name: Name of the snapshot to take, or a function from
+        sandbox ID to it.
+    :param tool: ``ansible`` or ``puppet``; ``None`` leaves out the
+        ``generate`` stage.
+    :param message: Commit or PR message for ``publish``.
+    :param reviewers: Reviewers for ``publish``.
+    :param external: Take external snapshots.
+    :param concurrency: Per-stage limits by stage name; 4 by default.
+    :param kwargs: Passed to every API call, e.g. ``_request_timeout``.
+    """
+    base = _per_sandbox(base_snapshot)
+    name = _per_sandbox(snapshot_name)
+    limits = concurrency or {}
+
+    def snapshot(api: Any, sandbox_id: str, results: Dict[str, Any]) -> Any:
+        request = FluidRemoteInternalRestSnapshotRequest(
+            name=name(sandbox_id), external=external
+        )
+        return api.create_snapshot(sandbox_id, request, **kwargs)
+
+    def diff(api: Any, sandbox_id: str, results: Dict[str, Any]) -> Any:
+        request = FluidRemoteInternalRestDiffRequest(
+            from_snapshot=base(sandbox_id), to_snapshot=name(sandbox_id)
+        )
+        return api.diff_snapshots(sandbox_id, request, **kwargs)
+
+    def generate(api: Any, sandbox_id: str, results: Dict[str, Any]) -> Any:
+        return api.generate_configuration(sandbox_id, tool, **kwargs)
+
+    def publish(api: Any, sandbox_id: str, results: Dict[str, Any]) -> Any:
+        request = FluidRemoteInternalRestPublishRequest(
+            job_id=job_id, message=message, reviewers=reviewers
+        )
+        return api.publish_changes(sandbox_id, request, **kwargs)
+
+    fns: List[Any] = [("snapshot", snapshot), ("diff", diff)]
+    if tool is not None:
+        fns.append(("generate", generate))
+    fns.append(("publish", publish))
+    return [Stage(n, fn, limits.get(n, 4)) for n, fn in fns]
@@ -14,16 +14,31 @@
 
 import io
 import json
+import os
 import re
 import ssl
+import weakref
 
 import urllib3
 
+from virsh_sandbox import multipart, spill, unixsocket
 from virsh_sandbox.exceptions import ApiException, ApiValueError
 
 SUPPORTED_SOCKS_PROXIES = {"socks5", "socks5h", "socks4", "socks4a"}
 RESTResponseType = urllib3.HTTPResponse
 
+# Every client, so that a forked child gets fresh connection pools.
+_live_clients: "weakref.WeakSet[RESTClientObject]" = weakref.WeakSet()
+
+
+def _reset_pools_after_fork():
+    for client in list(_live_clients):
+        client._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
 
 def is_socks_proxy_url(url):
     if url is None:
@@ -36,15 +51,44 @@ def is_socks_proxy_url(url):
 
 
 class RESTResponse(io.IOBase):
-    def __init__(self, resp) -> None:
+    def __init__(
+        self, resp, spill_threshold=None, spill_dir=None, retain_body=True
+    ) -> None:
         self.response = resp
         self.status = resp.status
         self.reason = resp.reason
         self.data = None
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self.retain_body = retain_body
 
-    def read(self):
-        if self.data is None:
-            self.data = self.response.data
+    @property
+    def is_attachment(self):
+        """Whether this is a successful ``Content-Disposition: attachment``
+        response, whose body is streamed to disk rather than preloaded."""
+        disposition = self.response.headers.get("Content-Disposition") or ""
+        return 200 <= self.status <= 299 and disposition.lower().startswith(
+            "attachment"
+        )
+
+    def read(self, stream_attachment=True):
+        """Read the body; with a spill threshold, large bodies come back as
+        a read-only ``mmap`` of a temporary file instead of ``bytes``.
+
+        Attachments are left unread (and ``None`` returned) unless
+        ``stream_attachment`` is false, so file responses can be written to
+        disk chunk by chunk."""
+        if self.data is None and not (stream_attachment and self.is_attachment):
+            if self.spill_threshold is None and self.retain_body:
+                self.data = self.response.data
+            elif self.spill_threshold is None:
+                # Not cached on the urllib3 response, so releasing self.data
+                # releases the body.
+                self.data = self.response.read()
+            else:
+                self.data = spill.spool(
+                    self.response, self.spill_threshold, self.spill_dir
+                )
         return self.data
 
     @property
@@ -96,22 +140,40 @@ class RESTClientObject:
         if configuration.connection_pool_maxsize is not None:
             pool_args["maxsize"] = configuration.connection_pool_maxsize
 
-        # https pool manager
-        self.pool_manager: urllib3.PoolManager
-
-        if configuration.proxy:
-            if is_socks_proxy_url(configuration.proxy):
+        self.spill_threshold = configuration.spill_threshold
+        self.spill_dir = configuration.temp_folder_path
+        self.retain_body = configuration.retain_response_body
+
+        self._unix_socket = unixsocket.socket_path(configuration.host)
+        self._proxy = configuration.proxy
+        self._proxy_headers = configuration.proxy_headers
+        self._pool_args = pool_args
+        self.pool_manager = self._new_pool_manager()
+        _live_clients.add(self)
+
+    def _new_pool_manager(self) -> urllib3.PoolManager:
+        pool_args = dict(self._pool_args)
+        if self._unix_socket:
+            # A proxy cannot reach a local socket, so none is used.
+            return unixsocket.UnixSocketPoolManager(self._unix_socket, **pool_args)
+        if self._proxy:
+            if is_socks_proxy_url(self._proxy):
                 from urllib3.contrib.socks import SOCKSProxyManager
 
-                pool_args["proxy_url"] = configuration.proxy
-                pool_args["headers"] = configuration.proxy_headers
-                self.pool_manager = SOCKSProxyManager(**pool_args)
-            else:
-                pool_args["proxy_url"] = configuration.proxy
-                pool_args["proxy_headers"] = configuration.proxy_headers
-                self.pool_manager = urllib3.ProxyManager(**pool_args)
-        else:
-            self.pool_manager = urllib3.PoolManager(**pool_args)
+                pool_args["proxy_url"] = self._proxy
+                pool_args["headers"] = self._proxy_headers
+                return SOCKSProxyManager(**pool_args)
+            pool_args["proxy_url"] = self._proxy
+            pool_args["proxy_headers"] = self._proxy_headers
+            return urllib3.ProxyManager(**pool_args)
+        return urllib3.PoolManager(**pool_args)
+
+    def _after_fork(self) -> None:
+        # The inherited sockets and their TLS state are shared with the
+        # parent; the child must never read or write them. Dropping the old
+        # pools only closes the child's copies of the descriptors, so the
+        # parent's connections stay intact.
+        self.pool_manager = self._new_pool_manager()
 
     def request(
         self,
@@ -184,20 +246,23 @@ class RESTClientObject:
                         preload_content=False,
                     )
                 elif content_type == "multipart/form-data":
-                    # must del headers['Content-Type'], or the correct
-                    # Content-Type which generated by urllib3 will be
-                    # overwritten.
-                    del headers["Content-Type"]
                     # Ensures that dict objects are serialized
                     post_params = [
                         (a, json.dumps(b)) if isinstance(b, dict) else (a, b)
                         for a, b in post_params
                     ]
+                    # File parts are streamed from disk while sending; the
+                    # length is declared when every part size is known and
+                    # urllib3 uses chunked transfer otherwise.
+                    encoder = multipart.MultipartEncoder(post_params)
+                    headers["Content-Type"] = encoder.content_type
+                    content_length = encoder.content_length
+                    if content_length is not None:
+                        headers["Content-Length"] = str(content_length)
                     r = self.pool_manager.request(
                         method,
                         url,
-                        fields=post_params,
-                        encode_multipart=True,
+                        body=encoder,
                         timeout=timeout,
                         headers=headers,
                         preload_content=False,
@@ -246,4 +311,4 @@ class RESTClientObject:
             msg = "\n".join([type(e).__name__, str(e)])
             raise ApiException(status=0, reason=msg)
 
-        return RESTResponse(r)
+        return RESTResponse(r, self.spill_threshold, self.spill_dir, self.retain_body)
@@ -0,0 +1,379 @@
+# coding: utf-8
+
+"""Buffered recording of SSH access sessions.
+
+``AccessApi.record_session_start`` and ``record_session_end`` are one
+blocking HTTP call per event. :class:`SessionRecorder` queues the events
+instead and sends them from a background thread. A batch goes out when
+``max_batch`` events are waiting or ``flush_interval`` has passed, through
+``POST /v1/access/sessions/batch``. Each event carries the time it
+happened, so buffering does not shift the recorded times.
+
+Servers without the batch endpoint get the same events as single calls,
+made concurrently across sessions and in order within each session. Those
+calls record the time they arrive.
+"""
+
+import collections
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Union
+
+from virsh_sandbox.api.access_api import AccessApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.exceptions import ApiException
+from virsh_sandbox.models.internal_rest_session_end_request import (
+    InternalRestSessionEndRequest,
+)
+from virsh_sandbox.models.internal_rest_session_start_request import (
+    InternalRestSessionStartRequest,
+)
+
+_refs = itertools.count(1)
+
+
+class SessionHandle:
+    """A session whose start was queued by :meth:`SessionRecorder.start`.
+
+    ``session_id`` is set once the start has been recorded, and ``error``
+    if recording it failed.
+    """
+
+    def __init__(self, ref: str) -> None:
+        self.ref = ref
+        self.session_id: Optional[str] = None
+        self.error: Optional[Exception] = None
+        self._done = threading.Event()
+
+    def _resolve(
+        self, session_id: Optional[str], error: Optional[Exception] = None
+    ) -> None:
+        self.session_id = session_id
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> str:
+        """Wait until the start is recorded and return the session ID.
+
+        :raises TimeoutError: If ``timeout`` passed first.
+        :raises Exception: The error that recording the start failed with.
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError("session start not recorded yet")
+        if self.error is not None:
+            raise self.error
+        assert self.session_id is not None
+        return self.session_id
+
+    def __repr__(self) -> str:
+        return "SessionHandle(%r, session_id=%r)" % (self.ref, self.session_id)
+
+
+class _Event:
+    __slots__ = ("kind", "handle", "session_id", "certificate_id", "detail", "at")
+
+    def __init__(
+        self,
+        kind: str,
+        handle: Optional[SessionHandle],
+        session_id: Optional[str],
+        certificate_id: Optional[str],
+        detail: Optional[str],
+    ) -> None:
+        self.kind = kind
+        self.handle = handle
+        self.session_id = session_id
+        self.certificate_id = certificate_id
+        self.detail = detail  # source IP of a start, reason of an end
+        self.at = time.time()
+
+    @property
+    def session_key(self) -> str:
+        return self.handle.ref if self.handle is not None else self.session_id or ""
+
+
+class SessionRecorder:
+    """Queue session starts and ends and record them in batches.
+
+    Example:
+        >>> with SessionRecorder(api_client) as recorder:
+        ...     session = recorder.start(certificate_id, source_ip=client_ip)
+        ...     ...  # the SSH session runs
+        ...     recorder.end(session, reason="client disconnected")
+
+    The queue holds at most ``max_queue`` events. When it is full, callers
+    wait for room, so a slow server slows the bastion down and no events
+    are dropped. :meth:`close` sends everything still queued.
+
+    Failed events are not retried. A failed start sets the error on its
+    handle, and every failure is counted in :meth:`stats`.
+
+    :param api_client: Client for the access API; the default client if
+        omitted.
+    :param max_batch: Most events per request, up to the server's 1000.
+    :param flush_interval: Longest time in seconds an event waits before it
+        is sent.
+    :param max_queue: Capacity of the queue.
+    :param concurrency: Parallel calls per flush when the server has no
+        batch endpoint.
+    """
+
+    def __init__(
+        self,
+        api_client: Optional[ApiClient] = None,
+        max_batch: int = 200,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        concurrency: int = 8,
+    ) -> None:
+        self.api = AccessApi(api_client)
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue: Deque[_Event] = collections.deque()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._flushing = 0
+        self._closed = False
+        self._batch_endpoint: Optional[bool] = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="session-recorder"
+        )
+        self._counts: Dict[str, int] = collections.Counter()
+        self._thread = threading.Thread(
+            target=self._run, name="session-recorder", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self) -> "SessionRecorder":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.close()
+
+    def _put(self, event: _Event) -> None:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("session recorder is closed")
+            self._cond.wait_for(
+                lambda: len(self._queue) < self.max_queue or self._closed
+            )
+            if self._closed:
+                raise RuntimeError("session recorder is closed")
+            self._queue.append(event)
+            # The first event starts the flush interval; a full batch ends it.
+            if len(self._queue) in (1, self.max_batch):
+                self._cond.notify_all()
+
+    def start(
+        self, certificate_id: str, source_ip: Optional[str] = None
+    ) -> SessionHandle:
+        """Queue the start of a session authenticated with ``certificate_id``.
+
+        :return: A handle to pass to :meth:`end`.
+        """
+        handle = SessionHandle("s%d" % next(_refs))
+        self._put(_Event("start", handle, None, certificate_id, source_ip))
+        return handle
+
+    def end(
+        self, session: Union[SessionHandle, str], reason: Optional[str] = None
+    ) -> None:
+        """Queue the end of a session.
+
+        :param session: Handle from :meth:`start`, or the ID of a session
+            recorded elsewhere.
+        :param reason: Disconnect reason; the server's default if omitted.
+        """
+        if isinstance(session, SessionHandle):
+            self._put(_Event("end", session, None, None, reason))
+        else:
+            self._put(_Event("end", None, session, None, reason))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Send queued events now and wait until they are recorded.
+
+        :return: Whether everything was sent before ``timeout``.
+        """
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(
+                    lambda: not self._queue and not self._in_flight, timeout
+                )
+            finally:
+                self._flushing -= 1
+
+    def close(self) -> None:
+        """Record everything still queued and stop the background thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Counters: ``recorded``, ``failed``, ``requests`` and ``queued``."""
+        with self._cond:
+            counts = dict(self._counts)
+            counts.setdefault("recorded", 0)
+            counts.setdefault("failed", 0)
+            counts.setdefault("requests", 0)
+            counts["queued"] = len(self._queue)
+            return counts
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._queue:
+                    self._cond.wait_for(lambda: self._queue or self._closed)
+                if not self._queue and self._closed:
+                    return
+                # Give the batch time to fill unless flushing or closing.
+                deadline = self._queue[0].at + self.flush_interval
+                self._cond.wait_for(
+                    lambda: len(self._queue) >= self.max_batch
+                    or self._flushing
+                    or self._closed,
+                    max(deadline - time.time(), 0),
+                )
+                batch = [
+                    self._queue.popleft()
+                    for _ in range(min(self.max_batch, len(self._queue)))
+                ]
+                self._in_flight = len(batch)
+                self._cond.notify_all()  # room for blocked producers
+            try:
+                self._send(batch)
+            finally:
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
+
+    def _send(self, batch: List[_Event]) -> None:
+        if self._batch_endpoint is not False:
+            try:
+                self._send_batch(batch)
+                self._batch_endpoint = True
+                return
+            except ApiException as e:
+                if self._batch_endpoint is None and e.status in (404, 405):
+                    self._batch_endpoint = False
+                else:
+                    self._fail(batch, e)
+                    return
+            except Exception as e:
+                self._fail(batch, e)
+                return
+        self._send_single(batch)
+
+    def _fail(self, batch: List[_Event], error: Exception) -> None:
+        for event in batch:
+            self._resolve(event, None, error)
+
+    def _resolve(
+        self, event: _Event, session_id: Optional[str], error: Optional[Exception]
+    ) -> None:
+        if event.kind == "start" and event.handle is not None:
+            event.handle._resolve(session_id, error)
+        with self._cond:
+            self._counts["failed" if error is not None else "recorded"] += 1
+
+    def _send_batch(self, batch: List[_Event]) -> None:
+        events = []
+        for event in batch:
+            doc: Dict[str, Any] = {
+                "type": event.kind,
+                "at": datetime.fromtimestamp(event.at, timezone.utc).isoformat(),
+            }
+            if event.handle is not None:
+                doc["ref"] = event.handle.ref
+                if event.kind == "end" and event.handle.session_id:
+                    doc["session_id"] = event.handle.session_id
+            if event.session_id:
+                doc["session_id"] = event.session_id
+            if event.kind == "start":
+                doc["certificate_id"] = event.certificate_id
+                if event.detail:
+                    doc["source_ip"] = event.detail
+            elif event.detail:
+                doc["reason"] = event.detail
+            events.append(doc)
+
+        client = self.api.api_client
+        method, url, headers, body, _ = client.param_serialize(
+            method="POST",
+            resource_path="/v1/access/sessions/batch",
+            header_params={
+                "Accept": "application/json",
+                "Content-Type": "application/json",
+            },
+            body={"events": events},
+        )
+        with self._cond:
+            self._counts["requests"] += 1
+        response = client.call_api(method, url, headers, body).response
+        try:
+            if not 200 <= response.status <= 299:
+                raise ApiException.from_response(
+                    http_resp=response,
+                    body=None,
+                    data=None,
+                    body_limit=client.configuration.exception_body_limit,
+                )
+            results = json.loads(response.data)["results"]
+        finally:
+            response.release_conn()
+        for event, result in zip(batch, results):
+            error = result.get("error")
+            self._resolve(
+                event,
+                result.get("session_id"),
+                ApiException(status=200, reason=error) if error else None,
+            )
+
+    def _send_single(self, batch: List[_Event]) -> None:
+        # One task per session keeps each session's events in order.
+        by_session: Dict[str, List[_Event]] = collections.OrderedDict()
+        for event in batch:
+            by_session.setdefault(event.session_key, []).append(event)
+        futures = [
+            self._executor.submit(self._send_session, events)
+            for events in by_session.values()
+        ]
+        for future in futures:
+            future.result()
+
+    def _send_session(self, events: List[_Event]) -> None:
+        for event in events:
+            with self._cond:
+                self._counts["requests"] += 1
+            try:
+                if event.kind == "start":
+                    started = self.api.record_session_start(
+                        InternalRestSessionStartRequest(
+                            certificate_id=event.certificate_id, source_ip=event.detail
+                        )
+                    )
+                    self._resolve(event, started.session_id, None)
+                    continue
+                session_id = event.session_id
+                if event.handle is not None:
+                    if event.handle.error is not None:
+                        raise event.handle.error
+                    session_id = event.handle.session_id
+                self.api.record_session_end(
+                    InternalRestSessionEndRequest(
+                        session_id=session_id, reason=event.detail
+                    )
+                )
+                self._resolve(event, session_id, None)
+            except Exception as e:
+                self._resolve(event, None, e)
@@ -0,0 +1,635 @@
+# coding: utf-8
+
+"""Client that spreads sandboxes across several fluid-remote hosts.
+
+Each libvirt host runs its own fluid-remote. :class:`ShardedSandboxClient`
+places new sandboxes on the least loaded healthy host, remembers which host
+owns every sandbox ID it has seen and sends follow-up calls for that sandbox
+to its owner. List calls are fanned out to every host and merged.
+
+Hosts are probed in the background and every call's outcome and latency is
+tracked per host. A host that keeps failing, or answers too slowly, is
+ejected from placement for a while, and creates that cannot reach a host
+fail over to the next one.
+"""
+
+import collections
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import urllib3
+from dateutil.parser import isoparse
+
+from virsh_sandbox.api.health_api import HealthApi
+from virsh_sandbox.api.sandbox_api import SandboxApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.exceptions import ApiException, NotFoundException, ServiceException
+from virsh_sandbox.models.fluid_remote_internal_rest_create_sandbox_request import (
+    FluidRemoteInternalRestCreateSandboxRequest,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_create_sandbox_response import (
+    FluidRemoteInternalRestCreateSandboxResponse,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_list_sandboxes_response import (
+    FluidRemoteInternalRestListSandboxesResponse,
+)
+
+T = TypeVar("T")
+
+DEFAULT_LOAD_TTL = 5.0
+"""Seconds a host's sandbox count is trusted before it is fetched again."""
+
+DEFAULT_PROBE_TIMEOUT = 2.0
+"""Timeout in seconds for the health and load probes used for placement."""
+
+DEFAULT_PROBE_INTERVAL = 5.0
+"""Seconds between background health probes of every host."""
+
+DEFAULT_CONNECT_TIMEOUT = 3.0
+"""Connect timeout for calls made without an explicit ``_request_timeout``."""
+
+DEFAULT_READ_TIMEOUT = 60.0
+"""Read timeout for calls made without an explicit ``_request_timeout``."""
+
+DEFAULT_COMMAND_TIMEOUT = 600.0
+"""fluid-remote's command timeout, used when a run request sets none."""
+
+_LATENCY_ALPHA = 0.3
+
+LIVE_STATES = frozenset({"CREATED", "STARTING", "RUNNING"})
+"""Sandbox states that count towards a host's load."""
+
+ROUTED_METHODS = frozenset(
+    {
+        "create_snapshot",
+        "destroy_sandbox",
+        "diff_snapshots",
+        "discover_sandbox_ip",
+        "generate_configuration",
+        "get_sandbox",
+        "inject_ssh_key",
+        "list_sandbox_commands",
+        "publish_changes",
+        "run_sandbox_command",
+        "start_sandbox",
+        "stream_sandbox_activity",
+    }
+)
+"""``SandboxApi`` methods taking a sandbox ID that are sent to its owner."""
+
+_METHOD_SUFFIXES = ("_with_http_info", "_without_preload_content")
+
+TRANSPORT_ERRORS = (ApiException, urllib3.exceptions.HTTPError, OSError)
+"""Errors that mark a host as unhealthy when raised by a probe."""
+
+
+class OutlierPolicy(NamedTuple):
+    """When to eject a host from placement, and for how long."""
+
+    consecutive_failures: int = 3
+    """Eject after this many failed calls in a row."""
+    error_rate: float = 0.5
+    """Eject when this fraction of the calls in ``window`` failed..."""
+    min_requests: int = 10
+    """...and at least this many calls were made in ``window``."""
+    window: float = 30.0
+    """Seconds of call outcomes considered for ``error_rate``."""
+    max_latency: Optional[float] = None
+    """Eject when the smoothed call latency exceeds this many seconds."""
+    base_ejection: float = 10.0
+    """Seconds of the first ejection; doubled for each repeated ejection."""
+    max_ejection: float = 300.0
+    """Upper bound for the ejection time."""
+
+
+def _is_failure(error: BaseException) -> bool:
+    """Whether ``error`` says something about the host's health.
+
+    Transport errors and 5xx responses count; 4xx responses are the
+    caller's problem and do not.
+    """
+    if isinstance(error, ApiException):
+        return error.status is None or error.status >= 500
+    return isinstance(error, (urllib3.exceptions.HTTPError, OSError))
+
+
+def _connect_failed(error: BaseException) -> bool:
+    """Whether ``error`` happened before the request reached the host."""
+    if isinstance(error, urllib3.exceptions.MaxRetryError):
+        error = error.reason
+    return isinstance(error, urllib3.exceptions.ConnectTimeoutError)
+
+
+def _read_timed_out(error: BaseException) -> bool:
+    """Whether ``error`` is a host that accepted the request but did not answer."""
+    if isinstance(error, urllib3.exceptions.MaxRetryError):
+        error = error.reason
+    return isinstance(error, urllib3.exceptions.ReadTimeoutError)
+
+
+def _base_method(name: str) -> str:
+    for suffix in _METHOD_SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def _result_data(result: Any) -> Any:
+    """Return the model of a plain or ``_with_http_info`` result."""
+    return getattr(result, "data", result)
+
+
+_NO_TIME = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+
+def _created_key(sandbox: Any) -> Tuple[datetime.datetime, str]:
+    """Sort key ordering sandboxes by creation time, then ID.
+
+    ``created_at`` is parsed rather than compared as a string: Go trims
+    trailing zeros from fractional seconds, so ``09:00:00Z`` sorts after
+    ``09:00:00.5Z`` as text.
+    """
+    created = _NO_TIME
+    if sandbox.created_at:
+        try:
+            created = isoparse(sandbox.created_at)
+        except ValueError:
+            pass
+        else:
+            if created.tzinfo is None:
+                created = created.replace(tzinfo=datetime.timezone.utc)
+    return created, sandbox.id or ""
+
+
+class Shard:
+    """One fluid-remote host and its load estimate.
+
+    :param configuration: Configuration pointing at the host.
+    :param weight: Relative capacity; a host with weight 2 is given twice
+        as many sandboxes as a host with weight 1.
+    :param policy: Outlier ejection thresholds.
+    """
+
+    def __init__(
+        self,
+        configuration: Configuration,
+        weight: float = 1.0,
+        policy: OutlierPolicy = OutlierPolicy(),
+    ) -> None:
+        if weight <= 0:
+            raise ValueError("weight must be positive")
+        self.host = configuration.host
+        self.weight = weight
+        self.api_client = ApiClient(configuration)
+        self.sandbox_api = SandboxApi(self.api_client)
+        self.health_api = HealthApi(self.api_client)
+        self.healthy = True
+        """Result of the last probe; unhealthy hosts receive no new sandboxes."""
+        self.live = 0
+        """Live sandboxes, as last fetched plus local creates and destroys."""
+        self.pending = 0
+        """Creates placed on this host that have not returned yet."""
+        self.refreshed_at: Optional[float] = None
+        self.policy = policy
+        self.latency: Optional[float] = None
+        """Exponentially smoothed call latency in seconds."""
+        self.consecutive_failures = 0
+        self.ejections = 0
+        """Ejections since the host last answered successfully."""
+        self.ejected_until: Optional[float] = None
+        self._outcomes: Deque[Tuple[float, bool]] = collections.deque()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def load(self) -> float:
+        """Weighted number of live and pending sandboxes."""
+        return (self.live + self.pending) / self.weight
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until is not None and time.monotonic() < self.ejected_until
+
+    @property
+    def available(self) -> bool:
+        """Whether new work may be placed on this host."""
+        return self.healthy and not self.ejected
+
+    @property
+    def error_rate(self) -> float:
+        """Fraction of failed calls within the policy window."""
+        with self._stats_lock:
+            self._prune(time.monotonic())
+            if not self._outcomes:
+                return 0.0
+            return sum(1 for _, ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def _prune(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self.policy.window:
+            self._outcomes.popleft()
+
+    def record(self, ok: bool, latency: float) -> None:
+        """Record the outcome of one call and eject the host if it is an outlier."""
+        now = time.monotonic()
+        policy = self.policy
+        with self._stats_lock:
+            self._outcomes.append((now, ok))
+            self._prune(now)
+            self.latency = (
+                latency
+                if self.latency is None
+                else _LATENCY_ALPHA * latency + (1 - _LATENCY_ALPHA) * self.latency
+            )
+            if ok:
+                self.consecutive_failures = 0
+            else:
+                self.consecutive_failures += 1
+            if self.ejected_until is not None and now < self.ejected_until:
+                return
+            failures = sum(1 for _, success in self._outcomes if not success)
+            if (
+                self.consecutive_failures >= policy.consecutive_failures
+                or (
+                    len(self._outcomes) >= policy.min_requests
+                    and failures / len(self._outcomes) >= policy.error_rate
+                )
+                or (
+                    policy.max_latency is not None and self.latency > policy.max_latency
+                )
+            ):
+                self.ejections += 1
+                duration = min(
+                    policy.base_ejection * 2 ** (self.ejections - 1),
+                    policy.max_ejection,
+                )
+                self.ejected_until = now + duration
+                self._outcomes.clear()
+                self.consecutive_failures = 0
+                self.latency = None
+            elif ok:
+                self.ejections = 0
+
+    def call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Call ``fn`` and record its outcome and latency for this host."""
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            if _is_failure(e):
+                self.record(False, time.monotonic() - start)
+            raise
+        self.record(True, time.monotonic() - start)
+        return result
+
+    def is_stale(self, ttl: float) -> bool:
+        return self.refreshed_at is None or time.monotonic() - self.refreshed_at > ttl
+
+    def refresh(self, timeout: Optional[float] = DEFAULT_PROBE_TIMEOUT) -> None:
+        """Probe health and count live sandboxes.
+
+        Probe failures mark the host unhealthy instead of raising.
+        """
+        try:
+            health = self.call(self.health_api.get_health, _request_timeout=timeout)
+            listing = self.call(
+                self.sandbox_api.list_sandboxes, _request_timeout=timeout
+            )
+        except TRANSPORT_ERRORS:
+            self.healthy = False
+        else:
+            self.healthy = health.status == "ok"
+            self.live = sum(
+                1 for sb in listing.sandboxes or [] if sb.state in LIVE_STATES
+            )
+        self.refreshed_at = time.monotonic()
+
+    def close(self) -> None:
+        self.api_client.rest_client.pool_manager.clear()
+
+    def __repr__(self) -> str:
+        return "Shard(%r, live=%d, pending=%d, healthy=%r, ejected=%r)" % (
+            self.host,
+            self.live,
+            self.pending,
+            self.healthy,
+            self.ejected,
+        )
+
+
+class ShardedSandboxClient:
+    """``SandboxApi`` facade over several fluid-remote hosts.
+
+    ``create_sandbox`` goes to the healthy host with the lowest weighted
+    count of live sandboxes; counts are fetched at most every ``load_ttl``
+    seconds and adjusted locally in between, so a burst of creates is spread
+    instead of landing on the same host. Methods that take a sandbox ID
+    (``run_sandbox_command``, ``destroy_sandbox``, ...) are sent to the host
+    that owns it. IDs the client has not seen are located by asking every
+    host. ``list_sandboxes`` queries all hosts in parallel and merges.
+
+    A background thread probes every host each ``probe_interval`` seconds.
+    Hosts that fail the probe, or that :class:`OutlierPolicy` ejects because
+    of their error rate or latency, receive no new sandboxes. Calls without
+    an explicit ``_request_timeout`` use ``connect_timeout`` and
+    ``read_timeout``, and a create whose connection fails is retried on the
+    next host, so an unreachable host costs seconds rather than a full
+    request timeout. A host that accepts a call but stops answering raises
+    once ``read_timeout`` passes and counts as a failed call; commands get
+    their own timeout on top of it.
+
+    Example:
+        >>> client = ShardedSandboxClient(["http://kvm-1:8080", "http://kvm-2:8080"])
+        >>> sb = client.create_sandbox(request).sandbox
+        >>> client.run_sandbox_command(sb.id, run_request)
+        >>> client.host_for(sb.id)
+        'http://kvm-2:8080'
+
+    :param hosts: Base URLs or configurations, one per fluid-remote.
+    :param weights: Relative capacity per host, in the order of ``hosts``.
+    :param load_ttl: Seconds between load probes of a host.
+    :param probe_timeout: Timeout for health and load probes.
+    :param max_workers: Threads used for fan-out; one per host by default.
+    :param probe_interval: Seconds between background probes; ``None``
+        disables the background thread.
+    :param connect_timeout: Connect timeout for calls made without
+        ``_request_timeout``.
+    :param read_timeout: Read timeout for calls made without
+        ``_request_timeout``; ``None`` waits forever.
+    :param policy: Outlier ejection thresholds shared by all hosts.
+    """
+
+    def __init__(
+        self,
+        hosts: Sequence[Union[str, Configuration]],
+        weights: Optional[Sequence[float]] = None,
+        load_ttl: float = DEFAULT_LOAD_TTL,
+        probe_timeout: Optional[float] = DEFAULT_PROBE_TIMEOUT,
+        max_workers: Optional[int] = None,
+        probe_interval: Optional[float] = DEFAULT_PROBE_INTERVAL,
+        connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,
+        policy: OutlierPolicy = OutlierPolicy(),
+    ) -> None:
+        if not hosts:
+            raise ValueError("at least one host is required")
+        if weights is not None and len(weights) != len(hosts):
+            raise ValueError("weights must match hosts")
+        self.shards = [
+            Shard(
+                Configuration(host=host) if isinstance(host, str) else host,
+                1.0 if weights is None else weights[i],
+                policy,
+            )
+            for i, host in enumerate(hosts)
+        ]
+        self.load_ttl = load_ttl
+        self.probe_timeout = probe_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._owners: Dict[str, Shard] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers or len(self.shards), thread_name_prefix="fluid-shard"
+        )
+        self._closed = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+        if probe_interval is not None:
+            self._prober = threading.Thread(
+                target=self._probe_loop,
+                args=(probe_interval,),
+                name="fluid-shard-prober",
+                daemon=True,
+            )
+            self._prober.start()
+
+    def __enter__(self) -> "ShardedSandboxClient":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._prober is not None:
+            self._prober.join()
+        self._executor.shutdown(wait=True)
+        for shard in self.shards:
+            shard.close()
+
+    def _fan_out(
+        self, fn: Callable[[Shard], T], shards: Optional[List[Shard]] = None
+    ) -> List[Tuple[Shard, Optional[T], Optional[BaseException]]]:
+        """Run ``fn`` on every shard in parallel, collecting results and errors."""
+        shards = self.shards if shards is None else shards
+        futures = [(shard, self._executor.submit(fn, shard)) for shard in shards]
+        results = []
+        for shard, future in futures:
+            try:
+                results.append((shard, future.result(), None))
+            except BaseException as e:
+                results.append((shard, None, e))
+        return results
+
+    def refresh(self) -> None:
+        """Probe every host now, ignoring ``load_ttl``."""
+        self._fan_out(lambda shard: shard.refresh(self.probe_timeout))
+
+    def _probe_loop(self, interval: float) -> None:
+        while not self._closed.wait(interval):
+            try:
+                self.refresh()
+            except RuntimeError:
+                # The executor was shut down by a concurrent close().
+                return
+
+    def available_shards(self) -> List[Shard]:
+        """Hosts that currently accept new work."""
+        return [shard for shard in self.shards if shard.available]
+
+    def _call(self, shard: Shard, method: str, *args: Any, **kwargs: Any) -> Any:
+        if kwargs.get("_request_timeout") is None:
+            read = self.read_timeout
+            if read is not None and _base_method(method) == "run_sandbox_command":
+                # The host answers only once the command has finished.
+                request = args[1] if len(args) > 1 else kwargs.get("request")
+                command = getattr(request, "timeout_sec", None)
+                read += command or DEFAULT_COMMAND_TIMEOUT
+            if self.connect_timeout is not None or read is not None:
+                kwargs["_request_timeout"] = (self.connect_timeout, read)
+        return shard.call(getattr(shard.sandbox_api, method), *args, **kwargs)
+
+    def _place(self, exclude: Set[Shard]) -> Shard:
+        stale = [
+            shard
+            for shard in self.shards
+            if shard not in exclude and shard.is_stale(self.load_ttl)
+        ]
+        if stale:
+            self._fan_out(lambda shard: shard.refresh(self.probe_timeout), stale)
+        with self._lock:
+            candidates = [
+                shard
+                for shard in self.shards
+                if shard.available and shard not in exclude
+            ]
+            if not candidates:
+                raise ServiceException(
+                    status=503, reason="No healthy fluid-remote host available"
+                )
+            shard = min(candidates, key=lambda s: s.load)
+            shard.pending += 1
+            return shard
+
+    def _remember(self, sandbox_id: Optional[str], shard: Shard) -> None:
+        if sandbox_id:
+            with self._lock:
+                self._owners[sandbox_id] = shard
+
+    def _create(self, method: str, request: Any, **kwargs: Any) -> Any:
+        tried: Set[Shard] = set()
+        while True:
+            shard = self._place(tried)
+            try:
+                result = self._call(shard, method, request, **kwargs)
+            except BaseException as e:
+                with self._lock:
+                    shard.pending -= 1
+                if _read_timed_out(e):
+                    # The create may have happened, so it is not retried, but
+                    # the next one goes elsewhere.
+                    shard.healthy = False
+                if not _connect_failed(e):
+                    raise
+                # Nothing reached the host, so the create is safe to retry.
+                shard.healthy = False
+                tried.add(shard)
+                continue
+            break
+        with self._lock:
+            shard.pending -= 1
+            shard.live += 1
+        data = _result_data(result)
+        if isinstance(data, FluidRemoteInternalRestCreateSandboxResponse):
+            if data.sandbox is not None:
+                self._remember(data.sandbox.id, shard)
+        return result
+
+    def create_sandbox(
+        self, request: FluidRemoteInternalRestCreateSandboxRequest, **kwargs: Any
+    ) -> FluidRemoteInternalRestCreateSandboxResponse:
+        """Create a sandbox on the least loaded healthy host.
+
+        Accepts the same arguments as ``SandboxApi.create_sandbox``. If the
+        chosen host cannot be connected to, the next one is tried.
+
+        :raises ServiceException: If no host is healthy.
+        """
+        return self._create("create_sandbox", request, **kwargs)
+
+    def create_sandbox_with_http_info(
+        self, request: FluidRemoteInternalRestCreateSandboxRequest, **kwargs: Any
+    ) -> Any:
+        """Like :meth:`create_sandbox`, returning the ``ApiResponse``."""
+        return self._create("create_sandbox_with_http_info", request, **kwargs)
+
+    def shard_for(self, sandbox_id: str) -> Shard:
+        """Return the shard owning ``sandbox_id``, locating it if unknown.
+
+        :raises NotFoundException: If no host knows the sandbox.
+        """
+        with self._lock:
+            shard = self._owners.get(sandbox_id)
+        if shard is not None:
+            return shard
+        for shard, _, error in self._fan_out(
+            lambda s: self._call(s, "get_sandbox", sandbox_id)
+        ):
+            if error is None:
+                self._remember(sandbox_id, shard)
+                return shard
+        raise NotFoundException(
+            status=404, reason="Sandbox %s not found on any host" % sandbox_id
+        )
+
+    def host_for(self, sandbox_id: str) -> str:
+        """Return the base URL of the host owning ``sandbox_id``."""
+        return self.shard_for(sandbox_id).host
+
+    def forget(self, sandbox_id: str) -> None:
+        """Drop the cached owner of ``sandbox_id``."""
+        with self._lock:
+            self._owners.pop(sandbox_id, None)
+
+    def _routed(self, method: str) -> Callable[..., Any]:
+        destroys = _base_method(method) == "destroy_sandbox"
+
+        def call(id: str, *args: Any, **kwargs: Any) -> Any:
+            shard = self.shard_for(id)
+            result = self._call(shard, method, id, *args, **kwargs)
+            if destroys:
+                self.forget(id)
+                with self._lock:
+                    shard.live = max(shard.live - 1, 0)
+            return result
+
+        call.__name__ = method
+        call.__doc__ = getattr(SandboxApi, method).__doc__
+        return call
+
+    def __getattr__(self, name: str) -> Any:
+        if _base_method(name) in ROUTED_METHODS:
+            return self._routed(name)
+        raise AttributeError(
+            "%r object has no attribute %r" % (type(self).__name__, name)
+        )
+
+    def list_sandboxes(
+        self,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        **kwargs: Any,
+    ) -> FluidRemoteInternalRestListSandboxesResponse:
+        """List sandboxes on every host, merged newest first.
+
+        Filters are passed to each host's ``SandboxApi.list_sandboxes``;
+        ``limit`` and ``offset`` apply to the merged list, which is ordered
+        like each host's (``created_at`` descending) so pages do not
+        overlap. As from one host, ``total`` is the number of sandboxes
+        returned. Owners of the listed sandboxes are remembered for routing.
+
+        :raises ApiException: If any host fails.
+        """
+        per_host = None if limit is None else (offset or 0) + limit
+        results = self._fan_out(
+            lambda shard: self._call(shard, "list_sandboxes", limit=per_host, **kwargs)
+        )
+        sandboxes = []
+        for shard, result, error in results:
+            if error is not None:
+                raise error
+            for sb in result.sandboxes or []:
+                self._remember(sb.id, shard)
+                sandboxes.append(sb)
+        sandboxes.sort(key=_created_key, reverse=True)
+        start = offset or 0
+        end = None if limit is None else start + limit
+        page = sandboxes[start:end]
+        return FluidRemoteInternalRestListSandboxesResponse(
+            sandboxes=page, total=len(page)
+        )
@@ -0,0 +1,326 @@
+# coding: utf-8
+
+"""Spill-to-disk handling for oversized response bodies.
+
+Bodies larger than ``Configuration.spill_threshold`` are streamed into an
+unlinked temporary file and memory-mapped, so they occupy page cache rather
+than Python heap. JSON bodies are then parsed directly from the mapping;
+string values of at least ``Configuration.spill_string_threshold`` encoded
+bytes are not decoded but returned as :class:`SpilledText` handles.
+"""
+
+import codecs
+import json
+import mmap
+import re
+import tempfile
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+"""Bytes read from the network, or decoded from a handle, per step."""
+
+Buffer = Union[bytes, mmap.mmap]
+Path = Tuple[Union[str, int], ...]
+
+_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+_NUMBER = re.compile(rb"-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?")
+_LITERALS = {b"true": True, b"false": False, b"null": None}
+
+
+class SpilledText:
+    """Lazy handle to a large string kept in a spilled response.
+
+    The text stays in the memory-mapped response until it is read, so holding
+    the handle costs a few bytes regardless of the string's size. Call
+    :meth:`read` (or ``str(handle)``) to materialise it, or
+    :meth:`iter_chunks` / :meth:`copy_to` to process it incrementally.
+
+    :param buffer: Memory-mapped response body.
+    :param start: Offset of the first byte of the value.
+    :param end: Offset just past the last byte of the value.
+    :param json_escaped: Whether the bytes are a JSON string body (without
+        the surrounding quotes) rather than plain encoded text.
+    :param encoding: Text encoding of plain bodies.
+    """
+
+    __slots__ = ("_buffer", "_start", "_end", "_json_escaped", "_encoding")
+
+    def __init__(
+        self,
+        buffer: Buffer,
+        start: int,
+        end: int,
+        json_escaped: bool = True,
+        encoding: str = "utf-8",
+    ) -> None:
+        self._buffer = buffer
+        self._start = start
+        self._end = end
+        self._json_escaped = json_escaped
+        self._encoding = encoding
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the value as it appears in the response body."""
+        return self._end - self._start
+
+    def iter_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+        """Decode the value in pieces of roughly ``chunk_size`` bytes."""
+        if not self._json_escaped:
+            decoder = codecs.getincrementaldecoder(self._encoding)("replace")
+            for pos in range(self._start, self._end, chunk_size):
+                text = decoder.decode(
+                    self._buffer[pos : min(pos + chunk_size, self._end)]
+                )
+                if text:
+                    yield text
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        # Room for the longest unsplittable unit, an escaped surrogate pair.
+        chunk_size = max(chunk_size, 12)
+        pos = self._start
+        while pos < self._end:
+            text, pos = _decode_escaped(
+                self._buffer, pos, min(pos + chunk_size, self._end), self._end
+            )
+            yield text
+
+    def read(self) -> str:
+        """Decode and return the whole value."""
+        return "".join(self.iter_chunks())
+
+    def copy_to(self, fp: Any, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """Write the decoded value to text file ``fp``; return characters written."""
+        written = 0
+        for text in self.iter_chunks(chunk_size):
+            fp.write(text)
+            written += len(text)
+        return written
+
+    def __str__(self) -> str:
+        return self.read()
+
+    def __repr__(self) -> str:
+        return "SpilledText(nbytes=%d)" % self.nbytes
+
+
+def _decode_escaped(buf: Buffer, start: int, cut: int, end: int) -> Tuple[str, int]:
+    """Decode ``buf[start:cut]`` of a JSON string body, moving ``cut`` back
+    until it no longer splits an escape, surrogate pair or UTF-8 sequence."""
+    for _ in range(13):
+        piece = buf[start:cut]
+        try:
+            text = json.loads(b'"' + piece + b'"')
+        except ValueError:
+            if cut <= start + 1:
+                break
+            cut -= 1
+            continue
+        if cut < end and text and "\ud800" <= text[-1] <= "\udbff":
+            # A \uD8xx escape whose low surrogate is in the next piece.
+            cut -= 6
+            continue
+        if cut <= start:
+            break
+        return text, cut
+    raise ValueError("invalid JSON string at offset %d" % start)
+
+
+def spool(
+    response: Any,
+    threshold: int,
+    temp_dir: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Buffer:
+    """Read a urllib3 response, spilling to disk once it exceeds ``threshold``.
+
+    Small bodies are returned as ``bytes``. Larger ones are written chunk by
+    chunk to an unlinked temporary file in ``temp_dir`` and returned as a
+    read-only ``mmap``, which supports ``len``, slicing and ``bytes()``.
+    Useful with the ``*_without_preload_content`` API variants.
+
+    :param response: Unread ``urllib3.HTTPResponse``.
+    :param threshold: Largest body, in bytes, kept in memory.
+    :param temp_dir: Directory for the temporary file.
+    :param chunk_size: Bytes read per network read.
+    :return: The response body.
+    """
+    chunks: List[bytes] = []
+    size = 0
+    spill_file = None
+    try:
+        for chunk in response.stream(chunk_size):
+            if spill_file is not None:
+                spill_file.write(chunk)
+                continue
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > threshold:
+                spill_file = tempfile.TemporaryFile(dir=temp_dir)
+                spill_file.writelines(chunks)
+                chunks = []
+        if spill_file is None:
+            return b"".join(chunks)
+        spill_file.flush()
+        return mmap.mmap(spill_file.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        if spill_file is not None:
+            # The mapping keeps its own reference to the file.
+            spill_file.close()
+        response.release_conn()
+
+
+def is_spilled(data: Any) -> bool:
+    """Whether ``data`` is a body returned by :func:`spool` on disk."""
+    return isinstance(data, mmap.mmap)
+
+
+class _Parser:
+    """JSON parser over a bytes-like buffer that leaves large strings in place."""
+
+    def __init__(self, buf: Buffer, string_threshold: int) -> None:
+        self.buf = buf
+        self.string_threshold = string_threshold
+        self.handles: List[Tuple[Path, SpilledText]] = []
+
+    def skip(self, pos: int) -> int:
+        return _WHITESPACE.match(self.buf, pos).end()  # type: ignore[union-attr]
+
+    def string_end(self, pos: int) -> int:
+        """Return the offset of the closing quote of the string opened at pos."""
+        buf = self.buf
+        end = pos
+        while True:
+            end = buf.find(b'"', end + 1)
+            if end < 0:
+                raise ValueError("unterminated string at offset %d" % pos)
+            backslashes = 0
+            while buf[end - 1 - backslashes] == 0x5C:
+                backslashes += 1
+            if backslashes % 2 == 0:
+                return end
+
+    def value(self, pos: int, path: Path) -> Tuple[Any, int]:
+        pos = self.skip(pos)
+        buf = self.buf
+        char = buf[pos : pos + 1]
+        if char == b"{":
+            obj = {}
+            pos = self.skip(pos + 1)
+            if buf[pos : pos + 1] == b"}":
+                return obj, pos + 1
+            while True:
+                if buf[pos : pos + 1] != b'"':
+                    raise ValueError("expected key at offset %d" % pos)
+                key_end = self.string_end(pos)
+                key = json.loads(buf[pos : key_end + 1])
+                pos = self.skip(key_end + 1)
+                if buf[pos : pos + 1] != b":":
+                    raise ValueError("expected ':' at offset %d" % pos)
+                obj[key], pos = self.value(pos + 1, path + (key,))
+                pos = self.skip(pos)
+                char = buf[pos : pos + 1]
+                pos = self.skip(pos + 1)
+                if char == b"}":
+                    return obj, pos
+                if char != b",":
+                    raise ValueError("expected ',' or '}' at offset %d" % pos)
+        if char == b"[":
+            items: List[Any] = []
+            pos = self.skip(pos + 1)
+            if buf[pos : pos + 1] == b"]":
+                return items, pos + 1
+            while True:
+                item, pos = self.value(pos, path + (len(items),))
+                items.append(item)
+                pos = self.skip(pos)
+                char = buf[pos : pos + 1]
+                pos += 1
+                if char == b"]":
+                    return items, pos
+                if char != b",":
+                    raise ValueError("expected ',' or ']' at offset %d" % pos)
+        if char == b'"':
+            end = self.string_end(pos)
+            if end - pos - 1 >= self.string_threshold:
+                self.handles.append((path, SpilledText(buf, pos + 1, end)))
+                return "", end + 1
+            return json.loads(buf[pos : end + 1]), end + 1
+        match = _NUMBER.match(buf, pos)
+        if match is not None and match.end() > pos:
+            text = match.group()
+            if match.group(1) or match.group(2):
+                return float(text), match.end()
+            return int(text), match.end()
+        for literal, result in _LITERALS.items():
+            if buf[pos : pos + len(literal)] == literal:
+                return result, pos + len(literal)
+        raise ValueError("unexpected character at offset %d" % pos)
+
+
+def load_json(
+    buf: Buffer, string_threshold: int
+) -> Tuple[Any, List[Tuple[Path, SpilledText]]]:
+    """Parse a JSON document without decoding its large strings.
+
+    Each string of at least ``string_threshold`` encoded bytes is replaced by
+    ``""`` in the result so it still validates as ``str``; its location and
+    handle are returned alongside for :func:`attach`.
+
+    :param buf: Response body, typically the ``mmap`` returned by :func:`spool`.
+    :param string_threshold: Smallest string, in encoded bytes, to leave lazy.
+    :return: ``(data, [(path, handle), ...])``.
+    """
+    parser = _Parser(buf, string_threshold)
+    data, pos = parser.value(0, ())
+    if parser.skip(pos) != len(buf):
+        raise ValueError("extra data at offset %d" % pos)
+    return data, parser.handles
+
+
+def attach(obj: Any, handles: List[Tuple[Path, SpilledText]]) -> Any:
+    """Put handles back at their paths inside a deserialized object.
+
+    Paths use JSON keys, which are matched against model field aliases.
+    Model fields are set without validation since a handle is not a ``str``;
+    values that did not survive deserialization are skipped.
+
+    :return: ``obj``, or the handle itself when the whole document was one
+        large string.
+    """
+    for path, handle in handles:
+        if not path:
+            return handle
+        try:
+            target = obj
+            for key in path[:-1]:
+                target = _child(target, key)
+            _set_child(target, path[-1], handle)
+        except (AttributeError, KeyError, IndexError, TypeError):
+            # The value was dropped during deserialization, e.g. an unknown key.
+            continue
+    return obj
+
+
+def _field_name(model: BaseModel, key: str) -> str:
+    for name, field in type(model).model_fields.items():
+        if (field.alias or name) == key:
+            return name
+    return key
+
+
+def _child(obj: Any, key: Union[str, int]) -> Any:
+    if isinstance(obj, BaseModel):
+        return getattr(obj, _field_name(obj, str(key)))
+    return obj[key]
+
+
+def _set_child(obj: Any, key: Union[str, int], value: Any) -> None:
+    if isinstance(obj, BaseModel):
+        obj.__dict__[_field_name(obj, str(key))] = value
+    else:
+        obj[key] = value
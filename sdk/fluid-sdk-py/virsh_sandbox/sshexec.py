@@ -0,0 +1,394 @@
+# coding: utf-8
+
+"""Run commands in sandboxes over direct, multiplexed SSH connections.
+
+``SandboxApi.run_sandbox_command`` sends each command through fluid-remote,
+which opens a new SSH session for it. :class:`DirectExecutor` instead gets a
+certificate through ``AccessApi.request_access`` and keeps one OpenSSH
+control master per sandbox. Each command then runs as a new channel on that
+connection, with no key exchange or authentication.
+
+The system ``ssh`` client is used, so no extra Python packages are needed.
+Every connection is recorded with ``record_session_start`` when it opens
+and ``record_session_end`` when it closes. The access API stores sessions
+rather than single commands, so the end record's reason carries the command
+lines run on the connection with their exit codes, up to a size limit.
+Output and timings are kept locally in :attr:`DirectExecutor.history`.
+"""
+
+import collections
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Sequence
+
+from virsh_sandbox.api.access_api import AccessApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.certcache import CachedCertificate, CertificateCache
+from virsh_sandbox.models.internal_rest_session_end_request import (
+    InternalRestSessionEndRequest,
+)
+from virsh_sandbox.models.internal_rest_session_start_request import (
+    InternalRestSessionStartRequest,
+)
+
+_SSH_CONNECT_FAILED = 255
+
+
+class ExecResult(NamedTuple):
+    """Outcome of one command run by :class:`DirectExecutor`."""
+
+    sandbox_id: str
+    command: str
+    exit_code: int
+    stdout: bytes
+    stderr: bytes
+    started_at: float
+    """Unix time the command was started."""
+    duration: float
+    """Seconds the command took, including the SSH channel setup."""
+    session_id: Optional[str]
+    """Access session the command ran in."""
+
+
+class _Connection:
+    """Control master for one sandbox and its audit session."""
+
+    def __init__(self, sandbox_id: str, control_path: str) -> None:
+        self.sandbox_id = sandbox_id
+        self.control_path = control_path
+        self.lock = threading.Lock()
+        self.open = False
+        self.destination = ""
+        self.port: Optional[int] = None
+        self.session_id: Optional[str] = None
+        self.commands = 0
+        self.failures = 0
+        self.log: List[str] = []
+        self.log_size = 0
+
+
+class DirectExecutor:
+    """Run sandbox commands over persistent SSH connections.
+
+    The first command for a sandbox fetches a certificate for
+    ``public_key`` and opens a control master with it. Later commands reuse
+    that connection until it drops or :meth:`close` is called. The
+    certificate is needed only to authenticate, so an open connection
+    outlives it. A new connection gets a fresh certificate from the
+    :class:`CertificateCache`.
+
+    Commands may run from several threads at once. They share the
+    connection as separate channels, up to the sandbox sshd's
+    ``MaxSessions``, 10 by default.
+
+    Example:
+        >>> with DirectExecutor("~/.ssh/id_ed25519", "alice", api_client) as ex:
+        ...     result = ex.run(sandbox_id, "systemctl is-active nginx")
+        ...     print(result.exit_code, result.stdout)
+
+    :param private_key: Path of the private key whose public half is
+        certified.
+    :param user_id: User the certificates and sessions are issued to.
+    :param api_client: Client for the access API; the default client if
+        omitted.
+    :param public_key: Public key in OpenSSH format; read from
+        ``private_key + ".pub"`` if omitted.
+    :param certificates: Certificate cache to use; one is created with
+        ``ttl_minutes`` if omitted.
+    :param ttl_minutes: Lifetime of certificates from a created cache.
+    :param control_dir: Directory for control sockets, certificates and
+        known hosts; a private temporary directory if omitted.
+    :param control_persist: Seconds an idle control master stays open.
+    :param connect_timeout: SSH connect timeout in seconds.
+    :param ssh_options: Extra ``-o`` options, e.g. ``{"ProxyJump": "bastion"}``.
+    :param ssh_binary: The ``ssh`` client to run.
+    :param history_size: Command results kept in :attr:`history`.
+    :param session_log_limit: Bytes of command lines recorded in each
+        session's end record; later commands are only counted.
+    """
+
+    def __init__(
+        self,
+        private_key: str,
+        user_id: str,
+        api_client: Optional[ApiClient] = None,
+        public_key: Optional[str] = None,
+        certificates: Optional[CertificateCache] = None,
+        ttl_minutes: Optional[int] = 10,
+        control_dir: Optional[str] = None,
+        control_persist: int = 600,
+        connect_timeout: int = 10,
+        ssh_options: Optional[Dict[str, str]] = None,
+        ssh_binary: str = "ssh",
+        history_size: int = 1000,
+        session_log_limit: int = 16384,
+    ) -> None:
+        self.private_key = os.path.expanduser(private_key)
+        if public_key is None:
+            with open(self.private_key + ".pub") as f:
+                public_key = f.read().strip()
+        self.public_key = public_key
+        self.user_id = user_id
+        self.access = AccessApi(api_client)
+        self._own_certificates = certificates is None
+        self.certificates = certificates or CertificateCache(
+            api_client, ttl_minutes=ttl_minutes
+        )
+        self._own_dir = control_dir is None
+        self.control_dir = control_dir or tempfile.mkdtemp(prefix="fluid-ssh-")
+        os.makedirs(self.control_dir, mode=0o700, exist_ok=True)
+        self.control_persist = control_persist
+        self.connect_timeout = connect_timeout
+        self.ssh_options = dict(ssh_options or {})
+        self.ssh_binary = ssh_binary
+        self.history: Deque[ExecResult] = collections.deque(maxlen=history_size)
+        self.session_log_limit = session_log_limit
+        self._lock = threading.Lock()
+        self._connections: Dict[str, _Connection] = {}
+        self._closed = False
+
+    def __enter__(self) -> "DirectExecutor":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.close()
+
+    def _connection(self, sandbox_id: str) -> _Connection:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("executor is closed")
+            conn = self._connections.get(sandbox_id)
+            if conn is None:
+                # Socket paths are limited to about 100 bytes, so use a hash.
+                name = hashlib.sha256(sandbox_id.encode("utf-8")).hexdigest()[:16]
+                conn = _Connection(sandbox_id, os.path.join(self.control_dir, name))
+                self._connections[sandbox_id] = conn
+            return conn
+
+    def _base_args(self, conn: _Connection) -> List[str]:
+        options = {
+            "ControlPath": conn.control_path,
+            "BatchMode": "yes",
+            "ConnectTimeout": str(self.connect_timeout),
+            # Sandbox IPs are reused, so host keys are pinned on first use
+            # per sandbox rather than per address.
+            "UserKnownHostsFile": conn.control_path + "-known_hosts",
+            "StrictHostKeyChecking": "accept-new",
+        }
+        options.update(self.ssh_options)
+        args = [self.ssh_binary]
+        for key, value in options.items():
+            args += ["-o", "%s=%s" % (key, value)]
+        if conn.port is not None:
+            args += ["-p", str(conn.port)]
+        return args
+
+    def _connect(self, conn: _Connection) -> None:
+        cert = self.certificates.get(conn.sandbox_id, self.user_id, self.public_key)
+        response = cert.response
+        if not response.vm_ip_address:
+            raise ConnectionError("sandbox %s has no IP address" % conn.sandbox_id)
+        cert_path = conn.control_path + "-cert.pub"
+        with open(cert_path, "w") as f:
+            f.write((response.certificate or "").strip() + "\n")
+        conn.destination = "%s@%s" % (
+            response.username or "sandbox",
+            response.vm_ip_address,
+        )
+        conn.port = response.ssh_port
+        args = self._base_args(conn) + [
+            "-o",
+            "ControlMaster=yes",
+            "-o",
+            "ControlPersist=%d" % self.control_persist,
+            "-o",
+            "IdentitiesOnly=yes",
+            "-o",
+            "CertificateFile=%s" % cert_path,
+            "-i",
+            self.private_key,
+            "-N",
+            "-f",
+            conn.destination,
+        ]
+        done = subprocess.run(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            timeout=self.connect_timeout + 5,
+        )
+        if done.returncode != 0:
+            raise ConnectionError(
+                "ssh to sandbox %s failed: %s"
+                % (conn.sandbox_id, done.stderr.decode("utf-8", "replace").strip())
+            )
+        conn.open = True
+        conn.commands = conn.failures = conn.log_size = 0
+        conn.log = []
+        try:
+            conn.session_id = self._session_start(cert)
+        except BaseException:
+            # No unaudited connections.
+            self._disconnect(conn, "session start failed")
+            raise
+
+    def _session_start(self, cert: CachedCertificate) -> Optional[str]:
+        if not cert.certificate_id:
+            return None
+        started = self.access.record_session_start(
+            InternalRestSessionStartRequest(certificate_id=cert.certificate_id)
+        )
+        return started.session_id
+
+    def _disconnect(self, conn: _Connection, reason: str) -> None:
+        if conn.open:
+            subprocess.run(
+                self._base_args(conn) + ["-O", "exit", conn.destination],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=self.connect_timeout + 5,
+            )
+        conn.open = False
+        session_id, conn.session_id = conn.session_id, None
+        if session_id is not None:
+            summary = "%s; %d commands, %d failed" % (
+                reason,
+                conn.commands,
+                conn.failures,
+            )
+            lines = [summary] + conn.log
+            if len(conn.log) < conn.commands:
+                lines.append("... %d more" % (conn.commands - len(conn.log)))
+            summary = "\n".join(lines)
+            self.access.record_session_end(
+                InternalRestSessionEndRequest(session_id=session_id, reason=summary)
+            )
+
+    def _alive(self, conn: _Connection) -> bool:
+        done = subprocess.run(
+            self._base_args(conn) + ["-O", "check", conn.destination],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=self.connect_timeout + 5,
+        )
+        return done.returncode == 0
+
+    def run(
+        self,
+        sandbox_id: str,
+        command: str,
+        input: Optional[bytes] = None,
+        timeout: Optional[float] = None,
+    ) -> ExecResult:
+        """Run ``command`` with the sandbox user's shell.
+
+        A non-zero exit code is returned, not raised.
+
+        :param sandbox_id: Sandbox to run in.
+        :param command: Shell command line.
+        :param input: Bytes fed to the command's stdin.
+        :param timeout: Seconds before the local ``ssh`` is killed.
+        :raises ConnectionError: If no connection could be opened, or it
+            broke while the command ran. The command may or may not have
+            run; the next call reconnects.
+        :raises subprocess.TimeoutExpired: If ``timeout`` passed.
+        """
+        conn = self._connection(sandbox_id)
+        with conn.lock:
+            if not conn.open:
+                self._connect(conn)
+            args = self._base_args(conn) + [
+                "-o",
+                "ControlMaster=no",
+                conn.destination,
+                "--",
+                command,
+            ]
+            session_id = conn.session_id
+        started = time.time()
+        begin = time.monotonic()
+        done = subprocess.run(
+            args,
+            input=input,
+            stdin=None if input is not None else subprocess.DEVNULL,
+            capture_output=True,
+            timeout=timeout,
+        )
+        duration = time.monotonic() - begin
+        if done.returncode == _SSH_CONNECT_FAILED:
+            with conn.lock:
+                if conn.open and not self._alive(conn):
+                    conn.open = False
+                    self._disconnect(conn, "connection lost")
+                    raise ConnectionError(
+                        "ssh connection to sandbox %s lost: %s"
+                        % (sandbox_id, done.stderr.decode("utf-8", "replace").strip())
+                    )
+        result = ExecResult(
+            sandbox_id,
+            command,
+            done.returncode,
+            done.stdout,
+            done.stderr,
+            started,
+            duration,
+            session_id,
+        )
+        with conn.lock:
+            conn.commands += 1
+            if done.returncode != 0:
+                conn.failures += 1
+            # One line per command, escaped so multi-line commands stay one.
+            line = "[%d] %s" % (
+                done.returncode,
+                command.encode("unicode_escape").decode("ascii"),
+            )
+            if conn.log_size + len(line) + 1 <= self.session_log_limit:
+                conn.log.append(line)
+                conn.log_size += len(line) + 1
+        self.history.append(result)
+        return result
+
+    def run_many(
+        self, sandbox_id: str, commands: Sequence[str], **kwargs: Any
+    ) -> List[ExecResult]:
+        """Run ``commands`` one after another on the same connection."""
+        return [self.run(sandbox_id, command, **kwargs) for command in commands]
+
+    def disconnect(self, sandbox_id: str, reason: str = "closed by client") -> None:
+        """Close the connection to ``sandbox_id`` and end its session."""
+        with self._lock:
+            conn = self._connections.pop(sandbox_id, None)
+        if conn is not None:
+            with conn.lock:
+                self._disconnect(conn, reason)
+
+    def close(self) -> None:
+        """Close every connection and end their sessions."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            connections = list(self._connections.values())
+            self._connections.clear()
+        errors = []
+        for conn in connections:
+            with conn.lock:
+                try:
+                    self._disconnect(conn, "closed by client")
+                except Exception as e:
+                    errors.append(e)
+        if self._own_certificates:
+            self.certificates.close()
+        if self._own_dir:
+            shutil.rmtree(self.control_dir, ignore_errors=True)
+        if errors:
+            raise errors[0]
@@ -0,0 +1,1173 @@
+# coding: utf-8
+
+"""In-memory stand-in for fluid-remote, for load tests without VMs.
+
+:class:`StandinServer` answers the ``/v1/sandboxes``, ``/v1/vms``,
+``/v1/ansible/*`` and ``/v1/access/*`` endpoints the SDK calls. It keeps
+the same status codes and response shapes as fluid-remote, but nothing
+runs. Sandboxes, commands, snapshots, jobs, certificates and sessions live
+in memory. Cloning, booting, IP discovery, commands, snapshots, diffs and
+Ansible runs sleep for a time drawn from a configurable :class:`Latency`.
+Any operation can be made to fail at a given rate, and commands can be
+made to exit non-zero. The list, command and diff endpoints answer in CBOR
+when the ``Accept`` header prefers it, as fluid-remote's do.
+
+Certificates from ``/v1/access/request`` are well-formed OpenSSH
+certificates with an empty signature. :func:`parse_ssh_certificate` reads
+them, but sshd would reject them. WebSocket streams are not implemented.
+
+Run it on its own with::
+
+    python -m virsh_sandbox.standin --port 8080 --create lognormal:2,0.5 \\
+        --fail create=0.02
+"""
+
+import argparse
+import base64
+import itertools
+import json
+import math
+import os
+import random
+import re
+import socket
+import socketserver
+import stat
+import struct
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from virsh_sandbox import cbor
+
+OPERATIONS = (
+    "create",
+    "start",
+    "ip",
+    "run",
+    "snapshot",
+    "diff",
+    "destroy",
+    "ansible",
+    "access",
+)
+"""Operations with their own latency and failure rate."""
+
+_DESCRIPTIONS = {
+    "create": "cloning a sandbox",
+    "start": "booting a sandbox",
+    "ip": "IP discovery",
+    "run": "a command",
+    "snapshot": "a snapshot",
+    "diff": "a snapshot diff",
+    "destroy": "destroying a sandbox",
+    "ansible": "an Ansible job",
+    "access": "issuing a certificate",
+}
+
+
+class Latency(NamedTuple):
+    """A distribution of durations in seconds.
+
+    ``kind`` is ``"fixed"`` (always ``a``), ``"uniform"`` (between ``a`` and
+    ``b``), ``"normal"`` (mean ``a``, standard deviation ``b``, never below
+    zero) or ``"lognormal"`` (median ``a``, shape ``b``; long-tailed like
+    real clone and boot times).
+    """
+
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.a
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        if self.kind == "normal":
+            return max(rng.gauss(self.a, self.b), 0.0)
+        if self.kind == "lognormal":
+            return self.a * math.exp(rng.gauss(0.0, self.b)) if self.a > 0 else 0.0
+        raise ValueError("unknown latency distribution %r" % self.kind)
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        """Parse ``"0.5"``, ``"uniform:0.1,0.4"``, ``"normal:1,0.2"`` or
+        ``"lognormal:2,0.5"``."""
+        kind, _, args = spec.partition(":")
+        if not args:
+            return cls("fixed", float(kind))
+        values = [float(v) for v in args.split(",")]
+        if kind not in ("fixed", "uniform", "normal", "lognormal") or len(values) > 2:
+            raise ValueError("invalid latency %r" % spec)
+        latency = cls(kind, *values)
+        latency.sample(random.Random(0))
+        return latency
+
+
+NO_LATENCY = Latency()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _short_id(prefix: str) -> str:
+    return "%s-%s" % (prefix, uuid.uuid4().hex[:8].upper())
+
+
+def _ssh_string(data: bytes) -> bytes:
+    return struct.pack("!I", len(data)) + data
+
+
+def _unsigned_certificate(
+    serial: int, key_id: str, principal: str, valid_after: int, valid_before: int
+) -> str:
+    key_type = b"ssh-ed25519-cert-v01@openssh.com"
+    blob = b"".join(
+        [
+            _ssh_string(key_type),
+            _ssh_string(os.urandom(32)),  # nonce
+            _ssh_string(os.urandom(32)),  # public key
+            struct.pack("!QI", serial, 1),  # serial, user certificate
+            _ssh_string(key_id.encode()),
+            _ssh_string(_ssh_string(principal.encode())),
+            struct.pack("!QQ", valid_after, valid_before),
+            _ssh_string(b""),  # critical options
+            _ssh_string(b""),  # extensions
+            _ssh_string(b""),  # reserved
+            _ssh_string(b""),  # signature key
+            _ssh_string(b""),  # signature
+        ]
+    )
+    return "%s %s standin" % (key_type.decode(), base64.b64encode(blob).decode())
+
+
+_CA_PUBLIC_KEY = (
+    "ssh-ed25519 %s standin-ca"
+    % base64.b64encode(_ssh_string(b"ssh-ed25519") + _ssh_string(bytes(32))).decode()
+)
+
+
+class _Failure(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+Route = Tuple[str, "re.Pattern[str]", str]
+
+
+def _routes(*specs: Tuple[str, str, str]) -> List[Route]:
+    compiled = []
+    for method, path, name in specs:
+        pattern = re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", path)
+        compiled.append((method, re.compile("^" + pattern + "/?$"), name))
+    return compiled
+
+
+class StandinState:
+    """The stand-in's data and request handlers, without the HTTP layer.
+
+    :param latency: :class:`Latency` per name in :data:`OPERATIONS`; those
+        not given take no time. For ``"ansible"`` it is how long a job runs.
+    :param failures: Rate between 0 and 1 per operation, or ``"*"`` for
+        every request, at which calls fail with HTTP 500. For ``"ansible"``
+        the job is accepted and ends ``failed`` instead.
+    :param command_failure_rate: Rate at which commands exit with status 1.
+    :param vms: Names of the base VMs sandboxes can be cloned from.
+    :param seed: Seed for the latency and failure draws.
+    """
+
+    ROUTES = _routes(
+        ("GET", "/v1/health", "health"),
+        ("GET", "/v1/vms", "list_vms"),
+        ("GET", "/v1/sandboxes", "list_sandboxes"),
+        ("POST", "/v1/sandboxes", "create_sandbox"),
+        ("GET", "/v1/sandboxes/{id}", "get_sandbox"),
+        ("DELETE", "/v1/sandboxes/{id}", "destroy_sandbox"),
+        ("GET", "/v1/sandboxes/{id}/commands", "list_commands"),
+        ("GET", "/v1/sandboxes/{id}/ip", "discover_ip"),
+        ("POST", "/v1/sandboxes/{id}/sshkey", "inject_ssh_key"),
+        ("POST", "/v1/sandboxes/{id}/start", "start_sandbox"),
+        ("POST", "/v1/sandboxes/{id}/run", "run_command"),
+        ("POST", "/v1/sandboxes/{id}/snapshot", "create_snapshot"),
+        ("POST", "/v1/sandboxes/{id}/diff", "diff_snapshots"),
+        ("GET", "/v1/sandboxes/{id}/diff", "get_cached_diff"),
+        ("POST", "/v1/sandboxes/{id}/generate/{tool}", "generate"),
+        ("POST", "/v1/sandboxes/{id}/publish", "publish"),
+        ("POST", "/v1/ansible/jobs", "create_job"),
+        ("GET", "/v1/ansible/jobs/{job_id}", "get_job"),
+        ("GET", "/v1/ansible/playbooks", "list_playbooks"),
+        ("POST", "/v1/ansible/playbooks", "create_playbook"),
+        ("GET", "/v1/ansible/playbooks/{name}", "get_playbook"),
+        ("DELETE", "/v1/ansible/playbooks/{name}", "delete_playbook"),
+        ("GET", "/v1/ansible/playbooks/{name}/export", "export_playbook"),
+        ("POST", "/v1/ansible/playbooks/{name}/tasks", "add_task"),
+        ("PATCH", "/v1/ansible/playbooks/{name}/tasks/reorder", "reorder_tasks"),
+        ("PUT", "/v1/ansible/playbooks/{name}/tasks/{task_id}", "update_task"),
+        ("DELETE", "/v1/ansible/playbooks/{name}/tasks/{task_id}", "delete_task"),
+        ("POST", "/v1/access/request", "request_access"),
+        ("GET", "/v1/access/ca-pubkey", "ca_public_key"),
+        ("GET", "/v1/access/certificate/{cert_id}", "get_certificate"),
+        ("DELETE", "/v1/access/certificate/{cert_id}", "revoke_certificate"),
+        ("GET", "/v1/access/certificates", "list_certificates"),
+        ("POST", "/v1/access/session/start", "session_start"),
+        ("POST", "/v1/access/session/end", "session_end"),
+        ("POST", "/v1/access/sessions/batch", "session_batch"),
+        ("GET", "/v1/access/sessions", "list_sessions"),
+    )
+
+    # Handler name -> operation whose latency and failure rate apply.
+    OPERATION_OF = {
+        "create_sandbox": "create",
+        "start_sandbox": "start",
+        "discover_ip": "ip",
+        "run_command": "run",
+        "create_snapshot": "snapshot",
+        "diff_snapshots": "diff",
+        "destroy_sandbox": "destroy",
+        "create_job": "ansible",
+        "request_access": "access",
+    }
+
+    # Handlers that answer in CBOR when the Accept header prefers it.
+    CBOR_HANDLERS = frozenset(
+        (
+            "list_vms",
+            "list_sandboxes",
+            "get_sandbox",
+            "list_commands",
+            "run_command",
+            "diff_snapshots",
+            "get_cached_diff",
+        )
+    )
+
+    def __init__(
+        self,
+        latency: Optional[Dict[str, Latency]] = None,
+        failures: Optional[Dict[str, float]] = None,
+        command_failure_rate: float = 0.0,
+        vms: Tuple[str, ...] = ("ubuntu-base",),
+        seed: Optional[int] = None,
+    ) -> None:
+        unknown = (set(latency or ()) | set(failures or ())) - {"*", *OPERATIONS}
+        if unknown:
+            raise ValueError("unknown operations: %s" % ", ".join(sorted(unknown)))
+        self.latency = dict(latency or {})
+        self.failures = dict(failures or {})
+        self.command_failure_rate = command_failure_rate
+        self.vms = tuple(vms)
+        self.requests: Dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._serials = itertools.count(1)
+        self._addresses = itertools.count(1)
+        self.sandboxes: Dict[str, Dict[str, Any]] = {}
+        self.commands: Dict[str, List[Dict[str, Any]]] = {}
+        self.snapshots: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.diffs: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.playbooks: Dict[str, Dict[str, Any]] = {}
+        self.tasks: Dict[str, List[Dict[str, Any]]] = {}
+        self.certificates: Dict[str, Dict[str, Any]] = {}
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+
+    # -- plumbing ---------------------------------------------------------
+
+    def handler_name(self, method: str, url: str) -> Optional[str]:
+        """The name of the handler for a request, if there is one."""
+        path = urlsplit(url).path
+        for route_method, pattern, name in self.ROUTES:
+            if route_method == method and pattern.match(path):
+                return name
+        return None
+
+    def handle(
+        self, method: str, url: str, body: Optional[bytes]
+    ) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """Answer one request; returns the status and the JSON document."""
+        parts = urlsplit(url)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        allowed = False
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(parts.path)
+            if match is None:
+                continue
+            allowed = True
+            if route_method != method:
+                continue
+            with self._lock:
+                self.requests[name] = self.requests.get(name, 0) + 1
+            try:
+                doc = json.loads(body) if body else {}
+            except ValueError as e:
+                return 400, {"error": str(e), "code": 400}
+            try:
+                operation = self.OPERATION_OF.get(name)
+                if operation != "ansible":
+                    self._maybe_fail(operation)
+                return getattr(self, "_" + name)(
+                    query=query, doc=doc, **match.groupdict()
+                )
+            except _Failure as e:
+                return e.status, {"error": str(e), "code": e.status}
+        if allowed:
+            return 405, {"error": "method not allowed", "code": 405}
+        return 404, {"error": "not found", "code": 404}
+
+    def _maybe_fail(self, operation: Optional[str]) -> None:
+        rate = self.failures.get(operation or "", self.failures.get("*", 0.0))
+        with self._lock:
+            failed = rate > 0 and self._rng.random() < rate
+        if failed:
+            raise _Failure(500, "injected failure in %s" % (operation or "request"))
+
+    def _sleep(self, operation: str) -> float:
+        latency = self.latency.get(operation, NO_LATENCY)
+        with self._lock:
+            seconds = latency.sample(self._rng)
+        if seconds > 0:
+            time.sleep(seconds)
+        return seconds
+
+    def _sandbox(self, id: str) -> Dict[str, Any]:
+        # Destroyed sandboxes are soft-deleted, as in fluid-remote's store.
+        with self._lock:
+            sandbox = self.sandboxes.get(id)
+        if sandbox is None or sandbox.get("deleted_at"):
+            raise _Failure(404, "sandbox not found: %s" % id)
+        return sandbox
+
+    def _running(self, id: str) -> Dict[str, Any]:
+        sandbox = self._sandbox(id)
+        if sandbox["state"] != "RUNNING":
+            raise _Failure(500, "sandbox %s is %s" % (id, sandbox["state"]))
+        return sandbox
+
+    def _update(self, sandbox: Dict[str, Any], **fields: Any) -> None:
+        with self._lock:
+            sandbox.update(fields, updated_at=_now())
+
+    @staticmethod
+    def _page(items: List[Any], query: Dict[str, str]) -> List[Any]:
+        try:
+            offset = int(query.get("offset", 0))
+            limit = int(query["limit"]) if "limit" in query else None
+        except ValueError as e:
+            raise _Failure(400, "invalid limit or offset: %s" % e)
+        return items[offset : offset + limit if limit else None]
+
+    # -- sandboxes --------------------------------------------------------
+
+    def _health(self, **_: Any) -> Tuple[int, Dict[str, Any]]:
+        return 200, {"status": "ok"}
+
+    def _list_vms(self, **_: Any) -> Tuple[int, Dict[str, Any]]:
+        vms = [
+            {
+                "name": name,
+                "uuid": str(uuid.uuid5(uuid.NAMESPACE_DNS, name)),
+                "state": "shut off",
+                "persistent": True,
+                "disk_path": "/var/lib/libvirt/images/%s.qcow2" % name,
+            }
+            for name in self.vms
+        ]
+        return 200, {"vms": vms}
+
+    def _create_sandbox(self, doc: Dict[str, Any], **_: Any) -> Tuple[int, Any]:
+        if not doc.get("source_vm_name") or not doc.get("agent_id"):
+            raise _Failure(400, "source_vm_name and agent_id are required")
+        if doc["source_vm_name"] not in self.vms:
+            raise _Failure(
+                500, "create sandbox: vm %s not found" % doc["source_vm_name"]
+            )
+        self._sleep("create")
+        id = _short_id("SBX")
+        now = _now()
+        sandbox = {
+            "id": id,
+            "sandbox_name": "sbx-" + id[4:].lower(),
+            "agent_id": doc["agent_id"],
+            "job_id": _short_id("JOB"),
+            "base_image": doc["source_vm_name"],
+            "network": "default",
+            "state": "CREATED",
+            "ttl_seconds": doc.get("ttl_seconds"),
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._lock:
+            self.sandboxes[id] = sandbox
+            self.commands[id] = []
+            self.snapshots[id] = {}
+        ip = ""
+        if doc.get("auto_start"):
+            ip = self._boot(sandbox, bool(doc.get("wait_for_ip")))
+        return 201, {"sandbox": dict(sandbox), "ip_address": ip or None}
+
+    def _boot(self, sandbox: Dict[str, Any], wait_for_ip: bool) -> str:
+        self._update(sandbox, state="STARTING")
+        self._sleep("start")
+        self._update(sandbox, state="RUNNING")
+        return self._assign_ip(sandbox) if wait_for_ip else ""
+
+    def _assign_ip(self, sandbox: Dict[str, Any]) -> str:
+        if not sandbox.get("ip_address"):
+            self._sleep("ip")
+            with self._lock:
+                n = next(self._addresses)
+            self._update(
+                sandbox, ip_address="10.%d.%d.%d" % (n >> 16, n >> 8 & 255, n & 255)
+            )
+        return sandbox["ip_address"]
+
+    def _get_sandbox(self, id: str, query: Dict[str, str], **_: Any) -> Tuple[int, Any]:
+        doc: Dict[str, Any] = {"sandbox": dict(self._sandbox(id))}
+        if query.get("include_commands") == "true":
+            doc["commands"] = list(reversed(self.commands[id]))
+        return 200, doc
+
+    def _list_sandboxes(self, query: Dict[str, str], **_: Any) -> Tuple[int, Any]:
+        filters = {
+            "agent_id": query.get("agent_id"),
+            "job_id": query.get("job_id"),
+            "base_image": query.get("base_image"),
+            "state": query.get("state"),
+            "sandbox_name": query.get("vm_name"),
+        }
+        with self._lock:
+            sandboxes = [
+                dict(s)
+                for s in reversed(list(self.sandboxes.values()))
+                if not s.get("deleted_at")
+                and all(v is None or s.get(k) == v for k, v in filters.items())
+            ]
+        page = self._page(sandboxes, query)
+        return 200, {"sandboxes": page, "total": len(page)}
+
+    def _list_commands(
+        self, id: str, query: Dict[str, str], **_: Any
+    ) -> Tuple[int, Any]:
+        with self._lock:
+            sandbox = self.sandboxes.get(id)
+        if sandbox is None:
+            raise _Failure(404, "sandbox not found: %s" % id)
+        page = self._page(list(reversed(self.commands[id])), query)
+        # A destroyed sandbox still lists its history, but an empty page of
+        # it answers 404 like fluid-remote.
+        if sandbox.get("deleted_at") and not page:
+            raise _Failure(404, "sandbox not found: %s" % id)
+        return 200, {"commands": page, "total": len(page)}
+
+    def _discover_ip(self, id: str, **_: Any) -> Tuple[int, Any]:
+        return 200, {"ip_address": self._assign_ip(self._running(id))}
+
+    def _inject_ssh_key(
+        self, id: str, doc: Dict[str, Any], **_: Any
+    ) -> Tuple[int, Any]:
+        if not doc.get("public_key") or not doc.get("username"):
+            raise _Failure(400, "public_key and username are required")
+        self._running(id)
+        return 204, None
+
+    def _start_sandbox(self, id: str, doc: Dict[str, Any], **_: Any) -> Tuple[int, Any]:
+        sandbox = self._sandbox(id)
+        if sandbox["state"] == "DESTROYED":
+            raise _Failure(500, "start sandbox: sandbox %s is destroyed" % id)
+        if sandbox["state"] == "RUNNING":
+            ip = self._assign_ip(sandbox) if doc.get("wait_for_ip") else ""
+        else:
+            ip = self._boot(sandbox, bool(doc.get("wait_for_ip")))
+        return 200, {"ip_address": ip or None}
+
+    def _run_command(self, id: str, doc: Dict[str, Any], **_: Any) -> Tuple[int, Any]:
+        if not doc.get("command"):
+            raise _Failure(400, "command is required")
+        self._running(id)
+        started = _now()
+        self._sleep("run")
+        with self._lock:
+            failed = self._rng.random() < self.command_failure_rate
+        command = {
+            "id": _short_id("CMD"),
+            "sandbox_id": id,
+            "command": doc["command"],
+            "stdout": "" if failed else "ok\n",
+            "stderr": "injected failure\n" if failed else "",
+            "exit_code": 1 if failed else 0,
+            "started_at": started,
+            "ended_at": _now(),
+            "metadata": {"user": doc.get("user") or "sandbox"},
+        }
+        with self._lock:
+            self.commands[id].append(command)
+        return 200, {"command": command}
+
+    def _create_snapshot(
+        self, id: str, doc: Dict[str, Any], **_: Any
+    ) -> Tuple[int, Any]:
+        if not doc.get("name"):
+            raise _Failure(400, "name is required")
+        self._sandbox(id)
+        self._sleep("snapshot")
+        snapshot = {
+            "id": _short_id("SNP"),
+            "sandbox_id": id,
+            "name": doc["name"],
+            "kind": "EXTERNAL" if doc.get("external") else "INTERNAL",
+            "ref": doc["name"],
+            "created_at": _now(),
+        }
+        with self._lock:
+            self.snapshots[id][doc["name"]] = snapshot
+        return 201, {"snapshot": snapshot}
+
+    def _diff_snapshots(
+        self, id: str, doc: Dict[str, Any], **_: Any
+    ) -> Tuple[int, Any]:
+        from_name, to_name = doc.get("from_snapshot"), doc.get("to_snapshot")
+        if not from_name or not to_name:
+            raise _Failure(400, "from_snapshot and to_snapshot are required")
+        self._sandbox(id)
+        with self._lock:
+            stored = self.diffs.get((id, from_name, to_name))
+            missing = {from_name, to_name} - set(self.snapshots[id])
+        if stored is not None:
+            return 200, {"diff": stored}
+        if missing:
+            raise _Failure(
+                500, "diff snapshots: snapshot not found: %s" % sorted(missing)[0]
+            )
+        self._sleep("diff")
+        with self._lock:
+            commands = [c["command"] for c in self.commands[id]]
+        diff = {
+            "id": _short_id("DIF"),
+            "sandbox_id": id,
+            "from_snapshot": from_name,
+            "to_snapshot": to_name,
+            "created_at": _now(),
+            "diff_json": {
+                "files_added": [
+                    "/var/tmp/standin-%d" % i for i in range(len(commands))
+                ],
+                "files_modified": [],
+                "files_removed": [],
+                "commands_run": [{"cmd": c, "exit_code": 0} for c in commands],
+            },
+        }
+        with self._lock:
+            self.diffs[(id, from_name, to_name)] = diff
+        return 200, {"diff": diff}
+
+    def _get_cached_diff(
+        self, id: str, query: Dict[str, str], **_: Any
+    ) -> Tuple[int, Any]:
+        from_name, to_name = query.get("from_snapshot"), query.get("to_snapshot")
+        if not from_name or not to_name:
+            raise _Failure(400, "from_snapshot and to_snapshot are required")
+        with self._lock:
+            diff = self.diffs.get((id, from_name, to_name))
+        if diff is None:
+            raise _Failure(404, "no diff for %s..%s" % (from_name, to_name))
+        return 200, {"diff": diff}
+
+    def _generate(self, id: str, tool: str, **_: Any) -> Tuple[int, Any]:
+        if tool not in ("ansible", "puppet"):
+            raise _Failure(
+                400, "unsupported tool %r; expected 'ansible' or 'puppet'" % tool
+            )
+        return 501, {
+            "message": "generation not implemented yet",
+            "note": "tool=%s for sandbox %s" % (tool, id),
+        }
+
+    def _publish(self, doc: Dict[str, Any], **_: Any) -> Tuple[int, Any]:
+        if not doc.get("job_id"):
+            raise _Failure(400, "job_id is required")
+        return 501, {
+            "message": "publish not implemented yet",
+            "note": "job_id=" + doc["job_id"],
+        }
+
+    def _destroy_sandbox(self, id: str, **_: Any) -> Tuple[int, Any]:
+        sandbox = self._sandbox(id)
+        self._sleep("destroy")
+        self._update(sandbox, state="DESTROYED", deleted_at=_now())
+        return 200, {
+            "state": "DESTROYED",
+            "base_image": sandbox["base_image"],
+            "sandbox_name": sandbox["sandbox_name"],
+            "ttl_seconds": sandbox.get("ttl_seconds"),
+        }
+
+    # -- ansible ----------------------------------------------------------
+
+    def _create_job(self, doc: Dict[str, Any], **_: Any) -> Tuple[int, Any]:
+        if not doc.get("vm_name") or not doc.get("playbook"):
+            raise _Failure(400, "vm_name and playbook are required")
+        with self._lock:
+            duration = self.latency.get("ansible", NO_LATENCY).sample(self._rng)
+            failed = self._rng.random() < self.failures.get("ansible", 0.0)
+        id = str(uuid.uuid4())
+        job = {
+            "id": id,
+            "vm_name": doc["vm_name"],
+            "playbook": doc["playbook"],
+            "check": bool(doc.get("check")),
+            "_done": time.monotonic() + duration,
+            "_final": "failed" if failed else "finished",
+        }
+        with self._lock:
+            self.jobs[id] = job
+        return 200, {"job_id": id, "ws_url": "/v1/ansible/jobs/%s/stream" % id}
+
+    def _get_job(self, job_id: str, **_: Any) -> Tuple[int, Any]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            raise _Failure(404, "job not found")
+        status = job["_final"] if time.monotonic() >= job["_done"] else "running"
+        doc = {k: v for k, v in job.items() if not k.startswith("_")}
+        return 200, dict(doc, status=status)
+
+    def _playbook(self, name: str) -> Dict[str, Any]:
+        with self._lock:
+            playbook = self.playbooks.get(name)
+        if playbook is None:
+            raise _Failure(404, "playbook not found: %s" % name)
+        return playbook
+
+    def _list_playbooks(self, **_: Any) -> Tuple[int, Any]:
+        with self._lock:
+            playbooks = list(self.playbooks.values())
+        return 200, {"playbooks": playbooks, "total": len(playbooks)}
+
+    def _create_playbook(self, doc: Dict[str, Any], **_: Any) -> Tuple[int, Any]:
+        name = doc.get("name")
+        if not name:
+            raise _Failure(400, "name is required")
+        now = _now()
+        playbook = {
+            "id": _short_id("PB"),
+            "name": name,
+            "hosts": doc.get("hosts") or "all",
+            "become": bool(doc.get("become")),
+            "file_path": "/var/lib/fluid/playbooks/%s.yml" % name,
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._lock:
+            if name in self.playbooks:
+                raise _Failure(409, "playbook already exists: %s" % name)
+            self.playbooks[name] = playbook
+            self.tasks[name] = []
+        return 201, {"playbook": playbook}
+
+    def _get_playbook(self, name: str, **_: Any) -> Tuple[int, Any]:
+        return 200, {"playbook": self._playbook(name), "tasks": list(self.tasks[name])}
+
+    def _delete_playbook(self, name: str, **_: Any) -> Tuple[int, Any]:
+        self._playbook(name)
+        with self._lock:
+            self.playbooks.pop(name, None)
+            self.tasks.pop(name, None)
+        return 204, None
+
+    def _export_playbook(self, name: str, **_: Any) -> Tuple[int, Any]:
+        playbook = self._playbook(name)
+        lines = [
+            "- hosts: %s" % playbook["hosts"],
+            "  become: %s" % str(playbook["become"]).lower(),
+            "  tasks:",
+        ]
+        for task in self.tasks[name]:
+            lines.append("    - name: %s" % task["name"])
+            lines.append(
+                "      %s: %s" % (task["module"], json.dumps(task["params"] or {}))
+            )
+        return 200, {"yaml": "\n".join(lines) + "\n"}
+
+    def _add_task(self, name: str, doc: Dict[str, Any], **_: Any) -> Tuple[int, Any]:
+        playbook = self._playbook(name)
+        if not doc.get("name") or not doc.get("module"):
+            raise _Failure(400, "name and module are required")
+        with self._lock:
+            task = {
+                "id": _short_id("TSK"),
+                "playbook_id": playbook["id"],
+                "name": doc["name"],
+                "module": doc["module"],
+                "params": doc.get("params") or {},
+                "position": len(self.tasks[name]),
+                "created_at": _now(),
+            }
+            self.tasks[name].append(task)
+        return 201, {"task": task}
+
+    def _update_task(
+        self, name: str, task_id: str, doc: Dict[str, Any], **_: Any
+    ) -> Tuple[int, Any]:
+        self._playbook(name)
+        with self._lock:
+            for task in self.tasks[name]:
+                if task["id"] == task_id:
+                    break
+            else:
+                raise _Failure(404, "task not found")
+            for field in ("name", "module", "params"):
+                if doc.get(field) is not None:
+                    task[field] = doc[field]
+        return 200, {"task": task}
+
+    def _reorder_tasks(
+        self, name: str, doc: Dict[str, Any], **_: Any
+    ) -> Tuple[int, Any]:
+        playbook = self._playbook(name)
+        task_ids = doc.get("task_ids") or []
+        if not task_ids:
+            raise _Failure(400, "task_ids is required")
+        with self._lock:
+            tasks = {t["id"]: t for t in self.tasks[name]}
+            for task_id in task_ids:
+                if task_id not in tasks:
+                    raise _Failure(
+                        500,
+                        "task %s not found in playbook %s" % (task_id, playbook["id"]),
+                    )
+            for position, task_id in enumerate(task_ids):
+                tasks[task_id]["position"] = position
+            self.tasks[name].sort(key=lambda t: t["position"])
+        return 204, None
+
+    def _delete_task(self, name: str, task_id: str, **_: Any) -> Tuple[int, Any]:
+        self._playbook(name)
+        with self._lock:
+            tasks = self.tasks[name]
+            remaining = [t for t in tasks if t["id"] != task_id]
+            if len(remaining) == len(tasks):
+                raise _Failure(404, "task not found: %s" % task_id)
+            self.tasks[name] = remaining
+        return 204, None
+
+    # -- access -----------------------------------------------------------
+
+    def _request_access(self, doc: Dict[str, Any], **_: Any) -> Tuple[int, Any]:
+        for field in ("sandbox_id", "user_id", "public_key"):
+            if not doc.get(field):
+                raise _Failure(400, "%s is required" % field)
+        sandbox = self._running(doc["sandbox_id"])
+        ip = self._assign_ip(sandbox)
+        self._sleep("access")
+        ttl = int(doc.get("ttl_minutes") or 5) * 60
+        issued = int(time.time())
+        serial = next(self._serials)
+        id = _short_id("CERT")
+        certificate = {
+            "id": id,
+            "sandbox_id": sandbox["id"],
+            "user_id": doc["user_id"],
+            "vm_id": sandbox["sandbox_name"],
+            "identity": "%s@%s" % (doc["user_id"], sandbox["id"]),
+            "principals": ["sandbox"],
+            "serial_number": serial,
+            "status": "ACTIVE",
+            "issued_at": datetime.fromtimestamp(issued, timezone.utc).isoformat(),
+            "valid_after": datetime.fromtimestamp(
+                issued - 60, timezone.utc
+            ).isoformat(),
+            "valid_before": datetime.fromtimestamp(
+                issued + ttl, timezone.utc
+            ).isoformat(),
+            "ttl_seconds": ttl,
+            "_expires": issued + ttl,
+        }
+        with self._lock:
+            self.certificates[id] = certificate
+        return 200, {
+            "certificate_id": id,
+            "certificate": _unsigned_certificate(
+                serial, certificate["identity"], "sandbox", issued - 60, issued + ttl
+            ),
+            "vm_ip_address": ip,
+            "ssh_port": 22,
+            "username": "sandbox",
+            "valid_until": certificate["valid_before"],
+            "ttl_seconds": ttl,
+            "connect_command": "ssh -i sandbox_key sandbox@%s" % ip,
+            "instructions": "Certificate from a stand-in server; it is not signed.",
+        }
+
+    def _public_certificate(self, certificate: Dict[str, Any]) -> Dict[str, Any]:
+        doc = {k: v for k, v in certificate.items() if not k.startswith("_")}
+        doc["is_expired"] = time.time() >= certificate["_expires"]
+        return doc
+
+    def _ca_public_key(self, **_: Any) -> Tuple[int, Any]:
+        return 200, {
+            "public_key": _CA_PUBLIC_KEY,
+            "usage": "stand-in CA; certificates are not signed",
+        }
+
+    def _get_certificate(self, cert_id: str, **_: Any) -> Tuple[int, Any]:
+        with self._lock:
+            certificate = self.certificates.get(cert_id)
+        if certificate is None:
+            raise _Failure(404, "certificate not found")
+        return 200, self._public_certificate(certificate)
+
+    def _revoke_certificate(self, cert_id: str, **_: Any) -> Tuple[int, Any]:
+        with self._lock:
+            certificate = self.certificates.get(cert_id)
+            if certificate is None:
+                raise _Failure(404, "certificate not found")
+            if certificate["status"] == "REVOKED":
+                raise _Failure(400, "certificate already revoked")
+            certificate["status"] = "REVOKED"
+        return 200, {"message": "certificate revoked successfully", "id": cert_id}
+
+    def _list_certificates(self, query: Dict[str, str], **_: Any) -> Tuple[int, Any]:
+        with self._lock:
+            certificates = [
+                self._public_certificate(c)
+                for c in self.certificates.values()
+                if all(
+                    query.get(k) in (None, c[k])
+                    for k in ("sandbox_id", "user_id", "status")
+                )
+            ]
+        page = self._page(certificates, query)
+        return 200, {"certificates": page, "total": len(page)}
+
+    def _start_session(
+        self, certificate_id: str, source_ip: Optional[str], at: Optional[str]
+    ) -> str:
+        with self._lock:
+            certificate = self.certificates.get(certificate_id)
+            if certificate is None:
+                raise _Failure(
+                    500, "failed to record session start: certificate not found"
+                )
+            if certificate["status"] != "ACTIVE":
+                raise _Failure(
+                    500,
+                    "failed to record session start: certificate is %s"
+                    % certificate["status"],
+                )
+            sandbox = self.sandboxes.get(certificate["sandbox_id"], {})
+            id = _short_id("SES")
+            self.sessions[id] = {
+                "id": id,
+                "certificate_id": certificate_id,
+                "sandbox_id": certificate["sandbox_id"],
+                "user_id": certificate["user_id"],
+                "vm_id": certificate["vm_id"],
+                "vm_ip_address": sandbox.get("ip_address"),
+                "source_ip": source_ip,
+                "status": "ACTIVE",
+                "started_at": at or _now(),
+            }
+        return id
+
+    def _end_session(
+        self, session_id: str, reason: Optional[str], at: Optional[str]
+    ) -> None:
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                raise _Failure(500, "failed to record session end: session not found")
+            ended = datetime.fromisoformat(at) if at else datetime.now(timezone.utc)
+            started = datetime.fromisoformat(session["started_at"])
+            session.update(
+                status="ENDED",
+                ended_at=ended.isoformat(),
+                duration_seconds=max(int((ended - started).total_seconds()), 0),
+                reason=reason or "session ended normally",
+            )
+
+    def _session_start(self, doc: Dict[str, Any], **_: Any) -> Tuple[int, Any]:
+        if not doc.get("certificate_id"):
+            raise _Failure(400, "certificate_id is required")
+        return 200, {
+            "session_id": self._start_session(
+                doc["certificate_id"], doc.get("source_ip"), None
+            )
+        }
+
+    def _session_end(self, doc: Dict[str, Any], **_: Any) -> Tuple[int, Any]:
+        if not doc.get("session_id"):
+            raise _Failure(400, "session_id is required")
+        self._end_session(doc["session_id"], doc.get("reason"), None)
+        return 200, {
+            "message": "session ended successfully",
+            "session_id": doc["session_id"],
+        }
+
+    def _session_batch(self, doc: Dict[str, Any], **_: Any) -> Tuple[int, Any]:
+        events = doc.get("events") or []
+        if len(events) > 1000:
+            raise _Failure(400, "at most 1000 events per batch")
+        started: Dict[str, str] = {}
+        results = []
+        for event in events:
+            result = {"ref": event.get("ref")}
+            try:
+                if event.get("type") == "start":
+                    if not event.get("certificate_id"):
+                        raise _Failure(400, "certificate_id is required")
+                    session_id = self._start_session(
+                        event["certificate_id"], event.get("source_ip"), event.get("at")
+                    )
+                    if event.get("ref"):
+                        started[event["ref"]] = session_id
+                elif event.get("type") == "end":
+                    session_id = event.get("session_id") or started.get(
+                        event.get("ref") or ""
+                    )
+                    if not session_id:
+                        raise _Failure(
+                            400, "session_id or the ref of an earlier start is required"
+                        )
+                    self._end_session(session_id, event.get("reason"), event.get("at"))
+                else:
+                    raise _Failure(400, "unknown event type %r" % event.get("type"))
+                result["session_id"] = session_id
+            except _Failure as e:
+                result["error"] = str(e)
+            results.append(result)
+        failed = sum(1 for r in results if "error" in r)
+        return 200, {"results": results, "failed": failed}
+
+    def _list_sessions(self, query: Dict[str, str], **_: Any) -> Tuple[int, Any]:
+        with self._lock:
+            sessions = [
+                {k: v for k, v in s.items() if k != "reason"}
+                for s in self.sessions.values()
+                if all(
+                    query.get(k) in (None, s[k])
+                    for k in ("sandbox_id", "certificate_id")
+                )
+                and (query.get("active_only") != "true" or s["status"] == "ACTIVE")
+            ]
+        page = self._page(sessions, query)
+        return 200, {"sessions": page, "total": len(page)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed
+    # ACKs add about 40 ms to every keep-alive response.
+    disable_nagle_algorithm = True
+    server: "StandinServer"
+
+    def setup(self) -> None:
+        if self.server.unix_socket is not None:
+            self.disable_nagle_algorithm = False
+        super().setup()
+
+    def address_string(self) -> str:
+        return self.server.unix_socket or super().address_string()
+
+    def log_message(self, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(*args)
+
+    def _handle(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        state = self.server.state
+        status, doc = state.handle(self.command, self.path, body)
+        content_type = "application/json"
+        negotiated = state.handler_name(self.command, self.path) in state.CBOR_HANDLERS
+        if (
+            negotiated
+            and 200 <= status <= 299
+            and cbor.prefers_cbor(self.headers.get("Accept"))
+        ):
+            content_type = cbor.CONTENT_TYPE
+            data = cbor.dumps(doc)
+        else:
+            data = json.dumps(doc).encode() if doc is not None else b""
+        self.send_response(status)
+        if doc is not None:
+            self.send_header("Content-Type", content_type)
+        if negotiated:
+            self.send_header("Vary", "Accept")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+
+class StandinServer(ThreadingHTTPServer):
+    """HTTP server for a :class:`StandinState`, one thread per connection.
+
+    Example:
+        >>> state = StandinState(latency={"create": Latency("lognormal", 2, 0.5)})
+        >>> with StandinServer(state) as server:
+        ...     api_client = ApiClient(Configuration(host=server.url))
+
+    :param state: The stand-in; a default one without latency if omitted.
+    :param port: Port to listen on; a free one if 0.
+    :param unix_socket: Listen on a Unix domain socket at this path instead
+        of TCP, like fluid-remote's ``api.unix_socket``.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        state: Optional[StandinState] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        verbose: bool = False,
+        unix_socket: Optional[str] = None,
+    ) -> None:
+        self.unix_socket = unix_socket
+        if unix_socket is not None:
+            self.address_family = socket.AF_UNIX
+            # Replace a socket left by an earlier run, but no other file.
+            if os.path.exists(unix_socket) and stat.S_ISSOCK(
+                os.stat(unix_socket).st_mode
+            ):
+                os.unlink(unix_socket)
+        super().__init__(
+            unix_socket if unix_socket is not None else (host, port), _Handler
+        )
+        self.state = state or StandinState()
+        self.verbose = verbose
+        self._thread: Optional[threading.Thread] = None
+
+    def server_bind(self) -> None:
+        if self.unix_socket is None:
+            return super().server_bind()
+        # HTTPServer.server_bind expects a (host, port) address.
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+    @property
+    def url(self) -> str:
+        if self.unix_socket is not None:
+            return "unix://" + self.unix_socket
+        host, port = self.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def start(self) -> "StandinServer":
+        """Serve from a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self.serve_forever, name="standin", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """Stop serving and release the port."""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+        if self.unix_socket is not None and os.path.exists(self.unix_socket):
+            os.unlink(self.unix_socket)
+
+    def __enter__(self) -> "StandinServer":
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the stand-in's latency and failure options to ``parser``."""
+    group = parser.add_argument_group("stand-in server")
+    for operation in OPERATIONS:
+        group.add_argument(
+            "--" + operation,
+            type=Latency.parse,
+            metavar="LATENCY",
+            help="seconds for %s, e.g. 0.5, uniform:0.1,0.4 or lognormal:2,0.5"
+            % _DESCRIPTIONS[operation],
+        )
+    group.add_argument(
+        "--fail",
+        action="append",
+        default=[],
+        metavar="OP=RATE",
+        help="fail OP (or * for every request) with HTTP 500 at RATE; repeatable",
+    )
+    group.add_argument(
+        "--command-failure-rate",
+        type=float,
+        default=0.0,
+        metavar="RATE",
+        help="rate of commands exiting 1",
+    )
+    group.add_argument(
+        "--vm",
+        action="append",
+        dest="vms",
+        metavar="NAME",
+        help="base VM name; repeatable",
+    )
+    group.add_argument("--seed", type=int, help="seed for latency and failure draws")
+
+
+def state_from_arguments(args: argparse.Namespace) -> StandinState:
+    """Build a :class:`StandinState` from options added by :func:`add_arguments`."""
+    failures = {}
+    for spec in args.fail:
+        operation, _, rate = spec.partition("=")
+        failures[operation] = float(rate)
+    return StandinState(
+        latency={
+            op: getattr(args, op) for op in OPERATIONS if getattr(args, op) is not None
+        },
+        failures=failures,
+        command_failure_rate=args.command_failure_rate,
+        vms=tuple(args.vms or ("ubuntu-base",)),
+        seed=args.seed,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Serve an in-memory stand-in for fluid-remote."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--unix-socket", metavar="PATH", help="listen on a Unix socket instead"
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="log every request"
+    )
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    server = StandinServer(
+        state_from_arguments(args),
+        args.host,
+        args.port,
+        args.verbose,
+        unix_socket=args.unix_socket,
+    )
+    print("fluid-remote stand-in listening on %s" % server.url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
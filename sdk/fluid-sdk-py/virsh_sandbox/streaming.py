@@ -0,0 +1,491 @@
+# coding: utf-8
+
+"""Incremental consumers for fluid-remote's streaming endpoints."""
+
+import asyncio
+import collections
+import json
+from typing import (
+    IO,
+    Any,
+    AsyncIterator,
+    Deque,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from virsh_sandbox.api.ansible_api import AnsibleApi
+from virsh_sandbox.api_client import ApiClient
+from virsh_sandbox.exceptions import ApiException
+from virsh_sandbox.models.fluid_remote_internal_ansible_job_status import (
+    FluidRemoteInternalAnsibleJobStatus,
+)
+from virsh_sandbox.models.fluid_remote_internal_rest_run_command_request import (
+    FluidRemoteInternalRestRunCommandRequest,
+)
+from virsh_sandbox.websocket import (
+    DEFAULT_MAX_MESSAGE_SIZE,
+    AsyncWebSocketConnection,
+    WebSocketConnection,
+    to_websocket_url,
+)
+
+DEFAULT_TAIL_LINES = 1000
+"""Number of most recent output lines kept by a stream."""
+
+DEFAULT_TAIL_CHUNKS = 256
+"""Number of most recent output chunks kept by a command stream."""
+
+TeeTarget = Union[str, IO[str], None]
+
+
+class _AnsibleJobOutputBase:
+    """State shared by the sync and async Ansible job output streams."""
+
+    def __init__(
+        self,
+        job_id: str,
+        api_client: Optional[ApiClient] = None,
+        tee: TeeTarget = None,
+        tail_lines: int = DEFAULT_TAIL_LINES,
+        timeout: Optional[float] = None,
+        max_message_size: int = DEFAULT_MAX_MESSAGE_SIZE,
+    ) -> None:
+        self.job_id = job_id
+        self.api = AnsibleApi(api_client)
+        self.timeout = timeout
+        self.max_message_size = max_message_size
+        self.tail: Deque[str] = collections.deque(maxlen=tail_lines)
+        """Most recent output lines, bounded by ``tail_lines``."""
+        self.lines_read = 0
+        self.status: Optional[FluidRemoteInternalAnsibleJobStatus] = None
+        """Final job status, set once the stream has ended."""
+        self._tee_target = tee
+        self._tee: Optional[IO[str]] = None
+        self._owns_tee = False
+        self._conn: Any = None
+        self.finished = False
+
+    def _request(self) -> Tuple[str, dict]:
+        _, url, headers, _, _ = self.api._stream_ansible_job_output_serialize(
+            job_id=self.job_id,
+            _request_auth=None,
+            _content_type=None,
+            _headers=None,
+            _host_index=0,
+        )
+        return to_websocket_url(url), headers
+
+    def _open_tee(self) -> None:
+        if isinstance(self._tee_target, str):
+            self._tee = open(self._tee_target, "a", encoding="utf-8", buffering=1)
+            self._owns_tee = True
+        else:
+            self._tee = self._tee_target
+
+    def _close_tee(self) -> None:
+        if self._tee is not None:
+            if self._owns_tee:
+                self._tee.close()
+            else:
+                self._tee.flush()
+        self._tee = None
+
+    def _split(self, payload: bytes) -> List[str]:
+        lines = payload.decode("utf-8", "replace").splitlines()
+        for line in lines:
+            self.tail.append(line)
+            if self._tee is not None:
+                self._tee.write(line + "\n")
+        self.lines_read += len(lines)
+        return lines
+
+    def _fetch_status(self) -> Optional[FluidRemoteInternalAnsibleJobStatus]:
+        job = self.api.get_ansible_job(self.job_id)
+        return job.status if job is not None else None
+
+
+class AnsibleJobOutputStream(_AnsibleJobOutputBase):
+    """Iterate over an Ansible job's output lines as the server emits them.
+
+    Connecting to ``/v1/ansible/jobs/{job_id}/stream`` starts the job, so the
+    stream should be opened once per job. Lines are yielded as soon as each
+    WebSocket message arrives; only the last ``tail_lines`` are retained. When
+    the server closes the stream the final job status is fetched and stored
+    on :attr:`status`.
+
+    Example:
+        >>> with AnsibleJobOutputStream(job_id, tee="job.log") as stream:
+        ...     for line in stream:
+        ...         print(line)
+        >>> stream.status
+
+    :param job_id: ID returned by ``create_ansible_job``.
+    :param api_client: Client used for configuration and the status lookup.
+    :param tee: Path or text file object that receives a copy of every line.
+    :param tail_lines: Number of recent lines kept in :attr:`tail`.
+    :param timeout: Socket timeout in seconds, ``None`` to wait indefinitely.
+    :param max_message_size: Largest single WebSocket message to accept.
+    """
+
+    _conn: Optional[WebSocketConnection]
+
+    def open(self) -> "AnsibleJobOutputStream":
+        """Connect to the stream; called implicitly on first iteration."""
+        if self._conn is None and not self.finished:
+            url, headers = self._request()
+            self._conn = WebSocketConnection.connect(
+                url,
+                headers=headers,
+                configuration=self.api.api_client.configuration,
+                timeout=self.timeout,
+                max_message_size=self.max_message_size,
+            )
+            self._open_tee()
+        return self
+
+    def __iter__(self) -> Iterator[str]:
+        self.open()
+        conn = self._conn
+        if conn is None:
+            return
+        try:
+            while True:
+                message = conn.recv()
+                if message is None:
+                    break
+                yield from self._split(message[1])
+        finally:
+            self.close()
+        self.status = self._fetch_status()
+
+    def close(self) -> None:
+        """Close the connection and any tee file opened by the stream."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        self._close_tee()
+        self.finished = True
+
+    def wait(self) -> Optional[FluidRemoteInternalAnsibleJobStatus]:
+        """Drain the stream, discarding output, and return the final status."""
+        for _ in self:
+            pass
+        return self.status
+
+    def __enter__(self) -> "AnsibleJobOutputStream":
+        return self.open()
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.close()
+
+
+class AsyncAnsibleJobOutputStream(_AnsibleJobOutputBase):
+    """asyncio variant of :class:`AnsibleJobOutputStream`.
+
+    A single event loop can follow many jobs concurrently; each stream only
+    holds its socket, the partially read frame and the bounded tail. The final
+    status lookup runs in the loop's default executor.
+
+    Example:
+        >>> async with AsyncAnsibleJobOutputStream(job_id) as stream:
+        ...     async for line in stream:
+        ...         print(line)
+    """
+
+    _conn: Optional[AsyncWebSocketConnection]
+
+    async def open(self) -> "AsyncAnsibleJobOutputStream":
+        """Connect to the stream; called implicitly on first iteration."""
+        if self._conn is None and not self.finished:
+            url, headers = self._request()
+            self._conn = await AsyncWebSocketConnection.connect(
+                url,
+                headers=headers,
+                configuration=self.api.api_client.configuration,
+                timeout=self.timeout,
+                max_message_size=self.max_message_size,
+            )
+            self._open_tee()
+        return self
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        await self.open()
+        conn = self._conn
+        if conn is None:
+            return
+        try:
+            while True:
+                if self.timeout is None:
+                    message = await conn.recv()
+                else:
+                    message = await asyncio.wait_for(conn.recv(), self.timeout)
+                if message is None:
+                    break
+                for line in self._split(message[1]):
+                    yield line
+        finally:
+            await self.close()
+        loop = asyncio.get_running_loop()
+        self.status = await loop.run_in_executor(None, self._fetch_status)
+
+    async def close(self) -> None:
+        """Close the connection and any tee file opened by the stream."""
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+        self._close_tee()
+        self.finished = True
+
+    async def wait(self) -> Optional[FluidRemoteInternalAnsibleJobStatus]:
+        """Drain the stream, discarding output, and return the final status."""
+        async for _ in self:
+            pass
+        return self.status
+
+    async def __aenter__(self) -> "AsyncAnsibleJobOutputStream":
+        return await self.open()
+
+    async def __aexit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        await self.close()
+
+
+class CommandOutput(NamedTuple):
+    """A chunk of stdout or stderr from a streamed command."""
+
+    data: str
+    is_stderr: bool
+
+
+class CommandResult(NamedTuple):
+    """Final frame of a streamed command."""
+
+    command_id: str
+    exit_code: int
+    duration: str
+    """Go duration string, e.g. ``"1.52s"``."""
+    error: Optional[str] = None
+    """SSH failure reported by the server; the command was still recorded."""
+
+
+class _CommandOutputBase:
+    """State shared by the sync and async command output streams."""
+
+    def __init__(
+        self,
+        sandbox_id: str,
+        request: FluidRemoteInternalRestRunCommandRequest,
+        api_client: Optional[ApiClient] = None,
+        tail_chunks: int = DEFAULT_TAIL_CHUNKS,
+        timeout: Optional[float] = None,
+        max_message_size: int = DEFAULT_MAX_MESSAGE_SIZE,
+    ) -> None:
+        self.sandbox_id = sandbox_id
+        self.request = request
+        self.api_client = api_client or ApiClient.get_default()
+        self.timeout = timeout
+        self.max_message_size = max_message_size
+        self.tail: Deque[CommandOutput] = collections.deque(maxlen=tail_chunks)
+        """Most recent output chunks, bounded by ``tail_chunks``."""
+        self.command_id: Optional[str] = None
+        """ID of the recorded command, known once the server starts it."""
+        self.result: Optional[CommandResult] = None
+        """Exit frame, set once the command has finished."""
+        self._conn: Any = None
+        self.finished = False
+
+    def _request(self) -> Tuple[str, dict, str]:
+        _, url, headers, _, _ = self.api_client.param_serialize(
+            method="GET",
+            resource_path="/v1/sandboxes/{id}/run/stream",
+            path_params={"id": self.sandbox_id},
+            header_params={},
+        )
+        payload = json.dumps(self.api_client.sanitize_for_serialization(self.request))
+        return to_websocket_url(url), headers, payload
+
+    def _handle(self, payload: bytes) -> Optional[CommandOutput]:
+        """Apply one server event, returning the output chunk it carries."""
+        event = json.loads(payload)
+        kind = event.get("type")
+        data = event.get("data") or {}
+        if kind == "command_output":
+            chunk = CommandOutput(data.get("output", ""), bool(data.get("is_stderr")))
+            self.tail.append(chunk)
+            return chunk
+        if kind == "command_start":
+            self.command_id = data.get("command_id")
+        elif kind == "command_end":
+            self.result = CommandResult(
+                command_id=data.get("command_id", ""),
+                exit_code=data.get("exit_code", 0),
+                duration=data.get("duration", ""),
+                error=data.get("error"),
+            )
+        elif kind == "error":
+            raise ApiException(reason=data.get("error", "run command failed"))
+        return None
+
+    def _check_finished(self) -> None:
+        if self.result is None:
+            raise ApiException(
+                reason="command stream closed before the command finished"
+            )
+
+    @property
+    def exit_code(self) -> Optional[int]:
+        """Exit code of the command, ``None`` until it has finished."""
+        return self.result.exit_code if self.result is not None else None
+
+
+class CommandOutputStream(_CommandOutputBase):
+    """Run a sandbox command and iterate over its output while it runs.
+
+    Uses ``/v1/sandboxes/{id}/run/stream``, the streaming counterpart of
+    ``SandboxApi.run_sandbox_command``. Each :class:`CommandOutput` chunk is
+    yielded as soon as the server reads it from the command; nothing is
+    accumulated beyond the last ``tail_chunks`` chunks, so long or chatty
+    commands use constant memory. Once the command exits, :attr:`result`
+    holds the exit code. The command is recorded server side exactly as with
+    ``run_sandbox_command``.
+
+    Example:
+        >>> request = FluidRemoteInternalRestRunCommandRequest(command="make")
+        >>> with CommandOutputStream(sandbox_id, request) as stream:
+        ...     for chunk in stream:
+        ...         print(chunk.data, end="")
+        >>> stream.exit_code
+
+    :param sandbox_id: Sandbox to run the command in.
+    :param request: Same request body as ``run_sandbox_command``.
+    :param api_client: Client used for configuration.
+    :param tail_chunks: Number of recent chunks kept in :attr:`tail`.
+    :param timeout: Socket timeout in seconds, ``None`` to wait indefinitely.
+    :param max_message_size: Largest single WebSocket message to accept.
+    :raises ApiException: If the server cannot start the command or the
+        stream ends without an exit frame.
+    """
+
+    _conn: Optional[WebSocketConnection]
+
+    def open(self) -> "CommandOutputStream":
+        """Connect and submit the command; called implicitly on iteration."""
+        if self._conn is None and not self.finished:
+            url, headers, payload = self._request()
+            self._conn = WebSocketConnection.connect(
+                url,
+                headers=headers,
+                configuration=self.api_client.configuration,
+                timeout=self.timeout,
+                max_message_size=self.max_message_size,
+            )
+            self._conn.send(payload)
+        return self
+
+    def __iter__(self) -> Iterator[CommandOutput]:
+        self.open()
+        conn = self._conn
+        if conn is None:
+            return
+        try:
+            while True:
+                message = conn.recv()
+                if message is None:
+                    break
+                chunk = self._handle(message[1])
+                if chunk is not None:
+                    yield chunk
+        finally:
+            self.close()
+        self._check_finished()
+
+    def close(self) -> None:
+        """Close the connection; the server stops a still-running command."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        self.finished = True
+
+    def wait(self) -> Optional[CommandResult]:
+        """Drain the stream, keeping only :attr:`tail`, and return the result."""
+        for _ in self:
+            pass
+        return self.result
+
+    def __enter__(self) -> "CommandOutputStream":
+        return self.open()
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.close()
+
+
+class AsyncCommandOutputStream(_CommandOutputBase):
+    """asyncio variant of :class:`CommandOutputStream`.
+
+    Reading is driven by the consumer, so a slow ``async for`` body applies
+    backpressure through the socket instead of queueing output in memory.
+
+    Example:
+        >>> async with AsyncCommandOutputStream(sandbox_id, request) as stream:
+        ...     async for chunk in stream:
+        ...         print(chunk.data, end="")
+    """
+
+    _conn: Optional[AsyncWebSocketConnection]
+
+    async def open(self) -> "AsyncCommandOutputStream":
+        """Connect and submit the command; called implicitly on iteration."""
+        if self._conn is None and not self.finished:
+            url, headers, payload = self._request()
+            self._conn = await AsyncWebSocketConnection.connect(
+                url,
+                headers=headers,
+                configuration=self.api_client.configuration,
+                timeout=self.timeout,
+                max_message_size=self.max_message_size,
+            )
+            await self._conn.send(payload)
+        return self
+
+    async def __aiter__(self) -> AsyncIterator[CommandOutput]:
+        await self.open()
+        conn = self._conn
+        if conn is None:
+            return
+        try:
+            while True:
+                if self.timeout is None:
+                    message = await conn.recv()
+                else:
+                    message = await asyncio.wait_for(conn.recv(), self.timeout)
+                if message is None:
+                    break
+                chunk = self._handle(message[1])
+                if chunk is not None:
+                    yield chunk
+        finally:
+            await self.close()
+        self._check_finished()
+
+    async def close(self) -> None:
+        """Close the connection; the server stops a still-running command."""
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+        self.finished = True
+
+    async def wait(self) -> Optional[CommandResult]:
+        """Drain the stream, keeping only :attr:`tail`, and return the result."""
+        async for _ in self:
+            pass
+        return self.result
+
+    async def __aenter__(self) -> "AsyncCommandOutputStream":
+        return await self.open()
+
+    async def __aexit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        await self.close()
@@ -0,0 +1,139 @@
+# coding: utf-8
+
+"""HTTP over a Unix domain socket, for clients on the fluid-remote host.
+
+When fluid-remote listens on a Unix domain socket (``api.unix_socket`` in
+its configuration), a client on the same host can set
+``Configuration.host`` to ``unix:///run/fluid-remote.sock``. Requests and
+streams then bypass the TCP stack, and no port has to be open for them.
+
+The socket path is everything after ``unix://`` in the configured host; the
+request path is appended to it as usual, so
+``unix:///run/fluid-remote.sock/v1/sandboxes`` is ``GET /v1/sandboxes`` on
+``/run/fluid-remote.sock``. Unix socket connections are never encrypted.
+
+``python -m virsh_sandbox.loadgen --transports 5000`` compares request
+latency over a Unix socket with loopback TCP.
+"""
+
+import socket
+from socket import timeout as SocketTimeout
+from typing import Any, Optional, Tuple
+
+import urllib3
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.poolmanager import SSL_KEYWORDS
+
+UNIX_SCHEME = "unix://"
+
+_POOL_SCHEME = "http+unix"
+"""Scheme that :class:`UnixSocketPoolManager` routes to the socket."""
+
+
+def socket_path(host: Optional[str]) -> Optional[str]:
+    """The socket path of a ``unix://`` host, or ``None`` for other hosts."""
+    if not host or not host.startswith(UNIX_SCHEME):
+        return None
+    return host[len(UNIX_SCHEME) :].rstrip("/") or None
+
+
+def split_url(url: str, path: str) -> Optional[Tuple[str, str]]:
+    """Split a URL on the socket at ``path`` into the socket path and the
+    request path with its query; ``None`` if the URL is not on that socket.
+    """
+    prefix = UNIX_SCHEME + path
+    if not url.startswith(prefix):
+        return None
+    rest = url[len(prefix) :]
+    if rest and rest[0] not in "/?":
+        return None
+    if not rest.startswith("/"):
+        rest = "/" + rest
+    return path, rest
+
+
+def connect(path: str, timeout: Optional[float] = None) -> socket.socket:
+    """Open a stream connection to the socket at ``path``."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(path)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+class _UnixHTTPConnection(HTTPConnection):
+    def __init__(self, *args: Any, socket_path: str, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.socket_path = socket_path
+
+    def _new_conn(self) -> socket.socket:
+        # The timeout is a float, None or urllib3's "default" sentinel.
+        timeout = self.timeout if isinstance(self.timeout, (int, float)) else None
+        try:
+            return connect(self.socket_path, timeout)
+        except SocketTimeout as e:
+            raise ConnectTimeoutError(
+                self,
+                "Connection to %s timed out. (connect timeout=%s)"
+                % (self.socket_path, self.timeout),
+            ) from e
+        except OSError as e:
+            raise NewConnectionError(
+                self, "Failed to establish a new connection: %s" % e
+            ) from e
+
+
+class _UnixHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _UnixHTTPConnection
+
+
+class UnixSocketPoolManager(urllib3.PoolManager):
+    """``PoolManager`` that sends ``unix://`` URLs for one socket over it.
+
+    URLs on other hosts use ordinary pools, so hosts chosen per operation
+    still work.
+
+    :param path: Path of the server's socket.
+    :param connection_pool_kw: As for ``urllib3.PoolManager``. TCP socket
+        options do not apply to the Unix socket pools.
+    """
+
+    def __init__(self, path: str, **connection_pool_kw: Any) -> None:
+        super().__init__(**connection_pool_kw)
+        self.socket_path = path
+        self.pool_classes_by_scheme = dict(
+            self.pool_classes_by_scheme, **{_POOL_SCHEME: _UnixHTTPConnectionPool}
+        )
+        self.key_fn_by_scheme = dict(
+            self.key_fn_by_scheme, **{_POOL_SCHEME: self.key_fn_by_scheme["http"]}
+        )
+
+    def _new_pool(
+        self,
+        scheme: str,
+        host: str,
+        port: int,
+        request_context: Optional[dict] = None,
+    ) -> urllib3.HTTPConnectionPool:
+        if scheme != _POOL_SCHEME:
+            return super()._new_pool(scheme, host, port, request_context)
+        context = dict(
+            self.connection_pool_kw if request_context is None else request_context
+        )
+        for key in SSL_KEYWORDS + ("scheme", "host", "port", "socket_options"):
+            context.pop(key, None)
+        return _UnixHTTPConnectionPool(
+            host, port, socket_path=self.socket_path, **context
+        )
+
+    def urlopen(
+        self, method: str, url: str, redirect: bool = True, **kw: Any
+    ) -> urllib3.BaseHTTPResponse:
+        split = split_url(url, self.socket_path)
+        if split is not None:
+            url = "%s://localhost%s" % (_POOL_SCHEME, split[1])
+        return super().urlopen(method, url, redirect, **kw)
@@ -0,0 +1,537 @@
+# coding: utf-8
+
+"""Minimal WebSocket client used by the streaming endpoints."""
+
+import asyncio
+import base64
+import hashlib
+import os
+import socket
+import ssl
+import struct
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from virsh_sandbox import unixsocket
+from virsh_sandbox.configuration import Configuration
+from virsh_sandbox.exceptions import ApiException, ApiValueError
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+
+DEFAULT_MAX_MESSAGE_SIZE = 4 * 1024 * 1024
+"""Largest reassembled message accepted from the server, in bytes."""
+
+_HANDSHAKE_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_MAX_HANDSHAKE_SIZE = 64 * 1024
+_HOP_BY_HOP_HEADERS = {"connection", "upgrade", "host", "content-length"}
+
+Message = Tuple[int, bytes]
+
+
+def to_websocket_url(url: str) -> str:
+    """Convert an ``http(s)://`` URL built by the API client to ``ws(s)://``.
+
+    :param url: URL returned by ``ApiClient.param_serialize``.
+    :return: Equivalent WebSocket URL.
+    """
+    if url.startswith("https://"):
+        return "wss://" + url[len("https://") :]
+    if url.startswith("http://"):
+        return "ws://" + url[len("http://") :]
+    return url
+
+
+def ssl_context(configuration: Configuration) -> ssl.SSLContext:
+    """Build an SSL context matching the urllib3 pool settings.
+
+    :param configuration: Client configuration.
+    :return: Configured SSL context.
+    """
+    ctx = ssl.create_default_context(
+        cafile=configuration.ssl_ca_cert,
+        cadata=(
+            configuration.ca_cert_data.decode()
+            if isinstance(configuration.ca_cert_data, bytes)
+            else configuration.ca_cert_data
+        ),
+    )
+    if configuration.cert_file:
+        ctx.load_cert_chain(configuration.cert_file, configuration.key_file)
+    if not configuration.verify_ssl:
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+    elif configuration.assert_hostname is False:
+        ctx.check_hostname = False
+    return ctx
+
+
+class _HandshakeResponse:
+    """Failed upgrade response, shaped like ``RESTResponse`` for ``ApiException``."""
+
+    def __init__(
+        self, status: int, reason: str, headers: Dict[str, str], data: bytes
+    ) -> None:
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.data = data
+
+
+def _split_url(url: str) -> Tuple[bool, str, int, str]:
+    parts = urlsplit(url)
+    if parts.scheme not in ("ws", "wss"):
+        raise ApiValueError("Unsupported WebSocket URL scheme: {0}".format(url))
+    secure = parts.scheme == "wss"
+    host = parts.hostname or "localhost"
+    port = parts.port or (443 if secure else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return secure, host, port, path
+
+
+def _unix_target(url: str, configuration: Configuration) -> Optional[Tuple[str, str]]:
+    # A URL on the configured Unix socket is left as unix:// by
+    # to_websocket_url; the socket path ends where the configured host does.
+    path = unixsocket.socket_path(configuration.host)
+    return unixsocket.split_url(url, path) if path else None
+
+
+def _handshake_request(
+    host: str, port: int, path: str, headers: Optional[Dict[str, Any]]
+) -> Tuple[bytes, str]:
+    key = base64.b64encode(os.urandom(16)).decode()
+    lines = [
+        "GET {0} HTTP/1.1".format(path),
+        "Host: {0}:{1}".format(host, port),
+        "Upgrade: websocket",
+        "Connection: Upgrade",
+        "Sec-WebSocket-Key: {0}".format(key),
+        "Sec-WebSocket-Version: 13",
+    ]
+    for name, value in (headers or {}).items():
+        if value is None or name.lower() in _HOP_BY_HOP_HEADERS:
+            continue
+        lines.append("{0}: {1}".format(name, value))
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"), key
+
+
+def _parse_handshake_head(head: bytes) -> Tuple[int, str, Dict[str, str]]:
+    status_line, _, header_block = head.decode("latin-1").partition("\r\n")
+    parts = status_line.split(" ", 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        raise ApiException(
+            status=0, reason="Malformed WebSocket handshake: {0}".format(status_line)
+        )
+    headers: Dict[str, str] = {}
+    for line in header_block.split("\r\n"):
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return int(parts[1]), parts[2] if len(parts) > 2 else "", headers
+
+
+def _check_accept(key: str, headers: Dict[str, str]) -> None:
+    digest = hashlib.sha1((key + _HANDSHAKE_GUID).encode()).digest()
+    if headers.get("sec-websocket-accept") != base64.b64encode(digest).decode():
+        raise ApiException(status=0, reason="Invalid Sec-WebSocket-Accept header")
+
+
+def _encode_frame(opcode: int, payload: bytes) -> bytes:
+    """Encode a single, final, masked client frame."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, 0x80 | length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127, length)
+    mask = os.urandom(4)
+    return header + mask + _apply_mask(payload, mask)
+
+
+def _apply_mask(payload: bytes, mask: bytes) -> bytes:
+    if not payload:
+        return payload
+    # XOR in one shot via int arithmetic; much faster than a per-byte loop.
+    repeated = (mask * (len(payload) // 4 + 1))[: len(payload)]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(
+        len(payload), "big"
+    )
+
+
+class _Assembler:
+    """Reassembles fragmented messages and tracks control frames."""
+
+    def __init__(self, max_message_size: int) -> None:
+        self.max_message_size = max_message_size
+        self._opcode: Optional[int] = None
+        self._fragments: list = []
+        self._size = 0
+
+    def feed(self, fin: bool, opcode: int, payload: bytes) -> Optional[Message]:
+        if opcode >= OPCODE_CLOSE:
+            return opcode, payload
+        if opcode != OPCODE_CONTINUATION:
+            self._opcode = opcode
+            self._fragments = []
+            self._size = 0
+        elif self._opcode is None:
+            raise ApiException(status=0, reason="Unexpected continuation frame")
+        self._size += len(payload)
+        if self._size > self.max_message_size:
+            raise ApiException(
+                status=0,
+                reason="WebSocket message exceeds {0} bytes".format(
+                    self.max_message_size
+                ),
+            )
+        self._fragments.append(payload)
+        if not fin:
+            return None
+        message = (self._opcode, b"".join(self._fragments))
+        self._opcode = None
+        self._fragments = []
+        self._size = 0
+        return message
+
+
+def _frame_header(head: bytes) -> Tuple[bool, int, bool, int]:
+    first, second = head[0], head[1]
+    return bool(first & 0x80), first & 0x0F, bool(second & 0x80), second & 0x7F
+
+
+class WebSocketConnection:
+    """Blocking WebSocket client connection.
+
+    Only the subset of RFC 6455 needed by fluid-remote is implemented: text and
+    binary messages, fragmentation, ping/pong and the close handshake. Frames
+    are read on demand, so an unread connection applies TCP backpressure to
+    the server instead of buffering in memory.
+
+    :param sock: Connected socket with the upgrade already performed.
+    :param max_message_size: Largest reassembled message to accept.
+    """
+
+    def __init__(
+        self, sock: socket.socket, max_message_size: int = DEFAULT_MAX_MESSAGE_SIZE
+    ) -> None:
+        self.sock = sock
+        self._reader = sock.makefile("rb")
+        self._assembler = _Assembler(max_message_size)
+        self.closed = False
+        self.close_code: Optional[int] = None
+
+    @classmethod
+    def connect(
+        cls,
+        url: str,
+        headers: Optional[Dict[str, Any]] = None,
+        configuration: Optional[Configuration] = None,
+        timeout: Optional[float] = None,
+        max_message_size: int = DEFAULT_MAX_MESSAGE_SIZE,
+    ) -> "WebSocketConnection":
+        """Open a connection and perform the upgrade handshake.
+
+        :param url: ``ws://`` or ``wss://`` URL, or a URL on the Unix socket
+            of a ``unix://`` configured host.
+        :param headers: Extra request headers (e.g. from ``param_serialize``).
+        :param configuration: Configuration used for TLS settings.
+        :param timeout: Socket timeout in seconds, ``None`` to block.
+        :param max_message_size: Largest reassembled message to accept.
+        :raises ApiException: If the server refuses the upgrade.
+        """
+        configuration = configuration or Configuration.get_default()
+        unix = _unix_target(url, configuration)
+        if unix is not None:
+            secure, host, port, path = False, "localhost", 80, unix[1]
+            sock = unixsocket.connect(unix[0], timeout)
+        else:
+            secure, host, port, path = _split_url(url)
+            sock = socket.create_connection((host, port), timeout=timeout)
+        try:
+            if unix is None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if secure:
+                sock = ssl_context(configuration).wrap_socket(
+                    sock, server_hostname=configuration.tls_server_name or host
+                )
+            request, key = _handshake_request(host, port, path, headers)
+            sock.sendall(request)
+            conn = cls(sock, max_message_size)
+            conn._handshake(key)
+        except BaseException:
+            sock.close()
+            raise
+        return conn
+
+    def _handshake(self, key: str) -> None:
+        head = b""
+        while not head.endswith(b"\r\n\r\n"):
+            line = self._reader.readline(_MAX_HANDSHAKE_SIZE)
+            if not line:
+                raise ApiException(
+                    status=0, reason="Connection closed during handshake"
+                )
+            head += line
+            if len(head) > _MAX_HANDSHAKE_SIZE:
+                raise ApiException(status=0, reason="WebSocket handshake too large")
+        status, reason, headers = _parse_handshake_head(head)
+        if status != 101:
+            length = int(headers.get("content-length", "0") or 0)
+            body = self._reader.read(min(length, _MAX_HANDSHAKE_SIZE))
+            raise ApiException.from_response(
+                http_resp=_HandshakeResponse(status, reason, headers, body),
+                body=body.decode("utf-8", "replace"),
+                data=None,
+            )
+        _check_accept(key, headers)
+
+    def _read_exact(self, n: int) -> bytes:
+        data = self._reader.read(n)
+        if len(data) != n:
+            raise ConnectionError("WebSocket connection closed unexpectedly")
+        return data
+
+    def _read_frame(self) -> Tuple[bool, int, bytes]:
+        fin, opcode, masked, length = _frame_header(self._read_exact(2))
+        if length == 126:
+            (length,) = struct.unpack("!H", self._read_exact(2))
+        elif length == 127:
+            (length,) = struct.unpack("!Q", self._read_exact(8))
+        if length > self._assembler.max_message_size:
+            raise ApiException(status=0, reason="WebSocket frame too large")
+        mask = self._read_exact(4) if masked else b""
+        payload = self._read_exact(length)
+        if masked:
+            payload = _apply_mask(payload, mask)
+        return fin, opcode, payload
+
+    def recv(self) -> Optional[Message]:
+        """Receive the next data message.
+
+        Pings are answered transparently. Returns ``None`` once the server
+        closes the connection.
+
+        :return: ``(opcode, payload)`` tuple or ``None`` when closed.
+        """
+        while not self.closed:
+            try:
+                fin, opcode, payload = self._read_frame()
+            except ConnectionError:
+                self._shutdown()
+                return None
+            message = self._assembler.feed(fin, opcode, payload)
+            if message is None:
+                continue
+            if opcode == OPCODE_PING:
+                try:
+                    self.send(payload, OPCODE_PONG)
+                except ConnectionError:
+                    # The server has gone; frames it sent first can still
+                    # be read.
+                    pass
+            elif opcode == OPCODE_PONG:
+                continue
+            elif opcode == OPCODE_CLOSE:
+                if len(payload) >= 2:
+                    (self.close_code,) = struct.unpack("!H", payload[:2])
+                self.close()
+                return None
+            else:
+                return message
+        return None
+
+    def send(self, data: Any, opcode: int = OPCODE_TEXT) -> None:
+        """Send a single message.
+
+        :param data: ``str`` or ``bytes`` payload.
+        :param opcode: Frame opcode, text by default.
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.sock.sendall(_encode_frame(opcode, data))
+
+    def close(self, code: int = CLOSE_NORMAL) -> None:
+        """Send a close frame (best effort) and release the socket."""
+        if self.closed:
+            return
+        try:
+            self.send(struct.pack("!H", code), OPCODE_CLOSE)
+        except OSError:
+            pass
+        self._shutdown()
+
+    def _shutdown(self) -> None:
+        self.closed = True
+        try:
+            self._reader.close()
+        finally:
+            self.sock.close()
+
+    def __enter__(self) -> "WebSocketConnection":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.close()
+
+
+class AsyncWebSocketConnection:
+    """asyncio counterpart of :class:`WebSocketConnection`.
+
+    :param reader: Stream reader with the upgrade already performed.
+    :param writer: Matching stream writer.
+    :param max_message_size: Largest reassembled message to accept.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        max_message_size: int = DEFAULT_MAX_MESSAGE_SIZE,
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self._assembler = _Assembler(max_message_size)
+        self.closed = False
+        self.close_code: Optional[int] = None
+
+    @classmethod
+    async def connect(
+        cls,
+        url: str,
+        headers: Optional[Dict[str, Any]] = None,
+        configuration: Optional[Configuration] = None,
+        timeout: Optional[float] = None,
+        max_message_size: int = DEFAULT_MAX_MESSAGE_SIZE,
+    ) -> "AsyncWebSocketConnection":
+        """Open a connection and perform the upgrade handshake.
+
+        :param url: ``ws://`` or ``wss://`` URL, or a URL on the Unix socket
+            of a ``unix://`` configured host.
+        :param headers: Extra request headers (e.g. from ``param_serialize``).
+        :param configuration: Configuration used for TLS settings.
+        :param timeout: Connect and handshake timeout in seconds.
+        :param max_message_size: Largest reassembled message to accept.
+        :raises ApiException: If the server refuses the upgrade.
+        """
+        configuration = configuration or Configuration.get_default()
+        unix = _unix_target(url, configuration)
+        if unix is not None:
+            host, port, path = "localhost", 80, unix[1]
+            opening = asyncio.open_unix_connection(unix[0], limit=_MAX_HANDSHAKE_SIZE)
+        else:
+            secure, host, port, path = _split_url(url)
+            opening = asyncio.open_connection(
+                host,
+                port,
+                ssl=ssl_context(configuration) if secure else None,
+                server_hostname=(
+                    (configuration.tls_server_name or host) if secure else None
+                ),
+                limit=_MAX_HANDSHAKE_SIZE,
+            )
+        reader, writer = await asyncio.wait_for(opening, timeout)
+        conn = cls(reader, writer, max_message_size)
+        try:
+            request, key = _handshake_request(host, port, path, headers)
+            writer.write(request)
+            await asyncio.wait_for(conn._handshake(key), timeout)
+        except BaseException:
+            writer.close()
+            raise
+        return conn
+
+    async def _handshake(self, key: str) -> None:
+        try:
+            head = await self.reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+            raise ApiException(
+                status=0, reason="WebSocket handshake failed: {0}".format(e)
+            )
+        status, reason, headers = _parse_handshake_head(head)
+        if status != 101:
+            length = int(headers.get("content-length", "0") or 0)
+            body = await self.reader.read(min(length, _MAX_HANDSHAKE_SIZE))
+            raise ApiException.from_response(
+                http_resp=_HandshakeResponse(status, reason, headers, body),
+                body=body.decode("utf-8", "replace"),
+                data=None,
+            )
+        _check_accept(key, headers)
+
+    async def _read_frame(self) -> Tuple[bool, int, bytes]:
+        fin, opcode, masked, length = _frame_header(await self.reader.readexactly(2))
+        if length == 126:
+            (length,) = struct.unpack("!H", await self.reader.readexactly(2))
+        elif length == 127:
+            (length,) = struct.unpack("!Q", await self.reader.readexactly(8))
+        if length > self._assembler.max_message_size:
+            raise ApiException(status=0, reason="WebSocket frame too large")
+        mask = await self.reader.readexactly(4) if masked else b""
+        payload = await self.reader.readexactly(length)
+        if masked:
+            payload = _apply_mask(payload, mask)
+        return fin, opcode, payload
+
+    async def recv(self) -> Optional[Message]:
+        """Receive the next data message, or ``None`` once closed."""
+        while not self.closed:
+            try:
+                fin, opcode, payload = await self._read_frame()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                self._shutdown()
+                return None
+            message = self._assembler.feed(fin, opcode, payload)
+            if message is None:
+                continue
+            if opcode == OPCODE_PING:
+                await self.send(payload, OPCODE_PONG)
+            elif opcode == OPCODE_PONG:
+                continue
+            elif opcode == OPCODE_CLOSE:
+                if len(payload) >= 2:
+                    (self.close_code,) = struct.unpack("!H", payload[:2])
+                await self.close()
+                return None
+            else:
+                return message
+        return None
+
+    async def send(self, data: Any, opcode: int = OPCODE_TEXT) -> None:
+        """Send a single message.
+
+        :param data: ``str`` or ``bytes`` payload.
+        :param opcode: Frame opcode, text by default.
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.writer.write(_encode_frame(opcode, data))
+        await self.writer.drain()
+
+    async def close(self, code: int = CLOSE_NORMAL) -> None:
+        """Send a close frame (best effort) and release the transport."""
+        if self.closed:
+            return
+        try:
+            await self.send(struct.pack("!H", code), OPCODE_CLOSE)
+        except (OSError, RuntimeError):
+            pass
+        self._shutdown()
+
+    def _shutdown(self) -> None:
+        self.closed = True
+        self.writer.close()
+
+    async def __aenter__(self) -> "AsyncWebSocketConnection":
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        await self.close()
@@ -0,0 +1,76 @@
+"""Compare run_sandbox_command through fluid-remote with DirectExecutor.
+
+Needs a running fluid-remote with the SSH CA configured, a running sandbox
+and a local key pair:
+
+    python bench_direct_exec.py --sandbox SBX-123 --key ~/.ssh/id_ed25519
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from virsh_sandbox import ApiClient, Configuration, DirectExecutor, SandboxApi
+from virsh_sandbox.models.fluid_remote_internal_rest_run_command_request import (
+    FluidRemoteInternalRestRunCommandRequest,
+)
+
+API_BASE = "http://localhost:8080"
+
+
+def measure(name, run, count, threads):
+    latencies = []
+
+    def one(i):
+        begin = time.perf_counter()
+        run("echo %d" % i)
+        latencies.append(time.perf_counter() - begin)
+
+    run("true")  # warm up: certificate, connection, pool
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(one, range(count)))
+    elapsed = time.perf_counter() - begin
+    latencies.sort()
+    print(
+        "%-8s %6d cmds  %8.1f cmds/s  p50 %7.1f ms  p95 %7.1f ms"
+        % (
+            name,
+            count,
+            count / elapsed,
+            statistics.median(latencies) * 1000,
+            latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--api", default=API_BASE)
+    parser.add_argument("--sandbox", required=True)
+    parser.add_argument("--key", required=True, help="private key to certify")
+    parser.add_argument("--user", default="bench")
+    parser.add_argument("-n", "--count", type=int, default=200)
+    parser.add_argument("-t", "--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    client = ApiClient(Configuration(host=args.api))
+    api = SandboxApi(client)
+
+    def rest(command):
+        request = FluidRemoteInternalRestRunCommandRequest(command=command)
+        api.run_sandbox_command(args.sandbox, request)
+
+    measure("rest", rest, args.count, args.threads)
+    with DirectExecutor(args.key, args.user, client) as executor:
+        measure(
+            "direct",
+            lambda command: executor.run(args.sandbox, command),
+            args.count,
+            args.threads,
+        )
+
+
+if __name__ == "__main__":
+    main()